@@ -42,6 +42,7 @@ PERMISSIONS = [
     ('invoices:update', 'invoices', 'update', 'Update invoices'),
     ('invoices:delete', 'invoices', 'delete', 'Delete invoices'),
     ('invoices:export', 'invoices', 'export', 'Export invoices'),
+    ('invoices:close', 'invoices', 'close', 'Close billing months'),
     
     # Payments
     ('payments:read', 'payments', 'read', 'Read payments'),
@@ -95,6 +96,7 @@ ROLES = {
             'entitlements:read', 'entitlements:create', 'entitlements:update', 'entitlements:delete',
             # Invoices
             'invoices:read', 'invoices:create', 'invoices:update', 'invoices:delete', 'invoices:export',
+            'invoices:close',
             # Payments
             'payments:read', 'payments:create', 'payments:update', 'payments:delete',
             # Feedback
@@ -97,7 +97,8 @@ class Role(models.Model):
     def has_permission(self, permission_codename: str) -> bool:
         if self.name == 'super_admin':
             return True
-        return self.permissions.filter(codename=permission_codename).exists()
+        from apps.utility.refdata import role_permissions
+        return permission_codename in role_permissions(self.pk)
 
 
 class MenuItem(models.Model):
@@ -27,8 +27,10 @@ class IsAdminOrSuperAdmin(BasePermission):
             return False
         if user.is_superuser:
             return True
-        if not user.role:
+        if not user.role_id:
             return False
-        return user.role.name in ['super_admin', 'admin']
+        from apps.utility.refdata import roles
+        role = roles().by_id.get(user.role_id)
+        return role is not None and role['name'] in ['super_admin', 'admin']
 
 
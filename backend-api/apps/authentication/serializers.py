@@ -30,6 +30,10 @@ class MenuItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'slug', 'title', 'path', 'icon', 'order', 'children']
 
     def get_children(self, obj):
+        children = self.context.get('children')
+        if children is not None:
+            # Active items grouped by parent id, loaded once by the view
+            return MenuItemSerializer(children.get(obj.id, []), many=True, context=self.context).data
         qs = obj.children.filter(is_active=True).order_by('order')
         return MenuItemSerializer(qs, many=True).data
 
@@ -1,3 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.db.models import F
 from django.test import TestCase
 
-# Create your tests here.
+from apps.utility import refdata, versions
+from apps.utility.models import ReferenceVersion
+from .models import Permission, Role
+
+User = get_user_model()
+
+
+class RolePermissionCacheTests(TestCase):
+
+    def setUp(self):
+        refdata.clear_local()
+        self.permission = Permission.objects.create(codename='feedback:create', resource='feedback', action='create')
+        self.role = Role.objects.create(name='sales_person')
+        self.role.permissions.add(self.permission)
+        self.user = User.objects.create_user(email='bob@example.com', username='bob', password='bob', role=self.role)
+
+    def test_revocation_applies_on_every_worker(self):
+        self.assertTrue(self.user.has_permission('feedback:create'))
+        self.role.permissions.remove(self.permission)
+        self.assertTrue(self.user.has_permission('feedback:create'))
+
+        # Another worker committed the revocation; this process's caches are untouched
+        ReferenceVersion.objects.filter(table='roles').update(version=F('version') + 1)
+        self.assertFalse(self.user.has_permission('feedback:create'))
+
+    def test_versions_are_read_once_per_request(self):
+        # As the request_started and request_finished signals would
+        versions._start_request()
+        self.addCleanup(versions._finish_request)
+        refdata.roles()
+        with self.assertNumQueries(0):
+            versions.get_version('roles')
+            versions.get_version('packages')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.role.permissions.remove(self.permission)
+        self.assertFalse(self.user.has_permission('feedback:create'))
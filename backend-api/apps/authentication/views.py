@@ -48,13 +48,13 @@ class TokenRefresh(TokenRefreshView):
 
 
 class RoleListCreateView(generics.ListCreateAPIView):
-    queryset = Role.objects.all()
+    queryset = Role.objects.prefetch_related('permissions')
     serializer_class = RoleSerializer
     permission_classes = [permissions.IsAuthenticated, IsAdminOrSuperAdmin]
 
 
 class RoleDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Role.objects.all()
+    queryset = Role.objects.prefetch_related('permissions')
     serializer_class = RoleSerializer
     permission_classes = [permissions.IsAuthenticated, IsAdminOrSuperAdmin]
 
@@ -99,21 +99,28 @@ class MenuView(APIView):
 
     def get(self, request):
         user = request.user
+        # The whole active menu in one query; the serializer nests children from it
+        items = MenuItem.objects.filter(is_active=True).order_by('order').prefetch_related(
+            'allowed_roles', 'required_permissions'
+        )
+        children = {}
+        for item in items:
+            children.setdefault(item.parent_id, []).append(item)
         # Top-level items
-        qs = MenuItem.objects.filter(is_active=True, parent__isnull=True).order_by('order')
         allowed = []
-        for item in qs:
+        for item in children.get(None, []):
             if self._allowed(user, item):
                 allowed.append(item)
-        data = MenuItemSerializer(allowed, many=True).data
+        data = MenuItemSerializer(allowed, many=True, context={'children': children}).data
         return Response(data)
 
     def _allowed(self, user, item):
         if user.is_superuser:
             return True
         # Role allowlist OR permission-based
-        if item.allowed_roles.exists():
-            if user.role and item.allowed_roles.filter(id=user.role_id).exists():
+        allowed_roles = item.allowed_roles.all()
+        if allowed_roles:
+            if user.role_id and any(role.id == user.role_id for role in allowed_roles):
                 return True
         required = item.required_permissions.all()
         if not required:
@@ -1,7 +1,15 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.db.models import Sum
-from .models import CustomerEntitlementMaster, CustomerEntitlementDetails, InvoiceMaster, InvoiceDetails
+from .models import (
+    CustomerEntitlementMaster,
+    CustomerEntitlementDetails,
+    CustomerEntitlementDetailsVersion,
+    InvoiceMaster,
+    InvoiceDetails,
+    ClosedPeriod,
+    PeriodClose,
+)
 
 
 class CustomerEntitlementDetailsInline(admin.TabularInline):
@@ -113,13 +121,13 @@ class CustomerEntitlementDetailsAdmin(admin.ModelAdmin):
     customer_name.short_description = 'Customer'
     
     def line_total(self, obj):
-        """Calculate and display line total"""
-        if obj.mbps and obj.unit_price:
-            total = float(obj.mbps * obj.unit_price)
-            total_formatted = f"{total:.2f}"
+        """Display line total"""
+        if obj.line_total:
+            total_formatted = f"{obj.line_total:.2f}"
             return format_html('<span style="color: green; font-weight: bold;">{}</span>', total_formatted)
         return '-'
     line_total.short_description = 'Line Total'
+    line_total.admin_order_field = 'line_total'
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
@@ -299,14 +307,11 @@ class InvoiceDetailsAdmin(admin.ModelAdmin):
     discount_amount.short_description = 'Discount Amount'
     
     def line_total(self, obj):
-        """Calculate line total"""
-        sub_total = float(obj.sub_total)
-        vat = float(obj.sub_total * (obj.vat_rate / 100))
-        discount = float(obj.sub_total * (obj.sub_discount_rate / 100))
-        total = sub_total + vat - discount
-        total_formatted = f"{total:.2f}"
+        """Display line total"""
+        total_formatted = f"{obj.line_total:.2f}"
         return format_html('<span style="color: green; font-weight: bold;">{}</span>', total_formatted)
     line_total.short_description = 'Line Total'
+    line_total.admin_order_field = 'line_total'
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
@@ -314,3 +319,66 @@ class InvoiceDetailsAdmin(admin.ModelAdmin):
             'invoice_master_id__customer_entitlement_master_id__customer_master_id',
             'entitlement_details_id'
         )
+
+
+@admin.register(CustomerEntitlementDetailsVersion)
+class CustomerEntitlementDetailsVersionAdmin(admin.ModelAdmin):
+    """Read-only view of entitlement detail history"""
+    list_display = [
+        'id', 'detail_id', 'cust_entitlement_id', 'type', 'mbps', 'unit_price',
+        'status', 'is_active', 'valid_from', 'valid_to', 'changed_by'
+    ]
+    list_filter = ['type', 'status', 'valid_from']
+    search_fields = ['=detail_id', '=cust_entitlement_id']
+    ordering = ['-valid_from']
+    date_hierarchy = 'valid_from'
+    list_per_page = 25
+    list_select_related = ['changed_by']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ClosedPeriod)
+class ClosedPeriodAdmin(admin.ModelAdmin):
+    """Read-only list of closed months; close and reopen with the close_period command"""
+    list_display = ['month', 'closed_at', 'closed_by']
+    ordering = ['-month']
+    list_select_related = ['closed_by']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PeriodClose)
+class PeriodCloseAdmin(admin.ModelAdmin):
+    """Read-only view of frozen month-end totals"""
+    list_display = [
+        'month', 'customer_id', 'kam_id', 'customer_type', 'invoice_count',
+        'billed_amount', 'paid_amount', 'due_amount', 'collected_amount'
+    ]
+    list_filter = ['month', 'customer_type']
+    search_fields = ['customer_id', 'kam_id']
+    ordering = ['-month', 'customer_id']
+    list_per_page = 50
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -5,3 +5,6 @@ class BillsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.bills'
 
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,261 @@
+"""
+Month-end close: freeze a month's billing and collection totals per customer
+and lock the month's invoices and payments against edits.
+
+Months are closed in order, so everything up to the end of the latest
+closed month is locked. Recording a payment today against an invoice of a
+closed month is still allowed; it only changes the invoice's settlement
+columns.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum, Count, DecimalField, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from apps.payment.models import PaymentMaster, PaymentDetails
+from .models import ClosedPeriod, PeriodClose, InvoiceMaster
+from .utils import bump_billing_version
+
+
+EXCLUDED_INVOICE_STATUSES = ['cancelled']
+EXCLUDED_PAYMENT_STATUSES = ['failed']
+
+# Invoice columns the close froze; they may not change on an invoice of a closed month
+LOCKED_INVOICE_FIELDS = [
+    'issue_date', 'customer_entitlement_master_id', 'total_bill_amount', 'total_vat_amount', 'total_discount_amount',
+]
+# Statuses payment recording moves a closed invoice between
+SETTLEMENT_STATUSES = ['unpaid', 'partial', 'paid']
+
+
+class PeriodClosedError(ValidationError):
+    def __init__(self, day, what):
+        super().__init__({'period': f'{day:%Y-%m} is closed; {what} can no longer be changed.'})
+
+
+def _next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _as_date(value):
+    return date.fromisoformat(value[:10]) if isinstance(value, str) else value
+
+
+def _money():
+    return DecimalField(max_digits=14, decimal_places=2)
+
+
+def _sum(field, condition=None):
+    return Coalesce(Sum(field, filter=condition, output_field=_money()), Value(Decimal('0')), output_field=_money())
+
+
+def closed_through():
+    """
+    Last day of the latest closed month, or None.
+
+    Read from the database on every check (one indexed row), so a close or
+    reopen applies to every worker at once.
+    """
+    latest = ClosedPeriod.objects.order_by('-month').values_list('month', flat=True).first()
+    return _next_month(latest) - timedelta(days=1) if latest else None
+
+
+def closed_months(start, end):
+    """Closed months lying entirely inside [start, end], oldest first"""
+    months = ClosedPeriod.objects.filter(month__gte=start, month__lte=end).order_by('month').values_list('month', flat=True)
+    return [month for month in months if _next_month(month) - timedelta(days=1) <= end]
+
+
+def close_period(month, user=None):
+    """
+    Close month: write its per-customer totals to period_close and lock it.
+    The month must be over and directly follow the latest closed month.
+    Returns the ClosedPeriod.
+    """
+    month = month.replace(day=1)
+    following = _next_month(month)
+    if following > timezone.localdate():
+        raise ValidationError({'month': f'{month:%Y-%m} is not over yet.'})
+
+    with transaction.atomic():
+        # Serialises concurrent closes
+        latest = ClosedPeriod.objects.select_for_update().order_by('-month').first()
+        if latest and month <= latest.month:
+            raise ValidationError({'month': f'{month:%Y-%m} is already closed.'})
+        if latest and month != _next_month(latest.month):
+            raise ValidationError({'month': f'Close {_next_month(latest.month):%Y-%m} first.'})
+        period = ClosedPeriod.objects.create(month=month, closed_by=user)
+
+        customer = 'customer_entitlement_master_id__customer_master_id'
+        totals = {}
+        for row in InvoiceMaster.objects.filter(issue_date__gte=month, issue_date__lt=following).exclude(
+            status__in=EXCLUDED_INVOICE_STATUSES
+        ).order_by().values(customer, f'{customer}__kam_id', f'{customer}__customer_type').annotate(
+            invoice_count=Count('id'),
+            billed_amount=_sum('total_bill_amount'),
+            vat_amount=_sum('total_vat_amount'),
+            discount_amount=_sum('total_discount_amount'),
+            paid_amount=_sum('total_paid_amount'),
+            due_amount=_sum('total_balance_due'),
+        ):
+            totals[row[customer]] = PeriodClose(
+                closed_period_id=period,
+                month=month,
+                customer_id=row[customer],
+                kam_id=row[f'{customer}__kam_id'],
+                customer_type=row[f'{customer}__customer_type'],
+                invoice_count=row['invoice_count'],
+                billed_amount=row['billed_amount'],
+                vat_amount=row['vat_amount'],
+                discount_amount=row['discount_amount'],
+                paid_amount=row['paid_amount'],
+                due_amount=row['due_amount'],
+            )
+
+        payment_customer = f'payment_master_id__{customer}'
+        for row in PaymentDetails.objects.filter(
+            payment_master_id__payment_date__gte=month, payment_master_id__payment_date__lt=following
+        ).exclude(status__in=EXCLUDED_PAYMENT_STATUSES).exclude(
+            payment_master_id__status__in=EXCLUDED_PAYMENT_STATUSES
+        ).order_by().values(payment_customer, f'{payment_customer}__kam_id', f'{payment_customer}__customer_type').annotate(
+            collected_amount=_sum('pay_amount'),
+            payment_count=Count('payment_master_id', distinct=True),
+        ):
+            total = totals.setdefault(row[payment_customer], PeriodClose(
+                closed_period_id=period,
+                month=month,
+                customer_id=row[payment_customer],
+                kam_id=row[f'{payment_customer}__kam_id'],
+                customer_type=row[f'{payment_customer}__customer_type'],
+            ))
+            total.collected_amount = row['collected_amount']
+            total.payment_count = row['payment_count']
+
+        PeriodClose.objects.bulk_create(totals.values(), batch_size=1000)
+        transaction.on_commit(bump_billing_version)
+    return period
+
+
+def reopen_period(month):
+    """Reopen the latest closed month, dropping its frozen totals"""
+    month = month.replace(day=1)
+    with transaction.atomic():
+        latest = ClosedPeriod.objects.select_for_update().order_by('-month').first()
+        if latest is None or latest.month != month:
+            raise ValidationError({'month': 'Only the latest closed month can be reopened.'})
+        latest.delete()
+        transaction.on_commit(bump_billing_version)
+
+
+AMOUNT_FIELDS = ['billed_amount', 'vat_amount', 'discount_amount', 'paid_amount', 'due_amount', 'collected_amount']
+COUNT_FIELDS = ['invoice_count', 'payment_count']
+
+
+def _totals(row):
+    return {
+        **{name: float(row[name] or 0) for name in AMOUNT_FIELDS},
+        **{name: row[name] or 0 for name in COUNT_FIELDS},
+    }
+
+
+def list_closed_periods():
+    """Closed months, newest first, with their frozen grand totals"""
+    periods = ClosedPeriod.objects.select_related('closed_by').order_by('-month').annotate(
+        customers=Count('totals'),
+        **{name: Sum(f'totals__{name}') for name in AMOUNT_FIELDS + COUNT_FIELDS},
+    )
+    return [{
+        'month': f'{period.month:%Y-%m}',
+        'closed_at': period.closed_at,
+        'closed_by': period.closed_by.email if period.closed_by else None,
+        'customers': period.customers,
+        **_totals(vars(period)),
+    } for period in periods]
+
+
+def closed_period_summary(month):
+    """A closed month's frozen totals per KAM and per customer"""
+    month = month.replace(day=1)
+    if not ClosedPeriod.objects.filter(month=month).exists():
+        raise ValidationError({'month': f'{month:%Y-%m} is not closed.'})
+    rows = PeriodClose.objects.filter(month=month)
+    by_kam = rows.order_by().values('kam_id').annotate(
+        customers=Count('id'), **{name: Sum(name) for name in AMOUNT_FIELDS + COUNT_FIELDS}
+    ).order_by('kam_id')
+    by_customer = rows.order_by('customer_id').values('customer_id', 'kam_id', 'customer_type', *AMOUNT_FIELDS, *COUNT_FIELDS)
+    return {
+        'month': f'{month:%Y-%m}',
+        'by_kam': [{'kam_id': row['kam_id'], 'customers': row['customers'], **_totals(row)} for row in by_kam],
+        'by_customer': [{
+            'customer_id': row['customer_id'],
+            'kam_id': row['kam_id'],
+            'customer_type': row['customer_type'],
+            **_totals(row),
+        } for row in by_customer],
+    }
+
+
+# ---- locks (called from pre_save / pre_delete signals and bulk writes) ----------
+
+def check_open(day, what, through=None):
+    """Raise PeriodClosedError when day falls in a closed month (through: closed_through(), when already read)"""
+    through = through or closed_through()
+    day = _as_date(day)
+    if through and day and day <= through:
+        raise PeriodClosedError(day, what)
+
+
+def check_invoice_save(invoice, update_fields=None):
+    through = closed_through()
+    if through is None:
+        return
+    if invoice._state.adding:
+        check_open(invoice.issue_date, 'its invoices', through)
+        return
+    status_ok = invoice.status in SETTLEMENT_STATUSES
+    if update_fields is not None and status_ok and not set(update_fields) & set(LOCKED_INVOICE_FIELDS):
+        # Payment recording and other non-financial updates
+        return
+    stored = InvoiceMaster.objects.filter(pk=invoice.pk).values('status', *LOCKED_INVOICE_FIELDS).first()
+    if stored is None or (stored['issue_date'] > through and _as_date(invoice.issue_date) > through):
+        return
+    day = min(stored['issue_date'], _as_date(invoice.issue_date))
+    meta = InvoiceMaster._meta
+    if any(stored[name] != getattr(invoice, meta.get_field(name).attname) for name in LOCKED_INVOICE_FIELDS):
+        raise PeriodClosedError(day, 'its invoices')
+    if stored['status'] != invoice.status and not (stored['status'] in SETTLEMENT_STATUSES and status_ok):
+        raise PeriodClosedError(day, 'its invoices')
+
+
+def check_invoice_detail(detail):
+    through = closed_through()
+    if through is None:
+        return
+    check_open(
+        InvoiceMaster.objects.filter(pk=detail.invoice_master_id_id).values_list('issue_date', flat=True).first(),
+        'its invoice lines', through,
+    )
+
+
+def check_payment_save(payment):
+    through = closed_through()
+    if through is None:
+        return
+    check_open(payment.payment_date, 'its payments', through)
+    if not payment._state.adding:
+        stored = PaymentMaster.objects.filter(pk=payment.pk).values_list('payment_date', flat=True).first()
+        check_open(stored, 'its payments', through)
+
+
+def check_payment_detail(detail):
+    through = closed_through()
+    if through is None:
+        return
+    check_open(
+        PaymentMaster.objects.filter(pk=detail.payment_master_id_id).values_list('payment_date', flat=True).first(),
+        'its payments', through,
+    )
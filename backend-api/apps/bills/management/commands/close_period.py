@@ -0,0 +1,34 @@
+"""
+Django management command for the month-end close.
+Freezes a month's per-customer billing and collection totals and locks its
+invoices and payments; --reopen undoes the latest close.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from apps.bills.closing import close_period, reopen_period
+from apps.dashboard.reports import parse_month_param
+
+
+class Command(BaseCommand):
+    help = 'Close a billing month (YYYY-MM), or reopen the latest closed month'
+
+    def add_arguments(self, parser):
+        parser.add_argument('month', help='Month to close, YYYY-MM')
+        parser.add_argument(
+            '--reopen',
+            action='store_true',
+            help='Reopen the month instead; only the latest closed month can be reopened',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            month = parse_month_param(options['month'], 'month')
+            if options['reopen']:
+                reopen_period(month)
+                self.stdout.write(self.style.SUCCESS(f'Reopened {month:%Y-%m}'))
+                return
+            period = close_period(month)
+        except ValidationError as exc:
+            raise CommandError(' '.join(str(message) for message in exc.detail.values()))
+        self.stdout.write(self.style.SUCCESS(f'Closed {month:%Y-%m}: {period.totals.count()} customer rows frozen'))
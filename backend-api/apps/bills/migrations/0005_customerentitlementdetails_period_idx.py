@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_period_gist_index(apps, schema_editor):
+    # GiST over daterange(start_date, end_date) only exists on PostgreSQL;
+    # other backends rely on the composite B-tree index below.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS ent_details_period_gist "
+        "ON customer_entitlement_details "
+        "USING gist (daterange(start_date, end_date, '[]'))"
+    )
+
+
+def drop_period_gist_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS ent_details_period_gist")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bills', '0004_customerentitlementmaster_link_id_and_more'),
+        ('package', '0002_packagepricing_mbps'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customerentitlementdetails',
+            index=models.Index(fields=['start_date', 'end_date'], name='ent_details_period_idx'),
+        ),
+        migrations.RunPython(create_period_gist_index, drop_period_gist_index),
+    ]
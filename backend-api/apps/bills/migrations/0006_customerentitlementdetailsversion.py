@@ -0,0 +1,58 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_open_versions(apps, schema_editor):
+    """Seed one open version per existing detail, valid from its creation"""
+    schema_editor.execute(
+        "INSERT INTO customer_entitlement_details_version ("
+        " detail_id, cust_entitlement_id, type, start_date, end_date, package_pricing_id,"
+        " mbps, unit_price, custom_mac_percentage_share, status, is_active,"
+        " valid_from, valid_to, changed_by_id"
+        ") SELECT"
+        " id, cust_entitlement_id, type, start_date, end_date, package_pricing_id,"
+        " mbps, unit_price, custom_mac_percentage_share, status, is_active,"
+        " created_at, NULL, COALESCE(updated_by_id, created_by_id)"
+        " FROM customer_entitlement_details"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bills', '0005_customerentitlementdetails_period_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerEntitlementDetailsVersion',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('detail_id', models.IntegerField(db_index=True)),
+                ('type', models.CharField(choices=[('bw', 'Bandwidth'), ('channel_partner', 'Channel Partner'), ('soho', 'SOHO/Home')], max_length=20)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('package_pricing_id', models.IntegerField(blank=True, null=True)),
+                ('mbps', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('unit_price', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('custom_mac_percentage_share', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('status', models.CharField(choices=[('active', 'Active'), ('inactive', 'Inactive'), ('expired', 'Expired')], max_length=20)),
+                ('is_active', models.BooleanField()),
+                ('valid_from', models.DateTimeField()),
+                ('valid_to', models.DateTimeField(blank=True, null=True)),
+                ('changed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='entitlement_detail_versions', to=settings.AUTH_USER_MODEL)),
+                ('cust_entitlement_id', models.ForeignKey(db_column='cust_entitlement_id', on_delete=django.db.models.deletion.CASCADE, related_name='detail_versions', to='bills.customerentitlementmaster')),
+            ],
+            options={
+                'db_table': 'customer_entitlement_details_version',
+                'ordering': ['detail_id', 'valid_from'],
+                'indexes': [models.Index(fields=['cust_entitlement_id', 'valid_from', 'valid_to'], name='ent_detail_ver_asof_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('valid_to__isnull', True)), fields=('detail_id',), name='ent_detail_ver_one_open')],
+            },
+        ),
+        migrations.RunPython(backfill_open_versions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bills', '0006_customerentitlementdetailsversion'),
+        ('utility', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoicemaster',
+            index=models.Index(fields=['status', 'issue_date'], name='invoice_status_issue_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bills', '0008_invoicemaster_invoice_updated_at_idx'),
+        ('package', '0002_packagepricing_mbps'),
+        ('utility', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customerentitlementdetails',
+            index=models.Index(fields=['created_by', 'created_at'], name='ent_details_created_by_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoicemaster',
+            index=models.Index(fields=['created_by', 'created_at'], name='invoice_created_by_idx'),
+        ),
+    ]
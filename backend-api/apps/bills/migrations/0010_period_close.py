@@ -0,0 +1,54 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bills', '0009_created_by_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClosedPeriod',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('month', models.DateField(help_text='First day of the month', unique=True)),
+                ('closed_at', models.DateTimeField(auto_now_add=True)),
+                ('closed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='closed_periods', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'closed_period',
+                'ordering': ['-month'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PeriodClose',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('customer_id', models.IntegerField()),
+                ('kam_id', models.IntegerField(blank=True, help_text='KAM at the close', null=True)),
+                ('customer_type', models.CharField(max_length=20)),
+                ('invoice_count', models.IntegerField(default=0, help_text='Invoices issued in the month')),
+                ('billed_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('vat_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('discount_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('paid_amount', models.DecimalField(decimal_places=2, default=0, help_text="Paid on the month's invoices at the close", max_digits=14)),
+                ('due_amount', models.DecimalField(decimal_places=2, default=0, help_text="Balance due on the month's invoices at the close", max_digits=14)),
+                ('collected_amount', models.DecimalField(decimal_places=2, default=0, help_text='Payments received in the month', max_digits=14)),
+                ('payment_count', models.IntegerField(default=0)),
+                ('closed_period_id', models.ForeignKey(db_column='closed_period_id', on_delete=django.db.models.deletion.CASCADE, related_name='totals', to='bills.closedperiod')),
+            ],
+            options={
+                'db_table': 'period_close',
+                'ordering': ['month', 'customer_id'],
+                'indexes': [models.Index(fields=['month', 'kam_id'], name='period_close_month_kam_idx')],
+                'constraints': [models.UniqueConstraint(fields=('month', 'customer_id'), name='period_close_uniq')],
+            },
+        ),
+    ]
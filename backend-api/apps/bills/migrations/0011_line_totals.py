@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:36
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bills', '0010_period_close'),
+        ('package', '0002_packagepricing_mbps'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customerentitlementdetails',
+            name='line_total',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.comparison.Coalesce(django.db.models.expressions.CombinedExpression(models.F('mbps'), '*', models.F('unit_price')), models.Value(Decimal('0')), output_field=models.DecimalField(decimal_places=2, max_digits=14)), output_field=models.DecimalField(decimal_places=2, max_digits=14)),
+        ),
+        migrations.AddField(
+            model_name='invoicedetails',
+            name='line_total',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('sub_total'), '*', django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.Value(100), '+', models.F('vat_rate')), '-', models.F('sub_discount_rate'))), '/', models.Value(100)), output_field=models.DecimalField(decimal_places=2, max_digits=14)),
+        ),
+        migrations.AddIndex(
+            model_name='customerentitlementdetails',
+            index=models.Index(fields=['line_total'], name='ent_details_line_total_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoicedetails',
+            index=models.Index(fields=['line_total'], name='invoice_details_line_total_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bills', '0011_line_totals'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customerentitlementdetailsversion',
+            name='cust_entitlement_id',
+            field=models.IntegerField(db_column='cust_entitlement_id'),
+        ),
+    ]
@@ -1,9 +1,46 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, connection, transaction
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from django.utils import timezone
 from apps.customers.models import CustomerMaster
 from apps.bills.utils import generate_bill_number
 
 
+def _money():
+    return models.DecimalField(max_digits=14, decimal_places=2)
+
+
+class CustomerEntitlementMasterQuerySet(models.QuerySet):
+
+    def with_total_amount(self, details=None):
+        """
+        Annotate total_entitlement_amount: the sum of line_total over the
+        entitlement's details, or over the given details queryset.
+        """
+        if details is None:
+            details = CustomerEntitlementDetails.objects.all()
+        total = details.filter(cust_entitlement_id=models.OuterRef('pk')).order_by().values(
+            'cust_entitlement_id'
+        ).annotate(total=models.Sum('line_total')).values('total')
+        return self.annotate(total_entitlement_amount=Coalesce(
+            models.Subquery(total, output_field=_money()), models.Value(Decimal('0')), output_field=_money()
+        ))
+
+    def for_list(self, selection=None):
+        """
+        Join and prefetch what CustomerEntitlementMasterSerializer reads, so a page costs a fixed number of queries;
+        with a FieldSelection, only what its fields read
+        """
+        qs = self
+        if selection is None or selection.wants('customer_name', 'customer_type'):
+            qs = qs.select_related('customer_master_id')
+        if selection is None or selection.wants('details', 'details_count'):
+            qs = qs.prefetch_related(models.Prefetch('details', queryset=CustomerEntitlementDetails.objects.with_package()))
+        return qs
+
+
 class CustomerEntitlementMaster(models.Model):
     """Customer Entitlement Master - Main billing record for a customer"""
     id = models.AutoField(primary_key=True)
@@ -41,6 +78,8 @@ class CustomerEntitlementMaster(models.Model):
         related_name='updated_entitlements'
     )
 
+    objects = CustomerEntitlementMasterQuerySet.as_manager()
+
     class Meta:
         db_table = 'customer_entitlement_master'
         ordering = ['-created_at']
@@ -59,6 +98,63 @@ class CustomerEntitlementMaster(models.Model):
             self.save(update_fields=['bill_number'])
 
 
+class CustomerEntitlementDetailsQuerySet(models.QuerySet):
+    """Date-range lookups over entitlement detail validity periods"""
+
+    def _period(self):
+        # Mirrors the daterange(start_date, end_date, '[]') GiST index created by
+        # migration 0005 so PostgreSQL can answer @> / && from the index.
+        from django.contrib.postgres.fields import DateRangeField
+        return self.alias(period=models.Func(
+            models.F('start_date'),
+            models.F('end_date'),
+            models.Value('[]'),
+            function='daterange',
+            output_field=DateRangeField(),
+        ))
+
+    def with_package(self):
+        """Join the pricing and package each line is named by"""
+        return self.select_related('package_pricing_id__package_master_id')
+
+    def active_on(self, on_date):
+        """Lines whose [start_date, end_date] period contains on_date"""
+        if connection.vendor == 'postgresql':
+            return self._period().filter(period__contains=on_date)
+        return self.filter(start_date__lte=on_date, end_date__gte=on_date)
+
+    def overlapping(self, start, end):
+        """Lines whose period shares at least one day with [start, end]"""
+        if connection.vendor == 'postgresql':
+            from django.db.backends.postgresql.psycopg_any import DateRange
+            return self._period().filter(period__overlap=DateRange(start, end, '[]'))
+        return self.filter(start_date__lte=end, end_date__gte=start)
+
+    # Bulk writes record history like save() does; deletes of any kind close
+    # it from the post_delete signal (signals.close_detail_versions), and
+    # lines unlinked by deleting their pricing are versioned from its
+    # post_delete (signals.version_unlinked_details)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        if kwargs.get('ignore_conflicts') or kwargs.get('update_conflicts'):
+            raise ValueError('bulk_create() of entitlement details cannot skip or merge rows: they need version history')
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            CustomerEntitlementDetailsVersion.objects.record_many(objs)
+        return objs
+
+    def update(self, **kwargs):
+        if not set(kwargs) & set(CustomerEntitlementDetailsVersion.TRACKED_FIELDS):
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            pks = list(self.select_for_update().values_list('pk', flat=True))
+            updated = super().update(**kwargs)
+            CustomerEntitlementDetailsVersion.objects.record_many(self.model._base_manager.filter(pk__in=pks))
+        return updated
+
+    update.alters_data = True
+
+
 class CustomerEntitlementDetails(models.Model):
     """Customer Entitlement Details - Detailed entitlement information"""
     TYPE_CHOICES = [
@@ -97,18 +193,176 @@ class CustomerEntitlementDetails(models.Model):
     remarks = models.TextField(blank=True, null=True, help_text="Additional remarks or notes (e.g., bandwidth type for BW customers)")
     is_active = models.BooleanField(default=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+    # mbps * unit_price, kept by the database; 0 for lines without both
+    line_total = models.GeneratedField(
+        expression=Coalesce(models.F('mbps') * models.F('unit_price'), models.Value(Decimal('0')), output_field=_money()),
+        output_field=_money(),
+        db_persist=True,
+    )
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='created_entitlement_details')
     updated_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='updated_entitlement_details')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CustomerEntitlementDetailsQuerySet.as_manager()
+
     class Meta:
         db_table = 'customer_entitlement_details'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['start_date', 'end_date'], name='ent_details_period_idx'),
+            models.Index(fields=['created_by', 'created_at'], name='ent_details_created_by_idx'),
+            models.Index(fields=['line_total'], name='ent_details_line_total_idx'),
+        ]
 
     def __str__(self):
         return f"{self.cust_entitlement_id.bill_number} - {self.type} ({self.start_date} to {self.end_date})"
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        # Saves that only touch untracked columns never change a version
+        if update_fields is not None and not set(update_fields) & set(CustomerEntitlementDetailsVersion.TRACKED_FIELDS):
+            return super().save(*args, **kwargs)
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            CustomerEntitlementDetailsVersion.objects.record(self)
+        # Inserts return the computed line_total; updates of its inputs must read it back
+        if not adding and (update_fields is None or {'mbps', 'unit_price'} & set(update_fields)):
+            self.refresh_from_db(fields=['line_total'])
+
+
+class CustomerEntitlementDetailsVersionQuerySet(models.QuerySet):
+    """Append-only history lookups for entitlement details"""
+
+    def as_of(self, moment):
+        """Versions that were current at the given datetime"""
+        return self.filter(valid_from__lte=moment).filter(
+            models.Q(valid_to__isnull=True) | models.Q(valid_to__gt=moment)
+        )
+
+    def current(self):
+        return self.filter(valid_to__isnull=True)
+
+    def record(self, detail):
+        """Append a version for detail if any tracked field changed"""
+        return self.record_many([detail])
+
+    def record_many(self, details):
+        """
+        Append a version for each of details whose tracked fields changed.
+
+        Closes their previously open versions and opens the new ones at the
+        same instant, inside the caller's transaction.
+        """
+        Version = CustomerEntitlementDetailsVersion
+        snapshots = {
+            detail.pk: (detail, {field: getattr(detail, Version.source_attname(field)) for field in Version.TRACKED_FIELDS})
+            for detail in details
+        }
+        if not snapshots:
+            return
+        now = timezone.now()
+        open_versions = {
+            version.detail_id: version
+            for version in self.select_for_update().filter(detail_id__in=snapshots, valid_to__isnull=True)
+        }
+        changed = []
+        for pk, (detail, snapshot) in snapshots.items():
+            version = open_versions.get(pk)
+            if version and version.cust_entitlement_id == detail.cust_entitlement_id_id and all(
+                getattr(version, field) == value for field, value in snapshot.items()
+            ):
+                continue
+            changed.append(Version(
+                detail_id=pk,
+                cust_entitlement_id=detail.cust_entitlement_id_id,
+                changed_by_id=detail.updated_by_id or detail.created_by_id,
+                valid_from=now,
+                **snapshot,
+            ))
+        self.filter(
+            id__in=[open_versions[version.detail_id].id for version in changed if version.detail_id in open_versions]
+        ).update(valid_to=now)
+        self.bulk_create(changed)
+
+    def close(self, detail_ids):
+        """Mark the open versions of deleted details as no longer valid"""
+        return self.filter(detail_id__in=detail_ids, valid_to__isnull=True).update(valid_to=timezone.now())
+
+
+class CustomerEntitlementDetailsVersion(models.Model):
+    """Point-in-time copy of the billable fields of an entitlement detail.
+
+    A row is valid for [valid_from, valid_to); the open row (valid_to NULL)
+    mirrors the live detail. Rows are never updated except to close them.
+    """
+    TRACKED_FIELDS = [
+        'type', 'start_date', 'end_date', 'package_pricing_id', 'mbps', 'unit_price',
+        'custom_mac_percentage_share', 'status', 'is_active',
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    # Plain columns rather than FKs so history survives deletion of the
+    # detail and of its entitlement
+    detail_id = models.IntegerField(db_index=True)
+    cust_entitlement_id = models.IntegerField(db_column='cust_entitlement_id')
+    type = models.CharField(max_length=20, choices=CustomerEntitlementDetails.TYPE_CHOICES)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    package_pricing_id = models.IntegerField(null=True, blank=True)
+    mbps = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    unit_price = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    custom_mac_percentage_share = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=CustomerEntitlementDetails.STATUS_CHOICES)
+    is_active = models.BooleanField()
+    valid_from = models.DateTimeField()
+    valid_to = models.DateTimeField(null=True, blank=True)
+    changed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='entitlement_detail_versions')
+
+    objects = CustomerEntitlementDetailsVersionQuerySet.as_manager()
+
+    class Meta:
+        db_table = 'customer_entitlement_details_version'
+        ordering = ['detail_id', 'valid_from']
+        indexes = [
+            models.Index(fields=['cust_entitlement_id', 'valid_from', 'valid_to'], name='ent_detail_ver_asof_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['detail_id'],
+                condition=models.Q(valid_to__isnull=True),
+                name='ent_detail_ver_one_open',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Detail #{self.detail_id} ({self.valid_from} - {self.valid_to or 'current'})"
+
+    @staticmethod
+    def source_attname(field):
+        """package_pricing_id is a FK on the detail; read its raw id column"""
+        return 'package_pricing_id_id' if field == 'package_pricing_id' else field
+
+
+class InvoiceMasterQuerySet(models.QuerySet):
+
+    def for_list(self, selection=None):
+        """
+        Join and prefetch what InvoiceMasterSerializer reads, so a page costs a fixed number of queries;
+        with a FieldSelection, only what its fields read
+        """
+        qs = self
+        if selection is None or selection.wants('customer_name', 'customer_id', 'bill_number'):
+            qs = qs.select_related('customer_entitlement_master_id__customer_master_id')
+        if selection is None or selection.wants('utility_info'):
+            qs = qs.select_related('information_master_id')
+        if selection is None or selection.wants('details', 'details_count'):
+            qs = qs.prefetch_related(
+                models.Prefetch('details', queryset=InvoiceDetails.objects.select_related('entitlement_details_id'))
+            )
+        return qs
+
 
 class InvoiceMaster(models.Model):
     """Invoice Master - 1:1 relationship with Customer Entitlement Master"""
@@ -146,7 +400,13 @@ class InvoiceMaster(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = InvoiceMasterQuerySet.as_manager()
+
     def save(self, *args, **kwargs):
+        # Totals are often saved with update_fields; keep updated_at moving so
+        # incremental readers (dashboard facts) see the change
+        if kwargs.get('update_fields'):
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'updated_at'}
         if not self.invoice_number:
             self.invoice_number = generate_bill_number(
                 self.customer_entitlement_master_id.customer_master_id.customer_name,
@@ -166,6 +426,11 @@ class InvoiceMaster(models.Model):
     class Meta:
         db_table = 'invoice_master'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'issue_date'], name='invoice_status_issue_idx'),
+            models.Index(fields=['updated_at'], name='invoice_updated_at_idx'),
+            models.Index(fields=['created_by', 'created_at'], name='invoice_created_by_idx'),
+        ]
 
     def __str__(self):
         return f"{self.invoice_number} - {self.customer_entitlement_master_id.customer_master_id.customer_name}"
@@ -192,13 +457,85 @@ class InvoiceDetails(models.Model):
     sub_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     vat_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0)
     sub_discount_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    # sub_total plus VAT less discount, kept by the database
+    line_total = models.GeneratedField(
+        expression=models.F('sub_total') * (
+            models.Value(100) + models.F('vat_rate') - models.F('sub_discount_rate')
+        ) / models.Value(100),
+        output_field=_money(),
+        db_persist=True,
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     remarks = models.TextField(blank=True)
     
     class Meta:
         db_table = 'invoice_details'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['line_total'], name='invoice_details_line_total_idx'),
+        ]
 
     def __str__(self):
         return f"{self.invoice_master_id.invoice_number} - Detail #{self.id}"
 
+
+
+class ClosedPeriod(models.Model):
+    """Closed Period - A billing month frozen by the month-end close"""
+    id = models.AutoField(primary_key=True)
+    month = models.DateField(unique=True, help_text="First day of the month")
+    closed_at = models.DateTimeField(auto_now_add=True)
+    closed_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='closed_periods'
+    )
+
+    class Meta:
+        db_table = 'closed_period'
+        ordering = ['-month']
+
+    def __str__(self):
+        return f"{self.month:%Y-%m}"
+
+
+class PeriodClose(models.Model):
+    """
+    Period Close - Per-customer billing and collection totals of a closed month,
+    as they stood at the close. Customer and KAM are plain ids so history
+    survives deletes and reassignments.
+    """
+    id = models.BigAutoField(primary_key=True)
+    closed_period_id = models.ForeignKey(
+        ClosedPeriod,
+        on_delete=models.CASCADE,
+        db_column='closed_period_id',
+        related_name='totals'
+    )
+    month = models.DateField(help_text="First day of the month")
+    customer_id = models.IntegerField()
+    kam_id = models.IntegerField(null=True, blank=True, help_text="KAM at the close")
+    customer_type = models.CharField(max_length=20)
+    invoice_count = models.IntegerField(default=0, help_text="Invoices issued in the month")
+    billed_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    vat_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    discount_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    paid_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0, help_text="Paid on the month's invoices at the close")
+    due_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0, help_text="Balance due on the month's invoices at the close")
+    collected_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0, help_text="Payments received in the month")
+    payment_count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'period_close'
+        ordering = ['month', 'customer_id']
+        constraints = [
+            models.UniqueConstraint(fields=['month', 'customer_id'], name='period_close_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['month', 'kam_id'], name='period_close_month_kam_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} - {self.customer_id}"
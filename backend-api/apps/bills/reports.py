@@ -0,0 +1,176 @@
+"""
+Set-based reports for the Bills App - Accounts receivable aging
+"""
+import csv
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q, F, Sum, Count, OuterRef, Subquery, DecimalField, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import InvoiceMaster
+from .utils import get_billing_version
+
+
+# (key, label, oldest age in days, youngest age in days)
+AGING_BUCKETS = [
+    ('current', '0-30', 30, 0),
+    ('days_31_60', '31-60', 60, 31),
+    ('days_61_90', '61-90', 90, 61),
+    ('days_90_plus', '90+', None, 91),
+]
+
+# group_by value -> (columns selected, column used as the row label)
+AGING_GROUPS = {
+    'customer': (
+        [
+            'customer_entitlement_master_id__customer_master_id',
+            'customer_entitlement_master_id__customer_master_id__customer_name',
+            'customer_entitlement_master_id__customer_master_id__customer_type',
+            'customer_entitlement_master_id__customer_master_id__kam_id__kam_name',
+        ],
+        'customer_entitlement_master_id__customer_master_id__customer_name',
+    ),
+    'kam': (
+        [
+            'customer_entitlement_master_id__customer_master_id__kam_id',
+            'customer_entitlement_master_id__customer_master_id__kam_id__kam_name',
+        ],
+        'customer_entitlement_master_id__customer_master_id__kam_id__kam_name',
+    ),
+    'customer_type': (
+        ['customer_entitlement_master_id__customer_master_id__customer_type'],
+        'customer_entitlement_master_id__customer_master_id__customer_type',
+    ),
+}
+
+# Short names for the response rows
+AGING_COLUMN_NAMES = {
+    'customer_entitlement_master_id__customer_master_id': 'customer_id',
+    'customer_entitlement_master_id__customer_master_id__customer_name': 'customer_name',
+    'customer_entitlement_master_id__customer_master_id__customer_type': 'customer_type',
+    'customer_entitlement_master_id__customer_master_id__kam_id': 'kam_id',
+    'customer_entitlement_master_id__customer_master_id__kam_id__kam_name': 'kam_name',
+}
+
+CLOSED_INVOICE_STATUSES = ['paid', 'cancelled']
+
+
+def _money():
+    return DecimalField(max_digits=14, decimal_places=2)
+
+
+def receivables_stamp():
+    """
+    Versions of the invoice and payment data the aging report reads.
+
+    Every invoice or payment write bumps one of the two counters, including
+    a payment_date edit that changes a past as-of balance. The counters are
+    shared by all workers (apps.utility.versions), so no worker keeps
+    serving an aging report cached before the write.
+    """
+    from apps.payment.utils import get_payments_version
+
+    return f'{get_billing_version()}:{get_payments_version()}'
+
+
+def aging_queryset(as_of, group_by='customer'):
+    """
+    Build the aging query: one GROUP BY with a conditional SUM per bucket.
+
+    Balances are total_balance_due for the current day. For a past as_of the
+    balance is rebuilt from payments dated on or before as_of, in the same query.
+    """
+    from apps.payment.models import PaymentDetails
+
+    columns, label_column = AGING_GROUPS[group_by]
+
+    qs = InvoiceMaster.objects.filter(issue_date__lte=as_of)
+
+    if as_of >= timezone.now().date():
+        qs = qs.exclude(status__in=CLOSED_INVOICE_STATUSES)
+        balance = F('total_balance_due')
+    else:
+        # An invoice paid since as_of was still open then; only cancellations drop out
+        qs = qs.exclude(status='cancelled')
+        paid_to_date = PaymentDetails.objects.filter(
+            payment_master_id__invoice_master_id=OuterRef('pk'),
+            payment_master_id__payment_date__lte=as_of,
+        ).order_by().values('payment_master_id__invoice_master_id').annotate(
+            total=Sum('pay_amount')
+        ).values('total')
+        balance = F('total_bill_amount') - Coalesce(
+            Subquery(paid_to_date, output_field=_money()), Value(Decimal('0')), output_field=_money()
+        )
+    qs = qs.annotate(aging_balance=balance).filter(aging_balance__gt=0)
+
+    aggregates = {}
+    for key, _, oldest, youngest in AGING_BUCKETS:
+        in_bucket = Q(issue_date__lte=as_of - timedelta(days=youngest))
+        if oldest is not None:
+            in_bucket &= Q(issue_date__gte=as_of - timedelta(days=oldest))
+        aggregates[key] = Coalesce(
+            Sum('aging_balance', filter=in_bucket, output_field=_money()),
+            Value(Decimal('0')), output_field=_money()
+        )
+    aggregates['total_due'] = Coalesce(
+        Sum('aging_balance', output_field=_money()), Value(Decimal('0')), output_field=_money()
+    )
+    aggregates['invoice_count'] = Count('id')
+
+    return qs.order_by().values(*columns).annotate(**aggregates).order_by(label_column)
+
+
+def build_aging_report(as_of, group_by='customer'):
+    """Aging rows and grand totals, cached until the next invoice/payment change"""
+    cache_key = f'bills:aging:{group_by}:{as_of.isoformat()}:{receivables_stamp()}'
+    report = cache.get(cache_key)
+    if report is not None:
+        return report
+
+    rows = []
+    totals = {key: Decimal('0') for key, _, _, _ in AGING_BUCKETS}
+    totals['total_due'] = Decimal('0')
+    totals['invoice_count'] = 0
+
+    for row in aging_queryset(as_of, group_by):
+        item = {AGING_COLUMN_NAMES.get(k, k): v for k, v in row.items()}
+        for key in totals:
+            totals[key] += item[key]
+            if key != 'invoice_count':
+                item[key] = float(item[key])
+        rows.append(item)
+
+    report = {
+        'as_of': as_of.isoformat(),
+        'group_by': group_by,
+        'buckets': [{'key': key, 'label': label} for key, label, _, _ in AGING_BUCKETS],
+        'rows': rows,
+        'totals': {k: (v if k == 'invoice_count' else float(v)) for k, v in totals.items()},
+    }
+    cache.set(cache_key, report, settings.REPORT_CACHE_TIMEOUT)
+    return report
+
+
+class _Echo:
+    """File-like object whose write() just returns the value for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def iter_aging_csv(as_of, group_by='customer'):
+    """Yield the aging report as CSV lines straight from the database cursor"""
+    columns, _ = AGING_GROUPS[group_by]
+    header = [AGING_COLUMN_NAMES[c] for c in columns]
+    header += [key for key, _, _, _ in AGING_BUCKETS] + ['total_due', 'invoice_count']
+
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    for row in aging_queryset(as_of, group_by).iterator(chunk_size=2000):
+        yield writer.writerow([row[c] for c in columns] + [
+            row[key] for key, _, _, _ in AGING_BUCKETS
+        ] + [row['total_due'], row['invoice_count']])
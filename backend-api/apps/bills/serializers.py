@@ -3,18 +3,23 @@ Serializers for Bills App - Invoice Master and Details
 """
 from rest_framework import serializers
 from django.db import models
+from django.db.models import prefetch_related_objects
 from django.utils import timezone
 from decimal import Decimal
 from .models import (
     CustomerEntitlementMaster,
     CustomerEntitlementDetails,
+    CustomerEntitlementDetailsVersion,
     InvoiceMaster,
     InvoiceDetails,
 )
 from apps.customers.serializers import CustomerMasterSerializer
+from config.serializers import BatchField, BatchListSerializer, SparseFieldsMixin, aggregate_by, count_related, is_prefetched
+from apps.package.pricing import get_pricing_index
+from apps.utility import refdata
 
 
-class InvoiceDetailsSerializer(serializers.ModelSerializer):
+class InvoiceDetailsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     entitlement_type = serializers.CharField(source='entitlement_details_id.type', read_only=True)
     entitlement_mbps = serializers.DecimalField(
         source='entitlement_details_id.mbps',
@@ -22,22 +27,15 @@ class InvoiceDetailsSerializer(serializers.ModelSerializer):
         decimal_places=2,
         read_only=True
     )
-    line_total = serializers.SerializerMethodField()
+    line_total = serializers.FloatField(read_only=True)
     
     class Meta:
         model = InvoiceDetails
         fields = '__all__'
         read_only_fields = ['created_at']
-    
-    def get_line_total(self, obj):
-        """Calculate line total with VAT and discount"""
-        sub_total = obj.sub_total
-        vat_amount = sub_total * (obj.vat_rate / Decimal('100'))
-        discount_amount = sub_total * (obj.sub_discount_rate / Decimal('100'))
-        return float(sub_total + vat_amount - discount_amount)
 
 
-class InvoiceMasterSerializer(serializers.ModelSerializer):
+class InvoiceMasterSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     customer_name = serializers.CharField(
         source='customer_entitlement_master_id.customer_master_id.customer_name',
         read_only=True
@@ -51,8 +49,8 @@ class InvoiceMasterSerializer(serializers.ModelSerializer):
         read_only=True
     )
     details = InvoiceDetailsSerializer(many=True, read_only=True)
-    details_count = serializers.SerializerMethodField()
-    utility_info = serializers.SerializerMethodField()
+    details_count = BatchField()
+    utility_info = BatchField()
     payment_status = serializers.SerializerMethodField()
     
     class Meta:
@@ -63,18 +61,19 @@ class InvoiceMasterSerializer(serializers.ModelSerializer):
             'total_bill_amount', 'total_paid_amount', 'total_balance_due',
             'total_vat_amount', 'total_discount_amount'
         ]
+        list_serializer_class = BatchListSerializer
+        expandable_fields = ['details', 'utility_info']
     
-    def get_details_count(self, obj):
-        return obj.details.count()
+    def load_details_count(self, objs):
+        return count_related(objs, 'details')
     
-    def get_utility_info(self, obj):
-        if obj.information_master_id:
-            return {
-                'id': obj.information_master_id.id,
-                'vat_rate': float(obj.information_master_id.vat_rate),
-                'terms_condition': obj.information_master_id.terms_condition,
-            }
-        return None
+    def load_utility_info(self, objs):
+        prefetch_related_objects(objs, 'information_master_id')
+        return {obj.pk: {
+            'id': obj.information_master_id.id,
+            'vat_rate': float(obj.information_master_id.vat_rate),
+            'terms_condition': obj.information_master_id.terms_condition,
+        } if obj.information_master_id else None for obj in objs}
     
     def get_payment_status(self, obj):
         """Determine payment status based on amounts"""
@@ -142,7 +141,8 @@ class InvoiceMasterCreateSerializer(serializers.ModelSerializer):
         from datetime import date
         
         details = entitlement.details.filter(is_active=True, status='active')
-        utility = invoice.information_master_id
+        pricing = get_pricing_index()
+        vat_rate = refdata.vat_rate(invoice.information_master_id_id)
         
         total_subtotal = Decimal('0')
         total_vat = Decimal('0')
@@ -154,16 +154,17 @@ class InvoiceMasterCreateSerializer(serializers.ModelSerializer):
             if ent_detail.mbps and ent_detail.unit_price:
                 line_subtotal = ent_detail.mbps * ent_detail.unit_price
             else:
-                # For home packages, use package pricing rate
-                if ent_detail.package_pricing_id and ent_detail.package_pricing_id.rate:
-                    line_subtotal = ent_detail.package_pricing_id.rate
+                # For home packages, use the package's rate effective on the issue date
+                price = pricing.resolve_pricing(
+                    ent_detail.package_pricing_id_id, invoice.issue_date or timezone.localdate()
+                )
+                if price and price.rate:
+                    line_subtotal = price.rate
                 else:
                     line_subtotal = Decimal('0')
             
             total_subtotal += line_subtotal
             
-            # Get VAT rate from utility or default
-            vat_rate = utility.vat_rate if utility else Decimal('0')
             vat_amount = line_subtotal * (vat_rate / Decimal('100'))
             total_vat += vat_amount
             
@@ -192,26 +193,23 @@ class InvoiceMasterCreateSerializer(serializers.ModelSerializer):
 
 # ==================== Customer Entitlement Serializers ====================
 
-class CustomerEntitlementDetailsSerializer(serializers.ModelSerializer):
-    package_name = serializers.SerializerMethodField()
-    line_total = serializers.SerializerMethodField()
+class CustomerEntitlementDetailsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    package_name = BatchField()
+    line_total = serializers.FloatField(read_only=True)
     bandwidth_type = serializers.SerializerMethodField()
     
     class Meta:
         model = CustomerEntitlementDetails
         fields = '__all__'
         read_only_fields = ['created_at', 'updated_at', 'timestamp']
+        list_serializer_class = BatchListSerializer
     
-    def get_package_name(self, obj):
-        if obj.package_pricing_id:
-            return obj.package_pricing_id.package_master_id.package_name
-        return None
-    
-    def get_line_total(self, obj):
-        """Calculate line total: mbps * unit_price"""
-        if obj.mbps and obj.unit_price:
-            return float(obj.mbps * obj.unit_price)
-        return 0.0
+    def load_package_name(self, objs):
+        prefetch_related_objects(objs, 'package_pricing_id__package_master_id')
+        return {
+            obj.pk: obj.package_pricing_id.package_master_id.package_name if obj.package_pricing_id else None
+            for obj in objs
+        }
     
     def get_bandwidth_type(self, obj):
         """Extract bandwidth type from remarks (ipt, gcc, cdn, nix, baishan)"""
@@ -246,28 +244,45 @@ class CustomerEntitlementDetailsSerializer(serializers.ModelSerializer):
         return data
 
 
-class CustomerEntitlementMasterSerializer(serializers.ModelSerializer):
+class CustomerEntitlementDetailsVersionSerializer(serializers.ModelSerializer):
+    line_total = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = CustomerEntitlementDetailsVersion
+        fields = '__all__'
+    
+    def get_line_total(self, obj):
+        """Line total at the time of this version: mbps * unit_price"""
+        if obj.mbps and obj.unit_price:
+            return float(obj.mbps * obj.unit_price)
+        return 0.0
+
+
+class CustomerEntitlementMasterSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     customer_name = serializers.CharField(source='customer_master_id.customer_name', read_only=True)
     customer_type = serializers.CharField(source='customer_master_id.customer_type', read_only=True)
     details = CustomerEntitlementDetailsSerializer(many=True, read_only=True)
-    details_count = serializers.SerializerMethodField()
-    total_entitlement_amount = serializers.SerializerMethodField()
+    details_count = BatchField()
+    total_entitlement_amount = BatchField()
     
     class Meta:
         model = CustomerEntitlementMaster
         fields = '__all__'
         read_only_fields = ['created_at', 'updated_at']
+        list_serializer_class = BatchListSerializer
+        expandable_fields = ['details']
     
-    def get_details_count(self, obj):
-        return obj.details.count()
+    def load_details_count(self, objs):
+        return count_related(objs, 'details')
     
-    def get_total_entitlement_amount(self, obj):
-        """Calculate total from all entitlement details"""
-        total = Decimal('0')
-        for detail in obj.details.all():
-            if detail.mbps and detail.unit_price:
-                total += detail.mbps * detail.unit_price
-        return float(total)
+    def load_total_entitlement_amount(self, objs):
+        """Sum of the details' line totals; annotated by CustomerEntitlementMasterQuerySet.with_total_amount"""
+        if all(hasattr(obj, 'total_entitlement_amount') for obj in objs):
+            return {obj.pk: float(obj.total_entitlement_amount) for obj in objs}
+        if all(is_prefetched(obj, 'details') for obj in objs):
+            return {obj.pk: float(sum((detail.line_total for detail in obj.details.all()), Decimal('0'))) for obj in objs}
+        totals = aggregate_by(objs, CustomerEntitlementDetails.objects.all(), 'cust_entitlement_id', models.Sum('line_total'))
+        return {pk: float(total) for pk, total in totals.items()}
 
 
 # ==================== Bulk Entitlement Details Serializers ====================
@@ -0,0 +1,70 @@
+"""
+Signal handlers for the Bills App
+"""
+from django.db import transaction
+from django.db.models.signals import pre_save, pre_delete, post_save, post_delete
+from django.dispatch import receiver
+
+from apps.package.models import PackagePricing
+from .models import (
+    CustomerEntitlementMaster,
+    CustomerEntitlementDetails,
+    InvoiceMaster,
+    InvoiceDetails,
+    CustomerEntitlementDetailsVersion,
+)
+from .closing import check_open, check_invoice_save, check_invoice_detail
+from .utils import bump_billing_version
+
+
+@receiver(post_save, sender=CustomerEntitlementMaster)
+@receiver(post_delete, sender=CustomerEntitlementMaster)
+@receiver(post_save, sender=CustomerEntitlementDetails)
+@receiver(post_delete, sender=CustomerEntitlementDetails)
+@receiver(post_save, sender=InvoiceMaster)
+@receiver(post_delete, sender=InvoiceMaster)
+@receiver(post_save, sender=InvoiceDetails)
+@receiver(post_delete, sender=InvoiceDetails)
+def billing_changed(sender, **kwargs):
+    """Invalidate cached billing reports once the write is committed"""
+    transaction.on_commit(bump_billing_version)
+
+
+@receiver(post_delete, sender=CustomerEntitlementDetails)
+def close_detail_versions(sender, instance, **kwargs):
+    """End the history of a deleted line, whether deleted on its own, in a queryset or with its entitlement"""
+    CustomerEntitlementDetailsVersion.objects.close([instance.pk])
+
+
+@receiver(post_delete, sender=PackagePricing)
+def version_unlinked_details(sender, instance, **kwargs):
+    """
+    Deleting a pricing nulls package_pricing_id on its lines with a plain SQL
+    UPDATE (SET_NULL), which bypasses save() and the queryset update();
+    record the change here, from the lines whose open version named it
+    """
+    detail_ids = list(CustomerEntitlementDetailsVersion.objects.current().filter(
+        package_pricing_id=instance.pk
+    ).values_list('detail_id', flat=True))
+    if detail_ids:
+        CustomerEntitlementDetailsVersion.objects.record_many(
+            CustomerEntitlementDetails._base_manager.filter(pk__in=detail_ids)
+        )
+        transaction.on_commit(bump_billing_version)
+
+
+@receiver(pre_save, sender=InvoiceMaster)
+def lock_closed_invoice(sender, instance, update_fields=None, **kwargs):
+    """Invoices of closed months keep the figures the month-end close froze"""
+    check_invoice_save(instance, update_fields)
+
+
+@receiver(pre_delete, sender=InvoiceMaster)
+def lock_closed_invoice_delete(sender, instance, **kwargs):
+    check_open(instance.issue_date, 'its invoices')
+
+
+@receiver(pre_save, sender=InvoiceDetails)
+@receiver(pre_delete, sender=InvoiceDetails)
+def lock_closed_invoice_lines(sender, instance, **kwargs):
+    check_invoice_detail(instance)
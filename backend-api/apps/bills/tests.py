@@ -0,0 +1,383 @@
+import itertools
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from apps.customers.models import CustomerMaster
+from apps.package.models import PackageMaster, PackagePricing
+from apps.package.pricing import get_pricing_index
+from apps.payment.models import PaymentMaster, PaymentDetails
+from apps.utility.refdata import clear_local
+from apps.utility.versions import bump_version
+from .closing import PeriodClosedError, close_period, closed_through, reopen_period
+from tests.query_budget import measure
+from .models import (
+    ClosedPeriod, CustomerEntitlementMaster, CustomerEntitlementDetails, CustomerEntitlementDetailsVersion, InvoiceDetails,
+    InvoiceMaster, PeriodClose,
+)
+from .reports import build_aging_report
+from .serializers import InvoiceMasterCreateSerializer
+
+User = get_user_model()
+
+_numbers = itertools.count(1)
+
+
+def make_customer(name='Acme', customer_type='bw', **kwargs):
+    return CustomerMaster.objects.create(
+        customer_name=name, email=f'{name.lower().replace(" ", "")}@example.com', address='-',
+        customer_type=customer_type, **kwargs
+    )
+
+
+def make_entitlement(customer=None, **kwargs):
+    kwargs.setdefault('bill_number', f'BL-TEST-{next(_numbers)}')
+    return CustomerEntitlementMaster.objects.create(customer_master_id=customer or make_customer(), **kwargs)
+
+
+def make_detail(entitlement, start, end, mbps='10', unit_price='100', **kwargs):
+    kwargs.setdefault('type', 'bw')
+    return CustomerEntitlementDetails.objects.create(
+        cust_entitlement_id=entitlement, start_date=start, end_date=end,
+        mbps=Decimal(mbps), unit_price=Decimal(unit_price), **kwargs
+    )
+
+
+def make_invoice(entitlement, issue_date, amount='100', paid='0', **kwargs):
+    amount, paid = Decimal(amount), Decimal(paid)
+    kwargs.setdefault('status', 'paid' if paid >= amount else 'partial' if paid else 'unpaid')
+    kwargs.setdefault('invoice_number', f'INV-TEST-{next(_numbers)}')
+    return InvoiceMaster.objects.create(
+        customer_entitlement_master_id=entitlement, issue_date=issue_date,
+        total_bill_amount=amount, total_paid_amount=paid, total_balance_due=amount - paid, **kwargs
+    )
+
+
+def make_payment(invoice, payment_date, amount='100', transaction_id='', **kwargs):
+    kwargs.setdefault('payment_method', 'cash')
+    kwargs.setdefault('status', 'completed')
+    payment = PaymentMaster.objects.create(
+        payment_date=payment_date, customer_entitlement_master_id=invoice.customer_entitlement_master_id,
+        invoice_master_id=invoice, **kwargs
+    )
+    PaymentDetails.objects.create(
+        payment_master_id=payment, pay_amount=Decimal(amount), transaction_id=transaction_id, status=payment.status
+    )
+    return payment
+
+
+class EntitlementPeriodTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(email='admin@example.com', username='admin', password='admin')
+        entitlement = make_entitlement()
+        cls.january = make_detail(entitlement, date(2025, 1, 1), date(2025, 1, 31))
+        cls.february = make_detail(entitlement, date(2025, 2, 1), date(2025, 2, 28))
+        cls.spring = make_detail(entitlement, date(2025, 3, 1), date(2025, 5, 31))
+
+    def test_active_on_includes_both_ends(self):
+        active = CustomerEntitlementDetails.objects.active_on
+        self.assertEqual(set(active(date(2025, 1, 31))), {self.january})
+        self.assertEqual(set(active(date(2025, 2, 1))), {self.february})
+        self.assertEqual(set(active(date(2025, 6, 1))), set())
+
+    def test_overlapping(self):
+        overlapping = CustomerEntitlementDetails.objects.overlapping
+        self.assertEqual(set(overlapping(date(2025, 1, 31), date(2025, 2, 1))), {self.january, self.february})
+        self.assertEqual(set(overlapping(date(2025, 4, 1), date(2025, 4, 30))), {self.spring})
+        self.assertEqual(set(overlapping(date(2024, 1, 1), date(2024, 12, 31))), set())
+
+    def test_query_parameters(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        url = reverse('entitlement-detail-list')
+
+        response = client.get(url, {'as_of': '2025-02-14'})
+        self.assertEqual([row['id'] for row in response.data['results']], [self.february.id])
+
+        response = client.get(url, {'overlaps': '2025-02-20,2025-03-05'})
+        self.assertEqual({row['id'] for row in response.data['results']}, {self.february.id, self.spring.id})
+
+        self.assertEqual(client.get(url, {'as_of': '14/02/2025'}).status_code, 400)
+        self.assertEqual(client.get(url, {'overlaps': '2025-03-05,2025-02-20'}).status_code, 400)
+
+
+class InvoiceListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(email='admin@example.com', username='admin', password='admin')
+        for index in range(4):
+            entitlement = make_entitlement(make_customer(f'Customer {index}'))
+            invoice = make_invoice(entitlement, date(2025, 1, 1 + index), '1000')
+            for _ in range(index):
+                InvoiceDetails.objects.create(invoice_master_id=invoice, sub_total=Decimal('100'))
+
+    def test_details_count_costs_no_query_per_invoice(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        url = reverse('invoice-list')
+        response = client.get(url, {'ordering': 'issue_date'})
+        self.assertEqual([row['details_count'] for row in response.data['results']], [0, 1, 2, 3])
+        self.assertEqual(measure(client, url, 2).queries, measure(client, url, 100).queries)
+
+
+class EntitlementVersionTests(TestCase):
+
+    def setUp(self):
+        self.entitlement = make_entitlement()
+        self.detail = make_detail(self.entitlement, date(2025, 1, 1), date(2025, 12, 31))
+
+    def versions(self, detail=None):
+        return CustomerEntitlementDetailsVersion.objects.filter(detail_id=(detail or self.detail).pk).order_by('id')
+
+    def test_save_appends_version_only_on_change(self):
+        self.detail.remarks = 'untracked'
+        self.detail.save()
+        self.assertEqual(self.versions().count(), 1)
+
+        self.assertEqual(self.detail.line_total, Decimal('1000'))
+        self.detail.mbps = Decimal('20')
+        self.detail.save()
+        self.assertEqual(self.detail.line_total, Decimal('2000'))
+        first, second = self.versions()
+        self.assertEqual(first.mbps, Decimal('10'))
+        self.assertEqual(first.valid_to, second.valid_from)
+        self.assertIsNone(second.valid_to)
+        self.assertEqual(second.mbps, Decimal('20'))
+
+    def test_line_total_is_read_back_only_after_updates(self):
+        def reads(queries):
+            # refresh_from_db(fields=['line_total']) selects the key and line_total only
+            columns = f'SELECT {table}.{quote("id")}, {table}.{quote("line_total")} FROM'
+            return [query['sql'] for query in queries if query['sql'].startswith(columns)]
+
+        quote = connection.ops.quote_name
+        table = quote(CustomerEntitlementDetails._meta.db_table)
+
+        with CaptureQueriesContext(connection) as created:
+            detail = make_detail(self.entitlement, date(2026, 1, 1), date(2026, 12, 31))
+        self.assertEqual(detail.line_total, Decimal('1000'))
+        self.assertEqual(reads(created), [])
+
+        client = APIClient()
+        client.force_authenticate(User.objects.create_superuser(email='admin@example.com', username='admin', password='admin'))
+        with CaptureQueriesContext(connection) as patched:
+            response = client.patch(reverse('entitlement-detail-detail', args=[detail.pk]), {'mbps': '30'})
+        self.assertEqual(Decimal(str(response.data['line_total'])), Decimal('3000'))
+        self.assertEqual(len(reads(patched)), 1)
+
+    def test_queryset_update_appends_versions(self):
+        CustomerEntitlementDetails.objects.filter(pk=self.detail.pk).update(unit_price=Decimal('150'))
+        self.assertEqual([version.unit_price for version in self.versions()], [Decimal('100'), Decimal('150')])
+        self.assertEqual(self.versions().filter(valid_to__isnull=True).count(), 1)
+
+    def test_bulk_create_records_versions(self):
+        created = CustomerEntitlementDetails.objects.bulk_create([
+            CustomerEntitlementDetails(cust_entitlement_id=self.entitlement, type='bw',
+                                       start_date=date(2026, 1, 1), end_date=date(2026, 12, 31))
+            for _ in range(2)
+        ])
+        for detail in created:
+            self.assertEqual(self.versions(detail).get().start_date, date(2026, 1, 1))
+        with self.assertRaises(ValueError):
+            CustomerEntitlementDetails.objects.bulk_create(created, ignore_conflicts=True)
+
+    def test_history_survives_deleting_the_entitlement(self):
+        other = make_detail(self.entitlement, date(2026, 1, 1), date(2026, 12, 31))
+        CustomerEntitlementDetails.objects.filter(pk=other.pk).delete()
+        self.assertIsNotNone(self.versions(other).get().valid_to)
+
+        entitlement_id = self.entitlement.pk
+        self.entitlement.delete()
+        version = self.versions().get()
+        self.assertEqual(version.cust_entitlement_id, entitlement_id)
+        self.assertIsNotNone(version.valid_to)
+
+    def test_deleting_a_package_records_unlinked_lines(self):
+        package = PackageMaster.objects.create(package_name='Home 20', package_type='soho')
+        pricing = PackagePricing.objects.create(
+            package_master_id=package, rate=Decimal('500'), val_start_at=date(2025, 1, 1), val_end_at=date(2025, 12, 31)
+        )
+        self.detail.package_pricing_id = pricing
+        self.detail.save()
+
+        # The pricing goes with its package; the line's link is nulled by SET_NULL
+        package.delete()
+        self.assertEqual([version.package_pricing_id for version in self.versions()], [None, pricing.pk, None])
+        self.assertEqual(self.versions().filter(valid_to__isnull=True).count(), 1)
+
+    def test_snapshot_as_of(self):
+        before = timezone.now()
+        self.detail.mbps = Decimal('30')
+        self.detail.save()
+        client = APIClient()
+        client.force_authenticate(User.objects.create_superuser(email='admin@example.com', username='admin', password='admin'))
+        url = reverse('entitlement-snapshot', args=[self.entitlement.pk])
+
+        self.assertEqual(client.get(url, {'as_of': before.isoformat()}).data['total_amount'], 1000.0)
+        self.assertEqual(client.get(url).data['total_amount'], 3000.0)
+
+
+class AgingReportTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.customer = make_customer()
+
+    def invoice(self, issue_date, amount='100', paid='0'):
+        return make_invoice(make_entitlement(self.customer), issue_date, amount, paid)
+
+    def test_buckets(self):
+        self.invoice(date(2025, 6, 15), '100')
+        make_payment(self.invoice(date(2025, 5, 1), '200', paid='50'), date(2025, 5, 5), '50')
+        self.invoice(date(2025, 4, 1), '300')
+        self.invoice(date(2025, 1, 1), '400')
+        make_payment(self.invoice(date(2025, 2, 1), '500', paid='500'), date(2025, 7, 10), '500')
+
+        report = build_aging_report(date.today(), 'customer_type')
+        row, = report['rows']
+        self.assertEqual(row['customer_type'], 'bw')
+        self.assertEqual(row['invoice_count'], 4)
+        self.assertEqual(report['totals']['total_due'], 950.0)
+
+        # In the past, balances are rebuilt from the payments dated by then
+        report = build_aging_report(date(2025, 6, 30))
+        row, = report['rows']
+        self.assertEqual(
+            [row[key] for key in ('current', 'days_31_60', 'days_61_90', 'days_90_plus')],
+            [100.0, 150.0, 300.0, 900.0],
+        )
+
+    def test_past_balance_follows_payment_date_edits(self):
+        invoice = self.invoice(date(2025, 5, 1), '100', paid='100')
+        with self.captureOnCommitCallbacks(execute=True):
+            payment = make_payment(invoice, date(2025, 7, 10))
+        self.assertEqual(build_aging_report(date(2025, 6, 30))['totals']['total_due'], 100.0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            payment.payment_date = date(2025, 6, 1)
+            payment.save()
+        self.assertEqual(build_aging_report(date(2025, 6, 30))['rows'], [])
+
+
+    def test_cache_follows_writes_from_other_workers(self):
+        invoice = self.invoice(date(2025, 5, 1), '100', paid='100')
+        payment = make_payment(invoice, date(2025, 7, 10))
+        self.assertEqual(build_aging_report(date(2025, 6, 30))['totals']['total_due'], 100.0)
+
+        payment.payment_date = date(2025, 6, 1)
+        payment.save()
+        # Another worker committed the edit; its version bump reaches this process through the database
+        bump_version('payments')
+        self.assertEqual(build_aging_report(date(2025, 6, 30))['rows'], [])
+
+
+class PeriodCloseTests(TestCase):
+
+    def setUp(self):
+        self.customer = make_customer()
+        self.invoice = make_invoice(make_entitlement(self.customer), date(2025, 1, 10), '1000')
+        self.payment = make_payment(self.invoice, date(2025, 1, 20), '400')
+
+    def test_close_freezes_totals(self):
+        with self.assertRaises(ValidationError):
+            close_period(timezone.localdate())
+        close_period(date(2025, 1, 1))
+        frozen = PeriodClose.objects.get(month=date(2025, 1, 1), customer_id=self.customer.pk)
+        self.assertEqual((frozen.invoice_count, frozen.billed_amount, frozen.collected_amount, frozen.payment_count),
+                         (1, Decimal('1000'), Decimal('400'), 1))
+        with self.assertRaises(ValidationError):
+            close_period(date(2025, 3, 1))
+        with self.assertRaises(ValidationError):
+            reopen_period(date(2024, 12, 1))
+
+    def test_closed_month_is_locked(self):
+        close_period(date(2025, 1, 1))
+        self.invoice.total_bill_amount = Decimal('900')
+        with self.assertRaises(PeriodClosedError):
+            self.invoice.save()
+        with self.assertRaises(PeriodClosedError):
+            make_invoice(make_entitlement(self.customer), date(2025, 1, 31))
+        with self.assertRaises(PeriodClosedError):
+            make_payment(self.invoice, date(2025, 1, 25))
+        with self.assertRaises(PeriodClosedError), transaction.atomic():
+            self.payment.delete()
+
+        # Recording a later payment only moves the settlement columns
+        make_payment(self.invoice, date(2025, 2, 1), '600')
+        invoice = InvoiceMaster.objects.get(pk=self.invoice.pk)
+        invoice.total_paid_amount, invoice.total_balance_due, invoice.status = Decimal('1000'), Decimal('0'), 'paid'
+        invoice.save(update_fields=['total_paid_amount', 'total_balance_due', 'status'])
+
+        reopen_period(date(2025, 1, 1))
+        self.assertFalse(PeriodClose.objects.exists())
+        self.payment.delete()
+
+    def test_lock_is_read_from_the_database(self):
+        self.assertIsNone(closed_through())
+        # A close committed by another worker applies at once, whatever this process cached
+        ClosedPeriod.objects.create(month=date(2025, 1, 1))
+        self.assertEqual(closed_through(), date(2025, 1, 31))
+        with self.assertRaises(PeriodClosedError), transaction.atomic():
+            self.invoice.delete()
+
+
+class PackagePricingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_local()
+        self.customer = make_customer(customer_type='soho')
+        self.package = PackageMaster.objects.create(package_name='Home 20', package_type='soho')
+        self.old = self.pricing('800', date(2024, 1, 1), date(2024, 12, 31))
+        self.year = self.pricing('1000', date(2025, 1, 1), date(2025, 12, 31))
+        # Overlaps the second half of the year
+        self.promo = self.pricing('700', date(2025, 7, 1), date(2025, 12, 31))
+
+    def pricing(self, rate, start, end, **kwargs):
+        return PackagePricing.objects.create(
+            package_master_id=self.package, rate=Decimal(rate), mbps=20, val_start_at=start, val_end_at=end, **kwargs
+        )
+
+    def bill(self, pricing, issue_date):
+        entitlement = make_entitlement(self.customer)
+        CustomerEntitlementDetails.objects.create(
+            cust_entitlement_id=entitlement, start_date=date(2024, 1, 1), end_date=date(2025, 12, 31),
+            type='soho', package_pricing_id=pricing,
+        )
+        invoice = make_invoice(entitlement, issue_date, '0')
+        InvoiceMasterCreateSerializer()._calculate_invoice_totals(invoice, entitlement)
+        return invoice.total_bill_amount
+
+    def test_package_price_on_date(self):
+        index = get_pricing_index()
+        self.assertEqual(index.resolve(self.package.pk, date(2025, 3, 1)).rate, Decimal('1000'))
+        # The pricing that started last wins where windows overlap
+        self.assertEqual(index.resolve(self.package.pk, date(2025, 8, 1)).rate, Decimal('700'))
+        self.assertIsNone(index.resolve(self.package.pk, date(2026, 1, 1)))
+
+    def test_invoice_keeps_the_linked_pricing_while_valid(self):
+        self.assertEqual(self.bill(self.year, date(2025, 8, 1)), Decimal('1000'))
+        self.assertEqual(self.bill(self.promo, date(2025, 8, 1)), Decimal('700'))
+
+    def test_invoice_falls_back_for_expired_or_inactive_links(self):
+        self.assertEqual(self.bill(self.old, date(2025, 3, 1)), Decimal('1000'))
+        self.assertEqual(self.bill(self.old, date(2025, 8, 1)), Decimal('700'))
+        retired = self.pricing('1200', date(2025, 1, 1), date(2025, 12, 31), is_active=False)
+        clear_local()
+        cache.clear()
+        self.assertEqual(self.bill(retired, date(2025, 3, 1)), Decimal('1000'))
+        # Nothing effective on the date: the linked pricing is still billed
+        self.assertEqual(self.bill(self.old, date(2026, 3, 1)), Decimal('800'))
+        self.assertEqual(self.bill(None, date(2025, 3, 1)), Decimal('0'))
@@ -4,6 +4,8 @@ from calendar import monthrange
 from django.utils import timezone
 from django.db import transaction, models
 
+from apps.utility.versions import bump_version, get_version
+
 
 
 
@@ -37,4 +39,126 @@ def generate_bill_number(customer_name, bill_id, billing_date=None, prefix='KTL-
     # Generate bill number: {prefix}-{5 chars}-{bill_id}-{DDMMYYYY}
     bill_number = f"{prefix}-{clean_name}-{bill_id}-{date_str}"
     
-    return bill_number
\ No newline at end of file
+    return bill_number
+
+def parse_date_param(value, param_name):
+    """
+    Parse a YYYY-MM-DD query parameter.
+
+    Raises:
+        ValidationError: If the value is not a valid date
+    """
+    from django.utils.dateparse import parse_date
+    from rest_framework.exceptions import ValidationError
+
+    try:
+        parsed = parse_date(value.strip())
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({param_name: f'Invalid date "{value}". Use YYYY-MM-DD.'})
+    return parsed
+
+
+def parse_moment_param(value, param_name):
+    """
+    Parse an ISO datetime or YYYY-MM-DD query parameter into an aware datetime.
+
+    A bare date means the end of that day, so "as of 2025-10-15" includes
+    every change made on the 15th.
+    """
+    from django.utils.dateparse import parse_datetime
+    from rest_framework.exceptions import ValidationError
+
+    try:
+        moment = parse_datetime(value.strip())
+    except ValueError:
+        raise ValidationError({param_name: f'Invalid datetime "{value}".'})
+    if moment is None:
+        day = parse_date_param(value, param_name)
+        moment = datetime.combine(day, datetime.max.time())
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def parse_decimal_param(value, param_name):
+    """
+    Parse a decimal query parameter.
+
+    Raises:
+        ValidationError: If the value is not a finite number
+    """
+    from decimal import Decimal, InvalidOperation
+    from rest_framework.exceptions import ValidationError
+
+    try:
+        parsed = Decimal(value.strip())
+    except InvalidOperation:
+        parsed = None
+    if parsed is None or not parsed.is_finite():
+        raise ValidationError({param_name: f'Invalid number "{value}".'})
+    return parsed
+
+
+def apply_amount_filters(queryset, query_params, field, name=None):
+    """
+    Narrow a queryset by the ?min_<name>= and ?max_<name>= bounds on an amount field.
+
+    name defaults to the field name.
+    """
+    name = name or field
+    for bound, lookup in (('min', 'gte'), ('max', 'lte')):
+        param = f'{bound}_{name}'
+        if query_params.get(param):
+            queryset = queryset.filter(**{f'{field}__{lookup}': parse_decimal_param(query_params[param], param)})
+    return queryset
+
+
+def apply_period_filters(details_qs, query_params):
+    """
+    Narrow an entitlement details queryset by the ?as_of= and ?overlaps= parameters.
+
+    - as_of=YYYY-MM-DD: lines active on that date
+    - overlaps=YYYY-MM-DD,YYYY-MM-DD: lines whose period intersects the range
+
+    Returns:
+        tuple: (queryset, bool) - the bool is True when any period filter was applied
+    """
+    from rest_framework.exceptions import ValidationError
+
+    applied = False
+    as_of = query_params.get('as_of')
+    overlaps = query_params.get('overlaps')
+
+    if as_of:
+        details_qs = details_qs.active_on(parse_date_param(as_of, 'as_of'))
+        applied = True
+
+    if overlaps:
+        parts = overlaps.split(',')
+        if len(parts) != 2:
+            raise ValidationError({'overlaps': 'Expected two dates: start,end'})
+        start = parse_date_param(parts[0], 'overlaps')
+        end = parse_date_param(parts[1], 'overlaps')
+        if start > end:
+            raise ValidationError({'overlaps': 'Start date must be on or before end date'})
+        details_qs = details_qs.overlapping(start, end)
+        applied = True
+
+    return details_qs, applied
+
+
+def get_billing_version():
+    """
+    Current billing version counter.
+
+    Cached billing reports embed this in their keys, so bumping it
+    invalidates every one of them at once.
+    """
+    return get_version('billing')
+
+
+def bump_billing_version():
+    """Increment the billing version counter after an invoice or entitlement write"""
+    bump_version('billing')
@@ -3,7 +3,8 @@ from rest_framework import viewsets, generics, permissions, filters, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q, Sum, Count, Max
+from django.db.models import Q, Sum, Count, Max, Prefetch
+from django.http import StreamingHttpResponse
 from django.utils import timezone
 from datetime import datetime, date, timedelta
 from decimal import Decimal
@@ -13,28 +14,30 @@ from .models import (
     InvoiceDetails,
     CustomerEntitlementMaster,
     CustomerEntitlementDetails,
+    CustomerEntitlementDetailsVersion,
 )
 from apps.customers.models import CustomerMaster
+from .utils import apply_amount_filters, apply_period_filters, parse_date_param, parse_moment_param
+from .reports import AGING_GROUPS, build_aging_report, iter_aging_csv
+from .closing import close_period, closed_period_summary, list_closed_periods
 from .serializers import (
     InvoiceMasterSerializer,
     InvoiceMasterCreateSerializer,
     InvoiceDetailsSerializer,
     CustomerEntitlementMasterSerializer,
     CustomerEntitlementDetailsSerializer,
+    CustomerEntitlementDetailsVersionSerializer,
     BulkEntitlementDetailsCreateSerializer,
     BandwidthEntitlementDetailSerializer,
     ChannelPartnerEntitlementDetailSerializer,
 )
 from apps.authentication.permissions import RequirePermissions
+from config.serializers import FieldSelection
 
 
 class InvoiceMasterViewSet(viewsets.ModelViewSet):
     """Full CRUD for Invoice Master with auto-calculation"""
-    queryset = InvoiceMaster.objects.select_related(
-        'customer_entitlement_master_id__customer_master_id',
-        'information_master_id',
-        'created_by'
-    ).prefetch_related('details')
+    queryset = InvoiceMaster.objects.select_related('created_by')
     permission_classes = [permissions.IsAuthenticated, RequirePermissions]
     required_permissions = ['invoices:read']
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -48,7 +51,7 @@ class InvoiceMasterViewSet(viewsets.ModelViewSet):
         return InvoiceMasterSerializer
     
     def get_queryset(self):
-        qs = self.queryset
+        qs = self.queryset.for_list(FieldSelection.for_view(self))
         customer_id = self.request.query_params.get('customer_id')
         start_date = self.request.query_params.get('start_date')
         end_date = self.request.query_params.get('end_date')
@@ -126,20 +129,23 @@ class InvoiceMasterViewSet(viewsets.ModelViewSet):
             )
         
         # Get utility info (use first active one or create default)
+        from apps.utility import refdata
         from apps.utility.models import UtilityInformationMaster
-        utility = UtilityInformationMaster.objects.filter(is_active=True).first()
-        if not utility:
-            utility = UtilityInformationMaster.objects.create(
+        utility = refdata.utility().active
+        if utility:
+            utility_id = utility['id']
+        else:
+            utility_id = UtilityInformationMaster.objects.create(
                 vat_rate=Decimal('15'),
                 terms_condition='Standard payment terms apply',
                 is_active=True
-            )
+            ).id
         
         # Create invoice
         invoice_data = {
-            'customer_entitlement_master_id': entitlement,
+            'customer_entitlement_master_id': entitlement.id,
             'issue_date': date.today(),
-            'information_master_id': utility,
+            'information_master_id': utility_id,
             'status': 'draft',
             'auto_calculate': True,
         }
@@ -203,16 +209,81 @@ class InvoiceMasterViewSet(viewsets.ModelViewSet):
         })
 
 
+    def _aging_params(self, request):
+        as_of = request.query_params.get('as_of')
+        as_of = parse_date_param(as_of, 'as_of') if as_of else date.today()
+        group_by = request.query_params.get('group_by', 'customer')
+        if group_by not in AGING_GROUPS:
+            from rest_framework.exceptions import ValidationError
+            raise ValidationError({
+                'group_by': f'Choose from: {", ".join(AGING_GROUPS)}'
+            })
+        return as_of, group_by
+    
+    @action(detail=False, methods=['get'])
+    def aging(self, request):
+        """
+        Accounts receivable aging (0-30, 31-60, 61-90, 90+ days) of balance due
+        Query parameters:
+        - as_of: YYYY-MM-DD (default: today)
+        - group_by: 'customer', 'kam', 'customer_type' (default: 'customer')
+        """
+        as_of, group_by = self._aging_params(request)
+        return Response(build_aging_report(as_of, group_by))
+    
+    @action(detail=False, methods=['get'], url_path='aging/export')
+    def aging_export(self, request):
+        """Stream the aging report as CSV (same parameters as aging)"""
+        as_of, group_by = self._aging_params(request)
+        response = StreamingHttpResponse(iter_aging_csv(as_of, group_by), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="ar_aging_{group_by}_{as_of}.csv"'
+        return response
+
+    @action(detail=False, methods=['get'], url_path='closed-periods')
+    def closed_periods(self, request):
+        """
+        Months closed by the month-end close, newest first
+        Query parameters:
+        - month: YYYY-MM to get that closed month's frozen totals per KAM and per customer
+        """
+        month = request.query_params.get('month')
+        if month:
+            from apps.dashboard.reports import parse_month_param
+            return Response(closed_period_summary(parse_month_param(month, 'month')))
+        return Response(list_closed_periods())
+    
+    @action(detail=False, methods=['post'], url_path='close-period', required_permissions=['invoices:close'])
+    def close_month(self, request):
+        """
+        Close a month: freeze its billed, collected and due totals and lock its invoices and payments
+        Request body:
+        - month: YYYY-MM; must be over and follow the latest closed month
+        """
+        from apps.dashboard.reports import parse_month_param
+        month = parse_month_param(request.data.get('month') or '', 'month')
+        period = close_period(month, request.user)
+        return Response(closed_period_summary(period.month), status=status.HTTP_201_CREATED)
+
+
 class InvoiceDetailsViewSet(viewsets.ModelViewSet):
     """Full CRUD for Invoice Details"""
-    queryset = InvoiceDetails.objects.select_related(
-        'invoice_master_id', 'entitlement_details_id'
-    )
+    queryset = InvoiceDetails.objects.select_related('invoice_master_id')
     serializer_class = InvoiceDetailsSerializer
     permission_classes = [permissions.IsAuthenticated, RequirePermissions]
     required_permissions = ['invoices:read']
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['invoice_master_id']
+    ordering_fields = ['created_at', 'sub_total', 'line_total']
+    
+    def get_queryset(self):
+        """
+        Query parameters:
+        - min_line_total / max_line_total: bounds on the line total
+        """
+        qs = self.queryset
+        if FieldSelection.for_view(self).wants('entitlement_type', 'entitlement_mbps'):
+            qs = qs.select_related('entitlement_details_id')
+        return apply_amount_filters(qs, self.request.query_params, 'line_total')
     
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
@@ -228,6 +299,8 @@ class InvoiceDetailsViewSet(viewsets.ModelViewSet):
     
     def perform_update(self, serializer):
         detail = serializer.save()
+        # The database recomputes line_total; read it back for the response
+        detail.refresh_from_db(fields=['line_total'])
         # Recalculate invoice totals
         self._recalculate_invoice_totals(detail.invoice_master_id)
     
@@ -263,16 +336,41 @@ class InvoiceDetailsViewSet(viewsets.ModelViewSet):
 
 class CustomerEntitlementMasterViewSet(viewsets.ModelViewSet):
     """Full CRUD for Customer Entitlement Master"""
-    queryset = CustomerEntitlementMaster.objects.select_related(
-        'customer_master_id', 'created_by'
-    ).prefetch_related('details')
+    queryset = CustomerEntitlementMaster.objects.select_related('created_by')
     serializer_class = CustomerEntitlementMasterSerializer
     permission_classes = [permissions.IsAuthenticated, RequirePermissions]
     required_permissions = ['entitlements:read']
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['customer_master_id', 'activation_date']
     search_fields = ['bill_number', 'customer_master_id__customer_name']
-    ordering_fields = ['created_at', 'activation_date', 'bill_number']
+    ordering_fields = ['created_at', 'activation_date', 'bill_number', 'total_entitlement_amount']
+    
+    def get_queryset(self):
+        """
+        Query parameters (list):
+        - as_of / overlaps: see apply_period_filters
+        - min_total_entitlement_amount / max_total_entitlement_amount: bounds on the total
+        """
+        selection = FieldSelection.for_view(self)
+        qs = self.queryset.for_list(selection)
+        if self.action != 'list':
+            return qs.with_total_amount()
+        params = self.request.query_params
+        # The total is also needed to order or filter by it
+        with_total = selection.wants('total_entitlement_amount') or 'total_entitlement_amount' in (
+            params.get(filters.OrderingFilter.ordering_param) or ''
+        ) or any(params.get(f'{bound}_total_entitlement_amount') for bound in ('min', 'max'))
+        details_qs, applied = apply_period_filters(CustomerEntitlementDetails.objects.all(), params)
+        if applied:
+            # Only entitlements with matching lines, and only those lines nested and totalled
+            qs = qs.filter(id__in=details_qs.values('cust_entitlement_id'))
+            if selection.wants('details', 'details_count'):
+                qs = qs.prefetch_related(None).prefetch_related(Prefetch('details', queryset=details_qs.with_package()))
+            if with_total:
+                qs = qs.with_total_amount(details_qs)
+        elif with_total:
+            qs = qs.with_total_amount()
+        return apply_amount_filters(qs, params, 'total_entitlement_amount')
     
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
@@ -292,13 +390,46 @@ class CustomerEntitlementMasterViewSet(viewsets.ModelViewSet):
         customer.last_bill_invoice_date = timezone.now()
         customer.save(update_fields=['last_bill_invoice_date'])
     
+    @action(detail=True, methods=['get'])
+    def snapshot(self, request, pk=None):
+        """
+        Entitlement lines as they were at a point in time
+        Query parameters:
+        - as_of: ISO datetime or YYYY-MM-DD (default: now)
+        """
+        entitlement = self.get_object()
+        as_of = request.query_params.get('as_of')
+        moment = parse_moment_param(as_of, 'as_of') if as_of else timezone.now()
+        
+        versions = CustomerEntitlementDetailsVersion.objects.filter(
+            cust_entitlement_id=entitlement.pk
+        ).as_of(moment).order_by('detail_id')
+        serializer = CustomerEntitlementDetailsVersionSerializer(versions, many=True)
+        
+        return Response({
+            'entitlement_id': entitlement.id,
+            'as_of': moment,
+            'details': serializer.data,
+            'total_amount': sum(item['line_total'] for item in serializer.data),
+        })
+    
+    @action(detail=True, methods=['get'])
+    def versions(self, request, pk=None):
+        """Full change history of every line of this entitlement"""
+        entitlement = self.get_object()
+        versions = CustomerEntitlementDetailsVersion.objects.filter(
+            cust_entitlement_id=entitlement.pk
+        )
+        serializer = CustomerEntitlementDetailsVersionSerializer(versions, many=True)
+        return Response(serializer.data)
+    
     @action(detail=True, methods=['get', 'post'])
     def details(self, request, pk=None):
         """Get or create entitlement details"""
         entitlement = self.get_object()
         
         if request.method == 'GET':
-            details = entitlement.details.all()
+            details = entitlement.details.with_package()
             serializer = CustomerEntitlementDetailsSerializer(details, many=True)
             return Response(serializer.data)
         
@@ -360,16 +491,26 @@ class CustomerEntitlementMasterViewSet(viewsets.ModelViewSet):
 
 class CustomerEntitlementDetailsViewSet(viewsets.ModelViewSet):
     """Full CRUD for Customer Entitlement Details"""
-    queryset = CustomerEntitlementDetails.objects.select_related(
-        'cust_entitlement_id', 'package_pricing_id', 'created_by'
-    )
+    queryset = CustomerEntitlementDetails.objects.select_related('cust_entitlement_id', 'created_by')
     serializer_class = CustomerEntitlementDetailsSerializer
     permission_classes = [permissions.IsAuthenticated, RequirePermissions]
     required_permissions = ['entitlement_details:read']
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['cust_entitlement_id', 'type', 'status', 'is_active']
     search_fields = ['cust_entitlement_id__bill_number']
-    ordering_fields = ['created_at', 'start_date', 'end_date']
+    ordering_fields = ['created_at', 'start_date', 'end_date', 'line_total']
+    
+    def get_queryset(self):
+        """
+        Query parameters:
+        - as_of / overlaps: see apply_period_filters
+        - min_line_total / max_line_total: bounds on the line total
+        """
+        qs = self.queryset
+        if FieldSelection.for_view(self).wants('package_name'):
+            qs = qs.with_package()
+        qs, _ = apply_period_filters(qs, self.request.query_params)
+        return apply_amount_filters(qs, self.request.query_params, 'line_total')
     
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
@@ -379,18 +520,10 @@ class CustomerEntitlementDetailsViewSet(viewsets.ModelViewSet):
         return CustomerEntitlementDetailsSerializer
     
     def perform_create(self, serializer):
-        serializer.save(created_by=self.request.user)
-        # Update last_changes_updated_date
-        detail = serializer.instance
-        detail.last_changes_updated_date = date.today()
-        detail.save(update_fields=['last_changes_updated_date'])
+        serializer.save(created_by=self.request.user, last_changes_updated_date=date.today())
     
     def perform_update(self, serializer):
-        serializer.save(updated_by=self.request.user)
-        # Update last_changes_updated_date
-        detail = serializer.instance
-        detail.last_changes_updated_date = date.today()
-        detail.save(update_fields=['last_changes_updated_date'])
+        serializer.save(updated_by=self.request.user, last_changes_updated_date=date.today())
     
     @action(detail=False, methods=['get'])
     def bandwidth_types(self, request):
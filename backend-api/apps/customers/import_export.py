@@ -14,7 +14,8 @@ from django.http import HttpResponse
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 
-from .models import CustomerMaster, KAMMaster
+from apps.utility import refdata
+from .models import CustomerMaster
 from .utils import generate_customer_number
 
 logger = logging.getLogger(__name__)
@@ -256,6 +257,7 @@ class CustomerImporter:
             if not reader.fieldnames:
                 return 0, ['Invalid CSV file: No headers found'], []
             
+            kams = refdata.kams()
             for row_number, row in enumerate(reader, start=2):
                 try:
                     # Validate row
@@ -268,9 +270,8 @@ class CustomerImporter:
                     kam = None
                     kam_id = row.get('kam_id', '').strip()
                     if kam_id:
-                        try:
-                            kam = KAMMaster.objects.get(id=int(kam_id))
-                        except (ValueError, KAMMaster.DoesNotExist):
+                        kam = kams.instance(int(kam_id)) if kam_id.isdigit() else None
+                        if kam is None:
                             error_messages.append(f"Row {row_number}: KAM with ID '{kam_id}' not found")
                             continue
                     
@@ -359,6 +360,7 @@ class CustomerImporter:
             if df.empty:
                 return 0, ['Excel file is empty'], []
             
+            kams = refdata.kams()
             for row_number, row in df.iterrows():
                 try:
                     # Convert row to dictionary
@@ -377,9 +379,8 @@ class CustomerImporter:
                     kam = None
                     kam_id = row_data.get('kam_id', '').strip()
                     if kam_id:
-                        try:
-                            kam = KAMMaster.objects.get(id=int(kam_id))
-                        except (ValueError, KAMMaster.DoesNotExist):
+                        kam = kams.instance(int(kam_id)) if kam_id.isdigit() else None
+                        if kam is None:
                             error_messages.append(f"Row {row_number + 2}: KAM with ID '{kam_id}' not found")
                             continue
                     
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0007_alter_customermaster_customer_number'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customermaster',
+            index=models.Index(fields=['created_by', 'created_at'], name='customer_created_by_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customermaster',
+            index=models.Index(fields=['updated_by', 'updated_at'], name='customer_updated_by_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.core.validators import RegexValidator, MinValueValidator
 from django.utils import timezone
 from django.conf import settings
@@ -25,6 +26,53 @@ class KAMMaster(models.Model):
         return self.kam_name
 
 
+class CustomerMasterQuerySet(models.QuerySet):
+
+    def with_totals(self):
+        """
+        Annotate total_billed, total_paid and active_entitlements_count with
+        one correlated subquery each, instead of three queries per customer
+        """
+        from apps.bills.models import CustomerEntitlementMaster, InvoiceMaster
+        from apps.payment.models import PaymentDetails
+
+        money = models.DecimalField(max_digits=14, decimal_places=2)
+
+        def total(queryset, customer, field):
+            return Coalesce(models.Subquery(
+                queryset.filter(**{customer: models.OuterRef('pk')}).order_by().values(customer).annotate(
+                    total=models.Sum(field)
+                ).values('total'),
+                output_field=money,
+            ), models.Value(0), output_field=money)
+
+        return self.annotate(
+            total_billed=total(InvoiceMaster.objects.all(), 'customer_entitlement_master_id__customer_master_id', 'total_bill_amount'),
+            total_paid=total(
+                PaymentDetails.objects.all(), 'payment_master_id__customer_entitlement_master_id__customer_master_id', 'pay_amount'
+            ),
+            active_entitlements_count=Coalesce(models.Subquery(
+                CustomerEntitlementMaster.objects.filter(
+                    customer_master_id=models.OuterRef('pk'), details__is_active=True, details__status='active'
+                ).order_by().values('customer_master_id').annotate(count=models.Count('id', distinct=True)).values('count'),
+                output_field=models.IntegerField(),
+            ), models.Value(0)),
+        )
+
+    def for_list(self, selection=None):
+        """
+        Join and annotate what CustomerMasterSerializer reads, so a page costs a fixed number of queries;
+        with a FieldSelection, only what its fields read
+        """
+        qs = self
+        for field, relation in [('kam_details', 'kam_id'), ('created_by_details', 'created_by'), ('updated_by_details', 'updated_by')]:
+            if selection is None or selection.wants(field):
+                qs = qs.select_related(relation)
+        if selection is None or selection.wants('total_billed', 'total_paid', 'total_due', 'active_entitlements_count'):
+            qs = qs.with_totals()
+        return qs
+
+
 class CustomerMaster(models.Model):
     CUSTOMER_TYPE_CHOICES = [
         ('bw', 'Bandwidth'),
@@ -64,8 +112,14 @@ class CustomerMaster(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     updated_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='updated_customers', help_text="Auto-set to current user")
 
+    objects = CustomerMasterQuerySet.as_manager()
+
     class Meta:
         db_table = 'customer_master'
+        indexes = [
+            models.Index(fields=['created_by', 'created_at'], name='customer_created_by_idx'),
+            models.Index(fields=['updated_by', 'updated_at'], name='customer_updated_by_idx'),
+        ]
 
     def __str__(self):
         return self.customer_name
@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from django.db import models
+from django.db.models import prefetch_related_objects
 from decimal import Decimal
+from config.serializers import BatchField, BatchListSerializer, SparseFieldsMixin, aggregate_by
 from .models import (
     Prospect,
     ProspectStatusHistory,
@@ -11,24 +13,30 @@ from .models import (
 )
 
 
-class ProspectSerializer(serializers.ModelSerializer):
-    kam_details = serializers.SerializerMethodField()
+def user_details(user):
+    if user:
+        return {
+            'id': user.id,
+            'username': user.username,
+            'email': user.email,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+        }
+    return None
+
+
+class ProspectSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    kam_details = BatchField()
 
     class Meta:
         model = Prospect
         fields = '__all__'
         read_only_fields = ['created_at', 'updated_at', 'kam']
+        list_serializer_class = BatchListSerializer
 
-    def get_kam_details(self, obj):
-        if obj.kam:
-            return {
-                'id': obj.kam.id,
-                'username': getattr(obj.kam, 'username', ''),
-                'email': obj.kam.email,
-                'first_name': getattr(obj.kam, 'first_name', ''),
-                'last_name': getattr(obj.kam, 'last_name', ''),
-            }
-        return None
+    def load_kam_details(self, objs):
+        prefetch_related_objects(objs, 'kam')
+        return {obj.pk: user_details(obj.kam) for obj in objs}
 
     def validate_follow_up_date(self, value):
         from datetime import date
@@ -60,91 +68,72 @@ class ProspectAttachmentSerializer(serializers.ModelSerializer):
 
 # ==================== KAM Master Serializers ====================
 
-class KAMMasterSerializer(serializers.ModelSerializer):
-    assigned_customers_count = serializers.SerializerMethodField()
+class KAMMasterSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    assigned_customers_count = BatchField()
     
     class Meta:
         model = KAMMaster
         fields = '__all__'
         read_only_fields = ['created_at', 'updated_at']
+        list_serializer_class = BatchListSerializer
     
-    def get_assigned_customers_count(self, obj):
-        return obj.customers.count()
+    def load_assigned_customers_count(self, objs):
+        if all(hasattr(obj, 'customers_count') for obj in objs):
+            return {obj.pk: obj.customers_count for obj in objs}
+        return aggregate_by(objs, CustomerMaster.objects.all(), 'kam_id', models.Count('id'))
 
 
 # ==================== Customer Master Serializers ====================
 
-class CustomerMasterSerializer(serializers.ModelSerializer):
-    kam_details = serializers.SerializerMethodField()
-    total_billed = serializers.SerializerMethodField()
-    total_paid = serializers.SerializerMethodField()
-    total_due = serializers.SerializerMethodField()
-    active_entitlements_count = serializers.SerializerMethodField()
-    created_by_details = serializers.SerializerMethodField()
-    updated_by_details = serializers.SerializerMethodField()
+class CustomerMasterSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    kam_details = BatchField()
+    total_billed = BatchField(loader='load_totals', key='total_billed')
+    total_paid = BatchField(loader='load_totals', key='total_paid')
+    total_due = BatchField(loader='load_totals', key='total_due')
+    active_entitlements_count = BatchField(loader='load_totals', key='active_entitlements_count')
+    created_by_details = BatchField()
+    updated_by_details = BatchField()
     
     class Meta:
         model = CustomerMaster
         fields = '__all__'
         read_only_fields = ['created_at', 'updated_at', 'customer_number', 'last_bill_invoice_date', 'created_by', 'updated_by']
+        list_serializer_class = BatchListSerializer
+        expandable_fields = ['total_billed', 'total_paid', 'total_due', 'active_entitlements_count']
     
-    def get_kam_details(self, obj):
-        if obj.kam_id:
-            return {
-                'id': obj.kam_id.id,
-                'name': obj.kam_id.kam_name,
-                'email': obj.kam_id.email,
-                'phone': obj.kam_id.phone,
-            }
-        return None
-    
-    def get_created_by_details(self, obj):
-        if obj.created_by:
-            return {
-                'id': obj.created_by.id,
-                'username': obj.created_by.username,
-                'email': obj.created_by.email,
-                'first_name': obj.created_by.first_name,
-                'last_name': obj.created_by.last_name,
-            }
-        return None
-    
-    def get_updated_by_details(self, obj):
-        if obj.updated_by:
-            return {
-                'id': obj.updated_by.id,
-                'username': obj.updated_by.username,
-                'email': obj.updated_by.email,
-                'first_name': obj.updated_by.first_name,
-                'last_name': obj.updated_by.last_name,
-            }
-        return None
-    
-    def get_total_billed(self, obj):
-        """Calculate total billed amount from all invoices"""
-        from apps.bills.models import InvoiceMaster
-        total = InvoiceMaster.objects.filter(
-            customer_entitlement_master_id__customer_master_id=obj
-        ).aggregate(total=models.Sum('total_bill_amount'))['total']
-        return float(total) if total else 0.0
+    def load_kam_details(self, objs):
+        prefetch_related_objects(objs, 'kam_id')
+        return {obj.pk: {
+            'id': obj.kam_id.id,
+            'name': obj.kam_id.kam_name,
+            'email': obj.kam_id.email,
+            'phone': obj.kam_id.phone,
+        } if obj.kam_id else None for obj in objs}
     
-    def get_total_paid(self, obj):
-        """Calculate total paid amount from all payments"""
-        from apps.payment.models import PaymentMaster
-        total = PaymentMaster.objects.filter(
-            customer_entitlement_master_id__customer_master_id=obj
-        ).aggregate(total=models.Sum('details__pay_amount'))['total']
-        return float(total) if total else 0.0
+    def load_created_by_details(self, objs):
+        prefetch_related_objects(objs, 'created_by')
+        return {obj.pk: user_details(obj.created_by) for obj in objs}
     
-    def get_total_due(self, obj):
-        """Calculate total due amount"""
-        return self.get_total_billed(obj) - self.get_total_paid(obj)
+    def load_updated_by_details(self, objs):
+        prefetch_related_objects(objs, 'updated_by')
+        return {obj.pk: user_details(obj.updated_by) for obj in objs}
     
-    def get_active_entitlements_count(self, obj):
-        """Count active entitlements"""
-        return obj.entitlements.filter(
-            details__is_active=True,
-            details__status='active'
-        ).distinct().count()
-
-
+    def load_totals(self, objs):
+        """Billed, paid and due amounts and active entitlements; annotated by CustomerMasterQuerySet.with_totals"""
+        if all(hasattr(obj, 'total_billed') for obj in objs):
+            rows = {obj.pk: vars(obj) for obj in objs}
+        else:
+            rows = {row['pk']: row for row in CustomerMaster.objects.filter(pk__in=[obj.pk for obj in objs]).with_totals().values(
+                'pk', 'total_billed', 'total_paid', 'active_entitlements_count'
+            )}
+        totals = {}
+        for obj in objs:
+            row = rows[obj.pk]
+            billed, paid = float(row['total_billed']), float(row['total_paid'])
+            totals[obj.pk] = {
+                'total_billed': billed,
+                'total_paid': paid,
+                'total_due': billed - paid,
+                'active_entitlements_count': row['active_entitlements_count'],
+            }
+        return totals
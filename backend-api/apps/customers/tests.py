@@ -1,3 +1,155 @@
+from datetime import date
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.bills.models import CustomerEntitlementMaster
+from apps.bills.serializers import CustomerEntitlementDetailsSerializer, CustomerEntitlementMasterSerializer
+from apps.bills.tests import make_customer, make_detail, make_entitlement, make_invoice, make_payment
+from apps.package.models import PackageMaster, PackagePricing
+from apps.utility.refdata import clear_local
+from tests.query_budget import measure
+from .models import CustomerMaster, KAMMaster
+from .serializers import CustomerMasterSerializer
+
+User = get_user_model()
+
+
+class KAMListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(email='admin@example.com', username='admin', password='admin')
+        cls.kams = [KAMMaster.objects.create(kam_name=f'KAM {index}') for index in range(4)]
+        for index in range(6):
+            make_customer(f'Customer {index}', kam_id=cls.kams[index % 3])
+
+    def setUp(self):
+        cache.clear()
+        clear_local()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_assigned_customers_count(self):
+        url = reverse('kam-list')
+        counts = [2, 2, 2, 0]
+        for params in ({}, {'search': 'KAM'}):
+            response = self.client.get(url, params)
+            self.assertEqual([row['assigned_customers_count'] for row in response.data['results']], counts)
+        self.assertEqual(measure(self.client, url, 2).queries, measure(self.client, url, 100).queries)
+        self.assertEqual(self.client.get(reverse('kam-detail', args=[self.kams[0].pk])).data['assigned_customers_count'], 2)
+
+
+def counting(serializer_class, loader):
+    """Patch loader on serializer_class to count its calls, keeping its behaviour"""
+    return mock.patch.object(serializer_class, loader, autospec=True, side_effect=getattr(serializer_class, loader))
+
+
+class BatchFieldTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(email='admin@example.com', username='admin', password='admin')
+        kam = KAMMaster.objects.create(kam_name='Rahim', email='rahim@example.com')
+        cls.customers = [make_customer(f'Customer {index}', kam_id=kam, created_by=cls.admin) for index in range(4)]
+        package = PackageMaster.objects.create(package_name='Home 20', package_type='soho')
+        pricing = PackagePricing.objects.create(
+            package_master_id=package, rate=500, val_start_at=date(2025, 1, 1), val_end_at=date(2025, 12, 31)
+        )
+        for customer in cls.customers[:2]:
+            entitlement = make_entitlement(customer)
+            make_detail(entitlement, date(2025, 1, 1), date(2025, 12, 31), package_pricing_id=pricing)
+            make_detail(entitlement, date(2025, 1, 1), date(2025, 12, 31))
+            make_payment(make_invoice(entitlement, date(2025, 1, 1), '1000'), date(2025, 1, 10), '400')
+
+    def serialize(self, customers):
+        return CustomerMasterSerializer(customers, many=True).data
+
+    def test_loaders_run_once_per_list(self):
+        with counting(CustomerMasterSerializer, 'load_totals') as load_totals, \
+                counting(CustomerMasterSerializer, 'load_kam_details') as load_kam_details:
+            data = self.serialize(CustomerMaster.objects.order_by('id'))
+        # Four fields share the totals loader
+        self.assertEqual((load_totals.call_count, load_kam_details.call_count), (1, 1))
+        self.assertEqual(
+            [(row['total_billed'], row['total_paid'], row['total_due'], row['active_entitlements_count']) for row in data],
+            [(1000.0, 400.0, 600.0, 1), (1000.0, 400.0, 600.0, 1), (0.0, 0.0, 0.0, 0), (0.0, 0.0, 0.0, 0)],
+        )
+        self.assertEqual({row['kam_details']['name'] for row in data}, {'Rahim'})
+        self.assertEqual({row['created_by_details']['username'] for row in data}, {'admin'})
+        self.assertEqual({row['updated_by_details'] for row in data}, {None})
+
+    def test_queries_do_not_grow_with_the_list(self):
+        with CaptureQueriesContext(connection) as few:
+            self.serialize(CustomerMaster.objects.order_by('id')[:1])
+        with CaptureQueriesContext(connection) as many:
+            self.serialize(CustomerMaster.objects.order_by('id'))
+        self.assertEqual(len(few), len(many))
+
+    def test_single_object(self):
+        data = CustomerMasterSerializer(self.customers[0]).data
+        self.assertEqual((data['kam_details']['name'], data['total_due']), ('Rahim', 600.0))
+        self.assertEqual(CustomerMasterSerializer(self.customers[3]).data['active_entitlements_count'], 0)
+
+    def test_nested_lists_are_loaded_together(self):
+        with counting(CustomerEntitlementDetailsSerializer, 'load_package_name') as load_package_name:
+            data = CustomerEntitlementMasterSerializer(
+                CustomerEntitlementMaster.objects.order_by('id'), many=True
+            ).data
+        self.assertEqual(load_package_name.call_count, 1)
+        self.assertEqual([sorted(str(line['package_name']) for line in row['details']) for row in data],
+                         [['Home 20', 'None']] * 2)
+        self.assertEqual([row['total_entitlement_amount'] for row in data], [2000.0, 2000.0])
+
+
+class SparseFieldsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(email='admin@example.com', username='admin', password='admin')
+        make_invoice(make_entitlement(make_customer('Acme')), date(2025, 1, 1), '1000')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.url = reverse('customer-list')
+
+    def get(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results'][0], ' '.join(query['sql'] for query in queries)
+
+    def test_fields_and_expand(self):
+        row, sql = self.get(fields='id,customer_name')
+        self.assertEqual(set(row), {'id', 'customer_name'})
+        # Totals are neither computed nor annotated
+        self.assertNotIn('total_billed', sql)
+
+        row, sql = self.get(expand='')
+        self.assertNotIn('total_due', row)
+        self.assertIn('kam_details', row)
+
+        row, sql = self.get(fields='id', expand='total_due')
+        self.assertEqual(row, {'id': row['id'], 'total_due': 1000.0})
+
+        row, sql = self.get()
+        self.assertIn('total_billed', sql)
 
-# Create your tests here.
+    def test_unknown_names_are_rejected(self):
+        response = self.client.get(self.url, {'fields': 'id,bogus', 'expand': 'kam_details'})
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.data['fields'][0].startswith('Unknown name(s) in ?fields=: bogus. Valid names: '))
+        self.assertIn('customer_name', response.data['fields'][0])
+        self.assertEqual(
+            response.data['expand'],
+            ['Unknown name(s) in ?expand=: kam_details. '
+             'Valid names: active_entitlements_count, total_billed, total_due, total_paid.'],
+        )
+        self.assertEqual(self.client.get(reverse('invoice-list'), {'expand': 'detail'}).status_code, 400)
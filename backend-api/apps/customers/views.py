@@ -22,6 +22,8 @@ from .utils import convert_prospect_to_customer
 from .email_service import send_prospect_confirmation_email, send_customer_lost_email
 from .import_export import CustomerExporter, CustomerImporter
 from apps.authentication.permissions import RequirePermissions
+from config.serializers import FieldSelection
+from apps.utility import refdata
 
 
 
@@ -35,6 +37,22 @@ class KAMMasterListView(generics.ListAPIView):
     search_fields = ['kam_name', 'email', 'phone']
     ordering_fields = ['kam_name', 'created_at']
 
+    def get_queryset(self):
+        qs = super().get_queryset().order_by('id')
+        if FieldSelection.for_view(self).wants('assigned_customers_count'):
+            qs = qs.annotate(customers_count=Count('customers'))
+        return qs
+
+    def list(self, request, *args, **kwargs):
+        # Unfiltered lists are paged out of the KAM snapshot; the serializer counts the page's customers in one query
+        if not refdata.is_unfiltered_list(self):
+            return super().list(request, *args, **kwargs)
+        snapshot = refdata.kams()
+        kams = [snapshot.instance(row['id']) for row in snapshot.rows if row['is_active']]
+        page = self.paginate_queryset(kams)
+        serializer = self.get_serializer(kams if page is None else page, many=True)
+        return Response(serializer.data) if page is None else self.get_paginated_response(serializer.data)
+
 
 class KAMMasterDetailView(generics.RetrieveAPIView):
     """GET only - Retrieve single KAM Master"""
@@ -58,7 +76,7 @@ class CustomerMasterViewSet(viewsets.ModelViewSet):
     ordering_fields = ['customer_name', 'created_at', 'last_bill_invoice_date']
     
     def get_queryset(self):
-        qs = CustomerMaster.objects.select_related('kam_id', 'created_by').prefetch_related('entitlements')
+        qs = CustomerMaster.objects.for_list(FieldSelection.for_view(self))
         
         # Skip role checking during schema generation
         if getattr(self, 'swagger_fake_view', False):
@@ -92,9 +110,9 @@ class CustomerMasterViewSet(viewsets.ModelViewSet):
         """Get all entitlements for a customer"""
         from apps.bills.serializers import CustomerEntitlementMasterSerializer
         customer = self.get_object()
-        entitlements = CustomerEntitlementMaster.objects.filter(
+        entitlements = CustomerEntitlementMaster.objects.for_list().filter(
             customer_master_id=customer
-        ).prefetch_related('details')
+        )
         serializer = CustomerEntitlementMasterSerializer(entitlements, many=True)
         return Response(serializer.data)
     
@@ -103,7 +121,7 @@ class CustomerMasterViewSet(viewsets.ModelViewSet):
         """Get all invoices for a customer"""
         from apps.bills.models import InvoiceMaster
         customer = self.get_object()
-        invoices = InvoiceMaster.objects.filter(
+        invoices = InvoiceMaster.objects.for_list().filter(
             customer_entitlement_master_id__customer_master_id=customer
         )
         from apps.bills.serializers import InvoiceMasterSerializer
@@ -115,7 +133,7 @@ class CustomerMasterViewSet(viewsets.ModelViewSet):
         """Get all payments for a customer"""
         from apps.payment.models import PaymentMaster
         customer = self.get_object()
-        payments = PaymentMaster.objects.filter(
+        payments = PaymentMaster.objects.for_list().filter(
             customer_entitlement_master_id__customer_master_id=customer
         )
         from apps.payment.serializers import PaymentMasterSerializer
@@ -131,7 +149,7 @@ class CustomerMasterViewSet(viewsets.ModelViewSet):
         start_date = request.query_params.get('start_date')
         end_date = request.query_params.get('end_date')
         
-        payments = PaymentMaster.objects.filter(
+        payments = PaymentMaster.objects.for_list().filter(
             customer_entitlement_master_id__customer_master_id=customer
         )
         
@@ -164,7 +182,7 @@ class CustomerMasterViewSet(viewsets.ModelViewSet):
         end_date = request.query_params.get('end_date')
         period = request.query_params.get('period')  # 'monthly', 'weekly', etc.
         
-        invoices = InvoiceMaster.objects.filter(
+        invoices = InvoiceMaster.objects.for_list().filter(
             customer_entitlement_master_id__customer_master_id=customer
         )
         
@@ -187,7 +205,7 @@ class CustomerMasterViewSet(viewsets.ModelViewSet):
         """Get last bill/invoice for customer"""
         from apps.bills.models import InvoiceMaster
         customer = self.get_object()
-        last_invoice = InvoiceMaster.objects.filter(
+        last_invoice = InvoiceMaster.objects.for_list().filter(
             customer_entitlement_master_id__customer_master_id=customer
         ).order_by('-issue_date').first()
         
@@ -202,7 +220,7 @@ class CustomerMasterViewSet(viewsets.ModelViewSet):
         """Get previous bill (second to last)"""
         from apps.bills.models import InvoiceMaster
         customer = self.get_object()
-        invoices = InvoiceMaster.objects.filter(
+        invoices = InvoiceMaster.objects.for_list().filter(
             customer_entitlement_master_id__customer_master_id=customer
         ).order_by('-issue_date')[:2]
         
@@ -379,6 +397,8 @@ class ProspectListCreateView(generics.ListCreateAPIView):
 
     def get_queryset(self):
         qs = Prospect.objects.all()
+        if FieldSelection.for_view(self).wants('kam_details'):
+            qs = qs.select_related('kam')
         user = self.request.user
         if user.role and user.role.name == 'sales_person':
             qs = qs.filter(kam=user)
@@ -389,7 +409,7 @@ class ProspectListCreateView(generics.ListCreateAPIView):
 
 
 class ProspectDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Prospect.objects.all()
+    queryset = Prospect.objects.select_related('kam')
     serializer_class = ProspectSerializer
     permission_classes = [permissions.IsAuthenticated, RequirePermissions]
     required_permissions = ['prospects:update']
@@ -701,20 +721,3 @@ class ProspectImportView(APIView):
 #                 {'detail': 'Failed to convert prospect to customer'},
 #                 status=status.HTTP_400_BAD_REQUEST
 #             )
-
-
-# class RevenueCalculationView(APIView):
-#     permission_classes = [permissions.IsAuthenticated, RequirePermissions]
-#     required_permissions = ['reports:read']
-
-#     def get(self, request):
-#         # Simple aggregation example; can be extended to weekly/yearly
-#         monthly_total = BillRecord.objects.aggregate(total=models.Sum('total_bill'))['total'] or 0
-#         weekly_total = monthly_total / 4
-#         yearly_total = monthly_total * 12
-#         return Response({
-#             'monthly': float(monthly_total),
-#             'weekly': float(weekly_total),
-#             'yearly': float(yearly_total),
-#         })
-
@@ -0,0 +1,62 @@
+from django.contrib import admin
+from .models import DailyRevenueFact, FactRefreshState, KAMMonthlyRollup, RevenueForecast
+
+
+@admin.register(DailyRevenueFact)
+class DailyRevenueFactAdmin(admin.ModelAdmin):
+    """Read-only view of the derived revenue facts"""
+    list_display = [
+        'date', 'customer_master_id', 'kam_id', 'customer_type', 'package_type',
+        'billed_amount', 'collected_amount', 'due_amount'
+    ]
+    list_filter = ['customer_type', 'package_type', 'date']
+    search_fields = ['customer_master_id__customer_name']
+    date_hierarchy = 'date'
+    list_select_related = ['customer_master_id', 'kam_id']
+    list_per_page = 50
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(FactRefreshState)
+class FactRefreshStateAdmin(admin.ModelAdmin):
+    list_display = ['name', 'high_water_mark', 'refreshed_at', 'rows_written']
+    readonly_fields = ['name', 'high_water_mark', 'refreshed_at', 'rows_written']
+
+
+@admin.register(KAMMonthlyRollup)
+class KAMMonthlyRollupAdmin(admin.ModelAdmin):
+    """Read-only view of the derived KAM monthly rollup"""
+    list_display = [
+        'month', 'kam_id', 'total_customers', 'active_customers', 'new_customers',
+        'churned_customers', 'billed_amount', 'collected_amount', 'paid_invoices'
+    ]
+    list_filter = ['kam_id', 'month']
+    date_hierarchy = 'month'
+    list_select_related = ['kam_id']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(RevenueForecast)
+class RevenueForecastAdmin(admin.ModelAdmin):
+    """Read-only view of the generated revenue forecast"""
+    list_display = [
+        'month', 'customer_type', 'kam_id', 'billed_amount', 'collected_amount', 'history_months', 'generated_at'
+    ]
+    list_filter = ['customer_type', 'kam_id', 'month']
+    list_select_related = ['kam_id']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
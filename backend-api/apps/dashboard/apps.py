@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class DashboardConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.dashboard'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,288 @@
+"""
+In-process columnar copy of daily_revenue_fact for dashboard slicing.
+
+Every worker keeps the fact rows as NumPy columns: dictionary-encoded
+int32 dimensions, int32 day numbers and int64 amounts in paisa. Group-by
+and filter queries are answered with boolean masks and ufunc reductions
+instead of a database round trip. Enabled with DASHBOARD_CUBE_ENABLED.
+"""
+import threading
+import time
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db.models import F, BigIntegerField
+from django.db.models.functions import Cast, Round
+
+from .facts import DAILY_REVENUE
+from .models import DailyRevenueFact, FactRefreshState
+
+
+# Dimension columns: cube name -> fact column
+DIMENSIONS = {
+    'customer': 'customer_master_id',
+    'kam': 'kam_id',
+    'customer_type': 'customer_type',
+    'package_type': 'package_type',
+}
+
+# Dashboard query parameter -> (dimension, value parser)
+CUBE_FILTERS = {
+    'kam_id': ('kam', int),
+    'customer_type': ('customer_type', str),
+    'package_type': ('package_type', str),
+    'customer_id': ('customer', int),
+}
+
+# Stored measures; due is always billed - collected so it is derived
+MEASURES = {
+    'billed': 'billed_amount',
+    'collected': 'collected_amount',
+}
+
+LOAD_CHUNK_SIZE = 50000
+PAISA = Decimal('0.01')
+
+
+def _day_number(day):
+    return day.toordinal()
+
+
+def _paisa(field):
+    return Cast(Round(F(field) * 100), BigIntegerField())
+
+
+class Dictionary:
+    """Value <-> int32 code mapping for one dimension"""
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, value):
+        return self.codes.get(value)
+
+
+class CubeData:
+    """One immutable generation of columns; queries hold a reference while they run"""
+
+    def __init__(self, columns, dictionaries, max_id, refreshed_at):
+        self.columns = columns
+        self.dictionaries = dictionaries
+        self.max_id = max_id
+        self.refreshed_at = refreshed_at
+
+    def __len__(self):
+        return len(self.columns['day'])
+
+
+class RevenueCube:
+    """Process-wide cube, refreshed from the fact table's high-water mark"""
+
+    def __init__(self):
+        self.data = None
+        self.checked_at = 0
+        self.lock = threading.Lock()
+
+    # ---- loading -------------------------------------------------------
+
+    @staticmethod
+    def _read(queryset, dictionaries):
+        """Encode fact rows into column arrays, chunk by chunk"""
+        fields = ['id', 'date', *DIMENSIONS.values(), *(f'{name}_paisa' for name in MEASURES)]
+        rows = queryset.order_by().annotate(**{
+            f'{name}_paisa': _paisa(field) for name, field in MEASURES.items()
+        }).values_list(*fields)
+
+        chunks = {name: [] for name in ['day', *DIMENSIONS, *MEASURES]}
+        max_id = 0
+        buffer = []
+
+        def flush():
+            nonlocal max_id
+            if not buffer:
+                return
+            columns = list(zip(*buffer))
+            max_id = max(max_id, max(columns[0]))
+            chunks['day'].append(np.fromiter(map(_day_number, columns[1]), dtype=np.int32, count=len(buffer)))
+            for offset, name in enumerate(DIMENSIONS, start=2):
+                encode = dictionaries[name].encode
+                chunks[name].append(np.fromiter(map(encode, columns[offset]), dtype=np.int32, count=len(buffer)))
+            for offset, name in enumerate(MEASURES, start=2 + len(DIMENSIONS)):
+                chunks[name].append(np.array(columns[offset], dtype=np.int64))
+            buffer.clear()
+
+        for row in rows.iterator(chunk_size=LOAD_CHUNK_SIZE):
+            buffer.append(row)
+            if len(buffer) == LOAD_CHUNK_SIZE:
+                flush()
+        flush()
+
+        dtypes = {'day': np.int32, **{name: np.int32 for name in DIMENSIONS}, **{name: np.int64 for name in MEASURES}}
+        columns = {
+            name: np.concatenate(parts) if parts else np.empty(0, dtype=dtypes[name])
+            for name, parts in chunks.items()
+        }
+        return columns, max_id
+
+    def _load(self, refreshed_at):
+        dictionaries = {name: Dictionary() for name in DIMENSIONS}
+        columns, max_id = self._read(DailyRevenueFact.objects.all(), dictionaries)
+        return CubeData(columns, dictionaries, max_id, refreshed_at)
+
+    def _apply_changes(self, data, refreshed_at):
+        """
+        Fold in facts written since the last load.
+
+        A fact refresh deletes and re-inserts all rows of each rebuilt
+        customer, so rows above the loaded max id name the customers whose
+        older rows are stale. Returns None when the result does not match the
+        table (e.g. a customer lost all its facts) and a full load is needed.
+        """
+        dictionaries = data.dictionaries
+        new_columns, new_max_id = self._read(DailyRevenueFact.objects.filter(id__gt=data.max_id), dictionaries)
+        keep = ~np.isin(data.columns['customer'], np.unique(new_columns['customer']))
+        columns = {
+            name: np.concatenate([column[keep], new_columns[name]])
+            for name, column in data.columns.items()
+        }
+        if len(columns['day']) != DailyRevenueFact.objects.count():
+            return None
+        return CubeData(columns, dictionaries, max(data.max_id, new_max_id), refreshed_at)
+
+    def refresh(self, force=False):
+        """
+        Catch up with the fact table. Checks at most once per
+        DASHBOARD_FACT_MAX_AGE seconds unless force is set.
+        """
+        if not force and self.data is not None and time.monotonic() - self.checked_at < settings.DASHBOARD_FACT_MAX_AGE:
+            return self.data
+        with self.lock:
+            # Read the mark before the rows: a refresh committing in between is picked up next time
+            refreshed_at = FactRefreshState.objects.filter(name=DAILY_REVENUE).values_list(
+                'refreshed_at', flat=True
+            ).first()
+            data = self.data
+            if data is None:
+                data = self._load(refreshed_at)
+            elif data.refreshed_at != refreshed_at:
+                data = self._apply_changes(data, refreshed_at) or self._load(refreshed_at)
+            self.data = data
+            self.checked_at = time.monotonic()
+        return data
+
+    # ---- queries -------------------------------------------------------
+
+    @staticmethod
+    def _mask(data, filters, start=None, end=None):
+        """Row mask for dashboard filter parameters and an inclusive date range, None when nothing can match"""
+        columns = data.columns
+        mask = np.ones(len(data), dtype=bool)
+        for param, (name, parse) in CUBE_FILTERS.items():
+            value = filters.get(param)
+            if not value:
+                continue
+            try:
+                code = data.dictionaries[name].lookup(parse(value))
+            except ValueError:
+                code = None
+            if code is None:
+                return None
+            mask &= columns[name] == code
+        if start is not None:
+            mask &= columns['day'] >= _day_number(start)
+        if end is not None:
+            mask &= columns['day'] <= _day_number(end)
+        return mask
+
+    def aggregate(self, filters, start=None, end=None, bins=None, by=None):
+        """
+        Sum billed/collected/due over the filtered rows.
+
+        bins: sorted period start dates; rows are grouped by the last start
+        on or before their day (rows before the first start are dropped).
+        by: a dimension name to group by.
+        Returns {key: {'billed', 'collected', 'due'}} with Decimal amounts. The
+        key is the bin start, the dimension value, both as a tuple, or None
+        without grouping.
+        """
+        data = self.refresh()
+        mask = self._mask(data, filters, start, end)
+        if mask is None or not mask.any():
+            return {}
+        columns = data.columns
+
+        group = np.zeros(int(mask.sum()), dtype=np.int64)
+        sizes = []
+        if bins:
+            edges = np.array([_day_number(day) for day in bins], dtype=np.int32)
+            bin_index = np.searchsorted(edges, columns['day'][mask], side='right') - 1
+            inside = bin_index >= 0
+            mask[mask] = inside
+            group = bin_index[inside].astype(np.int64)
+            sizes.append(len(edges))
+        if by:
+            codes = columns[by][mask]
+            size = len(data.dictionaries[by].values)
+            group = group * size + codes if sizes else codes.astype(np.int64)
+            sizes.append(size)
+        if not len(group):
+            return {}
+
+        # Sort once, then reduce each contiguous run of equal group ids in int64
+        order = np.argsort(group, kind='stable')
+        group = group[order]
+        starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+        sums = {
+            name: np.add.reduceat(columns[name][mask][order], starts)
+            for name in MEASURES
+        }
+
+        result = {}
+        for position, group_id in enumerate(group[starts].tolist()):
+            parts = []
+            if by:
+                group_id, code = divmod(group_id, sizes[-1])
+            if bins:
+                parts.append(bins[group_id])
+            if by:
+                parts.append(data.dictionaries[by].values[code])
+            billed = Decimal(int(sums['billed'][position])) * PAISA
+            collected = Decimal(int(sums['collected'][position])) * PAISA
+            key = tuple(parts) if len(parts) > 1 else (parts[0] if parts else None)
+            result[key] = {'billed': billed, 'collected': collected, 'due': billed - collected}
+        return result
+
+    def distinct_count(self, filters, dimension, start=None, end=None, billed_only=False):
+        """Number of distinct dimension values among the filtered rows"""
+        data = self.refresh()
+        mask = self._mask(data, filters, start, end)
+        if mask is None:
+            return 0
+        if billed_only:
+            mask &= data.columns['billed'] > 0
+        return int(np.unique(data.columns[dimension][mask]).size)
+
+
+_cube = RevenueCube()
+
+
+def get_cube():
+    """The process-wide cube, or None when DASHBOARD_CUBE_ENABLED is off"""
+    if not settings.DASHBOARD_CUBE_ENABLED:
+        return None
+    return _cube
+
+
+def refresh_cube(force=False):
+    cube = get_cube()
+    if cube is not None:
+        cube.refresh(force=force)
@@ -0,0 +1,196 @@
+"""
+Live KPI deltas for dashboard streams.
+
+Billing, payment and prospect writes publish a compact delta once their
+transaction commits; the broker hands that one event to every open stream.
+The in-memory broker reaches the streams of its own process. With
+REDIS_URL set, events travel over a Redis channel so a write served by any
+worker reaches the streams held by all of them.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'dashboard:kpi'
+
+# Delta fields, summed when events are merged
+COUNTERS = ['billed', 'collected', 'invoices', 'prospect_conversions']
+
+# Prospect status the sales flow uses for a prospect that became a customer
+CONVERTED_PROSPECT_STATUSES = ['qualified']
+
+# Events buffered per stream; a stream that falls this far behind drops the extra
+QUEUE_SIZE = 1000
+
+
+class StreamCapacityError(Exception):
+    """The worker already holds DASHBOARD_STREAM_MAX_CONNECTIONS streams"""
+
+
+class Subscription:
+    """One stream's queue, fed from any thread through its event loop"""
+
+    def __init__(self, broker, loop):
+        self.broker = broker
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.dropped = 0
+
+    def deliver(self, event):
+        # Runs on self.loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def get(self, timeout):
+        """All events queued within timeout seconds of the first one, or [] when none arrive"""
+        try:
+            events = [await asyncio.wait_for(self.queue.get(), timeout)]
+        except asyncio.TimeoutError:
+            return []
+        while not self.queue.empty():
+            events.append(self.queue.get_nowait())
+        return events
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """In-process pub/sub; publish() is safe to call from any thread"""
+
+    def __init__(self, max_connections):
+        self.max_connections = max_connections
+        self.subscriptions = set()
+        self.lock = threading.Lock()
+
+    def subscribe(self):
+        """Register a stream for the running event loop; raises StreamCapacityError when full"""
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            if len(self.subscriptions) >= self.max_connections:
+                raise StreamCapacityError()
+            subscription = Subscription(self, loop)
+            self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+    def dispatch(self, event):
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # The stream's loop has shut down; its view will never unsubscribe
+                self.unsubscribe(subscription)
+
+    def publish(self, event):
+        self.dispatch(event)
+
+
+class RedisBroker(LocalBroker):
+    """Publishes through a Redis channel; one listener thread per process feeds local streams"""
+
+    def __init__(self, max_connections, url):
+        super().__init__(max_connections)
+        self.url = url
+        self.listener = None
+        self.client = None
+
+    def _client(self):
+        if self.client is None:
+            import redis
+            self.client = redis.Redis.from_url(self.url)
+        return self.client
+
+    def subscribe(self):
+        subscription = super().subscribe()
+        with self.lock:
+            if self.listener is None:
+                self.listener = threading.Thread(target=self._listen, name='dashboard-events', daemon=True)
+                self.listener.start()
+        return subscription
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CHANNEL)
+                for message in pubsub.listen():
+                    self.dispatch(json.loads(message['data']))
+            except Exception:
+                logger.exception('Dashboard event listener lost its Redis connection; reconnecting')
+                time.sleep(1)
+
+    def publish(self, event):
+        try:
+            self._client().publish(CHANNEL, json.dumps(event))
+        except Exception:
+            # Streams are a convenience; a write must never fail because of them
+            logger.exception('Failed to publish dashboard event')
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """The process-wide broker: Redis-backed when REDIS_URL is set, in-memory otherwise"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                max_connections = settings.DASHBOARD_STREAM_MAX_CONNECTIONS
+                if settings.REDIS_URL:
+                    _broker = RedisBroker(max_connections, settings.REDIS_URL)
+                else:
+                    _broker = LocalBroker(max_connections)
+    return _broker
+
+
+def set_broker(broker):
+    """Swap the process-wide broker (e.g. a fresh LocalBroker in tests); returns the previous one"""
+    global _broker
+    with _broker_lock:
+        previous, _broker = _broker, broker
+    return previous
+
+
+def kpi_delta(day=None, **counters):
+    """A compact event: the day it counts towards and its non-zero counters"""
+    day = day or timezone.localdate()
+    event = {'date': (day if isinstance(day, str) else day.isoformat())[:10]}
+    for name in COUNTERS:
+        value = counters.get(name)
+        if value:
+            event[name] = float(value) if name in ('billed', 'collected') else value
+    return event
+
+
+def publish_on_commit(event):
+    """Publish once the current transaction commits; nothing is sent for a rollback"""
+    transaction.on_commit(lambda: get_broker().publish(event))
+
+
+def merge_deltas(events):
+    """Sum queued events per date so a stream sends one frame however many writes landed"""
+    merged = {}
+    for event in events:
+        row = merged.setdefault(event['date'], {'date': event['date']})
+        for name in COUNTERS:
+            if name in event:
+                row[name] = round(row.get(name, 0) + event[name], 2)
+    return [merged[day] for day in sorted(merged)]
@@ -0,0 +1,197 @@
+"""
+Incremental maintenance of the daily_revenue_fact table.
+
+Refreshes run outside the request path, from the refresh_revenue_facts
+command (on a schedule, or looping with --every); dashboard requests
+only read the facts.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from apps.customers.models import CustomerMaster
+from apps.bills.models import InvoiceMaster, InvoiceDetails, CustomerEntitlementDetails
+from apps.payment.models import PaymentMaster, PaymentDetails
+from .models import DailyRevenueFact, FactRefreshState
+from .rollups import kam_assignments, save_assignments, refresh_kam_rollups
+
+
+DAILY_REVENUE = 'daily_revenue'
+
+# Writes committed slightly after the previous refresh started can carry an
+# older updated_at; re-reading this window catches them (rebuilds are idempotent).
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+CUSTOMER_BATCH_SIZE = 500
+
+EXCLUDED_INVOICE_STATUSES = ['cancelled']
+EXCLUDED_PAYMENT_STATUSES = ['failed']
+
+ZERO = Decimal('0')
+CENT = Decimal('0.01')
+
+
+def changed_customer_ids(since):
+    """Customers with any billing, payment or customer change after since"""
+    changed = set()
+    changed.update(CustomerMaster.objects.filter(updated_at__gt=since).values_list('id', flat=True))
+    changed.update(InvoiceMaster.objects.filter(updated_at__gt=since).values_list(
+        'customer_entitlement_master_id__customer_master_id', flat=True))
+    changed.update(PaymentMaster.objects.filter(updated_at__gt=since).values_list(
+        'customer_entitlement_master_id__customer_master_id', flat=True))
+    changed.update(PaymentDetails.objects.filter(updated_at__gt=since).values_list(
+        'payment_master_id__customer_entitlement_master_id__customer_master_id', flat=True))
+    changed.update(CustomerEntitlementDetails.objects.filter(updated_at__gt=since).values_list(
+        'cust_entitlement_id__customer_master_id', flat=True))
+    changed.discard(None)
+    return changed
+
+
+def _allocate(amount, shares):
+    """Split amount over package types in proportion to shares, remainder on the last one"""
+    total = sum(shares.values()) if shares else ZERO
+    if not total:
+        yield '', amount
+        return
+    remaining = amount
+    allocations = sorted(shares.items())
+    for index, (package_type, share) in enumerate(allocations):
+        if index == len(allocations) - 1:
+            yield package_type, remaining
+        else:
+            part = (amount * share / total).quantize(CENT)
+            remaining -= part
+            yield package_type, part
+
+
+def _build_facts(customers):
+    """
+    Compute fact rows for a batch of customers.
+
+    customers maps customer id -> (kam id, customer_type). Invoice totals and
+    payments are spread over an invoice's package types in proportion to its
+    line items; invoices without line items go under a blank package type.
+    """
+    ids = list(customers)
+    rows = defaultdict(lambda: {'billed': ZERO, 'vat': ZERO, 'discount': ZERO, 'collected': ZERO})
+
+    invoice_shares = defaultdict(dict)
+    lines = InvoiceDetails.objects.filter(
+        invoice_master_id__customer_entitlement_master_id__customer_master_id__in=ids
+    ).order_by().values('invoice_master_id', 'entitlement_details_id__type').annotate(
+        line_billed=Sum('line_total')
+    )
+    for line in lines:
+        invoice_shares[line['invoice_master_id']][line['entitlement_details_id__type'] or ''] = line['line_billed']
+
+    invoices = InvoiceMaster.objects.filter(
+        customer_entitlement_master_id__customer_master_id__in=ids
+    ).exclude(status__in=EXCLUDED_INVOICE_STATUSES).order_by().values(
+        'id', 'issue_date', 'customer_entitlement_master_id__customer_master_id',
+        'total_bill_amount', 'total_vat_amount', 'total_discount_amount',
+    )
+    for invoice in invoices:
+        shares = invoice_shares.get(invoice['id'])
+        day, customer_id = invoice['issue_date'], invoice['customer_entitlement_master_id__customer_master_id']
+        for column, field in [('billed', 'total_bill_amount'), ('vat', 'total_vat_amount'), ('discount', 'total_discount_amount')]:
+            for package_type, part in _allocate(invoice[field], shares):
+                rows[(day, customer_id, package_type)][column] += part
+
+    payment_customer = 'payment_master_id__customer_entitlement_master_id__customer_master_id'
+    payments = PaymentDetails.objects.filter(**{f'{payment_customer}__in': ids}).exclude(
+        status__in=EXCLUDED_PAYMENT_STATUSES
+    ).exclude(
+        payment_master_id__status__in=EXCLUDED_PAYMENT_STATUSES
+    ).order_by().values(
+        'payment_master_id__payment_date', payment_customer, 'payment_master_id__invoice_master_id'
+    ).annotate(amount=Sum('pay_amount'))
+    for payment in payments:
+        shares = invoice_shares.get(payment['payment_master_id__invoice_master_id'])
+        day, customer_id = payment['payment_master_id__payment_date'], payment[payment_customer]
+        for package_type, part in _allocate(payment['amount'], shares):
+            rows[(day, customer_id, package_type)]['collected'] += part
+
+    facts = []
+    for (day, customer_id, package_type), amounts in rows.items():
+        if not any(amounts.values()):
+            continue
+        kam_id, customer_type = customers[customer_id]
+        billed = amounts['billed'].quantize(CENT)
+        collected = amounts['collected'].quantize(CENT)
+        facts.append(DailyRevenueFact(
+            date=day,
+            customer_master_id_id=customer_id,
+            kam_id_id=kam_id,
+            customer_type=customer_type,
+            package_type=package_type,
+            billed_amount=billed,
+            vat_amount=amounts['vat'].quantize(CENT),
+            discount_amount=amounts['discount'].quantize(CENT),
+            collected_amount=collected,
+            due_amount=billed - collected,
+        ))
+    return facts
+
+
+def _rebuild(customer_ids=None):
+    """Replace the fact rows of the given customers (all customers when None)"""
+    customers = CustomerMaster.objects.order_by('id')
+    if customer_ids is None:
+        DailyRevenueFact.objects.all().delete()
+    else:
+        DailyRevenueFact.objects.filter(customer_master_id__in=customer_ids).delete()
+        customers = customers.filter(id__in=customer_ids)
+
+    written = 0
+    batch = {}
+    for customer in customers.values('id', 'kam_id', 'customer_type').iterator(chunk_size=CUSTOMER_BATCH_SIZE):
+        batch[customer['id']] = (customer['kam_id'], customer['customer_type'])
+        if len(batch) == CUSTOMER_BATCH_SIZE:
+            written += len(DailyRevenueFact.objects.bulk_create(_build_facts(batch), batch_size=1000))
+            batch = {}
+    if batch:
+        written += len(DailyRevenueFact.objects.bulk_create(_build_facts(batch), batch_size=1000))
+    return written
+
+
+def refresh_daily_revenue_facts(full=False):
+    """
+    Bring daily_revenue_fact up to date.
+
+    Only customers touched since the stored high-water mark are rebuilt,
+    unless full is set or the table has never been built. The KAM monthly
+    rollup rows of every KAM those customers belong or belonged to follow.
+    Returns (customers rebuilt or None for all, rows written).
+    """
+    with transaction.atomic():
+        state, _ = FactRefreshState.objects.select_for_update().get_or_create(name=DAILY_REVENUE)
+        started = timezone.now()
+
+        current, assigned, moved = kam_assignments()
+        if full or state.high_water_mark is None:
+            customer_ids = kam_ids = None
+        else:
+            customer_ids = changed_customer_ids(state.high_water_mark - REFRESH_OVERLAP)
+            # Facts carry the KAM, so reassigned customers are rebuilt too
+            customer_ids |= {customer_id for customer_id in moved if customer_id in current}
+            kam_ids = {current[c] for c in customer_ids if c in current}
+            kam_ids |= {assigned[c] for c in customer_ids | moved if c in assigned}
+
+        written = _rebuild(customer_ids) if customer_ids is None or customer_ids else 0
+        save_assignments(current, moved)
+        refresh_kam_rollups(kam_ids)
+
+        state.high_water_mark = started
+        state.refreshed_at = timezone.now()
+        state.rows_written = written
+        state.save()
+    return customer_ids, written
+
+
+def facts_refreshed_at():
+    """When daily_revenue_fact was last refreshed, or None if it never was"""
+    return FactRefreshState.objects.filter(name=DAILY_REVENUE).values_list('refreshed_at', flat=True).first()
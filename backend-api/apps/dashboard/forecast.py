@@ -0,0 +1,173 @@
+"""
+Monthly billing and collections forecasts per customer type and KAM.
+
+Every (customer type, KAM) series is fitted at once: the monthly history
+is one (series x months) array and additive Holt-Winters with a damped
+trend runs over all series and a small grid of smoothing parameters in the
+same array operations. Each series keeps the parameters with the lowest
+one-step-ahead squared error.
+"""
+from datetime import date
+from decimal import Decimal
+from itertools import product
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import DailyRevenueFact, RevenueForecast
+
+
+SEASON = 12
+# Seasonality is only fitted on series with two full years of actuals
+MIN_SEASONAL_HISTORY = 2 * SEASON
+# Trend damping: the trend's effect fades over the horizon instead of running away
+PHI = 0.9
+
+ALPHAS = [0.2, 0.5, 0.8]
+BETAS = [0.05, 0.2]
+GAMMAS = [0.1, 0.3]
+
+MEASURES = ['billed', 'collected']
+DEFAULT_HORIZON = 12
+PAISA = Decimal('0.01')
+
+
+def _month_index(month):
+    return month.year * 12 + month.month - 1
+
+
+def _month_from_index(index):
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def monthly_history(until):
+    """
+    Monthly actuals of every (customer_type, kam_id) series before the month of until.
+
+    One GROUP BY query. Returns (keys, first_month, values, starts): values is
+    a (measure, series, month) array from first_month to the last complete
+    month, starts the month offset of each series' first actuals.
+    """
+    rows = DailyRevenueFact.objects.filter(date__lt=until.replace(day=1)).order_by().annotate(
+        month=TruncMonth('date')
+    ).values('month', 'customer_type', 'kam_id').annotate(
+        billed=Sum('billed_amount'), collected=Sum('collected_amount')
+    ).values_list('customer_type', 'kam_id', 'month', 'billed', 'collected')
+    rows = list(rows)
+    if not rows:
+        return [], None, np.zeros((len(MEASURES), 0, 0)), np.zeros(0, dtype=np.int64)
+
+    keys = sorted({(customer_type, kam_id) for customer_type, kam_id, *_ in rows}, key=lambda key: (key[0], key[1] or 0))
+    series = {key: position for position, key in enumerate(keys)}
+    first = min(_month_index(row[2]) for row in rows)
+    months = _month_index(until.replace(day=1)) - first
+
+    values = np.zeros((len(MEASURES), len(keys), months))
+    starts = np.full(len(keys), months, dtype=np.int64)
+    for customer_type, kam_id, month, billed, collected in rows:
+        position, offset = series[(customer_type, kam_id)], _month_index(month) - first
+        values[0, position, offset] = billed or 0
+        values[1, position, offset] = collected or 0
+        starts[position] = min(starts[position], offset)
+    return keys, _month_from_index(first), values, starts
+
+
+def holt_winters(values, starts, horizon):
+    """
+    Damped additive Holt-Winters for many series at once.
+
+    values: (series, months) actuals; months before a series' start are
+    ignored. Every parameter combination in the grid is run side by side and
+    each series keeps its best one. Returns a (series, horizon) array of
+    non-negative forecasts for the months after the last column.
+    """
+    count, months = values.shape
+    grid = np.array(list(product(ALPHAS, BETAS, GAMMAS)))
+    alpha, beta, gamma = (grid[:, column, None] for column in range(3))
+    # Too little history to tell seasonality from noise: keep those seasons at zero
+    seasonal_series = months - starts >= MIN_SEASONAL_HISTORY
+    gamma = gamma * seasonal_series
+
+    # Classic initialisation on series with two seasons of history: level and
+    # season from the first year, trend from the change between the first two years
+    first_years = np.take_along_axis(
+        values, np.minimum(starts[:, None] + np.arange(MIN_SEASONAL_HISTORY), months - 1), axis=1
+    )
+    year_means = first_years.reshape(count, 2, SEASON).mean(axis=2)
+    initial_season = np.where(seasonal_series[:, None], first_years[:, :SEASON] - year_means[:, :1], 0)
+    # Seasons are indexed by calendar position so they line up with month % SEASON
+    positions = (starts[:, None] + np.arange(SEASON)) % SEASON
+    season_by_position = np.zeros((count, SEASON))
+    np.put_along_axis(season_by_position, positions, initial_season, axis=1)
+
+    level = np.broadcast_to(np.where(seasonal_series, year_means[:, 0], 0), (len(grid), count)).copy()
+    trend = np.broadcast_to(
+        np.where(seasonal_series, (year_means[:, 1] - year_means[:, 0]) / SEASON, 0), (len(grid), count)
+    ).copy()
+    season = np.broadcast_to(season_by_position, (len(grid), count, SEASON)).copy()
+    sse = np.zeros((len(grid), count))
+    # The initial year is fitted by construction; smoothing starts after it
+    warm_up = np.where(seasonal_series, starts + SEASON - 1, starts)
+
+    for month in range(months):
+        actual = values[:, month]
+        first = month == starts
+        active = month > warm_up
+        seasonal = season[:, :, month % SEASON]
+
+        error = actual - (level + PHI * trend + seasonal)
+        sse += np.where(active, error * error, 0)
+
+        new_level = alpha * (actual - seasonal) + (1 - alpha) * (level + PHI * trend)
+        new_trend = beta * (new_level - level) + (1 - beta) * PHI * trend
+        season[:, :, month % SEASON] = np.where(active, gamma * (actual - new_level) + (1 - gamma) * seasonal, seasonal)
+        trend = np.where(active, new_trend, trend)
+        level = np.where(first & ~seasonal_series, actual, np.where(active, new_level, level))
+
+    best = np.argmin(sse, axis=0)
+    series = np.arange(count)
+    level, trend, season = level[best, series], trend[best, series], season[best, series]
+
+    steps = np.arange(1, horizon + 1)
+    damping = np.cumsum(PHI ** steps)
+    seasonal = season[:, (months - 1 + steps) % SEASON]
+    return np.maximum(level[:, None] + trend[:, None] * damping + seasonal, 0)
+
+
+def refresh_revenue_forecast(horizon=DEFAULT_HORIZON, today=None):
+    """
+    Refit every series and replace the forecast table.
+    Forecasts start with the current month; returns (series fitted, rows written).
+    """
+    today = today or timezone.localdate()
+    keys, first_month, values, starts = monthly_history(today)
+    measures, count, months = values.shape
+
+    rows = []
+    if count:
+        forecasts = holt_winters(values.reshape(measures * count, months), np.tile(starts, measures), horizon)
+        forecasts = forecasts.reshape(measures, count, horizon)
+        # Series with nothing projected (e.g. every customer left) are not stored
+        keep = np.flatnonzero(forecasts.max(axis=(0, 2)) >= 0.005)
+        generated_at = timezone.now()
+        first_forecast = _month_index(today.replace(day=1))
+        for position in keep.tolist():
+            customer_type, kam_id = keys[position]
+            for step in range(horizon):
+                rows.append(RevenueForecast(
+                    month=_month_from_index(first_forecast + step),
+                    customer_type=customer_type,
+                    kam_id_id=kam_id,
+                    billed_amount=Decimal(float(forecasts[0, position, step])).quantize(PAISA),
+                    collected_amount=Decimal(float(forecasts[1, position, step])).quantize(PAISA),
+                    history_months=int(months - starts[position]),
+                    generated_at=generated_at,
+                ))
+
+    with transaction.atomic():
+        RevenueForecast.objects.all().delete()
+        RevenueForecast.objects.bulk_create(rows, batch_size=2000)
+    return count, len(rows)
@@ -0,0 +1,159 @@
+"""
+Django management command to compare dashboard queries on the SQL fact table
+with the in-process NumPy cube. Synthetic data is generated inside a
+transaction that is rolled back, so it is safe to run against a dev database.
+"""
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from apps.customers.models import CustomerMaster, KAMMaster
+from apps.dashboard.cube import get_cube
+from apps.dashboard.facts import DAILY_REVENUE
+from apps.dashboard.models import DailyRevenueFact, FactRefreshState
+from apps.dashboard.reports import revenue_series, kpis, customer_wise_revenue
+
+
+PACKAGE_TYPES = ['bw', 'channel_partner', 'soho', '']
+CUSTOMER_TYPES = ['bw', 'channel_partner', 'soho']
+
+
+def _rounded(value):
+    """Round floats to the cent: SQLite sums decimals as binary floats, the cube sums exact paisa"""
+    if isinstance(value, float):
+        return round(value, 2)
+    if isinstance(value, dict):
+        return {key: _rounded(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_rounded(item) for item in value]
+    return value
+
+
+class Command(BaseCommand):
+    help = 'Benchmark dashboard reports on SQL vs. the NumPy revenue cube with synthetic facts (rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Synthetic fact rows (invoice line allocations)')
+        parser.add_argument('--customers', type=int, default=2000, help='Synthetic customers')
+        parser.add_argument('--kams', type=int, default=25, help='Synthetic KAMs')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per query; the median is reported')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            try:
+                kam_ids, customers = self._generate(options)
+
+                today = date.today()
+                sample_kam = str(kam_ids[0])
+                cases = [
+                    ('monthly series', lambda: revenue_series({}, 'month', today)),
+                    ('weekly series, one KAM', lambda: revenue_series({'kam_id': sample_kam}, 'week', today)),
+                    ('yearly series, soho/bw', lambda: revenue_series({'customer_type': 'soho', 'package_type': 'bw'}, 'year', today)),
+                    ('month KPIs', lambda: kpis({}, 'month', today)),
+                    ('top 20 customers', lambda: customer_wise_revenue({}, 20)),
+                ]
+
+                with override_settings(DASHBOARD_CUBE_ENABLED=True):
+                    started = time.perf_counter()
+                    data = get_cube().refresh(force=True)
+                    load_seconds = time.perf_counter() - started
+                    memory = sum(column.nbytes for column in data.columns.values())
+                    self.stdout.write(
+                        f'Cube load: {len(data):,} rows in {load_seconds:.2f}s, {memory / 1024 / 1024:.1f} MiB of columns'
+                    )
+
+                self.stdout.write(f"{'query':<28}{'sql ms':>10}{'cube ms':>10}{'speedup':>10}  match")
+                for name, run in cases:
+                    with override_settings(DASHBOARD_CUBE_ENABLED=False):
+                        sql_ms, sql_result = self._time(run, options['repeat'])
+                    with override_settings(DASHBOARD_CUBE_ENABLED=True):
+                        cube_ms, cube_result = self._time(run, options['repeat'])
+                    self.stdout.write(
+                        f'{name:<28}{sql_ms:>10.1f}{cube_ms:>10.1f}{sql_ms / cube_ms:>9.1f}x  '
+                        f"{'yes' if _rounded(sql_result) == _rounded(cube_result) else 'NO'}"
+                    )
+            finally:
+                # Nothing generated here may survive the benchmark
+                transaction.set_rollback(True)
+
+    @staticmethod
+    def _time(run, repeat):
+        timings = []
+        result = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = run()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings), result
+
+    def _generate(self, options):
+        rng = random.Random(42)
+        run_id = int(time.time())
+
+        kams = KAMMaster.objects.bulk_create([
+            KAMMaster(kam_name=f'Benchmark KAM {index}') for index in range(options['kams'])
+        ])
+        kam_ids = [kam.id for kam in kams]
+        customers = CustomerMaster.objects.bulk_create([
+            CustomerMaster(
+                customer_name=f'Benchmark Customer {index}',
+                email=f'benchmark-{run_id}-{index}@example.com',
+                address='-',
+                customer_type=rng.choice(CUSTOMER_TYPES),
+                kam_id_id=rng.choice(kam_ids),
+            )
+            for index in range(options['customers'])
+        ], batch_size=1000)
+
+        # Spread rows evenly: each customer gets consecutive days x package types
+        per_customer = -(-options['rows'] // len(customers))
+        days = -(-per_customer // len(PACKAGE_TYPES))
+        first_day = date.today() - timedelta(days=days - 1)
+
+        def facts():
+            produced = 0
+            for customer in customers:
+                for offset in range(days):
+                    for package_type in PACKAGE_TYPES:
+                        if produced == options['rows']:
+                            return
+                        billed = Decimal(rng.randint(0, 500000)) / 100
+                        collected = (billed * rng.choice([0, 0, 1, Decimal('0.5')])).quantize(Decimal('0.01'))
+                        produced += 1
+                        yield DailyRevenueFact(
+                            date=first_day + timedelta(days=offset),
+                            customer_master_id_id=customer.id,
+                            kam_id_id=customer.kam_id_id,
+                            customer_type=customer.customer_type,
+                            package_type=package_type,
+                            billed_amount=billed,
+                            collected_amount=collected,
+                            due_amount=billed - collected,
+                        )
+
+        started = time.perf_counter()
+        DailyRevenueFact.objects.all().delete()
+        batch = []
+        for fact in facts():
+            batch.append(fact)
+            if len(batch) == 10000:
+                DailyRevenueFact.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            DailyRevenueFact.objects.bulk_create(batch)
+        # Mark the table fresh so neither path triggers a rebuild from the (real) source tables
+        FactRefreshState.objects.update_or_create(
+            name=DAILY_REVENUE, defaults={'high_water_mark': timezone.now(), 'refreshed_at': timezone.now()}
+        )
+        self.stdout.write(
+            f"Generated {options['rows']:,} fact rows for {len(customers):,} customers "
+            f'in {time.perf_counter() - started:.1f}s'
+        )
+        return kam_ids, customers
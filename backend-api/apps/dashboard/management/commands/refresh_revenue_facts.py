@@ -0,0 +1,54 @@
+"""
+Django management command to refresh the daily revenue fact table.
+Run it from cron, or keep it running with --every, to keep dashboard reads
+off the invoice and payment tables; dashboard requests never refresh it.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.dashboard.facts import refresh_daily_revenue_facts
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Refresh daily_revenue_fact from invoice and payment changes since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Rebuild the whole table instead of only changed customers',
+        )
+        parser.add_argument(
+            '--every',
+            type=int,
+            nargs='?',
+            const=settings.DASHBOARD_FACT_MAX_AGE,
+            metavar='SECONDS',
+            help=f'Keep running, refreshing every SECONDS (default: {settings.DASHBOARD_FACT_MAX_AGE})',
+        )
+
+    def handle(self, *args, **options):
+        if not options['every']:
+            self.refresh(options['full'])
+            return
+        full = options['full']
+        while True:
+            close_old_connections()
+            try:
+                self.refresh(full)
+                full = False
+            except Exception:
+                # Keep the schedule through a database restart or a bad row
+                logger.exception('daily_revenue_fact refresh failed')
+            time.sleep(options['every'])
+
+    def refresh(self, full):
+        customer_ids, written = refresh_daily_revenue_facts(full=full)
+        scope = 'all customers' if customer_ids is None else f'{len(customer_ids)} changed customers'
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {scope}: {written} fact rows written'))
@@ -0,0 +1,23 @@
+"""
+Django management command to refit the monthly revenue forecast.
+Run it nightly from cron after refresh_revenue_facts.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.dashboard.forecast import DEFAULT_HORIZON, refresh_revenue_forecast
+
+
+class Command(BaseCommand):
+    help = 'Refit billing and collection forecasts per customer type and KAM and replace revenue_forecast'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horizon', type=int, default=DEFAULT_HORIZON, help='Months to forecast, starting with the current one')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        series, written = refresh_revenue_forecast(horizon=options['horizon'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Fitted {series} series: {written} forecast rows written in {time.perf_counter() - started:.2f}s'
+        ))
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('customers', '0007_alter_customermaster_customer_number'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FactRefreshState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('high_water_mark', models.DateTimeField(blank=True, null=True)),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True)),
+                ('rows_written', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'fact_refresh_state',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyRevenueFact',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('customer_type', models.CharField(max_length=20)),
+                ('package_type', models.CharField(blank=True, help_text='Blank when the invoice has no line items', max_length=20)),
+                ('billed_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('vat_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('discount_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('collected_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('due_amount', models.DecimalField(decimal_places=2, default=0, help_text='billed - collected for the day', max_digits=14)),
+                ('customer_master_id', models.ForeignKey(db_column='customer_master_id', on_delete=django.db.models.deletion.CASCADE, related_name='revenue_facts', to='customers.customermaster')),
+                ('kam_id', models.ForeignKey(blank=True, db_column='kam_id', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='revenue_facts', to='customers.kammaster')),
+            ],
+            options={
+                'db_table': 'daily_revenue_fact',
+                'ordering': ['date'],
+                'indexes': [models.Index(fields=['kam_id', 'date'], name='daily_revenue_kam_date_idx'), models.Index(fields=['customer_master_id', 'date'], name='daily_revenue_cust_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'customer_master_id', 'package_type'), name='daily_revenue_fact_uniq')],
+            },
+        ),
+    ]
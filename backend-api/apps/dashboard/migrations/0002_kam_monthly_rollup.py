@@ -0,0 +1,46 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0007_alter_customermaster_customer_number'),
+        ('dashboard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KAMCustomerAssignment',
+            fields=[
+                ('customer_id', models.IntegerField(help_text='Kept after the customer is deleted', primary_key=True, serialize=False)),
+                ('kam_id', models.IntegerField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'kam_customer_assignment',
+            },
+        ),
+        migrations.CreateModel(
+            name='KAMMonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('total_customers', models.IntegerField(default=0, help_text='Customers assigned at month end')),
+                ('active_customers', models.IntegerField(default=0, help_text='Assigned and not churned at month end')),
+                ('new_customers', models.IntegerField(default=0)),
+                ('churned_customers', models.IntegerField(default=0)),
+                ('billed_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('collected_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('paid_invoices', models.IntegerField(default=0, help_text='Invoices fully paid this month')),
+                ('days_to_pay_total', models.IntegerField(default=0, help_text='Sum of issue-to-final-payment days of paid_invoices')),
+                ('kam_id', models.ForeignKey(blank=True, db_column='kam_id', help_text='Null for customers without a KAM', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='monthly_rollups', to='customers.kammaster')),
+            ],
+            options={
+                'db_table': 'kam_monthly_rollup',
+                'ordering': ['month'],
+                'indexes': [models.Index(fields=['month', 'kam_id'], name='kam_rollup_month_idx')],
+            },
+        ),
+    ]
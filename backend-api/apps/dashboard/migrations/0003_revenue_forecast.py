@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0008_created_by_idx'),
+        ('dashboard', '0002_kam_monthly_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevenueForecast',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('month', models.DateField(help_text='First day of the forecast month')),
+                ('customer_type', models.CharField(max_length=20)),
+                ('billed_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('collected_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('history_months', models.IntegerField(default=0, help_text='Months of actuals the model was fitted on')),
+                ('generated_at', models.DateTimeField()),
+                ('kam_id', models.ForeignKey(blank=True, db_column='kam_id', help_text='Null for customers without a KAM', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='revenue_forecasts', to='customers.kammaster')),
+            ],
+            options={
+                'db_table': 'revenue_forecast',
+                'ordering': ['month'],
+                'indexes': [models.Index(fields=['month', 'kam_id'], name='revenue_forecast_month_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,144 @@
+from django.db import models
+
+
+class DailyRevenueFact(models.Model):
+    """
+    Daily Revenue Fact - Billing and collections pre-aggregated per day,
+    customer and package type. Maintained by apps.dashboard.facts
+    """
+    id = models.BigAutoField(primary_key=True)
+    date = models.DateField()
+    customer_master_id = models.ForeignKey(
+        'customers.CustomerMaster',
+        on_delete=models.CASCADE,
+        db_column='customer_master_id',
+        related_name='revenue_facts'
+    )
+    kam_id = models.ForeignKey(
+        'customers.KAMMaster',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_column='kam_id',
+        related_name='revenue_facts'
+    )
+    customer_type = models.CharField(max_length=20)
+    package_type = models.CharField(max_length=20, blank=True, help_text="Blank when the invoice has no line items")
+    billed_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    vat_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    discount_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    collected_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    due_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0, help_text="billed - collected for the day")
+
+    class Meta:
+        db_table = 'daily_revenue_fact'
+        ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'customer_master_id', 'package_type'],
+                name='daily_revenue_fact_uniq'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['kam_id', 'date'], name='daily_revenue_kam_date_idx'),
+            models.Index(fields=['customer_master_id', 'date'], name='daily_revenue_cust_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.customer_master_id_id} - {self.package_type or '-'}"
+
+
+class FactRefreshState(models.Model):
+    """High-water mark of the last incremental refresh of a fact table"""
+    name = models.CharField(max_length=50, unique=True)
+    high_water_mark = models.DateTimeField(null=True, blank=True)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+    rows_written = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'fact_refresh_state'
+
+    def __str__(self):
+        return f"{self.name} @ {self.high_water_mark}"
+
+
+class KAMMonthlyRollup(models.Model):
+    """
+    KAM Monthly Rollup - Per-KAM, per-month customer and revenue figures.
+    Flow columns (new, churned, billed, collected, days to pay) can be summed
+    over any month range; customer counts are month-end snapshots.
+    """
+    id = models.BigAutoField(primary_key=True)
+    kam_id = models.ForeignKey(
+        'customers.KAMMaster',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        db_column='kam_id',
+        related_name='monthly_rollups',
+        help_text="Null for customers without a KAM"
+    )
+    month = models.DateField(help_text="First day of the month")
+    total_customers = models.IntegerField(default=0, help_text="Customers assigned at month end")
+    active_customers = models.IntegerField(default=0, help_text="Assigned and not churned at month end")
+    new_customers = models.IntegerField(default=0)
+    churned_customers = models.IntegerField(default=0)
+    billed_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    collected_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    paid_invoices = models.IntegerField(default=0, help_text="Invoices fully paid this month")
+    days_to_pay_total = models.IntegerField(default=0, help_text="Sum of issue-to-final-payment days of paid_invoices")
+
+    class Meta:
+        db_table = 'kam_monthly_rollup'
+        ordering = ['month']
+        indexes = [
+            models.Index(fields=['month', 'kam_id'], name='kam_rollup_month_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kam_id_id or 'Unassigned'} - {self.month:%Y-%m}"
+
+
+class KAMCustomerAssignment(models.Model):
+    """KAM each customer was last rolled up under, so a reassignment can fix both KAMs"""
+    customer_id = models.IntegerField(primary_key=True, help_text="Kept after the customer is deleted")
+    kam_id = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'kam_customer_assignment'
+
+    def __str__(self):
+        return f"{self.customer_id} -> {self.kam_id}"
+
+
+class RevenueForecast(models.Model):
+    """
+    Revenue Forecast - Projected billing and collections per month, customer
+    type and KAM. Rebuilt as a whole by apps.dashboard.forecast
+    """
+    id = models.BigAutoField(primary_key=True)
+    month = models.DateField(help_text="First day of the forecast month")
+    customer_type = models.CharField(max_length=20)
+    kam_id = models.ForeignKey(
+        'customers.KAMMaster',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        db_column='kam_id',
+        related_name='revenue_forecasts',
+        help_text="Null for customers without a KAM"
+    )
+    billed_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    collected_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    history_months = models.IntegerField(default=0, help_text="Months of actuals the model was fitted on")
+    generated_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'revenue_forecast'
+        ordering = ['month']
+        indexes = [
+            models.Index(fields=['month', 'kam_id'], name='revenue_forecast_month_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} - {self.customer_type} - {self.kam_id_id or 'Unassigned'}"
@@ -0,0 +1,428 @@
+"""
+Dashboard KPIs and revenue series read from daily_revenue_fact and kam_monthly_rollup
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db.models import Q, Sum, Count, Max, DecimalField, Value
+from django.db.models.functions import Coalesce, TruncWeek, TruncMonth, TruncYear
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from apps.bills.utils import parse_date_param
+from apps.customers.models import CustomerMaster
+from .cube import get_cube
+from .models import DailyRevenueFact, KAMMonthlyRollup, RevenueForecast
+
+
+# Filters accepted by every dashboard endpoint: query parameter -> fact lookup
+FACT_FILTERS = {
+    'kam_id': 'kam_id',
+    'customer_type': 'customer_type',
+    'package_type': 'package_type',
+    'customer_id': 'customer_master_id',
+}
+
+SERIES = {
+    'week': (TruncWeek, 12),
+    'month': (TruncMonth, 12),
+    'year': (TruncYear, 5),
+}
+
+KPI_PERIODS = ['week', 'month', 'year']
+
+# rank_by value -> (leaderboard column, highest first)
+KAM_RANKINGS = {
+    'revenue': ('total_revenue', True),
+    'collected': ('total_collected', True),
+    'collection_rate': ('collection_rate', True),
+    'active_customers': ('active_customers', True),
+    'new_customers': ('new_customers', True),
+    'days_to_pay': ('avg_days_to_pay', False),
+}
+
+
+def _money():
+    return DecimalField(max_digits=14, decimal_places=2)
+
+
+def _sum(field, condition=None):
+    return Coalesce(Sum(field, filter=condition, output_field=_money()), Value(Decimal('0')), output_field=_money())
+
+
+def _rate(collected, billed):
+    """Collected / billed as a fraction (0 when nothing was billed)"""
+    return float(collected / billed) if billed else 0.0
+
+
+def _change(current, previous):
+    """Percentage change, rounded to one decimal"""
+    if not previous:
+        return 100.0 if current else 0.0
+    return round(float((current - previous) / previous * 100), 1)
+
+
+def period_start(day, period):
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day.replace(month=1, day=1)
+
+
+def shift_period(start, period, steps):
+    """Start of the period steps periods before (negative) or after start"""
+    if period == 'week':
+        return start + timedelta(weeks=steps)
+    if period == 'month':
+        month_index = start.year * 12 + start.month - 1 + steps
+        return date(month_index // 12, month_index % 12 + 1, 1)
+    return date(start.year + steps, 1, 1)
+
+
+def period_label(start, period):
+    if period == 'week':
+        return f"W{start.isocalendar()[1]} {start.strftime('%d %b')}"
+    if period == 'month':
+        return start.strftime('%b %Y')
+    return str(start.year)
+
+
+def fact_queryset(params):
+    """Facts filtered by the shared dashboard query parameters"""
+    qs = DailyRevenueFact.objects.all()
+    for param, lookup in FACT_FILTERS.items():
+        if params.get(param):
+            qs = qs.filter(**{lookup: params[param]})
+    return qs
+
+
+def date_bounds(params, default_start=None, default_end=None):
+    start = parse_date_param(params['start_date'], 'start_date') if params.get('start_date') else default_start
+    end = parse_date_param(params['end_date'], 'end_date') if params.get('end_date') else default_end
+    return start, end
+
+
+def revenue_series(params, period, today=None):
+    """
+    Billed, collected and due per week/month/year, with empty periods filled in.
+    Defaults to the last 12 weeks, 12 months or 5 years.
+    """
+    trunc, default_count = SERIES[period]
+    today = today or date.today()
+    current = period_start(today, period)
+    start, end = date_bounds(params, shift_period(current, period, -(default_count - 1)), today)
+    start = period_start(start, period)
+
+    cube = get_cube()
+    if cube is not None:
+        bins = [start]
+        while shift_period(bins[-1], period, 1) <= end:
+            bins.append(shift_period(bins[-1], period, 1))
+        by_period = cube.aggregate(params, start, end, bins=bins)
+    else:
+        rows = fact_queryset(params).filter(date__gte=start, date__lte=end).order_by().annotate(
+            period=trunc('date')
+        ).values('period').annotate(
+            billed=_sum('billed_amount'),
+            collected=_sum('collected_amount'),
+            due=_sum('due_amount'),
+        )
+        by_period = {}
+        for row in rows:
+            key = row['period'].date() if hasattr(row['period'], 'date') else row['period']
+            by_period[key] = row
+
+    series = []
+    cursor = start
+    while cursor <= end:
+        row = by_period.get(cursor)
+        billed = row['billed'] if row else Decimal('0')
+        collected = row['collected'] if row else Decimal('0')
+        series.append({
+            'period': cursor.isoformat(),
+            'label': period_label(cursor, period),
+            'revenue': float(billed),
+            'collected': float(collected),
+            'due': float(row['due']) if row else 0.0,
+            'collection_rate': round(_rate(collected, billed) * 100, 1),
+        })
+        cursor = shift_period(cursor, period, 1)
+    return series
+
+
+def _cube_kpi_totals(cube, params, current_start, previous_start, previous_end, today):
+    """The fact totals kpis() needs, answered from the in-process cube"""
+    empty = {'billed': Decimal('0'), 'collected': Decimal('0'), 'due': Decimal('0')}
+    current = cube.aggregate(params, current_start, today).get(None, empty)
+    previous = cube.aggregate(params, previous_start, previous_end).get(None, empty)
+    return {
+        'revenue': current['billed'],
+        'collected': current['collected'],
+        'previous_revenue': previous['billed'],
+        'previous_collected': previous['collected'],
+        'outstanding': cube.aggregate(params, end=today).get(None, empty)['due'],
+        'active': cube.distinct_count(params, 'customer', current_start, today, billed_only=True),
+        'previous_active': cube.distinct_count(params, 'customer', previous_start, previous_end, billed_only=True),
+    }
+
+
+def kpis(params, period='month', today=None):
+    """
+    Period-to-date KPIs compared with the same span of the previous period.
+    *_change values are percentage changes; collection_rate_change is in points.
+    """
+    today = today or date.today()
+    current_start = period_start(today, period)
+    previous_start = shift_period(current_start, period, -1)
+    previous_end = min(previous_start + (today - current_start), current_start - timedelta(days=1))
+
+    cube = get_cube()
+    if cube is not None:
+        totals = _cube_kpi_totals(cube, params, current_start, previous_start, previous_end, today)
+    else:
+        current = Q(date__gte=current_start, date__lte=today)
+        previous = Q(date__gte=previous_start, date__lte=previous_end)
+        totals = fact_queryset(params).aggregate(
+            revenue=_sum('billed_amount', current),
+            collected=_sum('collected_amount', current),
+            previous_revenue=_sum('billed_amount', previous),
+            previous_collected=_sum('collected_amount', previous),
+            outstanding=_sum('due_amount', Q(date__lte=today)),
+            active=Count('customer_master_id', distinct=True, filter=current & Q(billed_amount__gt=0)),
+            previous_active=Count('customer_master_id', distinct=True, filter=previous & Q(billed_amount__gt=0)),
+        )
+
+    customers = CustomerMaster.objects.all()
+    if params.get('kam_id'):
+        customers = customers.filter(kam_id=params['kam_id'])
+    if params.get('customer_type'):
+        customers = customers.filter(customer_type=params['customer_type'])
+    counts = customers.aggregate(
+        total=Count('id', filter=Q(created_at__date__lte=today)),
+        previous_total=Count('id', filter=Q(created_at__date__lte=previous_end)),
+    )
+
+    collection_rate = round(_rate(totals['collected'], totals['revenue']) * 100, 1)
+    previous_rate = round(_rate(totals['previous_collected'], totals['previous_revenue']) * 100, 1)
+    return {
+        'period': period,
+        'start_date': current_start.isoformat(),
+        'end_date': today.isoformat(),
+        'total_revenue': float(totals['revenue']),
+        'total_revenue_change': _change(totals['revenue'], totals['previous_revenue']),
+        'total_collected': float(totals['collected']),
+        'total_collected_change': _change(totals['collected'], totals['previous_collected']),
+        'total_outstanding': float(totals['outstanding']),
+        'total_customers': counts['total'],
+        'total_customers_change': _change(counts['total'], counts['previous_total']),
+        'active_customers': totals['active'],
+        'active_customers_change': _change(totals['active'], totals['previous_active']),
+        'collection_rate': collection_rate,
+        'collection_rate_change': round(collection_rate - previous_rate, 1),
+    }
+
+
+CUSTOMER_COLUMNS = [
+    'customer_name', 'customer_type', 'status', 'created_at', 'updated_at', 'kam_id__kam_name',
+]
+
+
+def _cube_customer_rows(cube, params, start, end, limit):
+    """Per-customer totals from the cube, shaped like the SQL rows of customer_wise_revenue"""
+    totals = sorted(
+        cube.aggregate(params, start, end, by='customer').items(),
+        key=lambda item: (-item[1]['billed'], item[0])
+    )
+    if limit:
+        totals = totals[:limit]
+    customers = {
+        customer['id']: customer
+        for customer in CustomerMaster.objects.filter(id__in=[customer_id for customer_id, _ in totals]).values(
+            'id', *CUSTOMER_COLUMNS
+        )
+    }
+    return [{
+        'customer_master_id': customer_id,
+        **{f'customer_master_id__{column}': customers[customer_id][column] for column in CUSTOMER_COLUMNS},
+        **amounts,
+    } for customer_id, amounts in totals if customer_id in customers]
+
+
+def customer_wise_revenue(params, limit=None):
+    """Billed and collected per customer, highest revenue first"""
+    start, end = date_bounds(params)
+    cube = get_cube()
+    if cube is not None:
+        rows = _cube_customer_rows(cube, params, start, end, limit)
+    else:
+        facts = fact_queryset(params)
+        if start:
+            facts = facts.filter(date__gte=start)
+        if end:
+            facts = facts.filter(date__lte=end)
+
+        rows = facts.order_by().values(
+            'customer_master_id',
+            'customer_master_id__customer_name',
+            'customer_master_id__customer_type',
+            'customer_master_id__status',
+            'customer_master_id__created_at',
+            'customer_master_id__updated_at',
+            'customer_master_id__kam_id__kam_name',
+        ).annotate(
+            billed=_sum('billed_amount'),
+            collected=_sum('collected_amount'),
+            due=_sum('due_amount'),
+        ).order_by('-billed', 'customer_master_id')
+        if limit:
+            rows = rows[:limit]
+
+    return [{
+        'customerId': row['customer_master_id'],
+        'customerName': row['customer_master_id__customer_name'],
+        'customerType': row['customer_master_id__customer_type'],
+        'kam': row['customer_master_id__kam_id__kam_name'],
+        'joinDate': row['customer_master_id__created_at'].date().isoformat(),
+        # Customers have no explicit leave date; the last update of an inactive one stands in
+        'leaveDate': (
+            None if row['customer_master_id__status'] == 'active'
+            else row['customer_master_id__updated_at'].date().isoformat()
+        ),
+        'totalRevenue': float(row['billed']),
+        'totalCollected': float(row['collected']),
+        'totalDue': float(row['due']),
+        'collectionRate': round(_rate(row['collected'], row['billed']), 4),
+    } for row in rows]
+
+
+def revenue_forecast(params):
+    """
+    Projected billing and collections per month, summed over the series
+    matching the kam_id / customer_type filters
+    """
+    qs = RevenueForecast.objects.all()
+    for param in ['kam_id', 'customer_type']:
+        if params.get(param):
+            qs = qs.filter(**{param: params[param]})
+    rows = qs.order_by('month').values('month').annotate(
+        billed=_sum('billed_amount'),
+        collected=_sum('collected_amount'),
+        generated_at=Max('generated_at'),
+    )
+    generated_at = max((row['generated_at'] for row in rows), default=None)
+    return {
+        'generated_at': generated_at.isoformat() if generated_at else None,
+        'forecast': [{
+            'period': row['month'].isoformat(),
+            'label': period_label(row['month'], 'month'),
+            'revenue': float(row['billed']),
+            'collected': float(row['collected']),
+            'collection_rate': round(_rate(row['collected'], row['billed']) * 100, 1),
+        } for row in rows],
+    }
+
+
+def parse_month_param(value, param_name):
+    """Parse a YYYY-MM (or YYYY-MM-DD) parameter into the first day of that month"""
+    value = value.strip()
+    return parse_date_param(f'{value}-01' if len(value) == 7 else value, param_name).replace(day=1)
+
+
+def kam_performance(params, today=None):
+    """
+    KAM leaderboard over a month range, read from the monthly rollup only.
+    Flow figures are summed over the range; customer counts are taken at its last month.
+    """
+    today = today or date.today()
+    end = parse_month_param(params['end_month'], 'end_month') if params.get('end_month') else (
+        period_start(parse_date_param(params['end_date'], 'end_date'), 'month')
+        if params.get('end_date') else period_start(today, 'month')
+    )
+    start = parse_month_param(params['start_month'], 'start_month') if params.get('start_month') else (
+        period_start(parse_date_param(params['start_date'], 'start_date'), 'month')
+        if params.get('start_date') else shift_period(end, 'month', -11)
+    )
+    rank_by = params.get('rank_by', 'revenue')
+    if rank_by not in KAM_RANKINGS:
+        raise ValidationError({'rank_by': f'Choose from: {", ".join(KAM_RANKINGS)}'})
+
+    rollups = KAMMonthlyRollup.objects.all()
+    if params.get('kam_id'):
+        rollups = rollups.filter(kam_id=params['kam_id'])
+
+    totals = {
+        row['kam_id']: row
+        for row in rollups.filter(month__gte=start, month__lte=end).order_by().values(
+            'kam_id', 'kam_id__kam_name'
+        ).annotate(
+            billed=_sum('billed_amount'),
+            collected=_sum('collected_amount'),
+            new=Sum('new_customers'),
+            churned=Sum('churned_customers'),
+            paid=Sum('paid_invoices'),
+            days=Sum('days_to_pay_total'),
+        )
+    }
+    month_end = {
+        row['kam_id']: row
+        for row in rollups.filter(month=end).values(
+            'kam_id', 'kam_id__kam_name', 'total_customers', 'active_customers'
+        )
+    }
+
+    result = []
+    for kam_id in {*totals, *month_end}:
+        flows = totals.get(kam_id, {})
+        counts = month_end.get(kam_id, {})
+        billed = flows.get('billed', Decimal('0'))
+        collected = flows.get('collected', Decimal('0'))
+        paid = flows.get('paid', 0)
+        result.append({
+            'kam_id': kam_id,
+            'kam': (flows or counts).get('kam_id__kam_name') or 'Unassigned',
+            'total_customers': counts.get('total_customers', 0),
+            'active_customers': counts.get('active_customers', 0),
+            'new_customers': flows.get('new', 0),
+            'churned_customers': flows.get('churned', 0),
+            'total_revenue': float(billed),
+            'total_collected': float(collected),
+            'collection_rate': round(_rate(collected, billed) * 100, 1),
+            'paid_invoices': paid,
+            'avg_days_to_pay': round(flows['days'] / paid, 1) if paid else None,
+        })
+
+    key, descending = KAM_RANKINGS[rank_by]
+    # KAMs without a value (no paid invoices) rank last either way
+    result.sort(key=lambda item: item['kam'])
+    result.sort(key=lambda item: (item[key] is None, -(item[key] or 0) if descending else (item[key] or 0)))
+    for rank, item in enumerate(result, start=1):
+        item['rank'] = rank
+        item['start_month'] = start.isoformat()
+        item['end_month'] = end.isoformat()
+    return result
+
+
+def dashboard_snapshot(params, period='month', today=None):
+    """Every dashboard series plus precomputed summary numbers in one payload"""
+    today = today or date.today()
+    monthly = revenue_series(params, 'month', today)
+    kpi = kpis(params, period, today)
+    billed = sum(item['revenue'] for item in monthly)
+    collected = sum(item['collected'] for item in monthly)
+    return {
+        'generated_at': timezone.now().isoformat(),
+        'summary': {
+            'total_revenue': round(billed, 2),
+            'total_collected': round(collected, 2),
+            'total_customers': kpi['total_customers'],
+            'active_customers': kpi['active_customers'],
+            'collection_rate': round(collected / billed * 100, 1) if billed else 0.0,
+        },
+        'kpis': kpi,
+        'weekly': revenue_series(params, 'week', today),
+        'monthly': monthly,
+        'yearly': revenue_series(params, 'year', today),
+        'customer_wise': customer_wise_revenue(params),
+        'kam_performance': kam_performance(params, today),
+    }
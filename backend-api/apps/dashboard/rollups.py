@@ -0,0 +1,140 @@
+"""
+Per-KAM monthly rollup maintained alongside daily_revenue_fact
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import Q, Sum, Max
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from apps.customers.models import CustomerMaster
+from apps.bills.models import InvoiceMaster
+from .models import DailyRevenueFact, KAMMonthlyRollup, KAMCustomerAssignment
+
+
+MISSING = object()
+
+
+def _month(day):
+    return day.replace(day=1)
+
+
+def _next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _kam_filter(kam_ids, field='kam_id'):
+    """Q matching the given KAM ids, where None stands for customers without a KAM"""
+    condition = Q(**{f'{field}__in': [k for k in kam_ids if k is not None]})
+    if None in kam_ids:
+        condition |= Q(**{f'{field}__isnull': True})
+    return condition
+
+
+def kam_assignments():
+    """
+    Current and last rolled-up KAM per customer, and the customers that differ.
+
+    Covers every way a KAM can change, including queryset updates and
+    SET_NULL from a deleted KAM that never touch updated_at, and deleted
+    customers that must drop out of their old KAM's counts.
+    """
+    current = dict(CustomerMaster.objects.values_list('id', 'kam_id'))
+    assigned = dict(KAMCustomerAssignment.objects.values_list('customer_id', 'kam_id'))
+    moved = {
+        customer_id for customer_id in current.keys() | assigned.keys()
+        if current.get(customer_id, MISSING) != assigned.get(customer_id, MISSING)
+    }
+    return current, assigned, moved
+
+
+def save_assignments(current, moved):
+    KAMCustomerAssignment.objects.filter(customer_id__in=moved).delete()
+    KAMCustomerAssignment.objects.bulk_create([
+        KAMCustomerAssignment(customer_id=customer_id, kam_id=current[customer_id])
+        for customer_id in moved if customer_id in current
+    ], batch_size=1000)
+
+
+def refresh_kam_rollups(kam_ids=None):
+    """
+    Rebuild the rollup rows of the given KAMs (None in the set means
+    unassigned customers; kam_ids=None rebuilds every KAM).
+
+    Billing and collections come from daily_revenue_fact, so this must run
+    after the facts of the affected customers were rebuilt.
+    Returns the number of rows written.
+    """
+    if kam_ids is not None and not kam_ids:
+        return 0
+
+    facts = DailyRevenueFact.objects.all()
+    customers = CustomerMaster.objects.all()
+    invoices = InvoiceMaster.objects.filter(status='paid')
+    rollups = KAMMonthlyRollup.objects.all()
+    if kam_ids is not None:
+        facts = facts.filter(_kam_filter(kam_ids))
+        customers = customers.filter(_kam_filter(kam_ids))
+        invoices = invoices.filter(_kam_filter(kam_ids, 'customer_entitlement_master_id__customer_master_id__kam_id'))
+        rollups = rollups.filter(_kam_filter(kam_ids))
+
+    months = defaultdict(lambda: defaultdict(lambda: {
+        'new': 0, 'churned': 0, 'billed': Decimal('0'), 'collected': Decimal('0'), 'paid': 0, 'days': 0,
+    }))
+
+    for row in facts.order_by().annotate(month=TruncMonth('date')).values('kam_id', 'month').annotate(
+        billed=Sum('billed_amount'), collected=Sum('collected_amount')
+    ):
+        bucket = months[row['kam_id']][row['month']]
+        bucket['billed'] += row['billed']
+        bucket['collected'] += row['collected']
+
+    # A customer that is no longer active churned in the month of its last billing or payment
+    last_activity = dict(facts.order_by().values('customer_master_id').annotate(
+        last=Max('date')
+    ).values_list('customer_master_id', 'last'))
+    for customer in customers.values('id', 'kam_id', 'status', 'created_at', 'updated_at'):
+        joined = _month(timezone.localtime(customer['created_at']).date())
+        months[customer['kam_id']][joined]['new'] += 1
+        if customer['status'] != 'active':
+            left = last_activity.get(customer['id']) or timezone.localtime(customer['updated_at']).date()
+            months[customer['kam_id']][max(_month(left), joined)]['churned'] += 1
+
+    for invoice in invoices.order_by().values(
+        'issue_date', 'customer_entitlement_master_id__customer_master_id__kam_id'
+    ).annotate(paid_on=Max('payments__payment_date')):
+        if invoice['paid_on'] is None:
+            continue
+        bucket = months[invoice['customer_entitlement_master_id__customer_master_id__kam_id']][_month(invoice['paid_on'])]
+        bucket['paid'] += 1
+        bucket['days'] += max((invoice['paid_on'] - invoice['issue_date']).days, 0)
+
+    this_month = _month(timezone.localdate())
+    rows = []
+    for kam_id, by_month in months.items():
+        month = min(by_month)
+        total = active = 0
+        # One row per month up to now so month-end customer counts exist for any range
+        while month <= max(this_month, max(by_month)):
+            bucket = by_month.get(month)
+            if bucket:
+                total += bucket['new']
+                active += bucket['new'] - bucket['churned']
+            rows.append(KAMMonthlyRollup(
+                kam_id_id=kam_id,
+                month=month,
+                total_customers=total,
+                active_customers=active,
+                new_customers=bucket['new'] if bucket else 0,
+                churned_customers=bucket['churned'] if bucket else 0,
+                billed_amount=bucket['billed'] if bucket else 0,
+                collected_amount=bucket['collected'] if bucket else 0,
+                paid_invoices=bucket['paid'] if bucket else 0,
+                days_to_pay_total=bucket['days'] if bucket else 0,
+            ))
+            month = _next_month(month)
+
+    rollups.delete()
+    return len(KAMMonthlyRollup.objects.bulk_create(rows, batch_size=1000))
@@ -0,0 +1,99 @@
+"""
+Signal handlers for the Dashboard App
+"""
+from decimal import Decimal
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from apps.customers.models import CustomerMaster, ProspectStatusHistory
+from apps.bills.models import InvoiceMaster, InvoiceDetails
+from apps.payment.models import PaymentMaster, PaymentDetails
+from .events import CONVERTED_PROSPECT_STATUSES, kpi_delta, publish_on_commit
+
+
+def _touch_customers(**lookup):
+    # Deleted rows leave no updated_at behind; touching the customer lets the
+    # next incremental fact refresh pick the change up.
+    CustomerMaster.objects.filter(**lookup).update(updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=InvoiceMaster)
+def invoice_deleted(sender, instance, **kwargs):
+    _touch_customers(entitlements__id=instance.customer_entitlement_master_id_id)
+
+
+@receiver(post_delete, sender=InvoiceDetails)
+def invoice_detail_deleted(sender, instance, **kwargs):
+    _touch_customers(entitlements__invoice__id=instance.invoice_master_id_id)
+
+
+@receiver(post_delete, sender=PaymentMaster)
+def payment_deleted(sender, instance, **kwargs):
+    _touch_customers(entitlements__id=instance.customer_entitlement_master_id_id)
+
+
+@receiver(post_delete, sender=PaymentDetails)
+def payment_detail_deleted(sender, instance, **kwargs):
+    _touch_customers(entitlements__payments__id=instance.payment_master_id_id)
+
+
+# ---- live KPI deltas -------------------------------------------------------
+
+def _related_value(instance, field, model, column):
+    """A column of the instance's parent row, from the cached parent when loaded"""
+    descriptor = getattr(type(instance), field)
+    if descriptor.is_cached(instance):
+        return getattr(getattr(instance, field), column)
+    return model.objects.filter(pk=getattr(instance, f'{field}_id')).values_list(column, flat=True).first()
+
+
+def _line_total(detail):
+    return detail.sub_total * (Decimal('100') + detail.vat_rate - detail.sub_discount_rate) / Decimal('100')
+
+
+@receiver(post_save, sender=InvoiceMaster)
+def publish_invoice_created(sender, instance, created, **kwargs):
+    if created and instance.status != 'cancelled':
+        publish_on_commit(kpi_delta(instance.issue_date, invoices=1))
+
+
+@receiver(post_delete, sender=InvoiceMaster)
+def publish_invoice_deleted(sender, instance, **kwargs):
+    if instance.status != 'cancelled':
+        publish_on_commit(kpi_delta(instance.issue_date, invoices=-1))
+
+
+@receiver(post_save, sender=InvoiceDetails)
+def publish_invoice_line_created(sender, instance, created, **kwargs):
+    # Line edits are not streamed; dashboards pick them up on their next snapshot
+    if created:
+        issue_date = _related_value(instance, 'invoice_master_id', InvoiceMaster, 'issue_date')
+        publish_on_commit(kpi_delta(issue_date, billed=_line_total(instance)))
+
+
+@receiver(post_delete, sender=InvoiceDetails)
+def publish_invoice_line_deleted(sender, instance, **kwargs):
+    issue_date = _related_value(instance, 'invoice_master_id', InvoiceMaster, 'issue_date')
+    publish_on_commit(kpi_delta(issue_date, billed=-_line_total(instance)))
+
+
+@receiver(post_save, sender=PaymentDetails)
+def publish_payment_received(sender, instance, created, **kwargs):
+    if created and instance.status != 'failed':
+        payment_date = _related_value(instance, 'payment_master_id', PaymentMaster, 'payment_date')
+        publish_on_commit(kpi_delta(payment_date, collected=instance.pay_amount))
+
+
+@receiver(post_delete, sender=PaymentDetails)
+def publish_payment_deleted(sender, instance, **kwargs):
+    if instance.status != 'failed':
+        payment_date = _related_value(instance, 'payment_master_id', PaymentMaster, 'payment_date')
+        publish_on_commit(kpi_delta(payment_date, collected=-instance.pay_amount))
+
+
+@receiver(post_save, sender=ProspectStatusHistory)
+def publish_prospect_converted(sender, instance, created, **kwargs):
+    if created and instance.to_status in CONVERTED_PROSPECT_STATUSES:
+        publish_on_commit(kpi_delta(timezone.localdate(instance.changed_at), prospect_conversions=1))
@@ -0,0 +1,416 @@
+import asyncio
+import json
+import threading
+from datetime import date
+from unittest import mock
+
+import numpy as np
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.bills.models import InvoiceDetails
+from apps.bills.tests import make_customer, make_entitlement, make_detail, make_invoice, make_payment
+from apps.customers.models import CustomerMaster, KAMMaster
+from . import cube
+from .events import (
+    CHANNEL, LocalBroker, RedisBroker, StreamCapacityError, get_broker, kpi_delta, merge_deltas, set_broker,
+)
+from .facts import refresh_daily_revenue_facts
+from .forecast import SEASON, holt_winters, refresh_revenue_forecast
+from .models import DailyRevenueFact, RevenueForecast
+from .reports import kam_performance, kpis, revenue_series, customer_wise_revenue, revenue_forecast
+
+User = get_user_model()
+
+
+def make_billed_invoice(customer, issue_date, lines):
+    """An invoice with one line per (type, amount) in lines, billed at their sum"""
+    entitlement = make_entitlement(customer)
+    invoice = make_invoice(entitlement, issue_date, sum(Decimal(amount) for _, amount in lines))
+    for line_type, amount in lines:
+        detail = make_detail(entitlement, issue_date, issue_date, type=line_type)
+        InvoiceDetails.objects.create(invoice_master_id=invoice, entitlement_details_id=detail, sub_total=Decimal(amount))
+    return invoice
+
+
+class DailyRevenueFactTests(TestCase):
+
+    def setUp(self):
+        self.acme = make_customer('Acme')
+        self.globex = make_customer('Globex', customer_type='soho')
+        invoice = make_billed_invoice(self.acme, date(2025, 3, 1), [('bw', '300'), ('soho', '100')])
+        make_payment(invoice, date(2025, 3, 5), '200')
+        make_billed_invoice(self.globex, date(2025, 3, 2), [('soho', '50')])
+
+    def facts(self, customer):
+        return {
+            (fact.date, fact.package_type): (fact.billed_amount, fact.collected_amount)
+            for fact in DailyRevenueFact.objects.filter(customer_master_id=customer)
+        }
+
+    def test_full_rebuild_splits_by_package_type(self):
+        self.assertEqual(refresh_daily_revenue_facts(full=True)[0], None)
+        self.assertEqual(self.facts(self.acme), {
+            (date(2025, 3, 1), 'bw'): (Decimal('300'), Decimal('0')),
+            (date(2025, 3, 1), 'soho'): (Decimal('100'), Decimal('0')),
+            (date(2025, 3, 5), 'bw'): (Decimal('0'), Decimal('150')),
+            (date(2025, 3, 5), 'soho'): (Decimal('0'), Decimal('50')),
+        })
+
+    def test_incremental_refresh_rebuilds_changed_customers(self):
+        refresh_daily_revenue_facts()
+        make_billed_invoice(self.globex, date(2025, 4, 1), [('soho', '70')])
+        customer_ids, _ = refresh_daily_revenue_facts()
+        self.assertIn(self.globex.pk, customer_ids)
+        self.assertEqual(self.facts(self.globex)[(date(2025, 4, 1), 'soho')], (Decimal('70'), Decimal('0')))
+
+    def test_requests_only_read_facts(self):
+        call_command('refresh_revenue_facts', stdout=StringIO())
+        client = APIClient()
+        client.force_authenticate(User.objects.create_superuser(email='admin@example.com', username='admin', password='admin'))
+        url = reverse('dashboard-monthly-revenue')
+        params = {'start_date': '2025-03-01', 'end_date': '2025-04-30'}
+
+        make_billed_invoice(self.globex, date(2025, 4, 1), [('soho', '70')])
+        cache.clear()
+        self.assertEqual([row['revenue'] for row in client.get(url, params).data], [450.0, 0.0])
+
+        call_command('refresh_revenue_facts', stdout=StringIO())
+        self.assertEqual([row['revenue'] for row in client.get(url, params).data], [450.0, 70.0])
+
+
+class DashboardSnapshotTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(email='admin@example.com', username='admin', password='admin')
+        cls.acme = make_customer('Acme')
+        make_billed_invoice(cls.acme, date.today(), [('bw', '300')])
+        refresh_daily_revenue_facts(full=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.url = reverse('dashboard-snapshot')
+
+    def test_snapshot_sections(self):
+        data = self.client.get(self.url).data
+        self.assertEqual(
+            set(data), {'generated_at', 'summary', 'kpis', 'weekly', 'monthly', 'yearly', 'customer_wise', 'kam_performance'}
+        )
+        self.assertEqual(data['summary']['total_revenue'], 300.0)
+        self.assertEqual(data['monthly'][-1]['revenue'], 300.0)
+        self.assertEqual(self.client.get(self.url, {'period': 'decade'}).status_code, 400)
+
+    def test_cached_until_a_refresh(self):
+        first = self.client.get(self.url).data
+        with self.assertNumQueries(3):
+            # The cache versions, the fact refresh time and the activity log only
+            self.assertEqual(self.client.get(self.url).data['generated_at'], first['generated_at'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            make_billed_invoice(self.acme, date.today(), [('bw', '200')])
+        self.assertEqual(self.client.get(self.url).data['summary']['total_revenue'], 300.0)
+        refresh_daily_revenue_facts()
+        self.assertEqual(self.client.get(self.url).data['summary']['total_revenue'], 500.0)
+
+
+class KAMLeaderboardTests(TestCase):
+
+    def setUp(self):
+        self.rahim = KAMMaster.objects.create(kam_name='Rahim')
+        self.karim = KAMMaster.objects.create(kam_name='Karim')
+        self.acme = make_customer('Acme', kam_id=self.rahim)
+        self.globex = make_customer('Globex', kam_id=self.karim)
+        this_month = date.today().replace(day=1)
+        invoice = make_billed_invoice(self.acme, this_month, [('bw', '300')])
+        make_payment(invoice, this_month, '300')
+        invoice.status = 'paid'
+        invoice.save()
+        make_billed_invoice(self.globex, this_month, [('bw', '500')])
+        refresh_daily_revenue_facts(full=True)
+
+    def leaderboard(self, **params):
+        return [(row['kam'], row['total_revenue'], row['total_customers']) for row in kam_performance(params)]
+
+    def test_ranking(self):
+        self.assertEqual(self.leaderboard(), [('Karim', 500.0, 1), ('Rahim', 300.0, 1)])
+        self.assertEqual(self.leaderboard(rank_by='collected'), [('Rahim', 300.0, 1), ('Karim', 500.0, 1)])
+        rahim, = kam_performance({'rank_by': 'days_to_pay', 'kam_id': self.rahim.pk})
+        self.assertEqual((rahim['paid_invoices'], rahim['avg_days_to_pay']), (1, 0.0))
+        with self.assertRaises(ValidationError):
+            kam_performance({'rank_by': 'tenure'})
+
+    def test_reassigned_customer_moves_with_its_revenue(self):
+        CustomerMaster.objects.filter(pk=self.globex.pk).update(kam_id=self.rahim)
+        refresh_daily_revenue_facts()
+        self.assertEqual(self.leaderboard(), [('Rahim', 800.0, 2)])
+
+
+class RevenueCubeParityTests(TestCase):
+    """The in-process cube answers every dashboard query exactly like the fact table"""
+
+    today = date(2025, 3, 20)
+
+    def setUp(self):
+        self.kam = KAMMaster.objects.create(kam_name='Rahim')
+        self.acme = make_customer('Acme', kam_id=self.kam)
+        self.globex = make_customer('Globex', customer_type='soho')
+        invoice = make_billed_invoice(self.acme, date(2025, 1, 15), [('bw', '300.10'), ('soho', '99.95')])
+        make_payment(invoice, date(2025, 2, 3), '200.05')
+        make_billed_invoice(self.acme, date(2025, 3, 2), [('bw', '410')])
+        invoice = make_billed_invoice(self.globex, date(2025, 3, 10), [('soho', '75.25')])
+        make_payment(invoice, date(2025, 3, 18), '75.25')
+        refresh_daily_revenue_facts(full=True)
+        cube._cube.data = None
+
+    def tearDown(self):
+        cube._cube.data = None
+
+    def both(self, query):
+        """query() answered from SQL, then from the cube"""
+        sql = query()
+        with override_settings(DASHBOARD_CUBE_ENABLED=True):
+            cube.refresh_cube(force=True)
+            return sql, query()
+
+    def assertParity(self, query):
+        sql, from_cube = self.both(query)
+        self.assertEqual(from_cube, sql)
+        return sql
+
+    def test_queries_match(self):
+        filters = [
+            {}, {'kam_id': str(self.kam.pk)}, {'customer_type': 'soho'}, {'package_type': 'bw'},
+            {'customer_id': str(self.globex.pk)}, {'customer_id': '999999'},
+            {'start_date': '2025-02-01', 'end_date': '2025-03-15'},
+        ]
+        for params in filters:
+            with self.subTest(params=params):
+                for period in ['week', 'month', 'year']:
+                    self.assertParity(lambda: revenue_series(params, period, today=self.today))
+                    self.assertParity(lambda: kpis(params, period, today=self.today))
+                self.assertParity(lambda: customer_wise_revenue(params))
+                self.assertParity(lambda: customer_wise_revenue(params, limit=1))
+
+        month = self.assertParity(lambda: revenue_series({}, 'month', today=self.today))
+        self.assertEqual([row['revenue'] for row in month[-3:]], [400.05, 0.0, 485.25])
+
+    def test_incremental_refresh(self):
+        self.both(lambda: None)
+        make_billed_invoice(self.globex, date(2025, 3, 19), [('soho', '10.01')])
+        refresh_daily_revenue_facts()
+        sql, from_cube = self.both(lambda: customer_wise_revenue({}))
+        self.assertEqual(from_cube, sql)
+        self.assertEqual(sql[1]['totalRevenue'], 85.26)
+
+
+class FakeRedis:
+    """Records published messages; its pubsub yields the queued messages, then blocks"""
+
+    def __init__(self, messages=()):
+        self.published = []
+        self.messages = list(messages)
+        self.subscribed = threading.Event()
+
+    def publish(self, channel, data):
+        self.published.append((channel, data))
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return self
+
+    def subscribe(self, channel):
+        self.channel = channel
+
+    def listen(self):
+        yield from ({'data': message} for message in self.messages)
+        self.subscribed.set()
+        threading.Event().wait()
+
+
+class KPIBrokerTests(TestCase):
+
+    async def test_local_broker_delivers_to_every_stream(self):
+        broker = LocalBroker(max_connections=2)
+        first, second = broker.subscribe(), broker.subscribe()
+        with self.assertRaises(StreamCapacityError):
+            broker.subscribe()
+
+        # Writes publish from request threads, not the streams' loop
+        publisher = threading.Thread(target=broker.publish, args=[kpi_delta('2025-03-01', billed='100.50', invoices=1)])
+        publisher.start()
+        publisher.join()
+        expected = [{'date': '2025-03-01', 'billed': 100.5, 'invoices': 1}]
+        self.assertEqual(await first.get(1), expected)
+        self.assertEqual(await second.get(1), expected)
+        self.assertEqual(await first.get(0.01), [])
+
+        first.close()
+        broker.subscribe()
+        self.assertEqual(len(broker.subscriptions), 2)
+
+    async def test_slow_stream_drops_events(self):
+        broker = LocalBroker(max_connections=1)
+        with mock.patch('apps.dashboard.events.QUEUE_SIZE', 2):
+            subscription = broker.subscribe()
+        for day in range(1, 4):
+            broker.publish(kpi_delta(f'2025-03-0{day}', collected=10))
+        await asyncio.sleep(0)
+        self.assertEqual(len(await subscription.get(1)), 2)
+        self.assertEqual(subscription.dropped, 1)
+
+    def test_merge_deltas(self):
+        events = [
+            kpi_delta('2025-03-02', collected='10.10'),
+            kpi_delta('2025-03-01', billed=100, invoices=1),
+            kpi_delta('2025-03-02', collected='0.20', invoices=0),
+            kpi_delta('2025-03-01', billed=-40, invoices=-1),
+        ]
+        self.assertEqual(merge_deltas(events), [
+            {'date': '2025-03-01', 'billed': 60.0, 'invoices': 0},
+            {'date': '2025-03-02', 'collected': 10.3},
+        ])
+
+    async def test_redis_broker(self):
+        event = kpi_delta('2025-03-01', billed=5)
+        client = FakeRedis(messages=[json.dumps(event)])
+        broker = RedisBroker(max_connections=10, url='redis://unused')
+        broker.client = client
+
+        broker.publish(event)
+        self.assertEqual(client.published, [(CHANNEL, json.dumps(event))])
+
+        # One listener thread per process feeds the streams of every subscriber
+        subscription = broker.subscribe()
+        listener = broker.listener
+        broker.subscribe()
+        self.assertIs(broker.listener, listener)
+        self.assertEqual(await subscription.get(5), [event])
+        self.assertEqual(client.channel, CHANNEL)
+
+    def test_redis_publish_failure_does_not_fail_the_write(self):
+        broker = RedisBroker(max_connections=10, url='redis://unused')
+        broker.client = mock.Mock(publish=mock.Mock(side_effect=ConnectionError))
+        with self.assertLogs('apps.dashboard.events', 'ERROR'):
+            broker.publish(kpi_delta('2025-03-01', billed=5))
+
+
+@override_settings(DASHBOARD_STREAM_HEARTBEAT=1)
+class KPIStreamTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(email='admin@example.com', username='admin', password='admin')
+        cls.token = str(AccessToken.for_user(cls.admin))
+
+    def setUp(self):
+        self.previous_broker = set_broker(LocalBroker(max_connections=10))
+
+    def tearDown(self):
+        set_broker(self.previous_broker)
+
+    def test_needs_asgi(self):
+        response = self.client.get(reverse('dashboard-stream'), {'token': self.token})
+        self.assertEqual(response.status_code, 501)
+
+    async def test_needs_a_shared_broker(self):
+        response = await AsyncClient().get(reverse('dashboard-stream'), {'token': self.token})
+        self.assertEqual(response.status_code, 501)
+
+    @override_settings(DASHBOARD_STREAM_SINGLE_PROCESS=True)
+    async def test_stream(self):
+        client = AsyncClient()
+        url = reverse('dashboard-stream')
+        self.assertEqual((await client.get(url)).status_code, 401)
+        self.assertEqual((await client.get(url, {'token': 'bogus'})).status_code, 401)
+
+        response = await client.get(url, {'token': self.token})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        frames = aiter(response.streaming_content)
+        self.assertEqual(await anext(frames), b'retry: 5000\n\n')
+        self.assertEqual(await anext(frames), b': keepalive\n\n')
+
+        broker = get_broker()
+        broker.publish(kpi_delta('2025-03-01', billed=100))
+        broker.publish(kpi_delta('2025-03-01', billed=50, invoices=1))
+        frame = (await anext(frames)).decode()
+        self.assertEqual(frame.splitlines()[0], 'event: kpi')
+        self.assertEqual(json.loads(frame.splitlines()[1][len('data: '):]), {
+            'deltas': [{'date': '2025-03-01', 'billed': 150.0, 'invoices': 1}],
+        })
+
+
+class HoltWintersTests(TestCase):
+
+    def test_flat_and_trending_series(self):
+        values = np.array([[100.0] * 12, [10.0 * month for month in range(12)]])
+        flat, trending = holt_winters(values, np.array([0, 0]), horizon=6)
+        np.testing.assert_allclose(flat, 100.0)
+        self.assertTrue(np.all(np.diff(trending) > 0))
+        # The trend is damped, so it grows slower than the 10 a month of the history
+        self.assertLess(trending[-1] - trending[0], 50)
+
+    def test_seasonal_series_repeats_its_year(self):
+        year = np.array([100, 80, 90, 120, 150, 200, 180, 160, 140, 120, 110, 300], dtype=float)
+        forecast, = holt_winters(np.tile(year, 3)[None, :], np.array([0]), horizon=SEASON)
+        np.testing.assert_allclose(forecast, year, rtol=0.05)
+
+    def test_history_starts_and_floor(self):
+        # A series that only began in the last months, and one falling towards zero
+        values = np.array([[0.0] * 9 + [50.0] * 3, [90.0, 70.0, 50.0, 30.0, 10.0] + [0.0] * 7])
+        late, falling = holt_winters(values, np.array([9, 0]), horizon=3)
+        np.testing.assert_allclose(late, 50.0)
+        self.assertTrue(np.all(falling >= 0))
+
+
+class RevenueForecastTests(TestCase):
+
+    def setUp(self):
+        self.kam = KAMMaster.objects.create(kam_name='Rahim')
+        self.acme = make_customer('Acme', kam_id=self.kam)
+        self.globex = make_customer('Globex', customer_type='soho')
+        for month in range(1, 13):
+            self.fact(self.acme, date(2024, month, 10), '1000', '800')
+            self.fact(self.globex, date(2024, month, 3), '200', '200')
+        # The current month is incomplete and not fitted
+        self.fact(self.acme, date(2025, 1, 2), '99999', '0')
+
+    def fact(self, customer, day, billed, collected):
+        DailyRevenueFact.objects.create(
+            date=day, customer_master_id=customer, kam_id=customer.kam_id, customer_type=customer.customer_type,
+            package_type='bw', billed_amount=Decimal(billed), collected_amount=Decimal(collected),
+            due_amount=Decimal(billed) - Decimal(collected),
+        )
+
+    def test_refresh_writes_one_row_per_series_and_month(self):
+        self.assertEqual(refresh_revenue_forecast(horizon=3, today=date(2025, 1, 20)), (2, 6))
+        rows = RevenueForecast.objects.filter(customer_type='bw', kam_id=self.kam)
+        self.assertEqual([row.month for row in rows], [date(2025, 1, 1), date(2025, 2, 1), date(2025, 3, 1)])
+        self.assertEqual({(row.billed_amount, row.collected_amount, row.history_months) for row in rows},
+                         {(Decimal('1000.00'), Decimal('800.00'), 12)})
+
+        forecast = revenue_forecast({'customer_type': 'soho'})['forecast']
+        self.assertEqual([(row['period'], row['revenue'], row['collection_rate']) for row in forecast], [
+            ('2025-01-01', 200.0, 100.0), ('2025-02-01', 200.0, 100.0), ('2025-03-01', 200.0, 100.0),
+        ])
+        self.assertEqual(revenue_forecast({})['forecast'][0]['revenue'], 1200.0)
+
+    def test_refresh_replaces_the_forecast(self):
+        refresh_revenue_forecast(horizon=3, today=date(2025, 1, 20))
+        DailyRevenueFact.objects.filter(customer_master_id=self.globex).delete()
+        call_command('refresh_revenue_forecast', stdout=StringIO())
+        self.assertEqual(set(RevenueForecast.objects.values_list('customer_type', flat=True)), {'bw'})
+
+        DailyRevenueFact.objects.all().delete()
+        self.assertEqual(refresh_revenue_forecast(today=date(2025, 1, 20)), (0, 0))
+        self.assertFalse(RevenueForecast.objects.exists())
@@ -0,0 +1,24 @@
+from django.urls import path
+from .views import (
+    KPIView,
+    WeeklyRevenueView,
+    MonthlyRevenueView,
+    YearlyRevenueView,
+    CustomerWiseRevenueView,
+    KAMPerformanceView,
+    RevenueForecastView,
+    SnapshotView,
+    kpi_stream,
+)
+
+urlpatterns = [
+    path('kpis/', KPIView.as_view(), name='dashboard-kpis'),
+    path('weekly-revenue/', WeeklyRevenueView.as_view(), name='dashboard-weekly-revenue'),
+    path('monthly-revenue/', MonthlyRevenueView.as_view(), name='dashboard-monthly-revenue'),
+    path('yearly-revenue/', YearlyRevenueView.as_view(), name='dashboard-yearly-revenue'),
+    path('customer-wise-revenue/', CustomerWiseRevenueView.as_view(), name='dashboard-customer-wise-revenue'),
+    path('kam-performance/', KAMPerformanceView.as_view(), name='dashboard-kam-performance'),
+    path('revenue-forecast/', RevenueForecastView.as_view(), name='dashboard-revenue-forecast'),
+    path('snapshot/', SnapshotView.as_view(), name='dashboard-snapshot'),
+    path('stream/', kpi_stream, name='dashboard-stream'),
+]
@@ -0,0 +1,49 @@
+"""
+Utility functions for dashboard operations
+"""
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+
+
+def snapshot_cache_key(prefix, params):
+    """Stable cache key from a prefix and a dict of normalized parameters"""
+    normalized = json.dumps(sorted(params.items()), default=str)
+    return f'{prefix}:{hashlib.md5(normalized.encode()).hexdigest()}'
+
+
+def get_or_compute(key, compute, timeout, lock_timeout=30, wait=10, poll_interval=0.05):
+    """
+    Cached value for key, computing it at most once across concurrent misses.
+
+    The first caller to miss takes a short cache lock and computes; the
+    others poll the cache for up to wait seconds and only compute
+    themselves if the lock holder never delivers (e.g. it crashed).
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, True, lock_timeout):
+        try:
+            value = compute()
+            cache.set(key, value, timeout)
+            return value
+        finally:
+            cache.delete(lock_key)
+
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(poll_interval)
+        value = cache.get(key)
+        if value is not None:
+            return value
+        if cache.get(lock_key) is None:
+            break
+
+    value = compute()
+    cache.set(key, value, timeout)
+    return value
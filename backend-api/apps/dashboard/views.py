@@ -0,0 +1,266 @@
+"""
+REST API Views for Dashboard App
+"""
+import json
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework import permissions, status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from apps.authentication.permissions import RequirePermissions
+from apps.bills.utils import get_billing_version, parse_date_param
+from apps.payment.utils import get_payments_version
+from .cube import refresh_cube
+from .events import LocalBroker, StreamCapacityError, get_broker, merge_deltas
+from .facts import facts_refreshed_at
+from .reports import (
+    FACT_FILTERS,
+    KPI_PERIODS,
+    kpis,
+    revenue_series,
+    customer_wise_revenue,
+    kam_performance,
+    revenue_forecast,
+    dashboard_snapshot,
+)
+from .utils import snapshot_cache_key, get_or_compute
+
+
+class DashboardView(APIView):
+    """
+    Base view: reports permission, reading the fact tables as the
+    refresh_revenue_facts command last left them
+    """
+    permission_classes = [permissions.IsAuthenticated, RequirePermissions]
+    required_permissions = ['reports:read']
+    uses_cube = True
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.uses_cube:
+            refresh_cube()
+
+
+class KPIView(DashboardView):
+    def get(self, request):
+        """
+        Headline KPIs for the current period to date vs. the same span of the previous one
+        Query parameters:
+        - period: 'week', 'month', 'year' (default: 'month')
+        - kam_id, customer_type, package_type, customer_id: Filters
+        """
+        period = request.query_params.get('period', 'month')
+        if period not in KPI_PERIODS:
+            return Response(
+                {'error': f'Invalid period. Choose from: {", ".join(KPI_PERIODS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(kpis(request.query_params, period))
+
+
+class RevenueSeriesView(DashboardView):
+    """Revenue series for the period set by the subclass"""
+    period = None
+
+    def get(self, request):
+        """
+        Revenue, collections and dues per period
+        Query parameters:
+        - start_date, end_date: Range (YYYY-MM-DD, default: last 12 weeks / 12 months / 5 years)
+        - kam_id, customer_type, package_type, customer_id: Filters
+        """
+        return Response(revenue_series(request.query_params, self.period))
+
+
+class WeeklyRevenueView(RevenueSeriesView):
+    period = 'week'
+
+
+class MonthlyRevenueView(RevenueSeriesView):
+    period = 'month'
+
+
+class YearlyRevenueView(RevenueSeriesView):
+    period = 'year'
+
+
+class CustomerWiseRevenueView(DashboardView):
+    def get(self, request):
+        """
+        Revenue and collection rate per customer, highest revenue first
+        Query parameters:
+        - start_date, end_date: Range (YYYY-MM-DD, default: all time)
+        - limit: Only return the top N customers
+        - kam_id, customer_type, package_type: Filters
+        """
+        limit = request.query_params.get('limit')
+        if limit:
+            try:
+                limit = int(limit)
+                if limit < 1:
+                    raise ValueError
+            except ValueError:
+                return Response(
+                    {'error': 'limit must be a positive integer'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        return Response(customer_wise_revenue(request.query_params, limit))
+
+
+class KAMPerformanceView(DashboardView):
+    def get(self, request):
+        """
+        KAM leaderboard over a month range, read from the monthly rollup
+        Query parameters:
+        - start_month, end_month: Range (YYYY-MM, default: last 12 months). start_date/end_date also accepted
+        - rank_by: 'revenue', 'collected', 'collection_rate', 'active_customers',
+          'new_customers', 'days_to_pay' (default: 'revenue')
+        - kam_id: Only this KAM
+        """
+        return Response(kam_performance(request.query_params))
+
+
+class RevenueForecastView(DashboardView):
+    """Read from the forecast table, which the nightly refresh_revenue_forecast rebuilds"""
+    uses_cube = False
+
+    def get(self, request):
+        """
+        Projected billing and collections for the coming months
+        Query parameters:
+        - kam_id, customer_type: Filters
+        """
+        return Response(revenue_forecast(request.query_params))
+
+
+class SnapshotView(DashboardView):
+    """All dashboard data in one cached response"""
+    # Refreshed on a cache miss only; hits never touch the fact tables
+    uses_cube = False
+
+    def get(self, request):
+        """
+        KPIs, weekly/monthly/yearly series, customer-wise revenue and KAM performance
+        Query parameters:
+        - period: KPI period 'week', 'month', 'year' (default: 'month')
+        - start_date, end_date: Range for the series (YYYY-MM-DD)
+        - kam_id, customer_type, package_type, customer_id: Filters
+        """
+        params = request.query_params
+        period = params.get('period', 'month')
+        if period not in KPI_PERIODS:
+            return Response(
+                {'error': f'Invalid period. Choose from: {", ".join(KPI_PERIODS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        # Validate up front so bad input is never cached or single-flighted
+        for name in ['start_date', 'end_date']:
+            if params.get(name):
+                parse_date_param(params[name], name)
+
+        user = request.user
+        if user.is_superuser:
+            scope = 'superuser'
+        else:
+            scope = user.role.name if user.role else 'none'
+
+        key_params = {
+            name: params[name]
+            for name in ['start_date', 'end_date', *FACT_FILTERS]
+            if params.get(name)
+        }
+        key_params.update({
+            'period': period,
+            'scope': scope,
+            # Default ranges are relative to today
+            'today': date.today(),
+            'billing': get_billing_version(),
+            'payments': get_payments_version(),
+            # A write shows up once a fact refresh has picked it up
+            'facts': facts_refreshed_at(),
+        })
+        cache_key = snapshot_cache_key('dashboard:snapshot', key_params)
+
+        def compute():
+            refresh_cube()
+            return dashboard_snapshot(params, period)
+
+        return Response(get_or_compute(cache_key, compute, settings.REPORT_CACHE_TIMEOUT))
+
+
+# Milliseconds an EventSource waits before reconnecting
+STREAM_RETRY_MS = 5000
+
+
+def _stream_access(request):
+    """(user, allowed) for a stream request; EventSource cannot set headers, so ?token= is accepted too"""
+    authenticator = JWTAuthentication()
+    header = authenticator.get_header(request)
+    raw_token = authenticator.get_raw_token(header) if header else request.GET.get('token', '').encode()
+    if not raw_token:
+        return None, False
+    try:
+        user = authenticator.get_user(authenticator.get_validated_token(raw_token))
+    except AuthenticationFailed:
+        return None, False
+    return user, user.is_superuser or user.has_permission('reports:read')
+
+
+async def _kpi_events(subscription):
+    try:
+        yield f'retry: {STREAM_RETRY_MS}\n\n'
+        while True:
+            events = await subscription.get(settings.DASHBOARD_STREAM_HEARTBEAT)
+            if not events:
+                yield ': keepalive\n\n'
+                continue
+            yield f'event: kpi\ndata: {json.dumps({"deltas": merge_deltas(events)})}\n\n'
+            if subscription.dropped:
+                # Deltas were lost while this client lagged; it should reload the snapshot
+                subscription.dropped = 0
+                yield 'event: resync\ndata: {}\n\n'
+    finally:
+        subscription.close()
+
+
+@require_GET
+async def kpi_stream(request):
+    """
+    Server-sent live KPI deltas (needs an ASGI server, and REDIS_URL unless it runs a single process)
+    Authentication: Authorization: Bearer <access token>, or ?token=<access token>
+    Events:
+    - kpi: {"deltas": [{date, billed, collected, invoices, prospect_conversions}]}, zero counters omitted
+    - resync: deltas were dropped; reload /api/dashboard/snapshot/
+    """
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker would hold the open stream for good without ever flushing it
+        return JsonResponse({'error': 'Live updates need the ASGI server (config.asgi).'}, status=501)
+    broker = get_broker()
+    if isinstance(broker, LocalBroker) and not settings.DASHBOARD_STREAM_SINGLE_PROCESS:
+        # Streams on other workers would never see this worker's writes
+        return JsonResponse({'error': 'Live updates need REDIS_URL, or a single-process server.'}, status=501)
+    user, allowed = await sync_to_async(_stream_access)(request)
+    if user is None:
+        return JsonResponse({'error': 'Authentication credentials were not provided or are invalid.'}, status=401)
+    if not allowed:
+        return JsonResponse({'error': 'You do not have permission to perform this action.'}, status=403)
+    try:
+        subscription = broker.subscribe()
+    except StreamCapacityError:
+        response = JsonResponse({'error': 'Too many live dashboard connections. Try again shortly.'}, status=503)
+        response['Retry-After'] = str(STREAM_RETRY_MS // 1000)
+        return response
+
+    response = StreamingHttpResponse(_kpi_events(subscription), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Keep nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
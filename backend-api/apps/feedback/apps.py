@@ -5,3 +5,6 @@ class FeedbackConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.feedback'
 
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,104 @@
+"""
+Feedback counters.
+
+Views are buffered per process and written behind in batches: one
+UPDATE ... SET view_count = view_count + n per flush instead of a
+read-modify-write save on every GET. A flush happens once
+FEEDBACK_VIEW_FLUSH_SIZE feedback items are pending, every
+FEEDBACK_VIEW_FLUSH_INTERVAL seconds from a timer thread (so an idle
+worker still writes its last views), and when the process exits. vote_count is kept with atomic F() increments and
+reconcile_vote_counts() corrects any drift from feedback_votes.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import Feedback, FeedbackVote
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounter:
+    """Per-process buffer of view increments keyed by feedback id"""
+
+    def __init__(self, interval, max_pending):
+        self.interval = interval
+        self.max_pending = max_pending
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+        self.timer = None
+        self.stopped = threading.Event()
+
+    def record(self, feedback_id):
+        """
+        Count one view. Returns this process's views of feedback_id buffered
+        so far, this one included: what a row read before the call is missing.
+        """
+        with self.lock:
+            count = self.pending[feedback_id] = self.pending.get(feedback_id, 0) + 1
+            due = len(self.pending) >= self.max_pending or time.monotonic() - self.last_flush >= self.interval
+            if self.timer is None and self.interval > 0:
+                # Started lazily, so importing the module in a command or a test starts no thread
+                self.timer = threading.Thread(target=self._flush_periodically, name='feedback-view-flush', daemon=True)
+                self.timer.start()
+        if due:
+            self.flush()
+        return count
+
+    def _flush_periodically(self):
+        """Timer thread: flush whatever is pending every interval seconds until stop()"""
+        while not self.stopped.wait(self.interval):
+            if self.pending:
+                self.flush()
+                # This thread holds its own connection; do not keep it past CONN_MAX_AGE
+                close_old_connections()
+
+    def stop(self):
+        """Stop the timer thread and write what is pending"""
+        self.stopped.set()
+        if self.timer is not None:
+            self.timer.join()
+        return self.flush()
+
+    def flush(self):
+        """Write the buffered views in one UPDATE; returns the number of feedback rows updated"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.last_flush = time.monotonic()
+        if not pending:
+            return 0
+        try:
+            return Feedback.objects.filter(pk__in=pending).update(view_count=F('view_count') + Case(
+                *[When(pk=pk, then=Value(count)) for pk, count in pending.items()],
+                default=Value(0),
+                output_field=IntegerField(),
+            ))
+        except Exception:
+            # Put them back for the next flush rather than losing them
+            logger.exception('Failed to flush feedback view counts')
+            with self.lock:
+                for pk, count in pending.items():
+                    self.pending[pk] = self.pending.get(pk, 0) + count
+            return 0
+
+
+view_counter = ViewCounter(settings.FEEDBACK_VIEW_FLUSH_INTERVAL, settings.FEEDBACK_VIEW_FLUSH_SIZE)
+
+atexit.register(view_counter.stop)
+
+
+def reconcile_vote_counts():
+    """Set vote_count from feedback_votes wherever it drifted; one UPDATE, returns rows fixed"""
+    actual = Coalesce(Subquery(
+        FeedbackVote.objects.filter(feedback=OuterRef('pk')).order_by().values('feedback').annotate(
+            count=Count('id')
+        ).values('count')
+    ), 0)
+    return Feedback.objects.exclude(vote_count=actual).update(vote_count=actual)
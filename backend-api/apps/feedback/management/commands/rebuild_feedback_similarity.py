@@ -0,0 +1,23 @@
+"""
+Django management command to (re)build the feedback similarity index.
+Feedback is indexed on save; run this once after deploying the index and
+whenever the signature parameters change.
+"""
+from django.core.management.base import BaseCommand
+
+from apps.feedback.models import FeedbackLSHBucket, FeedbackSignature
+from apps.feedback.similarity import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Index feedback title/description MinHash signatures for near-duplicate detection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Drop the index and rebuild every item')
+
+    def handle(self, *args, **options):
+        if options['full']:
+            FeedbackLSHBucket.objects.all().delete()
+            FeedbackSignature.objects.all().delete()
+        indexed = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} feedback items'))
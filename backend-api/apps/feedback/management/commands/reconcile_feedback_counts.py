@@ -0,0 +1,17 @@
+"""
+Django management command to correct feedback vote counts.
+vote_count is maintained with atomic increments; votes removed outside
+FeedbackVote.delete() (e.g. cascades when a user is deleted) leave it
+high. Run it from cron.
+"""
+from django.core.management.base import BaseCommand
+
+from apps.feedback.counters import reconcile_vote_counts
+
+
+class Command(BaseCommand):
+    help = 'Recount feedback vote_count from feedback_votes where it drifted'
+
+    def handle(self, *args, **options):
+        fixed = reconcile_vote_counts()
+        self.stdout.write(self.style.SUCCESS(f'Corrected vote_count on {fixed} feedback items'))
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feedback', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedbackSignature',
+            fields=[
+                ('feedback', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='feedback.feedback')),
+                ('text_hash', models.BigIntegerField(help_text='CRC32 of the indexed text; unchanged text is not re-indexed')),
+                ('minhash', models.BinaryField(help_text='MinHash signature, little-endian uint32 per permutation')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'feedback_signature',
+            },
+        ),
+        migrations.CreateModel(
+            name='FeedbackLSHBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.SmallIntegerField()),
+                ('bucket', models.BigIntegerField()),
+                ('feedback', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lsh_buckets', to='feedback.feedback')),
+            ],
+            options={
+                'db_table': 'feedback_lsh_bucket',
+                'indexes': [models.Index(fields=['band', 'bucket'], name='feedback_lsh_band_bucket_idx')],
+            },
+        ),
+    ]
@@ -2,6 +2,36 @@ from django.db import models
 from django.conf import settings
 from django.utils import timezone
 
+from .utils import PUBLIC_STATUSES, is_feedback_manager
+
+
+class FeedbackQuerySet(models.QuerySet):
+    """Visibility and list annotations for feedback"""
+
+    def visible_to(self, user):
+        """Sales persons see their own feedback and public ones; everyone else sees all"""
+        if user.is_authenticated and getattr(user, 'role', None) and user.role.name == 'sales_person':
+            return self.filter(models.Q(submitted_by=user) | models.Q(status__in=PUBLIC_STATUSES))
+        return self
+
+    def for_list(self, user, selection=None):
+        """
+        Annotate has_voted (EXISTS on the user's vote) and comments_count
+        (internal comments only count for managers), so a page of feedback
+        costs one query. With a FieldSelection, only what its fields read.
+        """
+        qs = self
+        for field, relation in [('submitted_by_details', 'submitted_by'), ('reviewed_by_details', 'reviewed_by')]:
+            if selection is None or selection.wants(field):
+                qs = qs.select_related(relation)
+        if selection is None or selection.wants('comments_count'):
+            comments = None if is_feedback_manager(user) else models.Q(comments__is_internal=False)
+            qs = qs.annotate(comments_count=models.Count('comments', filter=comments))
+        if selection is None or selection.wants('has_voted'):
+            voted = FeedbackVote.objects.filter(feedback=models.OuterRef('pk'), user=user) if user.is_authenticated else None
+            qs = qs.annotate(has_voted=models.Exists(voted) if voted is not None else models.Value(False))
+        return qs
+
 
 class Feedback(models.Model):
     """
@@ -109,6 +139,8 @@ class Feedback(models.Model):
         help_text='Internal notes for development team (not visible to submitter)'
     )
 
+    objects = FeedbackQuerySet.as_manager()
+
     class Meta:
         db_table = 'feedback'
         ordering = ['-created_at']
@@ -124,9 +156,9 @@ class Feedback(models.Model):
         return f"{self.title} - {self.get_status_display()}"
 
     def increment_view_count(self):
-        """Increment view count"""
-        self.view_count += 1
-        self.save(update_fields=['view_count'])
+        """Count a view; written behind in batches by the feedback view counter"""
+        from .counters import view_counter
+        self.view_count += view_counter.record(self.pk)
 
 
 class FeedbackComment(models.Model):
@@ -196,17 +228,61 @@ class FeedbackVote(models.Model):
         return f"{self.user} voted on {self.feedback.title}"
 
     def save(self, *args, **kwargs):
-        """Update vote count when vote is created"""
+        """Atomically increment the vote count when vote is created"""
         is_new = self.pk is None
         super().save(*args, **kwargs)
         if is_new:
-            self.feedback.vote_count = self.feedback.votes.count()
-            self.feedback.save(update_fields=['vote_count'])
+            Feedback.objects.filter(pk=self.feedback_id).update(vote_count=models.F('vote_count') + 1)
 
     def delete(self, *args, **kwargs):
-        """Update vote count when vote is deleted"""
-        feedback = self.feedback
-        super().delete(*args, **kwargs)
-        feedback.vote_count = feedback.votes.count()
-        feedback.save(update_fields=['vote_count'])
+        """Atomically decrement the vote count when vote is deleted"""
+        feedback_id = self.feedback_id
+        result = super().delete(*args, **kwargs)
+        Feedback.objects.filter(pk=feedback_id).update(vote_count=models.F('vote_count') - 1)
+        return result
+
+
+
+class FeedbackSignature(models.Model):
+    """
+    MinHash signature of a feedback item's title and description, kept in
+    step with the feedback by signals (see apps/feedback/similarity.py)
+    """
+    feedback = models.OneToOneField(
+        Feedback,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='signature',
+    )
+    text_hash = models.BigIntegerField(help_text='CRC32 of the indexed text; unchanged text is not re-indexed')
+    minhash = models.BinaryField(help_text='MinHash signature, little-endian uint32 per permutation')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'feedback_signature'
+
+    def __str__(self):
+        return f"Signature of feedback {self.feedback_id}"
+
+
+class FeedbackLSHBucket(models.Model):
+    """
+    LSH band buckets: feedback items sharing a (band, bucket) pair are
+    similarity candidates
+    """
+    feedback = models.ForeignKey(
+        Feedback,
+        on_delete=models.CASCADE,
+        related_name='lsh_buckets',
+    )
+    band = models.SmallIntegerField()
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        db_table = 'feedback_lsh_bucket'
+        indexes = [
+            models.Index(fields=['band', 'bucket'], name='feedback_lsh_band_bucket_idx'),
+        ]
 
+    def __str__(self):
+        return f"Feedback {self.feedback_id} band {self.band}"
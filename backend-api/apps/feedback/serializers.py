@@ -1,30 +1,45 @@
+from django.db.models import Count, prefetch_related_objects
 from rest_framework import serializers
 from .models import Feedback, FeedbackComment, FeedbackVote
 from apps.users.serializers import UserSerializer
+from config.serializers import BatchField, BatchListSerializer, SparseFieldsMixin, aggregate_by
+from .similarity import DUPLICATE_THRESHOLD, find_similar
+from .utils import is_feedback_manager
 
 
-class FeedbackVoteSerializer(serializers.ModelSerializer):
+def user_details(user):
+    if user:
+        return {
+            'id': user.id,
+            'username': user.username,
+            'email': user.email,
+        }
+    return None
+
+
+def load_user_details(objs, field):
+    """{obj.pk: user_details(obj.<field>)}, loading the users with one query"""
+    prefetch_related_objects(objs, field)
+    return {obj.pk: user_details(getattr(obj, field)) for obj in objs}
+
+
+class FeedbackVoteSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for feedback votes"""
-    user_details = serializers.SerializerMethodField()
+    user_details = BatchField()
 
     class Meta:
         model = FeedbackVote
         fields = ['id', 'user', 'user_details', 'created_at']
         read_only_fields = ['created_at']
+        list_serializer_class = BatchListSerializer
 
-    def get_user_details(self, obj):
-        if obj.user:
-            return {
-                'id': obj.user.id,
-                'username': obj.user.username,
-                'email': obj.user.email,
-            }
-        return None
+    def load_user_details(self, objs):
+        return load_user_details(objs, 'user')
 
 
-class FeedbackCommentSerializer(serializers.ModelSerializer):
+class FeedbackCommentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for feedback comments"""
-    user_details = serializers.SerializerMethodField()
+    user_details = BatchField()
     can_edit = serializers.SerializerMethodField()
 
     class Meta:
@@ -34,15 +49,10 @@ class FeedbackCommentSerializer(serializers.ModelSerializer):
             'is_internal', 'created_at', 'updated_at', 'can_edit'
         ]
         read_only_fields = ['created_at', 'updated_at']
+        list_serializer_class = BatchListSerializer
 
-    def get_user_details(self, obj):
-        if obj.user:
-            return {
-                'id': obj.user.id,
-                'username': obj.user.username,
-                'email': obj.user.email,
-            }
-        return None
+    def load_user_details(self, objs):
+        return load_user_details(objs, 'user')
 
     def get_can_edit(self, obj):
         """Check if current user can edit this comment"""
@@ -50,19 +60,19 @@ class FeedbackCommentSerializer(serializers.ModelSerializer):
         if not request or not request.user.is_authenticated:
             return False
         # User can edit their own comments, or admins can edit any
-        return obj.user == request.user or (
+        return obj.user_id == request.user.id or (
             request.user.is_superuser or
             (request.user.role and request.user.role.name in ['super_admin', 'admin'])
         )
 
 
-class FeedbackSerializer(serializers.ModelSerializer):
+class FeedbackSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Main serializer for feedback items"""
-    submitted_by_details = serializers.SerializerMethodField()
-    reviewed_by_details = serializers.SerializerMethodField()
+    submitted_by_details = BatchField()
+    reviewed_by_details = BatchField()
     comments = FeedbackCommentSerializer(many=True, read_only=True)
-    comments_count = serializers.SerializerMethodField()
-    has_voted = serializers.SerializerMethodField()
+    comments_count = BatchField()
+    has_voted = BatchField()
     can_edit = serializers.SerializerMethodField()
     can_delete = serializers.SerializerMethodField()
     can_manage = serializers.SerializerMethodField()
@@ -83,45 +93,36 @@ class FeedbackSerializer(serializers.ModelSerializer):
             'vote_count', 'view_count', 'created_at', 'updated_at',
             'reviewed_at', 'reviewed_by', 'completion_date'
         ]
+        list_serializer_class = BatchListSerializer
+        expandable_fields = ['comments']
+
+    def load_submitted_by_details(self, objs):
+        return load_user_details(objs, 'submitted_by')
 
-    def get_submitted_by_details(self, obj):
-        if obj.submitted_by:
-            return {
-                'id': obj.submitted_by.id,
-                'username': obj.submitted_by.username,
-                'email': obj.submitted_by.email,
-            }
-        return None
-
-    def get_reviewed_by_details(self, obj):
-        if obj.reviewed_by:
-            return {
-                'id': obj.reviewed_by.id,
-                'username': obj.reviewed_by.username,
-                'email': obj.reviewed_by.email,
-            }
-        return None
-
-    def get_comments_count(self, obj):
-        """Get count of public comments"""
+    def load_reviewed_by_details(self, objs):
+        return load_user_details(objs, 'reviewed_by')
+
+    def load_comments_count(self, objs):
+        """Count of comments the current user can see"""
+        if all(hasattr(obj, 'comments_count') for obj in objs):
+            # Annotated by Feedback.objects.for_list()
+            return {obj.pk: obj.comments_count for obj in objs}
+        comments = FeedbackComment.objects.all()
         request = self.context.get('request')
-        if request and request.user.is_authenticated:
+        if not (request and is_feedback_manager(request.user)):
             # Admins can see all comments, others only see public ones
-            user = request.user
-            is_admin = user.is_superuser or (
-                user.role and user.role.name in ['super_admin', 'admin', 'sales_manager']
-            )
-            if is_admin:
-                return obj.comments.count()
-            return obj.comments.filter(is_internal=False).count()
-        return obj.comments.filter(is_internal=False).count()
+            comments = comments.filter(is_internal=False)
+        return aggregate_by(objs, comments, 'feedback', Count('id'))
 
-    def get_has_voted(self, obj):
-        """Check if current user has voted on this feedback"""
+    def load_has_voted(self, objs):
+        """Whether the current user has voted on each feedback item"""
+        if all(hasattr(obj, 'has_voted') for obj in objs):
+            return {obj.pk: obj.has_voted for obj in objs}
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
-            return False
-        return obj.votes.filter(user=request.user).exists()
+            return {obj.pk: False for obj in objs}
+        voted = set(FeedbackVote.objects.filter(feedback__in=objs, user=request.user).values_list('feedback_id', flat=True))
+        return {obj.pk: obj.pk in voted for obj in objs}
 
     def get_can_edit(self, obj):
         """Check if current user can edit this feedback"""
@@ -129,7 +130,7 @@ class FeedbackSerializer(serializers.ModelSerializer):
         if not request or not request.user.is_authenticated:
             return False
         # User can edit their own feedback, or admins can edit any
-        return obj.submitted_by == request.user or (
+        return obj.submitted_by_id == request.user.id or (
             request.user.is_superuser or
             (request.user.role and request.user.role.name in ['super_admin', 'admin'])
         )
@@ -140,7 +141,7 @@ class FeedbackSerializer(serializers.ModelSerializer):
         if not request or not request.user.is_authenticated:
             return False
         # User can delete their own feedback, or admins can delete any
-        return obj.submitted_by == request.user or (
+        return obj.submitted_by_id == request.user.id or (
             request.user.is_superuser or
             (request.user.role and request.user.role.name in ['super_admin', 'admin'])
         )
@@ -190,19 +191,56 @@ class FeedbackSerializer(serializers.ModelSerializer):
         return data
 
 
+class FeedbackListSerializer(FeedbackSerializer):
+    """
+    Feedback list rows without nested comments.
+    Expects a queryset from Feedback.objects.for_list() for has_voted and comments_count.
+    """
+    comments = None
+
+    class Meta(FeedbackSerializer.Meta):
+        fields = [name for name in FeedbackSerializer.Meta.fields if name != 'comments']
+
+
 class FeedbackCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating feedback (excludes some fields)"""
+    ignore_duplicates = serializers.BooleanField(
+        write_only=True,
+        required=False,
+        default=False,
+        help_text='Submit even when near-duplicates of this feedback exist',
+    )
     
     class Meta:
         model = Feedback
         fields = [
             'title', 'description', 'category', 'priority',
             'email', 'expected_benefit', 'use_case',
-            'current_workaround', 'related_module', 'attachment'
+            'current_workaround', 'related_module', 'attachment',
+            'ignore_duplicates'
         ]
 
+    def validate(self, attrs):
+        """Reject near-duplicates of existing feedback unless ignore_duplicates is set"""
+        if attrs.get('ignore_duplicates'):
+            return attrs
+        request = self.context.get('request')
+        visible = Feedback.objects.visible_to(request.user) if request else Feedback.objects.all()
+        duplicates = find_similar(
+            attrs.get('title', ''), attrs.get('description', ''), queryset=visible, threshold=DUPLICATE_THRESHOLD
+        )
+        if duplicates:
+            raise serializers.ValidationError({
+                'possible_duplicates': [
+                    {'id': feedback.id, 'title': feedback.title, 'status': feedback.status, 'similarity': score}
+                    for feedback, score in duplicates
+                ],
+            })
+        return attrs
+
     def create(self, validated_data):
         """Create feedback with submitted_by set to current user"""
+        validated_data.pop('ignore_duplicates', None)
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             validated_data['submitted_by'] = request.user
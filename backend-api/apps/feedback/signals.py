@@ -0,0 +1,25 @@
+"""
+Signal handlers for the Feedback App
+"""
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Feedback
+from .similarity import index_feedback
+from .utils import bump_feedback_stats_version
+
+
+@receiver(post_save, sender=Feedback)
+@receiver(post_delete, sender=Feedback)
+def feedback_changed(sender, **kwargs):
+    """Invalidate cached feedback stats once the write is committed"""
+    transaction.on_commit(bump_feedback_stats_version)
+
+
+@receiver(post_save, sender=Feedback)
+def index_feedback_text(sender, instance, update_fields=None, **kwargs):
+    """Keep the similarity index in step with title and description"""
+    if update_fields is not None and not {'title', 'description'} & set(update_fields):
+        return
+    index_feedback(instance)
@@ -0,0 +1,157 @@
+"""
+Near-duplicate feedback detection with MinHash and LSH.
+
+A feedback item's title and description are reduced to character
+trigrams and summarised by a MinHash signature: for each of PERMUTATIONS
+hash functions, the smallest hash over the trigrams. The share of equal
+positions in two signatures estimates the Jaccard similarity of their
+trigram sets. Signatures are cut into BANDS bands of ROWS values; items
+that agree on a whole band land in the same (band, bucket) row of
+feedback_lsh_bucket. Finding similar feedback is one indexed lookup of
+the probe's BANDS buckets followed by a signature comparison of the few
+candidates, never a scan of feedback text.
+"""
+import re
+import zlib
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Feedback, FeedbackLSHBucket, FeedbackSignature
+
+
+# With 20 bands of 3 rows a pair is a candidate with probability
+# 1 - (1 - s**3)**20: about 0.93 at similarity 0.5, 0.15 at 0.2
+BANDS = 20
+ROWS = 3
+PERMUTATIONS = BANDS * ROWS
+SHINGLE = 3
+
+# Candidates at or above this estimated similarity are reported by /similar/
+SIMILAR_THRESHOLD = 0.4
+# ... and at or above this one block a new submission until confirmed
+DUPLICATE_THRESHOLD = 0.6
+DEFAULT_LIMIT = 10
+
+# Universal hashing (a * x + b) mod PRIME; a < 2**31 keeps a * x within uint64
+PRIME = np.uint64(4294967311)
+_rng = np.random.default_rng(20240601)
+_A = _rng.integers(1, 2 ** 31, PERMUTATIONS, dtype=np.uint64)
+_B = _rng.integers(0, 2 ** 31, PERMUTATIONS, dtype=np.uint64)
+EMPTY = np.full(PERMUTATIONS, np.iinfo(np.uint32).max, dtype=np.uint32)
+
+
+def normalize(title, description=''):
+    """Lowercased words of title and description joined by single spaces"""
+    return ' '.join(re.findall(r'\w+', f'{title or ""} {description or ""}'.lower()))
+
+
+def shingles(text):
+    """Distinct character trigrams of normalized text (the text itself when shorter)"""
+    if len(text) <= SHINGLE:
+        return {text} if text else set()
+    return {text[position:position + SHINGLE] for position in range(len(text) - SHINGLE + 1)}
+
+
+def signature(text):
+    """MinHash signature (uint32 array of PERMUTATIONS values) of normalized text"""
+    grams = shingles(text)
+    if not grams:
+        return EMPTY.copy()
+    hashes = np.fromiter((zlib.crc32(gram.encode()) for gram in grams), dtype=np.uint64, count=len(grams))
+    permuted = (hashes[:, None] * _A + _B) % PRIME
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def band_buckets(minhash):
+    """(band, bucket) pairs of a signature; bucket is a CRC32 of the band's values"""
+    return [
+        (band, zlib.crc32(minhash[band * ROWS:(band + 1) * ROWS].tobytes()))
+        for band in range(BANDS)
+    ]
+
+
+def similarity(minhash, others):
+    """Estimated Jaccard similarity of minhash to each row of others"""
+    return (others == minhash).mean(axis=1)
+
+
+def index_feedback_batch(items):
+    """
+    Create or refresh the signatures and buckets of feedback items; those
+    whose text is unchanged since they were indexed are skipped. A fixed
+    number of queries per call. Returns the number of items indexed.
+    """
+    texts = {feedback.pk: normalize(feedback.title, feedback.description) for feedback in items}
+    hashes = {pk: zlib.crc32(text.encode()) for pk, text in texts.items()}
+    current = dict(FeedbackSignature.objects.filter(feedback_id__in=texts).values_list('feedback_id', 'text_hash'))
+    changed = [pk for pk in texts if current.get(pk) != hashes[pk]]
+    if not changed:
+        return 0
+    signatures = {pk: signature(texts[pk]) for pk in changed}
+    with transaction.atomic():
+        FeedbackLSHBucket.objects.filter(feedback_id__in=changed).delete()
+        FeedbackSignature.objects.filter(feedback_id__in=changed).delete()
+        FeedbackSignature.objects.bulk_create([
+            FeedbackSignature(feedback_id=pk, text_hash=hashes[pk], minhash=minhash.tobytes())
+            for pk, minhash in signatures.items()
+        ])
+        FeedbackLSHBucket.objects.bulk_create([
+            FeedbackLSHBucket(feedback_id=pk, band=band, bucket=bucket)
+            for pk, minhash in signatures.items()
+            for band, bucket in band_buckets(minhash)
+        ], batch_size=5000)
+    return len(changed)
+
+
+def index_feedback(feedback):
+    """Index one feedback item; True when its text changed since it was last indexed"""
+    return bool(index_feedback_batch([feedback]))
+
+
+def rebuild_index(batch_size=500):
+    """Index every feedback item whose text changed since it was last indexed; returns items re-indexed"""
+    indexed, batch = 0, []
+    for feedback in Feedback.objects.only('id', 'title', 'description').order_by('id').iterator(chunk_size=batch_size):
+        batch.append(feedback)
+        if len(batch) == batch_size:
+            indexed += index_feedback_batch(batch)
+            batch = []
+    return indexed + (index_feedback_batch(batch) if batch else 0)
+
+
+def find_similar(title, description='', queryset=None, exclude_id=None, threshold=SIMILAR_THRESHOLD, limit=DEFAULT_LIMIT):
+    """
+    Feedback whose text is similar to title/description, most similar first.
+
+    queryset limits the results (e.g. to what the user may see). Returns
+    a list of (feedback, similarity) pairs.
+    """
+    minhash = signature(normalize(title, description))
+    if (minhash == EMPTY).all():
+        return []
+    buckets = Q()
+    for band, bucket in band_buckets(minhash):
+        buckets |= Q(band=band, bucket=bucket)
+    candidates = FeedbackSignature.objects.filter(
+        feedback_id__in=FeedbackLSHBucket.objects.filter(buckets).values('feedback_id')
+    )
+    if exclude_id is not None:
+        candidates = candidates.exclude(feedback_id=exclude_id)
+    if queryset is not None:
+        candidates = candidates.filter(feedback_id__in=queryset.values('id'))
+    rows = list(candidates.values_list('feedback_id', 'minhash'))
+    if not rows:
+        return []
+
+    scores = similarity(minhash, np.array([np.frombuffer(bytes(value), dtype=np.uint32) for _, value in rows]))
+    ranked = [
+        (feedback_id, float(score))
+        for (feedback_id, _), score in zip(rows, scores)
+        if score >= threshold
+    ]
+    ranked.sort(key=lambda item: -item[1])
+    ranked = ranked[:limit]
+    feedback = Feedback.objects.in_bulk([feedback_id for feedback_id, _ in ranked])
+    return [(feedback[feedback_id], round(score, 3)) for feedback_id, score in ranked if feedback_id in feedback]
@@ -0,0 +1,86 @@
+"""
+Feedback statistics from conditional aggregation.
+
+Bucket counts for a visibility scope (managers: all feedback; everyone
+else: public statuses) are one query with a filtered COUNT per bucket and
+are cached until feedback is created, changed or deleted. The current
+user's own figures are a second single query that is never cached.
+"""
+from django.conf import settings
+from django.db.models import Count, FilteredRelation, Q
+
+from apps.dashboard.utils import get_or_compute
+from .models import Feedback
+from .utils import PUBLIC_STATUSES, get_feedback_stats_version, is_feedback_manager
+
+BUCKETS = {
+    'by_status': ('status', [choice for choice, _ in Feedback.STATUS_CHOICES]),
+    'by_category': ('category', [choice for choice, _ in Feedback.CATEGORY_CHOICES]),
+    'by_priority': ('priority', [choice for choice, _ in Feedback.PRIORITY_CHOICES]),
+}
+
+
+def _bucket_counts(condition=None):
+    """Filtered COUNT expressions for the total and every bucket, limited to condition"""
+    def counted(extra=None):
+        parts = [part for part in (condition, extra) if part is not None]
+        return Count('id', filter=Q(*parts) if parts else None)
+
+    counts = {'total': counted()}
+    for section, (field, values) in BUCKETS.items():
+        for value in values:
+            counts[f'{section}:{value}'] = counted(Q(**{field: value}))
+    return counts
+
+
+def _sections(row):
+    """{'total': n, 'by_status': {...}, ...} without empty buckets, like the GROUP BY output it replaces"""
+    stats = {'total': row['total']}
+    for section, (_, values) in BUCKETS.items():
+        stats[section] = {value: row[f'{section}:{value}'] for value in values if row[f'{section}:{value}']}
+    return stats
+
+
+def scope_stats(scope):
+    """Cached bucket counts of a visibility scope: 'all' or 'public'"""
+    def compute():
+        qs = Feedback.objects.order_by()
+        if scope == 'public':
+            qs = qs.filter(status__in=PUBLIC_STATUSES)
+        return _sections(qs.aggregate(**_bucket_counts()))
+
+    key = f'feedback_stats:v{get_feedback_stats_version()}:{scope}'
+    return get_or_compute(key, compute, settings.REPORT_CACHE_TIMEOUT)
+
+
+def feedback_stats(user):
+    """
+    Stats over the feedback user can see plus their own feedback and vote counts.
+    Non-managers also see their own non-public feedback; those buckets come
+    from the same query as their personal counts.
+    """
+    manager = is_feedback_manager(user)
+    stats = scope_stats('all' if manager else 'public')
+
+    own = Q(submitted_by=user)
+    mine = Feedback.objects.order_by().alias(
+        my_vote=FilteredRelation('votes', condition=Q(votes__user=user))
+    ).filter(own | Q(my_vote__isnull=False)).aggregate(
+        my_feedback_count=Count('id', filter=own),
+        my_votes_count=Count('my_vote'),
+        **({} if manager else _bucket_counts(own & ~Q(status__in=PUBLIC_STATUSES))),
+    )
+    if not manager:
+        private = _sections(mine)
+        stats = {
+            'total': stats['total'] + private['total'],
+            **{
+                section: {
+                    value: stats[section].get(value, 0) + private[section].get(value, 0)
+                    for value in values
+                    if stats[section].get(value) or private[section].get(value)
+                }
+                for section, (_, values) in BUCKETS.items()
+            },
+        }
+    return {**stats, 'my_feedback_count': mine['my_feedback_count'], 'my_votes_count': mine['my_votes_count']}
@@ -0,0 +1,257 @@
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.authentication.models import Permission, Role
+from apps.utility.refdata import clear_local
+from apps.utility.versions import bump_version
+from .counters import ViewCounter
+from .models import Feedback, FeedbackComment, FeedbackLSHBucket, FeedbackSignature, FeedbackVote
+from .similarity import BANDS, EMPTY, find_similar, normalize, rebuild_index, shingles, signature, similarity
+from .stats import feedback_stats
+
+User = get_user_model()
+
+
+def make_user(name, role=None, permissions=('feedback:read',)):
+    """A user with role, which is granted permissions; no role makes a superuser"""
+    if role is None:
+        return User.objects.create_superuser(email=f'{name}@example.com', username=name, password=name)
+    role = Role.objects.get_or_create(name=role)[0]
+    role.permissions.add(*[
+        Permission.objects.get_or_create(codename=codename, defaults={
+            'resource': codename.split(':')[0], 'action': codename.split(':')[1],
+        })[0]
+        for codename in permissions
+    ])
+    return User.objects.create_user(email=f'{name}@example.com', username=name, password=name, role=role)
+
+
+def make_feedback(user, title='Export invoices to Excel', status='pending', **kwargs):
+    kwargs.setdefault('description', f'{title}, please.')
+    return Feedback.objects.create(title=title, submitted_by=user, status=status, **kwargs)
+
+
+class FeedbackListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = make_user('manager')
+        cls.alice = make_user('alice', 'sales_person')
+        cls.bob = make_user('bob', 'sales_person')
+        cls.public = make_feedback(cls.bob, 'Dark mode')
+        cls.own = make_feedback(cls.alice, 'Bulk SMS reminders', status='under_review')
+        cls.hidden = make_feedback(cls.bob, 'Private idea', status='under_review')
+        FeedbackVote.objects.create(feedback=cls.public, user=cls.alice)
+        FeedbackComment.objects.create(feedback=cls.public, user=cls.bob, content='+1')
+        FeedbackComment.objects.create(feedback=cls.public, user=cls.manager, content='Planned for Q3', is_internal=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def rows(self, user, url=None):
+        self.client.force_authenticate(user)
+        response = self.client.get(url or reverse('feedback-list-create'))
+        self.assertEqual(response.status_code, 200)
+        return {row['title']: (row['has_voted'], row['comments_count']) for row in response.data['results']}
+
+    def test_sales_person_sees_own_and_public_feedback(self):
+        self.assertEqual(self.rows(self.alice), {
+            'Dark mode': (True, 1),
+            'Bulk SMS reminders': (False, 0),
+        })
+        self.assertEqual(self.rows(self.alice, reverse('my-feedback')), {'Bulk SMS reminders': (False, 0)})
+
+    def test_managers_count_internal_comments(self):
+        self.assertEqual(self.rows(self.manager), {
+            'Dark mode': (False, 2),
+            'Bulk SMS reminders': (False, 0),
+            'Private idea': (False, 0),
+        })
+
+    def test_page_costs_the_same_whatever_its_size(self):
+        self.client.force_authenticate(self.manager)
+        url = reverse('feedback-list-create')
+        self.client.get(url)
+        with self.assertNumQueries(3):
+            # The paginator count, the page and the activity log
+            self.client.get(url, {'page_size': 1})
+        with self.assertNumQueries(3):
+            self.client.get(url, {'page_size': 3})
+
+
+def view_counts(*feedback):
+    return list(Feedback.objects.filter(pk__in=[item.pk for item in feedback]).order_by('pk').values_list('view_count', flat=True))
+
+
+class ViewCounterTests(TestCase):
+
+    def setUp(self):
+        self.first, self.second = make_feedback(None, 'Dark mode'), make_feedback(None, 'Bulk SMS reminders')
+
+    def test_flush_on_size(self):
+        counter = ViewCounter(interval=3600, max_pending=2)
+        self.addCleanup(counter.stop)
+        self.assertEqual([counter.record(self.first.pk), counter.record(self.first.pk)], [1, 2])
+        self.assertEqual(view_counts(self.first, self.second), [0, 0])
+
+        # The second pending item fills the buffer
+        self.assertEqual(counter.record(self.second.pk), 1)
+        self.assertEqual(view_counts(self.first, self.second), [2, 1])
+        self.assertEqual(counter.pending, {})
+
+    def test_stop_writes_what_is_pending(self):
+        counter = ViewCounter(interval=3600, max_pending=100)
+        counter.record(self.first.pk)
+        self.assertEqual(counter.stop(), 1)
+        self.assertEqual(view_counts(self.first), [1])
+        self.assertFalse(counter.timer.is_alive())
+
+    def test_detail_adds_buffered_views(self):
+        client = APIClient()
+        client.force_authenticate(make_user('manager'))
+        url = reverse('feedback-detail', args=[self.first.pk])
+        with mock.patch('apps.feedback.counters.view_counter', ViewCounter(interval=3600, max_pending=100)) as counter:
+            self.addCleanup(counter.stop)
+            self.assertEqual([client.get(url).data['view_count'] for _ in range(2)], [1, 2])
+        self.assertEqual(view_counts(self.first), [0])
+
+
+class ViewCounterIntervalTests(TransactionTestCase):
+
+    def test_flush_on_interval_without_further_views(self):
+        feedback = make_feedback(None)
+        counter = ViewCounter(interval=0.05, max_pending=100)
+        self.addCleanup(counter.stop)
+        # A clock that never moves: only the timer thread can flush
+        with mock.patch('apps.feedback.counters.time.monotonic', return_value=0):
+            counter.last_flush = 0
+            counter.record(feedback.pk)
+            counter.record(feedback.pk)
+            deadline = time.time() + 5
+            while view_counts(feedback) != [2] and time.time() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(view_counts(feedback), [2])
+        self.assertEqual(counter.pending, {})
+
+
+class FeedbackStatsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = make_user('manager')
+        cls.alice = make_user('alice', 'sales_person')
+        cls.bob = make_user('bob', 'sales_person')
+        make_feedback(cls.bob, 'Dark mode', category='ui_ux', priority='low')
+        make_feedback(cls.bob, 'Faster search', status='completed', category='performance')
+        make_feedback(cls.bob, 'Private idea', status='under_review')
+        voted = make_feedback(cls.alice, 'Bulk SMS reminders', status='on_hold', priority='high')
+        FeedbackVote.objects.create(feedback=voted, user=cls.bob)
+        FeedbackVote.objects.create(feedback=Feedback.objects.get(title='Dark mode'), user=cls.alice)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_manager_sees_every_bucket(self):
+        stats = feedback_stats(self.manager)
+        self.assertEqual(stats['total'], 4)
+        self.assertEqual(stats['by_status'], {'pending': 1, 'under_review': 1, 'completed': 1, 'on_hold': 1})
+        self.assertEqual(stats['by_priority'], {'low': 1, 'medium': 2, 'high': 1})
+        self.assertEqual((stats['my_feedback_count'], stats['my_votes_count']), (0, 0))
+
+    def test_others_see_public_and_their_own(self):
+        alice = feedback_stats(self.alice)
+        self.assertEqual(alice['total'], 3)
+        self.assertEqual(alice['by_status'], {'pending': 1, 'completed': 1, 'on_hold': 1})
+        self.assertEqual(alice['by_category'], {'ui_ux': 1, 'performance': 1, 'feature_request': 1})
+        self.assertEqual((alice['my_feedback_count'], alice['my_votes_count']), (1, 1))
+
+        bob = feedback_stats(self.bob)
+        self.assertEqual(bob['by_status'], {'pending': 1, 'completed': 1, 'under_review': 1})
+        self.assertEqual((bob['my_feedback_count'], bob['my_votes_count']), (3, 1))
+
+    def test_scope_is_cached_until_feedback_changes(self):
+        feedback_stats(self.alice)
+        with self.assertNumQueries(2):
+            # The stats version and the personal figures only
+            self.assertEqual(feedback_stats(self.bob)['total'], 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            make_feedback(self.manager, 'Audit log export', status='approved')
+        self.assertEqual(feedback_stats(self.bob)['by_status']['approved'], 1)
+
+    def test_cache_follows_writes_from_other_workers(self):
+        self.assertEqual(feedback_stats(self.alice)['total'], 3)
+        make_feedback(self.manager, 'Audit log export', status='approved')
+        # The bump of the worker that wrote it reaches this one through the database
+        bump_version('feedback_stats')
+        self.assertEqual(feedback_stats(self.alice)['total'], 4)
+
+
+class FeedbackSimilarityTests(TestCase):
+
+    def setUp(self):
+        self.bob = make_user('bob', 'sales_person')
+        self.export = make_feedback(self.bob, 'Export invoices to Excel', description='Download the invoice list as xlsx')
+        self.dark = make_feedback(self.bob, 'Dark mode', description='A dark theme for the dashboard at night')
+
+    def test_signature_estimates_jaccard(self):
+        first = normalize('Export invoices to Excel', 'Download the invoice list as xlsx')
+        second = normalize('Export the invoices to Excel', 'Download invoice lists as xlsx files')
+        exact = len(shingles(first) & shingles(second)) / len(shingles(first) | shingles(second))
+        estimate, = similarity(signature(first), signature(second)[None, :])
+        self.assertAlmostEqual(estimate, exact, delta=0.15)
+        self.assertEqual(similarity(signature(first), signature(first)[None, :])[0], 1.0)
+        self.assertTrue((signature('') == EMPTY).all())
+
+    def test_saving_indexes_changed_text(self):
+        self.assertEqual(FeedbackLSHBucket.objects.filter(feedback=self.export).count(), BANDS)
+        text_hash = FeedbackSignature.objects.get(feedback=self.export).text_hash
+
+        self.export.status = 'approved'
+        self.export.save(update_fields=['status'])
+        self.export.save()
+        self.assertEqual(FeedbackSignature.objects.get(feedback=self.export).text_hash, text_hash)
+
+        self.export.title = 'Export payments to Excel'
+        self.export.save()
+        self.assertNotEqual(FeedbackSignature.objects.get(feedback=self.export).text_hash, text_hash)
+        self.assertEqual(FeedbackLSHBucket.objects.filter(feedback=self.export).count(), BANDS)
+
+    def test_find_similar(self):
+        similar = find_similar('Export the invoices to Excel', 'Download invoice lists as xlsx files')
+        self.assertEqual([feedback for feedback, _ in similar], [self.export])
+        self.assertEqual(find_similar('Export the invoices to Excel', exclude_id=self.export.pk, threshold=0.1), [])
+        self.assertEqual(find_similar('Export the invoices to Excel', queryset=Feedback.objects.none()), [])
+        self.assertEqual(find_similar('!!!'), [])
+
+    def test_rebuild_index(self):
+        FeedbackSignature.objects.all().delete()
+        FeedbackLSHBucket.objects.all().delete()
+        self.assertEqual(rebuild_index(batch_size=1), 2)
+        self.assertEqual(rebuild_index(), 0)
+        self.assertEqual(find_similar('Dark mode', 'A dark theme for the dashboard')[0][0], self.dark)
+
+    def test_endpoints(self):
+        client = APIClient()
+        client.force_authenticate(make_user('alice', 'sales_person', ['feedback:read', 'feedback:create']))
+        # Role permissions are cached reference data
+        cache.clear()
+        clear_local()
+        url = reverse('feedback-list-create')
+        duplicate = {'title': 'Export invoices to Excel', 'description': 'Download the invoice list as xlsx please'}
+
+        response = client.post(url, duplicate)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([int(item['id']) for item in response.data['possible_duplicates']], [self.export.pk])
+        self.assertEqual(client.post(url, {**duplicate, 'ignore_duplicates': True}).status_code, 201)
+
+        similar = client.get(reverse('feedback-similar', args=[self.export.pk])).data
+        self.assertEqual([item['title'] for item in similar], ['Export invoices to Excel'])
+        self.assertGreaterEqual(similar[0]['similarity'], 0.6)
+        self.assertEqual(client.get(reverse('feedback-similar', args=[self.export.pk]), {'limit': 'x'}).status_code, 400)
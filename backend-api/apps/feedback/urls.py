@@ -3,6 +3,7 @@ from .views import (
     FeedbackListCreateView,
     FeedbackDetailView,
     FeedbackVoteView,
+    FeedbackSimilarView,
     FeedbackCommentListCreateView,
     FeedbackCommentDetailView,
     FeedbackStatsView,
@@ -17,6 +18,9 @@ urlpatterns = [
     # Voting
     path('<int:pk>/vote/', FeedbackVoteView.as_view(), name='feedback-vote'),
     
+    # Near-duplicates
+    path('<int:pk>/similar/', FeedbackSimilarView.as_view(), name='feedback-similar'),
+    
     # Comments
     path('<int:feedback_id>/comments/', FeedbackCommentListCreateView.as_view(), name='feedback-comments'),
     path('comments/<int:pk>/', FeedbackCommentDetailView.as_view(), name='feedback-comment-detail'),
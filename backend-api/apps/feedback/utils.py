@@ -0,0 +1,28 @@
+"""
+Utility functions for feedback operations
+"""
+from apps.utility.versions import bump_version, get_version
+
+
+# Roles that review feedback and see internal notes and comments
+MANAGER_ROLES = ['super_admin', 'admin', 'sales_manager']
+
+# Statuses every user can see; sales persons otherwise only see their own feedback
+PUBLIC_STATUSES = ['pending', 'approved', 'completed']
+
+
+def is_feedback_manager(user):
+    """True for superusers and reviewer roles"""
+    if not user or not user.is_authenticated:
+        return False
+    return user.is_superuser or bool(getattr(user, 'role', None) and user.role.name in MANAGER_ROLES)
+
+
+def get_feedback_stats_version():
+    """Current feedback stats version; cached stats embed it in their keys"""
+    return get_version('feedback_stats')
+
+
+def bump_feedback_stats_version():
+    """Invalidate every cached feedback stats scope"""
+    bump_version('feedback_stats')
@@ -1,11 +1,14 @@
 from rest_framework import generics, permissions, filters, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.exceptions import ValidationError
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q, Count
 from .models import Feedback, FeedbackComment, FeedbackVote
+from .similarity import DEFAULT_LIMIT, find_similar
+from .stats import feedback_stats
 from .serializers import (
     FeedbackSerializer,
+    FeedbackListSerializer,
     FeedbackCreateSerializer,
     FeedbackUpdateSerializer,
     FeedbackStatusUpdateSerializer,
@@ -13,6 +16,7 @@ from .serializers import (
     FeedbackVoteSerializer
 )
 from apps.authentication.permissions import RequirePermissions
+from config.serializers import FieldSelection
 
 
 class FeedbackListCreateView(generics.ListCreateAPIView):
@@ -30,21 +34,8 @@ class FeedbackListCreateView(generics.ListCreateAPIView):
     ordering = ['-created_at']
 
     def get_queryset(self):
-        qs = Feedback.objects.select_related(
-            'submitted_by', 'reviewed_by'
-        ).prefetch_related(
-            'comments', 'votes'
-        ).annotate(
-            comments_count=Count('comments', filter=Q(comments__is_internal=False))
-        ).all()
-
-        user = self.request.user
-        
         # Sales persons can only see their own feedback and public feedback
-        if user.role and user.role.name == 'sales_person':
-            qs = qs.filter(
-                Q(submitted_by=user) | Q(status__in=['pending', 'approved', 'completed'])
-            )
+        qs = Feedback.objects.visible_to(self.request.user).for_list(self.request.user, FieldSelection.for_view(self))
         
         # Filter by status if provided
         status_filter = self.request.query_params.get('status')
@@ -61,7 +52,7 @@ class FeedbackListCreateView(generics.ListCreateAPIView):
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return FeedbackCreateSerializer
-        return FeedbackSerializer
+        return FeedbackListSerializer
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -77,11 +68,7 @@ class FeedbackDetailView(generics.RetrieveUpdateDestroyAPIView):
     """
     Retrieve, update, or delete a specific feedback item
     """
-    queryset = Feedback.objects.select_related(
-        'submitted_by', 'reviewed_by'
-    ).prefetch_related(
-        'comments__user', 'votes__user'
-    ).all()
+    queryset = Feedback.objects.all()
     permission_classes = [permissions.IsAuthenticated, RequirePermissions]
     required_permissions = ['feedback:read']
 
@@ -123,15 +110,15 @@ class FeedbackDetailView(generics.RetrieveUpdateDestroyAPIView):
         if getattr(self, 'swagger_fake_view', False):
             return qs
         
-        user = self.request.user
+        selection = FieldSelection.for_view(self)
+        for field, relation in [('submitted_by_details', 'submitted_by'), ('reviewed_by_details', 'reviewed_by')]:
+            if selection.wants(field):
+                qs = qs.select_related(relation)
+        if selection.wants('comments'):
+            qs = qs.prefetch_related('comments__user')
         
         # Sales persons can only see their own feedback and public feedback
-        if user.is_authenticated and hasattr(user, 'role') and user.role and user.role.name == 'sales_person':
-            qs = qs.filter(
-                Q(submitted_by=user) | Q(status__in=['pending', 'approved', 'completed'])
-            )
-        
-        return qs
+        return qs.visible_to(self.request.user)
 
 
 class FeedbackVoteView(APIView):
@@ -159,6 +146,7 @@ class FeedbackVoteView(APIView):
             user=request.user
         )
 
+        feedback.refresh_from_db(fields=['vote_count'])
         if created:
             serializer = FeedbackVoteSerializer(vote)
             return Response({
@@ -187,6 +175,7 @@ class FeedbackVoteView(APIView):
         try:
             vote = FeedbackVote.objects.get(feedback=feedback, user=request.user)
             vote.delete()
+            feedback.refresh_from_db(fields=['vote_count'])
             return Response({
                 'success': True,
                 'message': 'Vote removed successfully',
@@ -199,6 +188,43 @@ class FeedbackVoteView(APIView):
             }, status=status.HTTP_400_BAD_REQUEST)
 
 
+class FeedbackSimilarView(APIView):
+    """
+    Feedback items whose title and description resemble this one
+    GET /api/feedback/<id>/similar/
+    Query parameters:
+    - limit: Maximum items returned (default: 10, max: 50)
+    """
+    permission_classes = [permissions.IsAuthenticated, RequirePermissions]
+    required_permissions = ['feedback:read']
+
+    def get(self, request, pk):
+        visible = Feedback.objects.visible_to(request.user)
+        feedback = visible.filter(pk=pk).only('id', 'title', 'description').first()
+        if feedback is None:
+            return Response(
+                {'detail': 'Feedback not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        try:
+            limit = min(max(int(request.query_params.get('limit', DEFAULT_LIMIT)), 1), 50)
+        except ValueError:
+            raise ValidationError({'limit': 'limit must be an integer.'})
+
+        similar = find_similar(feedback.title, feedback.description, queryset=visible, exclude_id=feedback.id, limit=limit)
+        return Response([
+            {
+                'id': item.id,
+                'title': item.title,
+                'category': item.category,
+                'status': item.status,
+                'vote_count': item.vote_count,
+                'similarity': score,
+            }
+            for item, score in similar
+        ])
+
+
 class FeedbackCommentListCreateView(generics.ListCreateAPIView):
     """
     List comments or add a comment to a feedback item
@@ -313,37 +339,8 @@ class FeedbackStatsView(APIView):
     required_permissions = ['feedback:read']
 
     def get(self, request):
-        """Get feedback statistics"""
-        user = self.request.user
-        is_admin = user.is_superuser or (
-            user.role and user.role.name in ['super_admin', 'admin', 'sales_manager']
-        )
-
-        # Base queryset
-        if is_admin:
-            qs = Feedback.objects.all()
-        else:
-            # Regular users see their own feedback and public ones
-            qs = Feedback.objects.filter(
-                Q(submitted_by=user) | Q(status__in=['pending', 'approved', 'completed'])
-            )
-
-        stats = {
-            'total': qs.count(),
-            'by_status': dict(qs.values('status').annotate(
-                count=Count('id')
-            ).values_list('status', 'count')),
-            'by_category': dict(qs.values('category').annotate(
-                count=Count('id')
-            ).values_list('category', 'count')),
-            'by_priority': dict(qs.values('priority').annotate(
-                count=Count('id')
-            ).values_list('priority', 'count')),
-            'my_feedback_count': Feedback.objects.filter(submitted_by=user).count() if user.is_authenticated else 0,
-            'my_votes_count': FeedbackVote.objects.filter(user=user).count() if user.is_authenticated else 0,
-        }
-
-        return Response(stats)
+        """Get feedback statistics (cached per visibility scope)"""
+        return Response(feedback_stats(request.user))
 
 
 class MyFeedbackView(generics.ListAPIView):
@@ -353,7 +350,7 @@ class MyFeedbackView(generics.ListAPIView):
     """
     permission_classes = [permissions.IsAuthenticated, RequirePermissions]
     required_permissions = ['feedback:read']
-    serializer_class = FeedbackSerializer
+    serializer_class = FeedbackListSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['status', 'category', 'priority']
     search_fields = ['title', 'description']
@@ -361,11 +358,7 @@ class MyFeedbackView(generics.ListAPIView):
     ordering = ['-created_at']
 
     def get_queryset(self):
-        return Feedback.objects.filter(
-            submitted_by=self.request.user
-        ).select_related('submitted_by', 'reviewed_by').prefetch_related(
-            'comments', 'votes'
-        ).all()
+        return Feedback.objects.filter(submitted_by=self.request.user).for_list(self.request.user, FieldSelection.for_view(self))
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
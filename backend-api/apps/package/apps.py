@@ -4,4 +4,3 @@ from django.apps import AppConfig
 class PackageConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.package'
-
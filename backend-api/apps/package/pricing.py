@@ -0,0 +1,99 @@
+"""
+Effective package prices by date.
+
+All pricings are held in a PricingIndex. The active ones are flattened
+per package into non-overlapping segments sorted by start date, so the
+price of package X on date D is one bisect. Where validity windows
+overlap, the pricing that started last wins. A line linked to a pricing
+keeps that pricing while it is valid; the package's price only stands in
+for a link that has expired or been deactivated. The index is built from the
+packages reference-data snapshot, so it is rebuilt whenever
+PackagePricing changes.
+"""
+import heapq
+from bisect import bisect_right
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+
+from apps.utility import refdata
+
+
+Price = namedtuple('Price', ['pricing_id', 'package_id', 'rate', 'mbps', 'val_start_at', 'val_end_at'])
+
+
+def _segments(prices):
+    """
+    Non-overlapping (start, Price or None) segments of one package's active
+    prices; each segment lasts until the next one starts.
+    """
+    prices = sorted(prices, key=lambda price: (price.val_start_at, price.pricing_id))
+    points = sorted({price.val_start_at for price in prices} | {price.val_end_at + timedelta(days=1) for price in prices})
+    segments, covering, position = [], [], 0
+    for point in points:
+        while position < len(prices) and prices[position].val_start_at <= point:
+            price = prices[position]
+            heapq.heappush(covering, (-price.val_start_at.toordinal(), -price.pricing_id, price))
+            position += 1
+        # Drop windows that ended before this point
+        while covering and covering[0][2].val_end_at < point:
+            heapq.heappop(covering)
+        current = covering[0][2] if covering else None
+        if not segments or segments[-1][1] != current:
+            segments.append((point, current))
+    return segments
+
+
+class PricingIndex:
+    """Per-package sorted price segments plus every pricing by id"""
+
+    def __init__(self, prices):
+        self.by_id = {price.pricing_id: price for price, _ in prices}
+        self.active_ids = set()
+        by_package = defaultdict(list)
+        for price, is_active in prices:
+            if is_active:
+                self.active_ids.add(price.pricing_id)
+                by_package[price.package_id].append(price)
+        self.starts, self.values = {}, {}
+        for package_id, package_prices in by_package.items():
+            segments = _segments(package_prices)
+            self.starts[package_id] = [start for start, _ in segments]
+            self.values[package_id] = [price for _, price in segments]
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Index pricing rows with id, package_master_id, rate, mbps, val_start_at, val_end_at, is_active"""
+        return cls([(Price(
+            row['id'], row['package_master_id'], row['rate'], row['mbps'], row['val_start_at'], row['val_end_at']
+        ), row['is_active']) for row in rows])
+
+    def resolve(self, package_id, on_date):
+        """The Price of package_id effective on on_date, or None"""
+        starts = self.starts.get(package_id)
+        if not starts:
+            return None
+        position = bisect_right(starts, on_date) - 1
+        return self.values[package_id][position] if position >= 0 else None
+
+    def resolve_pricing(self, pricing_id, on_date):
+        """
+        Price for a line linked to pricing_id: the linked pricing while it is
+        active and valid on on_date, else its package's price effective on
+        on_date, else the linked pricing itself. None for an unknown id.
+        """
+        linked = self.by_id.get(pricing_id)
+        if linked is None:
+            return None
+        if pricing_id in self.active_ids and linked.val_start_at <= on_date <= linked.val_end_at:
+            return linked
+        return self.resolve(linked.package_id, on_date) or linked
+
+
+def get_pricing_index():
+    """The PricingIndex of the current packages snapshot"""
+    return refdata.packages().pricing_index
+
+
+def resolve_price(package_id, on_date):
+    """The effective Price of a package on a date, or None"""
+    return get_pricing_index().resolve(package_id, on_date)
@@ -2,10 +2,12 @@
 Serializers for Package App
 """
 from rest_framework import serializers
+from config.serializers import SparseFieldsMixin
 from .models import PackageMaster, PackagePricing
+from .pricing import resolve_price
 
 
-class PackagePricingSerializer(serializers.ModelSerializer):
+class PackagePricingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     package_name = serializers.CharField(source='package_master_id.package_name', read_only=True)
     package_type = serializers.CharField(source='package_master_id.package_type', read_only=True)
     
@@ -15,7 +17,7 @@ class PackagePricingSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
 
 
-class PackageMasterSerializer(serializers.ModelSerializer):
+class PackageMasterSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     pricings = PackagePricingSerializer(many=True, read_only=True)
     active_pricing = serializers.SerializerMethodField()
     pricings_count = serializers.SerializerMethodField()
@@ -24,16 +26,16 @@ class PackageMasterSerializer(serializers.ModelSerializer):
         model = PackageMaster
         fields = '__all__'
         read_only_fields = ['created_at', 'updated_at']
+        expandable_fields = ['pricings']
     
     def get_active_pricing(self, obj):
         """Get currently active pricing"""
         from django.utils import timezone
-        today = timezone.now().date()
-        active = obj.pricings.filter(
-            is_active=True,
-            val_start_at__lte=today,
-            val_end_at__gte=today
-        ).first()
+        price = resolve_price(obj.id, timezone.localdate())
+        if price is None:
+            return None
+        # Taken from the prefetched pricings rather than queried per package
+        active = next((pricing for pricing in obj.pricings.all() if pricing.id == price.pricing_id), None)
         if active:
             return PackagePricingSerializer(active).data
         return None
@@ -41,3 +43,8 @@ class PackageMasterSerializer(serializers.ModelSerializer):
     def get_pricings_count(self, obj):
         return obj.pricings.count()
 
+
+
+class PackageMasterSnapshotSerializer(PackageMasterSerializer):
+    """Package payload cached as reference data; active_pricing depends on the day and is added at read time"""
+    active_pricing = None
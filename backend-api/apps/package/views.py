@@ -5,14 +5,19 @@ from rest_framework import viewsets, generics, permissions, filters, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from django_filters.rest_framework import DjangoFilterBackend
+from django.utils import timezone
 from .models import PackageMaster, PackagePricing
 from .serializers import PackageMasterSerializer, PackagePricingSerializer
+from .pricing import resolve_price
 from apps.authentication.permissions import RequirePermissions
+from apps.bills.utils import parse_date_param
+from apps.utility import refdata
+from config.serializers import FieldSelection
 
 
 class PackageMasterViewSet(viewsets.ModelViewSet):
     """CRUD for Package Master"""
-    queryset = PackageMaster.objects.prefetch_related('pricings').filter(is_active=True)
+    queryset = PackageMaster.objects.filter(is_active=True)
     serializer_class = PackageMasterSerializer
     permission_classes = [permissions.IsAuthenticated, RequirePermissions]
     required_permissions = ['packages:read']
@@ -23,15 +28,36 @@ class PackageMasterViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         # Allow viewing inactive packages for admin
-        if self.request.user.is_superuser:
-            return PackageMaster.objects.prefetch_related('pricings').all()
-        return self.queryset
+        qs = PackageMaster.objects.all() if self.request.user.is_superuser else self.queryset
+        if FieldSelection.for_view(self).wants('pricings', 'active_pricing', 'pricings_count'):
+            qs = qs.prefetch_related('pricings')
+        return qs
     
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             self.required_permissions = ['packages:write']
         return PackageMasterSerializer
     
+    def list(self, request, *args, **kwargs):
+        # Unfiltered lists are paged straight out of the packages snapshot
+        if not refdata.is_unfiltered_list(self):
+            return super().list(request, *args, **kwargs)
+        snapshot = refdata.packages()
+        packages = [item for item in snapshot.packages if request.user.is_superuser or item['is_active']]
+        page = self.paginate_queryset(packages)
+        selection = FieldSelection.for_view(self)
+        today = timezone.localdate()
+        data = []
+        for item in (packages if page is None else page):
+            item = dict(item)
+            if selection.wants('active_pricing'):
+                price = snapshot.pricing_index.resolve(item['id'], today)
+                item['active_pricing'] = next(
+                    (pricing for pricing in item['pricings'] if price and pricing['id'] == price.pricing_id), None
+                )
+            data.append(selection.trim(item))
+        return Response(data) if page is None else self.get_paginated_response(data)
+    
     @action(detail=True, methods=['get'])
     def pricings(self, request, pk=None):
         """Get all pricings for a package"""
@@ -39,11 +65,37 @@ class PackageMasterViewSet(viewsets.ModelViewSet):
         pricings = package.pricings.all()
         serializer = PackagePricingSerializer(pricings, many=True)
         return Response(serializer.data)
+    
+    @action(detail=True, methods=['get'])
+    def price(self, request, pk=None):
+        """
+        Effective rate and mbps of a package on a date
+        Query parameters:
+        - date: YYYY-MM-DD (default: today)
+        """
+        package = self.get_object()
+        on_date = request.query_params.get('date')
+        on_date = parse_date_param(on_date, 'date') if on_date else timezone.localdate()
+        price = resolve_price(package.id, on_date)
+        if price is None:
+            return Response(
+                {'detail': f'No active pricing for this package on {on_date}'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response({
+            'package_id': package.id,
+            'date': on_date,
+            'pricing_id': price.pricing_id,
+            'rate': float(price.rate) if price.rate is not None else None,
+            'mbps': price.mbps,
+            'val_start_at': price.val_start_at,
+            'val_end_at': price.val_end_at,
+        })
 
 
 class PackagePricingViewSet(viewsets.ModelViewSet):
     """CRUD for Package Pricing"""
-    queryset = PackagePricing.objects.select_related('package_master_id').filter(is_active=True)
+    queryset = PackagePricing.objects.filter(is_active=True)
     serializer_class = PackagePricingSerializer
     permission_classes = [permissions.IsAuthenticated, RequirePermissions]
     required_permissions = ['package_pricing:read']
@@ -52,9 +104,10 @@ class PackagePricingViewSet(viewsets.ModelViewSet):
     ordering_fields = ['val_start_at', 'val_end_at', 'created_at']
     
     def get_queryset(self):
-        if self.request.user.is_superuser:
-            return PackagePricing.objects.select_related('package_master_id').all()
-        return self.queryset
+        qs = PackagePricing.objects.all() if self.request.user.is_superuser else self.queryset
+        if FieldSelection.for_view(self).wants('package_name', 'package_type'):
+            qs = qs.select_related('package_master_id')
+        return qs
     
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
@@ -5,3 +5,5 @@ class PaymentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.payment'
 
+    def ready(self):
+        from . import signals  # noqa: F401
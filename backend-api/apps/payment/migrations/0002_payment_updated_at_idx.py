@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bills', '0008_invoicemaster_invoice_updated_at_idx'),
+        ('payment', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paymentdetails',
+            index=models.Index(fields=['updated_at'], name='payment_details_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentmaster',
+            index=models.Index(fields=['updated_at'], name='payment_master_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bills', '0009_created_by_idx'),
+        ('payment', '0002_payment_updated_at_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paymentmaster',
+            index=models.Index(fields=['created_by', 'created_at'], name='payment_master_created_by_idx'),
+        ),
+    ]
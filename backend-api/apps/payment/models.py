@@ -2,6 +2,23 @@ from django.db import models
 from django.conf import settings
 
 
+class PaymentMasterQuerySet(models.QuerySet):
+
+    def for_list(self, selection=None):
+        """
+        Join and prefetch what PaymentMasterSerializer reads, so a page costs a fixed number of queries;
+        with a FieldSelection, only what its fields read
+        """
+        qs = self
+        if selection is None or selection.wants('customer_name', 'customer_id'):
+            qs = qs.select_related('customer_entitlement_master_id__customer_master_id')
+        if selection is None or selection.wants('invoice_number', 'invoice_amount', 'invoice_balance'):
+            qs = qs.select_related('invoice_master_id')
+        if selection is None or selection.wants('details', 'total_paid', 'details_count'):
+            qs = qs.prefetch_related('details')
+        return qs
+
+
 class PaymentMaster(models.Model):
     """Payment Master - Main payment record"""
     
@@ -42,9 +59,15 @@ class PaymentMaster(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = PaymentMasterQuerySet.as_manager()
+
     class Meta:
         db_table = 'payment_master'
         ordering = ['-payment_date']
+        indexes = [
+            models.Index(fields=['updated_at'], name='payment_master_updated_idx'),
+            models.Index(fields=['created_by', 'created_at'], name='payment_master_created_by_idx'),
+        ]
 
     def __str__(self):
         return f"Payment #{self.id} - {self.payment_date} - {self.payment_method}"
@@ -86,6 +109,9 @@ class PaymentDetails(models.Model):
     class Meta:
         db_table = 'payment_details'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['updated_at'], name='payment_details_updated_idx'),
+        ]
 
     def __str__(self):
         return f"Payment Detail #{self.id} - {self.pay_amount}"
@@ -0,0 +1,411 @@
+"""
+Bank / bKash / Nagad statement reconciliation for the Payment App
+"""
+import csv
+import io
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import F, Sum, Case, When, Value, OuterRef, Subquery, DecimalField, CharField
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import LessThanOrEqual
+from django.utils import timezone
+
+from apps.bills.closing import SETTLEMENT_STATUSES, PeriodClosedError, check_open, closed_through
+from apps.bills.models import InvoiceMaster
+from apps.bills.utils import bump_billing_version
+from apps.dashboard.events import kpi_delta, publish_on_commit
+from .models import PaymentMaster, PaymentDetails
+from .utils import bump_payments_version
+
+
+STATEMENT_DATE_FORMATS = ['%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y']
+
+# Header aliases seen in bank and wallet exports -> canonical column
+STATEMENT_COLUMNS = {
+    'transaction_id': ['transaction_id', 'trx_id', 'trxid', 'txn_id', 'reference_no'],
+    'invoice_number': ['invoice_number', 'invoice_no', 'invoice'],
+    'customer_id': ['customer_id'],
+    'customer_name': ['customer_name', 'payer', 'payer_name', 'name'],
+    'amount': ['amount', 'credit', 'pay_amount'],
+    'date': ['date', 'payment_date', 'transaction_date', 'value_date'],
+    'payment_method': ['payment_method', 'channel', 'method'],
+    'remarks': ['remarks', 'narration', 'description'],
+}
+
+OPEN_INVOICE_EXCLUDED_STATUSES = ['paid', 'cancelled']
+
+
+def _money():
+    return DecimalField(max_digits=12, decimal_places=2)
+
+
+class StatementLine:
+    """One parsed statement row"""
+
+    __slots__ = (
+        'row_number', 'transaction_id', 'invoice_number', 'customer_id', 'customer_name',
+        'amount', 'date', 'payment_method', 'remarks', 'raw',
+    )
+
+    def __init__(self, row_number, raw):
+        self.row_number = row_number
+        self.raw = raw
+
+    def as_dict(self):
+        return {'row': self.row_number, **self.raw}
+
+
+class StatementReconciler:
+    """
+    Match statement lines to open invoices and apply them in bulk.
+
+    Lines are matched, in order, by:
+    1. transaction_id of an already recorded pending payment (confirms it)
+    2. invoice_number
+    3. customer (id or exact name) + amount equal to an open balance,
+       or any amount up to the balance when the customer has a single open invoice
+
+    apply() re-checks the matches against locked rows before writing.
+    """
+
+    def __init__(self, user=None, default_payment_method='', default_date=None):
+        self.user = user
+        self.default_payment_method = default_payment_method
+        self.default_date = default_date or timezone.now().date()
+
+        self.row_count = 0
+        self.lines = []
+        self.unmatched = []
+        self.to_confirm = []
+        self.to_create = []
+
+    # ---- parsing -------------------------------------------------------
+
+    @staticmethod
+    def _header_map(fieldnames):
+        normalized = {name.strip().lower().replace(' ', '_'): name for name in fieldnames if name}
+        mapping = {}
+        for column, aliases in STATEMENT_COLUMNS.items():
+            for alias in aliases:
+                if alias in normalized:
+                    mapping[column] = normalized[alias]
+                    break
+        return mapping
+
+    @staticmethod
+    def _parse_date(value):
+        for fmt in STATEMENT_DATE_FORMATS:
+            try:
+                return datetime.strptime(value, fmt).date()
+            except ValueError:
+                continue
+        raise ValueError(f"Invalid date '{value}'")
+
+    def read_csv(self, uploaded_file):
+        """
+        Parse the statement row by row from the uploaded file.
+        Returns a list of header errors (empty when the file is usable).
+        """
+        reader = csv.DictReader(io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', newline=''))
+        if not reader.fieldnames:
+            return ['Invalid CSV file: No headers found']
+
+        headers = self._header_map(reader.fieldnames)
+        if 'amount' not in headers:
+            return ["Missing required column 'amount'"]
+        if not {'transaction_id', 'invoice_number', 'customer_id', 'customer_name'} & set(headers):
+            return ['Need at least one of: transaction_id, invoice_number, customer_id, customer_name']
+
+        for row_number, row in enumerate(reader, start=2):
+            self.row_count += 1
+            line = StatementLine(row_number, row)
+            values = {column: (row.get(source) or '').strip() for column, source in headers.items()}
+            try:
+                amount = Decimal(values.get('amount', '').replace(',', ''))
+            except InvalidOperation:
+                self._reject(line, f"Invalid amount '{values.get('amount', '')}'")
+                continue
+            if amount <= 0:
+                # Debits and zero lines are not customer payments
+                self._reject(line, 'Not a credit')
+                continue
+            try:
+                line.date = self._parse_date(values['date']) if values.get('date') else self.default_date
+            except ValueError as e:
+                self._reject(line, str(e))
+                continue
+
+            line.payment_method = values.get('payment_method') or self.default_payment_method
+            if not line.payment_method:
+                self._reject(line, 'Missing payment_method')
+                continue
+
+            line.amount = amount
+            line.transaction_id = values.get('transaction_id', '')
+            line.invoice_number = values.get('invoice_number', '').upper()
+            line.customer_id = values.get('customer_id', '')
+            line.customer_name = values.get('customer_name', '').lower()
+            line.remarks = values.get('remarks', '')
+            self.lines.append(line)
+        return []
+
+    def _reject(self, line, reason):
+        self.unmatched.append({**line.as_dict(), 'reason': reason})
+
+    # ---- matching ------------------------------------------------------
+
+    def _open_invoices(self):
+        """All open invoices with the columns needed for matching, in one query"""
+        return InvoiceMaster.objects.exclude(
+            status__in=OPEN_INVOICE_EXCLUDED_STATUSES
+        ).filter(total_balance_due__gt=0).order_by('issue_date', 'id').values(
+            'id',
+            'invoice_number',
+            'total_balance_due',
+            'customer_entitlement_master_id',
+            'customer_entitlement_master_id__customer_master_id',
+            'customer_entitlement_master_id__customer_master_id__customer_name',
+        )
+
+    def match(self):
+        """Resolve every parsed line against in-memory hash indexes"""
+        by_number = {}
+        by_customer_id = defaultdict(list)
+        by_customer_name = defaultdict(list)
+        for invoice in self._open_invoices():
+            # Running balance so several lines against one invoice cannot overpay it
+            invoice['remaining'] = invoice['total_balance_due']
+            if invoice['invoice_number']:
+                by_number[invoice['invoice_number'].upper()] = invoice
+            by_customer_id[str(invoice['customer_entitlement_master_id__customer_master_id'])].append(invoice)
+            name = invoice['customer_entitlement_master_id__customer_master_id__customer_name']
+            if name:
+                by_customer_name[name.strip().lower()].append(invoice)
+
+        transaction_ids = {line.transaction_id for line in self.lines if line.transaction_id}
+        recorded = {}
+        if transaction_ids:
+            for detail in PaymentDetails.objects.filter(transaction_id__in=transaction_ids).values(
+                'id', 'transaction_id', 'pay_amount', 'status', 'payment_master_id'
+            ):
+                recorded[detail['transaction_id']] = detail
+
+        seen_transaction_ids = set()
+        for line in self.lines:
+            if line.transaction_id:
+                if line.transaction_id in seen_transaction_ids:
+                    self._reject(line, f"Duplicate transaction_id '{line.transaction_id}' in file")
+                    continue
+                seen_transaction_ids.add(line.transaction_id)
+
+                detail = recorded.get(line.transaction_id)
+                if detail is not None:
+                    if detail['status'] != 'pending':
+                        self._reject(line, f"Transaction '{line.transaction_id}' already recorded")
+                    elif detail['pay_amount'] != line.amount:
+                        self._reject(line, f"Amount differs from recorded payment ({detail['pay_amount']})")
+                    else:
+                        self.to_confirm.append((line, detail))
+                    continue
+
+            invoice, reason = self._match_invoice(line, by_number, by_customer_id, by_customer_name)
+            if invoice is None:
+                self._reject(line, reason)
+                continue
+            invoice['remaining'] -= line.amount
+            self.to_create.append((line, invoice))
+
+    def _match_invoice(self, line, by_number, by_customer_id, by_customer_name):
+        if line.invoice_number:
+            invoice = by_number.get(line.invoice_number)
+            if invoice is None:
+                return None, f"No open invoice '{line.invoice_number}'"
+            if line.amount > invoice['remaining']:
+                return None, f"Amount exceeds balance due ({invoice['remaining']})"
+            return invoice, None
+
+        candidates = by_customer_id.get(line.customer_id) or by_customer_name.get(line.customer_name)
+        if not candidates:
+            return None, 'No open invoice for customer'
+
+        exact = [inv for inv in candidates if inv['remaining'] == line.amount]
+        if exact:
+            return exact[0], None
+        open_candidates = [inv for inv in candidates if inv['remaining'] > 0]
+        if len(open_candidates) == 1:
+            if line.amount > open_candidates[0]['remaining']:
+                return None, f"Amount exceeds balance due ({open_candidates[0]['remaining']})"
+            return open_candidates[0], None
+        return None, 'Ambiguous: amount does not match a single open invoice'
+
+    # ---- applying ------------------------------------------------------
+
+    def _recheck(self):
+        """
+        Re-validate the matches under row locks, inside apply()'s transaction.
+
+        Another import or a manual payment may have paid the matched invoices
+        or confirmed the matched payments since match() read them. Lines that
+        no longer fit are moved to unmatched. The bulk writes skip the period
+        lock signals, so lines dated in a closed month, or confirming a
+        payment of one, are rejected here, as are payments that would move a
+        closed invoice out of a non-settlement status (e.g. draft).
+        """
+        through = closed_through()
+
+        def closed_reason(day, what):
+            if through is None:
+                return None
+            try:
+                check_open(day, what, through)
+            except PeriodClosedError as error:
+                return str(error.detail['period'])
+            return None
+
+        if self.to_confirm:
+            pending = dict(PaymentDetails.objects.select_for_update(of=('self',)).filter(
+                id__in=[detail['id'] for _, detail in self.to_confirm], status='pending'
+            ).values_list('id', 'payment_master_id__payment_date'))
+            confirm, self.to_confirm = self.to_confirm, []
+            for line, detail in confirm:
+                if detail['id'] in pending:
+                    reason = closed_reason(pending[detail['id']], 'its payments')
+                else:
+                    reason = f"Transaction '{line.transaction_id}' already recorded"
+                if reason:
+                    self._reject(line, reason)
+                else:
+                    self.to_confirm.append((line, detail))
+
+        if self.to_create:
+            # Locked in id order so concurrent imports cannot deadlock
+            locked = {
+                invoice['id']: invoice
+                for invoice in InvoiceMaster.objects.select_for_update().filter(
+                    id__in={invoice['id'] for _, invoice in self.to_create}
+                ).order_by('id').values('id', 'status', 'issue_date', 'total_balance_due')
+            }
+            remaining = {
+                invoice_id: Decimal('0') if invoice['status'] in OPEN_INVOICE_EXCLUDED_STATUSES else invoice['total_balance_due']
+                for invoice_id, invoice in locked.items()
+            }
+            # Read after the locks, so a concurrent import of the same statement has committed its lines
+            recorded = set(PaymentDetails.objects.filter(
+                transaction_id__in={line.transaction_id for line, _ in self.to_create if line.transaction_id}
+            ).values_list('transaction_id', flat=True))
+            create, self.to_create = self.to_create, []
+            for line, invoice in create:
+                balance = remaining.get(invoice['id'], Decimal('0'))
+                if line.transaction_id in recorded:
+                    reason = f"Transaction '{line.transaction_id}' already recorded"
+                elif line.amount > balance:
+                    reason = f"Amount exceeds balance due ({balance})"
+                else:
+                    stored = locked[invoice['id']]
+                    reason = closed_reason(line.date, 'its payments') or (
+                        closed_reason(stored['issue_date'], 'its invoices')
+                        if stored['status'] not in SETTLEMENT_STATUSES else None
+                    )
+                if reason:
+                    self._reject(line, reason)
+                else:
+                    remaining[invoice['id']] = balance - line.amount
+                    self.to_create.append((line, invoice))
+
+    @transaction.atomic
+    def apply(self):
+        """Write matched lines: bulk inserts, bulk confirms and one invoice totals update"""
+        self._recheck()
+        if self.to_confirm:
+            detail_ids = [detail['id'] for _, detail in self.to_confirm]
+            master_ids = {detail['payment_master_id'] for _, detail in self.to_confirm}
+            now = timezone.now()
+            PaymentDetails.objects.filter(id__in=detail_ids).update(status='completed', updated_at=now)
+            PaymentMaster.objects.filter(id__in=master_ids, status='pending').update(status='completed', updated_at=now)
+
+        if self.to_create:
+            payments = PaymentMaster.objects.bulk_create([
+                PaymentMaster(
+                    payment_date=line.date,
+                    payment_method=line.payment_method,
+                    customer_entitlement_master_id_id=invoice['customer_entitlement_master_id'],
+                    invoice_master_id_id=invoice['id'],
+                    remarks=f'Statement reconciliation (row {line.row_number})',
+                    status='completed',
+                    received_by=self.user,
+                    created_by=self.user,
+                )
+                for line, invoice in self.to_create
+            ])
+            PaymentDetails.objects.bulk_create([
+                PaymentDetails(
+                    payment_master_id=payment,
+                    pay_amount=line.amount,
+                    transaction_id=line.transaction_id,
+                    remarks=line.remarks,
+                    status='completed',
+                    received_by=self.user,
+                    created_by=self.user,
+                )
+                for payment, (line, _) in zip(payments, self.to_create)
+            ])
+            self.update_invoice_totals({invoice['id'] for _, invoice in self.to_create})
+
+        if self.to_confirm or self.to_create:
+            # bulk writes skip model signals
+            transaction.on_commit(bump_payments_version)
+        if self.to_create:
+            transaction.on_commit(bump_billing_version)
+            # Confirmed lines were streamed when their pending payment was saved
+            collected = defaultdict(Decimal)
+            for line, _ in self.to_create:
+                collected[line.date] += line.amount
+            for day, amount in sorted(collected.items()):
+                publish_on_commit(kpi_delta(day, collected=amount))
+
+    @staticmethod
+    def update_invoice_totals(invoice_ids):
+        """Recompute paid/balance/status for the given invoices in one UPDATE"""
+        paid = PaymentDetails.objects.filter(
+            payment_master_id__invoice_master_id=OuterRef('pk')
+        ).order_by().values('payment_master_id__invoice_master_id').annotate(
+            total=Sum('pay_amount')
+        ).values('total')
+        total_paid = Coalesce(Subquery(paid, output_field=_money()), Value(Decimal('0')), output_field=_money())
+
+        InvoiceMaster.objects.filter(id__in=invoice_ids).update(
+            total_paid_amount=total_paid,
+            total_balance_due=F('total_bill_amount') - total_paid,
+            # Only invoices that just received a payment get here, so unpaid is not possible
+            status=Case(
+                When(LessThanOrEqual(F('total_bill_amount'), total_paid), then=Value('paid')),
+                default=Value('partial'),
+                output_field=CharField(),
+            ),
+            updated_at=timezone.now(),
+        )
+
+    # ---- result --------------------------------------------------------
+
+    def summary(self):
+        return {
+            'total_lines': self.row_count,
+            'matched_count': len(self.to_create) + len(self.to_confirm),
+            'created_count': len(self.to_create),
+            'confirmed_count': len(self.to_confirm),
+            'unmatched_count': len(self.unmatched),
+            'matched_amount': float(sum((line.amount for line, _ in self.to_create + self.to_confirm), Decimal('0'))),
+            'matched': [
+                {'row': line.row_number, 'invoice_id': invoice['id'], 'invoice_number': invoice['invoice_number'],
+                 'amount': float(line.amount), 'action': 'created'}
+                for line, invoice in self.to_create
+            ] + [
+                {'row': line.row_number, 'payment_id': detail['payment_master_id'],
+                 'amount': float(line.amount), 'action': 'confirmed'}
+                for line, detail in self.to_confirm
+            ],
+            'unmatched': sorted(self.unmatched, key=lambda item: item['row']),
+        }
@@ -5,10 +5,11 @@ from rest_framework import serializers
 from django.db import models
 from django.db.models import Sum
 from decimal import Decimal
+from config.serializers import BatchField, BatchListSerializer, SparseFieldsMixin, aggregate_by, count_related, is_prefetched
 from .models import PaymentMaster, PaymentDetails
 
 
-class PaymentDetailsSerializer(serializers.ModelSerializer):
+class PaymentDetailsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     payment_method = serializers.CharField(source='payment_master_id.payment_method', read_only=True)
     payment_date = serializers.DateField(source='payment_master_id.payment_date', read_only=True)
     
@@ -18,7 +19,7 @@ class PaymentDetailsSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
 
 
-class PaymentMasterSerializer(serializers.ModelSerializer):
+class PaymentMasterSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     customer_name = serializers.CharField(
         source='customer_entitlement_master_id.customer_master_id.customer_name',
         read_only=True
@@ -44,21 +45,25 @@ class PaymentMasterSerializer(serializers.ModelSerializer):
         read_only=True
     )
     details = PaymentDetailsSerializer(many=True, read_only=True)
-    total_paid = serializers.SerializerMethodField()
-    details_count = serializers.SerializerMethodField()
+    total_paid = BatchField()
+    details_count = BatchField()
     
     class Meta:
         model = PaymentMaster
         fields = '__all__'
         read_only_fields = ['created_at', 'updated_at']
+        list_serializer_class = BatchListSerializer
+        expandable_fields = ['details']
     
-    def get_total_paid(self, obj):
-        """Calculate total paid from all payment details"""
-        total = obj.details.aggregate(total=Sum('pay_amount'))['total']
-        return float(total) if total else 0.0
+    def load_total_paid(self, objs):
+        """Total of each payment's details"""
+        if all(is_prefetched(obj, 'details') for obj in objs):
+            return {obj.pk: float(sum((detail.pay_amount for detail in obj.details.all()), Decimal('0'))) for obj in objs}
+        totals = aggregate_by(objs, PaymentDetails.objects.all(), 'payment_master_id', Sum('pay_amount'))
+        return {pk: float(total) for pk, total in totals.items()}
     
-    def get_details_count(self, obj):
-        return obj.details.count()
+    def load_details_count(self, objs):
+        return count_related(objs, 'details')
     
     def validate(self, data):
         """Validate payment data"""
@@ -0,0 +1,36 @@
+"""
+Signal handlers for the Payment App
+"""
+from django.db import transaction
+from django.db.models.signals import pre_save, pre_delete, post_save, post_delete
+from django.dispatch import receiver
+
+from apps.bills.closing import check_open, check_payment_save, check_payment_detail
+from .models import PaymentMaster, PaymentDetails
+from .utils import bump_payments_version
+
+
+@receiver(post_save, sender=PaymentMaster)
+@receiver(post_delete, sender=PaymentMaster)
+@receiver(post_save, sender=PaymentDetails)
+@receiver(post_delete, sender=PaymentDetails)
+def payments_changed(sender, **kwargs):
+    """Invalidate cached payment reports once the write is committed"""
+    transaction.on_commit(bump_payments_version)
+
+
+@receiver(pre_save, sender=PaymentMaster)
+def lock_closed_payment(sender, instance, **kwargs):
+    """Payments dated in closed months are frozen by the month-end close"""
+    check_payment_save(instance)
+
+
+@receiver(pre_delete, sender=PaymentMaster)
+def lock_closed_payment_delete(sender, instance, **kwargs):
+    check_open(instance.payment_date, 'its payments')
+
+
+@receiver(pre_save, sender=PaymentDetails)
+@receiver(pre_delete, sender=PaymentDetails)
+def lock_closed_payment_details(sender, instance, **kwargs):
+    check_payment_detail(instance)
@@ -0,0 +1,234 @@
+import io
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.bills.closing import close_period
+from apps.bills.models import InvoiceMaster
+from apps.bills.tests import make_customer, make_entitlement, make_invoice, make_payment
+from apps.customers.models import KAMMaster
+from apps.dashboard.events import set_broker
+from apps.utility.versions import bump_version
+from tests.query_budget import measure
+from .models import PaymentDetails
+from .reconciliation import StatementReconciler
+
+User = get_user_model()
+
+
+class CollectionsAnalyticsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(email='admin@example.com', username='admin', password='admin')
+        cls.kam = KAMMaster.objects.create(kam_name='Rahim')
+        cls.acme = make_customer('Acme', kam_id=cls.kam)
+        cls.globex = make_customer('Globex')
+        cls.acme_invoice = make_invoice(make_entitlement(cls.acme), date(2025, 1, 1), '1000')
+        cls.globex_invoice = make_invoice(make_entitlement(cls.globex), date(2025, 1, 1), '1000')
+        make_payment(cls.acme_invoice, date(2025, 1, 10), '100')
+        make_payment(cls.acme_invoice, date(2025, 2, 10), '200', payment_method='bkash')
+        make_payment(cls.globex_invoice, date(2025, 2, 20), '50')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.url = reverse('payment-analytics')
+
+    def rows(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_group_by_customer(self):
+        self.assertEqual(
+            [(row['customer_name'], row['total_amount'], row['payment_count']) for row in self.rows()],
+            [('Acme', 300.0, 2), ('Globex', 50.0, 1)],
+        )
+        self.assertEqual([row['customer_name'] for row in self.rows(sort='amount', top=1)], ['Globex'])
+
+    def test_group_by_period_and_method(self):
+        self.assertEqual(
+            [(row['period'], row['total_amount']) for row in self.rows(group_by='month')],
+            [('2025-01-01', 100.0), ('2025-02-01', 250.0)],
+        )
+        self.assertEqual(
+            {row['payment_method']: row['total_amount'] for row in self.rows(group_by='payment_method')},
+            {'cash': 150.0, 'bkash': 200.0},
+        )
+        self.assertEqual(
+            [(row['kam_name'], row['total_amount']) for row in self.rows(group_by='kam', kam_id=self.kam.pk)],
+            [('Rahim', 300.0)],
+        )
+
+    def test_cache_follows_payment_writes(self):
+        self.assertEqual(self.rows()[1]['total_amount'], 50.0)
+        with self.captureOnCommitCallbacks(execute=True):
+            make_payment(self.globex_invoice, date(2025, 3, 1), '500')
+        self.assertEqual(self.rows()[0]['customer_name'], 'Globex')
+
+    def test_viewset_filters_apply(self):
+        self.assertEqual(
+            [row['customer_name'] for row in self.rows(invoice_master_id=self.globex_invoice.pk)], ['Globex']
+        )
+        self.assertEqual(
+            [row['total_amount'] for row in self.rows(search=self.acme_invoice.invoice_number)], [300.0]
+        )
+        self.assertEqual([row['total_amount'] for row in self.rows(payment_method='bkash')], [200.0])
+        make_payment(self.globex_invoice, date(2025, 3, 1), '70', transaction_id='TRX-77')
+        self.assertEqual([row['total_amount'] for row in self.rows(search='TRX-77')], [70.0])
+
+    def test_paginated_in_sql(self):
+        response = self.client.get(self.url, {'page_size': 1, 'page': 2})
+        self.assertEqual((response.data['count'], len(response.data['results'])), (2, 1))
+        self.assertEqual(response.data['results'][0]['customer_name'], 'Globex')
+        self.assertEqual(self.client.get(self.url, {'top': 1}).data['count'], 1)
+        self.assertEqual(self.client.get(self.url, {'page': 3}).status_code, 404)
+
+    def test_cache_follows_writes_from_other_workers(self):
+        self.assertEqual(self.rows()[1]['total_amount'], 50.0)
+        make_payment(self.globex_invoice, date(2025, 3, 1), '500')
+        # The bump of the worker that wrote it reaches this one through the database
+        bump_version('payments')
+        self.assertEqual(self.rows()[0]['customer_name'], 'Globex')
+
+    def test_invalid_parameters(self):
+        response = self.client.get(self.url, {'group_by': 'year', 'sort': 'name', 'top': '0'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data), {'group_by', 'sort', 'top'})
+
+    def test_list_totals_cost_no_query_per_payment(self):
+        url = reverse('payment-list')
+        response = self.client.get(url, {'ordering': 'payment_date'})
+        self.assertEqual(
+            [(row['total_paid'], row['details_count']) for row in response.data['results']],
+            [(100.0, 1), (200.0, 1), (50.0, 1)],
+        )
+        self.assertEqual(measure(self.client, url, 1).queries, measure(self.client, url, 100).queries)
+
+    def test_by_customer(self):
+        response = self.client.get(reverse('payment-by-customer'))
+        self.assertEqual(
+            {row['customer_name']: (row['total_received'], row['payment_count']) for row in response.data},
+            {'Acme': (300.0, 2), 'Globex': (50.0, 1)},
+        )
+
+
+def statement(*rows, header='transaction_id,invoice_number,customer_name,amount,date'):
+    return io.BytesIO('\n'.join([header, *rows]).encode())
+
+
+def reconciler(*rows, **kwargs):
+    result = StatementReconciler(default_payment_method='bank_transfer', **kwargs)
+    result.read_csv(statement(*rows))
+    result.match()
+    return result
+
+
+class StatementReconciliationTests(TestCase):
+
+    def setUp(self):
+        self.acme = make_customer('Acme')
+        self.invoice = make_invoice(make_entitlement(self.acme), date(2025, 1, 1), '1000', invoice_number='INV-1')
+
+    def test_matching(self):
+        globex = make_customer('Globex')
+        make_invoice(make_entitlement(globex), date(2025, 1, 1), '300', invoice_number='INV-2')
+        make_invoice(make_entitlement(globex), date(2025, 2, 1), '400', invoice_number='INV-3')
+        make_payment(self.invoice, date(2025, 1, 5), '100', transaction_id='TRX-PENDING', status='pending')
+
+        result = reconciler(
+            'TRX-1,inv-1,,250,2025-01-10',
+            'TRX-2,,globex,50,2025-01-11',
+            'TRX-3,,globex,400,2025-01-12',
+            'TRX-4,INV-1,,900,2025-01-13',
+            'TRX-PENDING,,,100,2025-01-14',
+            'TRX-1,INV-1,,10,2025-01-15',
+            'TRX-5,,acme,-20,2025-01-16',
+        ).summary()
+
+        self.assertEqual(
+            [(item['row'], item['action']) for item in result['matched']],
+            [(2, 'created'), (4, 'created'), (6, 'confirmed')],
+        )
+        self.assertEqual(result['matched'][1]['invoice_number'], 'INV-3')
+        self.assertEqual(
+            {item['row']: item['reason'] for item in result['unmatched']},
+            {
+                3: 'Ambiguous: amount does not match a single open invoice',
+                5: 'Amount exceeds balance due (750.00)',
+                7: "Duplicate transaction_id 'TRX-1' in file",
+                8: 'Not a credit',
+            },
+        )
+
+    def test_apply_updates_invoices(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            reconciler('TRX-1,INV-1,,250,2025-01-10', 'TRX-2,INV-1,,750,2025-01-11').apply()
+        self.invoice.refresh_from_db()
+        self.assertEqual((self.invoice.total_paid_amount, self.invoice.total_balance_due), (Decimal('1000'), Decimal('0')))
+        self.assertEqual(self.invoice.status, 'paid')
+        self.assertEqual(PaymentDetails.objects.filter(transaction_id__in=['TRX-1', 'TRX-2']).count(), 2)
+
+    def test_apply_streams_collections(self):
+        published = []
+        previous = set_broker(mock.Mock(publish=published.append))
+        self.addCleanup(set_broker, previous)
+        make_payment(self.invoice, date(2025, 1, 5), '100', transaction_id='TRX-PENDING', status='pending')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reconciler(
+                'TRX-1,INV-1,,250,2025-01-10', 'TRX-2,INV-1,,50.50,2025-01-10', 'TRX-3,INV-1,,100,2025-01-11',
+                'TRX-PENDING,,,100,2025-01-12',
+            ).apply()
+        self.assertEqual(published, [
+            {'date': '2025-01-10', 'collected': 300.5},
+            {'date': '2025-01-11', 'collected': 100.0},
+        ])
+
+    def test_apply_rechecks_balances(self):
+        # A manual payment lands between matching and applying
+        result = reconciler('TRX-1,INV-1,,600,2025-01-10', 'TRX-2,INV-1,,300,2025-01-11')
+        InvoiceMaster.objects.filter(pk=self.invoice.pk).update(total_paid_amount=500, total_balance_due=500)
+        result.apply()
+        summary = result.summary()
+        self.assertEqual([item['row'] for item in summary['matched']], [3])
+        self.assertEqual(summary['unmatched'], [
+            {'row': 2, 'transaction_id': 'TRX-1', 'invoice_number': 'INV-1', 'customer_name': '', 'amount': '600',
+             'date': '2025-01-10', 'reason': 'Amount exceeds balance due (500.00)'},
+        ])
+
+    def test_apply_respects_closed_months(self):
+        draft = make_invoice(make_entitlement(self.acme), date(2025, 1, 15), '500', invoice_number='INV-2', status='draft')
+        make_payment(self.invoice, date(2025, 1, 5), '100', transaction_id='TRX-PENDING', status='pending')
+        result = reconciler(
+            'TRX-1,INV-1,,100,2025-01-31', 'TRX-2,INV-1,,100,2025-02-01', 'TRX-3,INV-2,,100,2025-02-01',
+            'TRX-PENDING,,,100,2025-02-02',
+        )
+        close_period(date(2025, 1, 1))
+        result.apply()
+        summary = result.summary()
+
+        self.assertEqual([item['row'] for item in summary['matched']], [3])
+        closed = '2025-01 is closed; its {} can no longer be changed.'
+        self.assertEqual({item['row']: item['reason'] for item in summary['unmatched']}, {
+            2: closed.format('payments'), 4: closed.format('invoices'), 5: closed.format('payments'),
+        })
+        draft.refresh_from_db()
+        self.assertEqual((draft.status, draft.total_paid_amount), ('draft', Decimal('0')))
+        self.assertEqual(PaymentDetails.objects.get(transaction_id='TRX-PENDING').status, 'pending')
+
+    def test_same_statement_imported_twice(self):
+        rows = ('TRX-1,INV-1,,100,2025-01-10',)
+        first, second = reconciler(*rows), reconciler(*rows)
+        first.apply()
+        second.apply()
+        self.assertEqual(second.summary()['created_count'], 0)
+        self.assertEqual(PaymentDetails.objects.filter(transaction_id='TRX-1').count(), 1)
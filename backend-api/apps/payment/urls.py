@@ -6,8 +6,9 @@ from .views import (
 )
 
 router = DefaultRouter()
-router.register(r'', PaymentMasterViewSet, basename='payment')
+# payment-details first: the payment detail route would otherwise match it as a pk
 router.register(r'payment-details', PaymentDetailsViewSet, basename='payment-detail')
+router.register(r'', PaymentMasterViewSet, basename='payment')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -0,0 +1,19 @@
+"""
+Utility functions for payment operations
+"""
+from apps.utility.versions import bump_version, get_version
+
+
+def get_payments_version():
+    """
+    Current payments version counter.
+
+    Cached payment reports embed this in their keys, so bumping it
+    invalidates every one of them at once.
+    """
+    return get_version('payments')
+
+
+def bump_payments_version():
+    """Increment the payments version counter after a payment write"""
+    bump_version('payments')
@@ -4,35 +4,43 @@ REST API Views for Payment App
 from rest_framework import viewsets, permissions, filters, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.settings import api_settings
 from django_filters.rest_framework import DjangoFilterBackend
+from django.conf import settings
+from django.core.cache import cache
 from django.db.models import Q, Sum, Count
 from django.utils import timezone
 from datetime import datetime, date
 from decimal import Decimal
 
 from .models import PaymentMaster, PaymentDetails
+from .reconciliation import StatementReconciler
+from .reports import (
+    COLLECTION_GROUPS,
+    COLLECTION_SORTS,
+    collections_cache_key,
+    collections_queryset,
+    serialize_collections,
+)
 from .serializers import (
     PaymentMasterSerializer,
     PaymentDetailsSerializer,
     PaymentDetailsCreateSerializer,
 )
 from apps.authentication.permissions import RequirePermissions
+from config.serializers import FieldSelection
 
 
 class PaymentMasterViewSet(viewsets.ModelViewSet):
     """Full CRUD for Payment Master"""
-    queryset = PaymentMaster.objects.select_related(
-        'customer_entitlement_master_id__customer_master_id',
-        'invoice_master_id',
-        'received_by',
-        'created_by'
-    ).prefetch_related('details')
+    queryset = PaymentMaster.objects.select_related('received_by', 'created_by')
     serializer_class = PaymentMasterSerializer
     permission_classes = [permissions.IsAuthenticated, RequirePermissions]
     required_permissions = ['payments:read']
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['status', 'payment_method', 'invoice_master_id']
-    search_fields = ['invoice_master_id__invoice_number', 'transaction_id']
+    search_fields = ['invoice_master_id__invoice_number', 'details__transaction_id']
     ordering_fields = ['created_at', 'payment_date']
     
     def get_serializer_class(self):
@@ -43,7 +51,7 @@ class PaymentMasterViewSet(viewsets.ModelViewSet):
         return PaymentMasterSerializer
     
     def get_queryset(self):
-        qs = self.queryset
+        qs = self.queryset.for_list(FieldSelection.for_view(self))
         customer_id = self.request.query_params.get('customer_id')
         start_date = self.request.query_params.get('start_date')
         end_date = self.request.query_params.get('end_date')
@@ -73,23 +81,13 @@ class PaymentMasterViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def history(self, request):
         """Get payment history with filters"""
-        customer_id = request.query_params.get('customer_id')
-        start_date = request.query_params.get('start_date')
-        end_date = request.query_params.get('end_date')
         invoice_id = request.query_params.get('invoice_id')
         
+        # customer_id, start_date and end_date are applied by get_queryset
         queryset = self.get_queryset()
         
-        if customer_id:
-            queryset = queryset.filter(
-                customer_entitlement_master_id__customer_master_id_id=customer_id
-            )
         if invoice_id:
             queryset = queryset.filter(invoice_master_id_id=invoice_id)
-        if start_date:
-            queryset = queryset.filter(payment_date__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(payment_date__lte=end_date)
         
         serializer = self.get_serializer(queryset.order_by('-payment_date'), many=True)
         
@@ -107,60 +105,156 @@ class PaymentMasterViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def by_customer(self, request):
         """Get total received amount per customer"""
-        customer_id = request.query_params.get('customer_id')
-        start_date = request.query_params.get('start_date')
-        end_date = request.query_params.get('end_date')
+        rows = collections_queryset(self.get_queryset(), 'customer')
         
-        queryset = self.get_queryset()
+        result = [{
+            'customer_id': row['customer_entitlement_master_id__customer_master_id'],
+            'customer_name': row['customer_entitlement_master_id__customer_master_id__customer_name'],
+            'total_received': float(row['total_amount']),
+            'payment_count': row['payment_count'],
+        } for row in rows]
         
-        if customer_id:
+        return Response(result)
+    
+    @action(detail=False, methods=['get'])
+    def analytics(self, request):
+        """
+        Collections grouped by customer, KAM, payment method or period
+        Query parameters:
+        - group_by: 'customer', 'kam', 'payment_method', 'day', 'week', 'month' (default: 'customer')
+        - sort: 'amount', '-amount', 'count', '-count' (default: -amount, or period for day/week/month)
+        - top: Only return the first N groups
+        - customer_id, kam_id, payment_method, status, invoice_master_id, start_date, end_date, search: Filters
+        - page, page_size: Pagination, applied to the grouped query
+        """
+        params = request.query_params
+        group_by = params.get('group_by', 'customer')
+        sort = params.get('sort') or None
+        top = params.get('top')
+        
+        errors = {}
+        if group_by not in COLLECTION_GROUPS:
+            errors['group_by'] = f'Choose from: {", ".join(COLLECTION_GROUPS)}'
+        if sort and sort not in COLLECTION_SORTS:
+            errors['sort'] = f'Choose from: {", ".join(COLLECTION_SORTS)}'
+        if top:
+            try:
+                top = int(top)
+                if top < 1:
+                    raise ValueError
+            except ValueError:
+                errors['top'] = 'Must be a positive integer'
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Every parameter that changes the response keys its cache entry
+        accepted = [
+            'customer_id', 'start_date', 'end_date', 'kam_id', *self.filterset_fields, api_settings.SEARCH_PARAM,
+            self.paginator.page_query_param, self.paginator.page_size_query_param,
+        ]
+        cache_key = collections_cache_key({
+            **{key: params.get(key) for key in accepted if params.get(key)},
+            'group_by': group_by, 'sort': sort, 'top': top,
+        })
+        data = cache.get(cache_key)
+        if data is not None:
+            return Response(data)
+        
+        queryset = self.filter_queryset(self.get_queryset())
+        if params.get('kam_id'):
             queryset = queryset.filter(
-                customer_entitlement_master_id__customer_master_id_id=customer_id
+                customer_entitlement_master_id__customer_master_id__kam_id=params['kam_id']
             )
-        if start_date:
-            queryset = queryset.filter(payment_date__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(payment_date__lte=end_date)
-        
-        # Group by customer and sum payments
-        from apps.customers.models import CustomerMaster
-        customers = CustomerMaster.objects.filter(
-            id__in=queryset.values_list(
-                'customer_entitlement_master_id__customer_master_id_id',
-                flat=True
-            ).distinct()
-        )
+        rows = collections_queryset(queryset, group_by, sort)
+        if top:
+            rows = rows[:top]
         
-        result = []
-        for customer in customers:
-            customer_payments = queryset.filter(
-                customer_entitlement_master_id__customer_master_id=customer
+        page = self.paginate_queryset(rows)
+        if page is None:
+            data = serialize_collections(rows, group_by)
+        else:
+            data = self.get_paginated_response(serialize_collections(page, group_by)).data
+        cache.set(cache_key, data, settings.REPORT_CACHE_TIMEOUT)
+        return Response(data)
+
+    
+    @action(
+        detail=False,
+        methods=['post'],
+        parser_classes=(MultiPartParser, FormParser),
+        required_permissions=['payments:create'],
+    )
+    def reconcile(self, request):
+        """
+        Import a bank / bKash / Nagad statement CSV and apply matched lines as payments
+        Request body:
+        - file: Statement CSV (multipart/form-data). Needs an amount column and at least one of
+          transaction_id, invoice_number, customer_id, customer_name
+        - payment_method: Used for lines without a payment_method/channel column
+        - payment_date: Used for lines without a date column (default: today)
+        - dry_run: 'true' to only report the matching without writing anything
+        """
+        if 'file' not in request.FILES:
+            return Response(
+                {'error': 'No file provided'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            total = customer_payments.aggregate(
-                total=Sum('details__pay_amount')
-            )['total'] or Decimal('0')
-            
-            result.append({
-                'customer_id': customer.id,
-                'customer_name': customer.customer_name,
-                'total_received': float(total),
-                'payment_count': customer_payments.count()
-            })
         
-        return Response(result)
+        uploaded_file = request.FILES['file']
+        if not uploaded_file.name.lower().endswith('.csv'):
+            return Response(
+                {'error': 'Invalid file format. Statement must be a CSV file'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        default_date = None
+        if request.data.get('payment_date'):
+            try:
+                default_date = datetime.strptime(request.data['payment_date'], '%Y-%m-%d').date()
+            except ValueError:
+                return Response(
+                    {'error': 'Invalid payment_date format. Use YYYY-MM-DD'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        dry_run = str(request.data.get('dry_run', '')).lower() in ['true', '1', 'yes']
+        
+        reconciler = StatementReconciler(
+            user=request.user,
+            default_payment_method=request.data.get('payment_method', ''),
+            default_date=default_date,
+        )
+        try:
+            errors = reconciler.read_csv(uploaded_file)
+        except UnicodeDecodeError:
+            errors = ['Invalid CSV file: File must be UTF-8 encoded']
+        if errors:
+            return Response({'error': errors[0]}, status=status.HTTP_400_BAD_REQUEST)
+        
+        reconciler.match()
+        if not dry_run:
+            reconciler.apply()
+        
+        return Response({
+            'dry_run': dry_run,
+            **reconciler.summary()
+        }, status=status.HTTP_200_OK if dry_run else status.HTTP_201_CREATED)
 
 
 class PaymentDetailsViewSet(viewsets.ModelViewSet):
     """Full CRUD for Payment Details"""
-    queryset = PaymentDetails.objects.select_related(
-        'payment_master_id', 'received_by', 'created_by'
-    )
+    queryset = PaymentDetails.objects.select_related('received_by', 'created_by')
     permission_classes = [permissions.IsAuthenticated, RequirePermissions]
     required_permissions = ['payments:read']
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['payment_master_id', 'status']
     search_fields = ['transaction_id']
     
+    def get_queryset(self):
+        qs = self.queryset
+        if FieldSelection.for_view(self).wants('payment_method', 'payment_date'):
+            qs = qs.select_related('payment_master_id')
+        return qs
+    
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             self.required_permissions = ['payments:create']
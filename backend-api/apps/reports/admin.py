@@ -0,0 +1,19 @@
+from django.contrib import admin
+from .models import CustomerMonthlySnapshot
+
+
+@admin.register(CustomerMonthlySnapshot)
+class CustomerMonthlySnapshotAdmin(admin.ModelAdmin):
+    """Read-only view of the captured customer snapshots"""
+    list_display = [
+        'month', 'customer_id', 'customer_type', 'status', 'activation_month',
+        'total_client', 'total_active_client', 'approximate', 'captured_at'
+    ]
+    list_filter = ['month', 'customer_type', 'status', 'approximate']
+    search_fields = ['customer_id']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
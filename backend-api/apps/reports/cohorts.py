@@ -0,0 +1,199 @@
+"""
+Churn and cohort analytics over customer monthly snapshots.
+
+The snapshot rows in range are read once into NumPy arrays; retention
+matrices, churn series and MAC client curves are computed with array
+indexing and bincount rather than per-customer loops.
+"""
+import numpy as np
+from django.db.models.functions import ExtractMonth, ExtractYear
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from apps.dashboard.reports import parse_month_param, shift_period
+from .models import CustomerMonthlySnapshot
+
+
+ACTIVE = 'active'
+MAC_TYPE = 'channel_partner'
+DEFAULT_MONTHS = 12
+
+
+def _month_index(field):
+    return ExtractYear(field) * 12 + ExtractMonth(field) - 1
+
+
+def _month_label(index):
+    return f'{index // 12:04d}-{index % 12 + 1:02d}'
+
+
+def _ratio(numerator, denominator):
+    """Element-wise numerator / denominator rounded to 4 places, None where undefined"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = np.round(numerator / denominator, 4)
+    return [None if np.isnan(value) or np.isinf(value) else float(value) for value in values]
+
+
+def cohort_range(params, today=None):
+    """(start, end) months from start_month/end_month, default the last 12 months"""
+    today = today or timezone.localdate()
+    end = parse_month_param(params['end_month'], 'end_month') if params.get('end_month') else today.replace(day=1)
+    start = parse_month_param(params['start_month'], 'start_month') if params.get('start_month') else (
+        shift_period(end, 'month', -(DEFAULT_MONTHS - 1))
+    )
+    if start > end:
+        raise ValidationError({'start_month': 'start_month must be on or before end_month.'})
+    return start, end
+
+
+def load_snapshots(params, start, end):
+    """Column arrays of the snapshot rows in [start, end] matching the filters"""
+    qs = CustomerMonthlySnapshot.objects.filter(month__gte=start, month__lte=end)
+    if params.get('customer_type'):
+        qs = qs.filter(customer_type=params['customer_type'])
+    if params.get('kam_id'):
+        try:
+            qs = qs.filter(kam_id=int(params['kam_id']))
+        except ValueError:
+            raise ValidationError({'kam_id': 'kam_id must be an integer.'})
+
+    rows = list(qs.order_by().annotate(
+        month_index=_month_index('month'),
+        activation_index=_month_index('activation_month'),
+    ).values_list(
+        'customer_id', 'month_index', 'activation_index', 'status', 'customer_type',
+        'total_client', 'total_active_client', 'free_giveaway_client',
+    ))
+    columns = list(zip(*rows)) or [()] * 8
+    return {
+        'customer': np.array(columns[0], dtype=np.int64),
+        'month': np.array(columns[1], dtype=np.int64),
+        'activation': np.array(columns[2], dtype=np.int64),
+        'active': np.array([status == ACTIVE for status in columns[3]], dtype=bool),
+        'mac': np.array([customer_type == MAC_TYPE for customer_type in columns[4]], dtype=bool),
+        'total_client': np.array([value or 0 for value in columns[5]], dtype=np.int64),
+        'total_active_client': np.array([value or 0 for value in columns[6]], dtype=np.int64),
+        'free_giveaway_client': np.array([value or 0 for value in columns[7]], dtype=np.int64),
+    }
+
+
+def retention_matrix(data, first, last):
+    """
+    Active share of each activation cohort by months since activation.
+    Cells for months without snapshots are None.
+    """
+    in_cohort = (data['activation'] >= first) & (data['activation'] <= last)
+    cohort = data['activation'][in_cohort] - first
+    offset = data['month'][in_cohort] - data['activation'][in_cohort]
+    valid = offset >= 0
+    cohort, offset = cohort[valid], offset[valid]
+    customers = data['customer'][in_cohort][valid]
+    active = data['active'][in_cohort][valid]
+
+    cohorts, width = last - first + 1, last - first + 1
+    active_counts = np.zeros((cohorts, width))
+    np.add.at(active_counts, (cohort, offset), active)
+    observed = np.zeros((cohorts, width), dtype=bool)
+    observed[cohort, offset] = True
+    # Cohort size: distinct customers seen in the cohort
+    _, first_rows = np.unique(customers, return_index=True)
+    sizes = np.bincount(cohort[first_rows], minlength=cohorts)
+
+    retention = np.where(observed, active_counts / np.maximum(sizes, 1)[:, None], np.nan)
+    result = []
+    for position in np.flatnonzero(sizes).tolist():
+        # A cohort can only be followed up to the last month of the range
+        cells = retention[position, :width - position]
+        result.append({
+            'cohort': _month_label(first + position),
+            'size': int(sizes[position]),
+            'retention': [None if np.isnan(value) else round(float(value), 4) for value in cells],
+        })
+    return result
+
+
+def churn_series(data, first, last):
+    """Per month: active customers, new, churned, reactivated and churn rate"""
+    months = last - first + 1
+    order = np.lexsort((data['month'], data['customer']))
+    customer, month, active = data['customer'][order], data['month'][order] - first, data['active'][order]
+
+    # Transitions between consecutive monthly snapshots of the same customer
+    continued = np.r_[False, (customer[1:] == customer[:-1]) & (month[1:] == month[:-1] + 1)]
+    was_active = np.r_[False, active[:-1]]
+    churned = continued & was_active & ~active
+    reactivated = continued & ~was_active & active
+    new = (data['month'][order] == data['activation'][order]) & active
+
+    active_counts = np.bincount(month, weights=active, minlength=months)
+    starting = np.bincount(month, weights=continued & was_active, minlength=months)
+    churned_counts = np.bincount(month, weights=churned, minlength=months)
+    reactivated_counts = np.bincount(month, weights=reactivated, minlength=months)
+    new_counts = np.bincount(month, weights=new, minlength=months)
+    captured = np.bincount(month, minlength=months) > 0
+    rates = _ratio(churned_counts, starting)
+
+    return [{
+        'month': _month_label(first + position),
+        'active': int(active_counts[position]),
+        'new': int(new_counts[position]),
+        'churned': int(churned_counts[position]),
+        'reactivated': int(reactivated_counts[position]),
+        'churn_rate': rates[position],
+    } for position in np.flatnonzero(captured).tolist()]
+
+
+def mac_growth(data, first, last):
+    """MAC partner client totals per month and the average client curve by months since activation"""
+    mac = data['mac']
+    month = data['month'][mac] - first
+    months = last - first + 1
+    partners = np.bincount(month, minlength=months)
+    totals = {
+        name: np.bincount(month, weights=data[name][mac], minlength=months)
+        for name in ['total_client', 'total_active_client', 'free_giveaway_client']
+    }
+    previous = np.r_[np.nan, totals['total_client'][:-1]]
+    previous[1:][partners[:-1] == 0] = np.nan
+    net_new = totals['total_client'] - previous
+    growth = _ratio(net_new, previous)
+
+    monthly = [{
+        'month': _month_label(first + position),
+        'partners': int(partners[position]),
+        'total_clients': int(totals['total_client'][position]),
+        'active_clients': int(totals['total_active_client'][position]),
+        'free_giveaway_clients': int(totals['free_giveaway_client'][position]),
+        'net_new_clients': None if np.isnan(net_new[position]) else int(net_new[position]),
+        'growth_rate': growth[position],
+    } for position in np.flatnonzero(partners).tolist()]
+
+    offset = data['month'][mac] - data['activation'][mac]
+    valid = offset >= 0
+    offset = offset[valid]
+    curve_partners = np.bincount(offset, minlength=1)
+    average_clients = _ratio(np.bincount(offset, weights=data['total_client'][mac][valid], minlength=1), curve_partners)
+    average_active = _ratio(np.bincount(offset, weights=data['total_active_client'][mac][valid], minlength=1), curve_partners)
+    curve = [{
+        'months_since_activation': position,
+        'partners': int(curve_partners[position]),
+        'avg_clients': average_clients[position],
+        'avg_active_clients': average_active[position],
+    } for position in np.flatnonzero(curve_partners).tolist()]
+    return {'monthly': monthly, 'by_months_since_activation': curve}
+
+
+def cohort_report(params, today=None):
+    """Retention matrix, churn series and MAC client growth for a month range"""
+    start, end = cohort_range(params, today)
+    data = load_snapshots(params, start, end)
+    first, last = start.year * 12 + start.month - 1, end.year * 12 + end.month - 1
+    return {
+        'period': {'start_month': _month_label(first), 'end_month': _month_label(last)},
+        'approximate': CustomerMonthlySnapshot.objects.filter(
+            month__gte=start, month__lte=end, approximate=True
+        ).exists(),
+        'retention': retention_matrix(data, first, last),
+        'churn': churn_series(data, first, last),
+        'mac_growth': mac_growth(data, first, last),
+    }
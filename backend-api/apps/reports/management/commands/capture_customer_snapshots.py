@@ -0,0 +1,27 @@
+"""
+Django management command to capture monthly customer snapshots.
+Run it daily from cron; the last run in a month becomes that month's state.
+"""
+from django.core.management.base import BaseCommand
+
+from apps.dashboard.reports import parse_month_param
+from apps.reports.snapshots import backfill_customer_snapshots, capture_customer_snapshots
+
+
+class Command(BaseCommand):
+    help = "Snapshot every customer's status and MAC counters for the current month"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backfill-from',
+            help='Also write approximate snapshots from this month (YYYY-MM) up to last month, '
+                 'for history before capturing started',
+        )
+
+    def handle(self, *args, **options):
+        if options['backfill_from']:
+            since = parse_month_param(options['backfill_from'], 'backfill_from')
+            written = backfill_customer_snapshots(since)
+            self.stdout.write(f'Backfilled {written} approximate snapshot rows')
+        written = capture_customer_snapshots()
+        self.stdout.write(self.style.SUCCESS(f'Captured {written} customer snapshots'))
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerMonthlySnapshot',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('customer_id', models.IntegerField(help_text='Kept after the customer is deleted')),
+                ('kam_id', models.IntegerField(blank=True, null=True)),
+                ('customer_type', models.CharField(max_length=20)),
+                ('status', models.CharField(max_length=20)),
+                ('activation_month', models.DateField(help_text='Month the customer was created')),
+                ('total_client', models.IntegerField(blank=True, help_text='MAC only', null=True)),
+                ('total_active_client', models.IntegerField(blank=True, help_text='MAC only', null=True)),
+                ('previous_total_client', models.IntegerField(blank=True, help_text='MAC only', null=True)),
+                ('free_giveaway_client', models.IntegerField(blank=True, help_text='MAC only', null=True)),
+                ('approximate', models.BooleanField(default=False, help_text='Backfilled from current data, not captured in the month')),
+                ('captured_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'customer_monthly_snapshot',
+                'ordering': ['month', 'customer_id'],
+                'indexes': [models.Index(fields=['activation_month', 'month'], name='customer_snapshot_cohort_idx')],
+                'constraints': [models.UniqueConstraint(fields=('month', 'customer_id'), name='customer_snapshot_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import models
+
+
+class CustomerMonthlySnapshot(models.Model):
+    """
+    Customer Monthly Snapshot - Each customer's status and MAC client counters
+    as captured for a month. CustomerMaster overwrites these in place; the
+    snapshots keep their history for churn and cohort analysis.
+    Written by apps.reports.snapshots
+    """
+    id = models.BigAutoField(primary_key=True)
+    month = models.DateField(help_text="First day of the month")
+    customer_id = models.IntegerField(help_text="Kept after the customer is deleted")
+    kam_id = models.IntegerField(null=True, blank=True)
+    customer_type = models.CharField(max_length=20)
+    status = models.CharField(max_length=20)
+    activation_month = models.DateField(help_text="Month the customer was created")
+    total_client = models.IntegerField(null=True, blank=True, help_text="MAC only")
+    total_active_client = models.IntegerField(null=True, blank=True, help_text="MAC only")
+    previous_total_client = models.IntegerField(null=True, blank=True, help_text="MAC only")
+    free_giveaway_client = models.IntegerField(null=True, blank=True, help_text="MAC only")
+    approximate = models.BooleanField(default=False, help_text="Backfilled from current data, not captured in the month")
+    captured_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'customer_monthly_snapshot'
+        ordering = ['month', 'customer_id']
+        constraints = [
+            models.UniqueConstraint(fields=['month', 'customer_id'], name='customer_snapshot_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['activation_month', 'month'], name='customer_snapshot_cohort_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} - {self.customer_id} - {self.status}"
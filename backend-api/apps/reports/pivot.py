@@ -0,0 +1,279 @@
+"""
+Pivot report engine: whitelisted dimensions and measures compiled to one GROUP BY query
+"""
+import csv
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import F, Sum, Count, DecimalField, ExpressionWrapper, Value
+from django.db.models.functions import Coalesce, TruncMonth
+from rest_framework.exceptions import ValidationError
+
+from apps.bills.models import InvoiceMaster, InvoiceDetails
+from apps.bills.utils import parse_date_param
+from apps.payment.models import PaymentDetails
+
+
+MAX_DIMENSIONS = 4
+
+
+def _money():
+    return DecimalField(max_digits=14, decimal_places=2)
+
+
+def _sum(expression):
+    return Coalesce(Sum(expression, output_field=_money()), Value(Decimal('0')), output_field=_money())
+
+
+class Dimension:
+    """
+    A group-by column set.
+
+    columns: (output name, lookup or expression) pairs selected for the group.
+    lookup: field filtered by ?<dimension>=value; month dimensions filter the
+    date field by a YYYY-MM value instead.
+    """
+
+    def __init__(self, columns, lookup=None, parse=str, month_of=None):
+        self.columns = columns
+        self.lookup = lookup or columns[0][1]
+        self.parse = parse
+        self.month_of = month_of
+
+    def filter(self, name, value):
+        if self.month_of:
+            try:
+                start = parse_date_param(f'{value.strip()}-01', name)
+            except ValidationError:
+                raise ValidationError({name: f'Invalid month "{value}". Use YYYY-MM.'})
+            end = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+            return {f'{self.month_of}__gte': start, f'{self.month_of}__lt': end}
+        try:
+            return {self.lookup: self.parse(value)}
+        except ValueError:
+            raise ValidationError({name: f'Invalid value "{value}".'})
+
+
+class Measure:
+    def __init__(self, aggregate, kind='money'):
+        self.aggregate = aggregate
+        self.kind = kind
+
+    def output(self, value):
+        if self.kind == 'count':
+            return value
+        return float(value) if value is not None else 0.0
+
+
+def _customer_dimensions(customer, entitlement):
+    """Dimensions shared by every source, given the paths to the customer and entitlement master"""
+    return {
+        'customer_type': Dimension([('customer_type', f'{customer}__customer_type')]),
+        'kam': Dimension(
+            [('kam_id', f'{customer}__kam_id'), ('kam', f'{customer}__kam_id__kam_name')],
+            parse=int,
+        ),
+        'customer': Dimension(
+            [('customer_id', customer), ('customer', f'{customer}__customer_name')],
+            parse=int,
+        ),
+        'nttn_company': Dimension([('nttn_company', f'{entitlement}__nttn_company')]),
+        'bandwidth_type': Dimension([('bandwidth_type', f'{entitlement}__type_of_bw')]),
+    }
+
+
+class PivotSource:
+    """A base queryset with the dimensions and measures that may be asked of it"""
+
+    def __init__(self, queryset, date_field, dimensions, measures):
+        self.queryset = queryset
+        self.date_field = date_field
+        self.dimensions = dimensions
+        self.measures = measures
+
+
+PIVOT_SOURCES = {
+    'invoices': lambda: PivotSource(
+        InvoiceMaster.objects.exclude(status='cancelled'),
+        'issue_date',
+        {
+            **_customer_dimensions(
+                'customer_entitlement_master_id__customer_master_id', 'customer_entitlement_master_id'
+            ),
+            'status': Dimension([('status', 'status')]),
+            'issue_month': Dimension([('issue_month', TruncMonth('issue_date'))], month_of='issue_date'),
+        },
+        {
+            'billed': Measure(_sum('total_bill_amount')),
+            'paid': Measure(_sum('total_paid_amount')),
+            'due': Measure(_sum('total_balance_due')),
+            'vat': Measure(_sum('total_vat_amount')),
+            'discount': Measure(_sum('total_discount_amount')),
+            'invoice_count': Measure(Count('id'), 'count'),
+        },
+    ),
+    'invoice_lines': lambda: PivotSource(
+        InvoiceDetails.objects.exclude(invoice_master_id__status='cancelled'),
+        'invoice_master_id__issue_date',
+        {
+            **_customer_dimensions(
+                'invoice_master_id__customer_entitlement_master_id__customer_master_id',
+                'invoice_master_id__customer_entitlement_master_id',
+            ),
+            'status': Dimension([('status', 'invoice_master_id__status')]),
+            'issue_month': Dimension(
+                [('issue_month', TruncMonth('invoice_master_id__issue_date'))],
+                month_of='invoice_master_id__issue_date',
+            ),
+            'package_type': Dimension([('package_type', 'entitlement_details_id__type')]),
+        },
+        {
+            'billed': Measure(_sum('line_total')),
+            'subtotal': Measure(_sum('sub_total')),
+            'vat': Measure(_sum(ExpressionWrapper(F('sub_total') * F('vat_rate') / Value(100), output_field=_money()))),
+            'discount': Measure(_sum(ExpressionWrapper(
+                F('sub_total') * F('sub_discount_rate') / Value(100), output_field=_money()
+            ))),
+            'mbps': Measure(_sum('entitlement_details_id__mbps')),
+            'line_count': Measure(Count('id'), 'count'),
+        },
+    ),
+    'payments': lambda: PivotSource(
+        PaymentDetails.objects.exclude(status='failed').exclude(payment_master_id__status='failed'),
+        'payment_master_id__payment_date',
+        {
+            **_customer_dimensions(
+                'payment_master_id__customer_entitlement_master_id__customer_master_id',
+                'payment_master_id__customer_entitlement_master_id',
+            ),
+            'status': Dimension([('status', 'status')]),
+            'payment_method': Dimension([('payment_method', 'payment_master_id__payment_method')]),
+            'payment_month': Dimension(
+                [('payment_month', TruncMonth('payment_master_id__payment_date'))],
+                month_of='payment_master_id__payment_date',
+            ),
+        },
+        {
+            'paid': Measure(_sum('pay_amount')),
+            'payment_count': Measure(Count('payment_master_id', distinct=True), 'count'),
+        },
+    ),
+}
+
+
+def _split(value):
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
+
+
+class PivotQuery:
+    """A validated pivot request; normalized() is what results are cached on"""
+
+    def __init__(self, params):
+        source_name = params.get('source', 'invoices')
+        if source_name not in PIVOT_SOURCES:
+            raise ValidationError({'source': f'Choose from: {", ".join(PIVOT_SOURCES)}'})
+        self.source_name = source_name
+        self.source = source = PIVOT_SOURCES[source_name]()
+
+        self.dimensions = list(dict.fromkeys(_split(params.get('dimensions'))))
+        unknown = [name for name in self.dimensions if name not in source.dimensions]
+        if unknown:
+            raise ValidationError({'dimensions': (
+                f'Unknown for {source_name}: {", ".join(unknown)}. Choose from: {", ".join(source.dimensions)}'
+            )})
+        if len(self.dimensions) > MAX_DIMENSIONS:
+            raise ValidationError({'dimensions': f'At most {MAX_DIMENSIONS} dimensions.'})
+
+        self.measures = list(dict.fromkeys(_split(params.get('measures')))) or list(source.measures)
+        unknown = [name for name in self.measures if name not in source.measures]
+        if unknown:
+            raise ValidationError({'measures': (
+                f'Unknown for {source_name}: {", ".join(unknown)}. Choose from: {", ".join(source.measures)}'
+            )})
+
+        self.filters = {}
+        for name, dimension in source.dimensions.items():
+            if params.get(name):
+                self.filters[name] = params[name].strip()
+        self.start_date = parse_date_param(params['start_date'], 'start_date') if params.get('start_date') else None
+        self.end_date = parse_date_param(params['end_date'], 'end_date') if params.get('end_date') else None
+
+        self.columns = [column for name in self.dimensions for column, _ in source.dimensions[name].columns]
+        self.sort = params.get('sort') or f'-{self.measures[0]}'
+        if self.sort.lstrip('-') not in [*self.columns, *self.measures]:
+            raise ValidationError({'sort': f'Sort by one of: {", ".join([*self.columns, *self.measures])}'})
+
+    def normalized(self):
+        return {
+            'source': self.source_name,
+            'dimensions': self.dimensions,
+            'measures': self.measures,
+            'filters': sorted(self.filters.items()),
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'sort': self.sort,
+        }
+
+    def filtered(self):
+        """The source rows matching the filters, before grouping"""
+        source = self.source
+        qs = source.queryset.order_by()
+        for name, value in self.filters.items():
+            qs = qs.filter(**source.dimensions[name].filter(name, value))
+        if self.start_date:
+            qs = qs.filter(**{f'{source.date_field}__gte': self.start_date})
+        if self.end_date:
+            qs = qs.filter(**{f'{source.date_field}__lte': self.end_date})
+        return qs
+
+    def queryset(self):
+        """One GROUP BY query over the requested dimensions (at least one), sorted and stable for paging"""
+        fields, selected = [], {}
+        for name in self.dimensions:
+            for column, expression in self.source.dimensions[name].columns:
+                if expression == column:
+                    # A model field selected under its own name (an alias would clash)
+                    fields.append(column)
+                else:
+                    selected[column] = F(expression) if isinstance(expression, str) else expression
+        aggregates = {name: self.source.measures[name].aggregate for name in self.measures}
+        qs = self.filtered().values(*fields, **selected).annotate(**aggregates)
+        tie_breakers = [column for column in self.columns if column != self.sort.lstrip('-')]
+        return qs.order_by(self.sort, *tie_breakers)
+
+    def totals(self):
+        totals = self.filtered().aggregate(**{
+            name: self.source.measures[name].aggregate for name in self.measures
+        })
+        return {name: self.source.measures[name].output(totals[name]) for name in self.measures}
+
+    def serialize(self, row):
+        item = {}
+        for column in self.columns:
+            value = row[column]
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()[:7]
+            item[column] = value
+        for name in self.measures:
+            item[name] = self.source.measures[name].output(row[name])
+        return item
+
+
+class _Echo:
+    """File-like object whose write() just returns the value for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def iter_pivot_csv(query):
+    """Yield every pivot row as CSV lines straight from the database cursor"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow([*query.columns, *query.measures])
+    if not query.columns:
+        totals = query.totals()
+        yield writer.writerow([totals[name] for name in query.measures])
+        return
+    for row in query.queryset().iterator(chunk_size=2000):
+        item = query.serialize(row)
+        yield writer.writerow([item[column] for column in [*query.columns, *query.measures]])
@@ -0,0 +1,285 @@
+"""
+Company and data-entry performance reports built from set-based aggregates
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Q, F, Sum, Count, CharField, DecimalField, Value
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from apps.bills.closing import closed_months
+from apps.bills.models import InvoiceMaster, CustomerEntitlementDetails, PeriodClose
+from apps.bills.utils import parse_date_param
+from apps.customers.models import CustomerMaster
+from apps.dashboard.reports import shift_period
+from apps.payment.models import PaymentMaster, PaymentDetails
+
+
+EXCLUDED_INVOICE_STATUSES = ['cancelled']
+EXCLUDED_PAYMENT_STATUSES = ['failed']
+
+INVOICE_STATUSES = ['draft', 'unpaid', 'partial', 'paid']
+
+# action -> (model, user column, timestamp column); each has a (user, timestamp) index
+ACTIVITY_SOURCES = {
+    'create_customer': (CustomerMaster, 'created_by', 'created_at'),
+    'update_customer': (CustomerMaster, 'updated_by', 'updated_at'),
+    'create_entitlement': (CustomerEntitlementDetails, 'created_by', 'created_at'),
+    'create_bill': (InvoiceMaster, 'created_by', 'created_at'),
+    'create_payment': (PaymentMaster, 'created_by', 'created_at'),
+}
+
+# updated_at is stamped on creation too; saves this close to created_at are not edits
+UPDATE_GRACE = timedelta(seconds=1)
+
+
+def _money():
+    return DecimalField(max_digits=14, decimal_places=2)
+
+
+def _sum(field, condition=None):
+    return Coalesce(Sum(field, filter=condition, output_field=_money()), Value(Decimal('0')), output_field=_money())
+
+
+def report_range(params):
+    """(start, end) dates from the query parameters, default current month to date"""
+    today = timezone.localdate()
+    start = parse_date_param(params['start_date'], 'start_date') if params.get('start_date') else today.replace(day=1)
+    end = parse_date_param(params['end_date'], 'end_date') if params.get('end_date') else today
+    if start > end:
+        raise ValidationError({'start_date': 'start_date must be on or before end_date.'})
+    return start, end
+
+
+def moment_range(start, end):
+    """Aware [start, end) datetimes so timestamp columns are compared directly (index friendly)"""
+    return (
+        timezone.make_aware(datetime.combine(start, time.min)),
+        timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)),
+    )
+
+
+def company_report(params):
+    """
+    Billing, collections and customer movements for a date range.
+
+    Each section is one aggregate query; the monthly breakdown adds one
+    GROUP BY query per section. Whole months of the range that are closed
+    are read from the month-end close (period_close), so their billed,
+    received, due and collected figures are those frozen at close time and
+    only the open part of the range is aggregated live. Bill counts by
+    status and collections by method are always live.
+    """
+    start, end = report_range(params)
+    since, until = moment_range(start, end)
+
+    invoices = InvoiceMaster.objects.filter(
+        issue_date__gte=start, issue_date__lte=end
+    ).exclude(status__in=EXCLUDED_INVOICE_STATUSES).order_by()
+    payments = PaymentDetails.objects.filter(
+        payment_master_id__payment_date__gte=start, payment_master_id__payment_date__lte=end
+    ).exclude(status__in=EXCLUDED_PAYMENT_STATUSES).exclude(
+        payment_master_id__status__in=EXCLUDED_PAYMENT_STATUSES
+    ).order_by()
+
+    # Months are closed in order, so the closed months of the range are one block
+    closed = closed_months(start, end)
+    live_invoices, live_payments = invoices, payments
+    frozen = PeriodClose.objects.filter(month__in=closed).order_by()
+    if closed:
+        closed_end = shift_period(closed[-1], 'month', 1)
+        live_invoices = invoices.exclude(issue_date__gte=closed[0], issue_date__lt=closed_end)
+        live_payments = payments.exclude(
+            payment_master_id__payment_date__gte=closed[0], payment_master_id__payment_date__lt=closed_end
+        )
+
+    billing = live_invoices.aggregate(
+        total_bills=Count('id'),
+        total_amount=_sum('total_bill_amount'),
+        total_received=_sum('total_paid_amount'),
+        total_due=_sum('total_balance_due'),
+        total_vat=_sum('total_vat_amount'),
+        total_discount=_sum('total_discount_amount'),
+    )
+    billing.update(invoices.aggregate(
+        **{f'{name}_bills': Count('id', filter=Q(status=name)) for name in INVOICE_STATUSES},
+    ))
+    collections = live_payments.aggregate(
+        total_collected=_sum('pay_amount'),
+        payment_count=Count('payment_master_id', distinct=True),
+    )
+    if closed:
+        totals = frozen.aggregate(
+            total_bills=Coalesce(Sum('invoice_count'), 0),
+            total_amount=_sum('billed_amount'),
+            total_received=_sum('paid_amount'),
+            total_due=_sum('due_amount'),
+            total_vat=_sum('vat_amount'),
+            total_discount=_sum('discount_amount'),
+            total_collected=_sum('collected_amount'),
+            payment_count=Coalesce(Sum('payment_count'), 0),
+        )
+        for name in ['total_bills', 'total_amount', 'total_received', 'total_due', 'total_vat', 'total_discount']:
+            billing[name] += totals[name]
+        for name in ['total_collected', 'payment_count']:
+            collections[name] += totals[name]
+    by_method = payments.values('payment_master_id__payment_method').annotate(
+        amount=_sum('pay_amount'),
+        payment_count=Count('payment_master_id', distinct=True),
+    ).order_by('-amount')
+
+    # Customers that are no longer active and were last changed in the range count as churned
+    customer_types = [choice for choice, _ in CustomerMaster.CUSTOMER_TYPE_CHOICES]
+    new_in_range = Q(created_at__gte=since, created_at__lt=until)
+    customers = CustomerMaster.objects.order_by().aggregate(
+        total_customers=Count('id', filter=Q(created_at__lt=until)),
+        active_customers=Count('id', filter=Q(status='active')),
+        new_customers=Count('id', filter=new_in_range),
+        churned_customers=Count('id', filter=Q(updated_at__gte=since, updated_at__lt=until) & ~Q(status='active')),
+        **{f'new_{name}': Count('id', filter=new_in_range & Q(customer_type=name)) for name in customer_types},
+    )
+
+    monthly = {}
+
+    def month_row(month):
+        return monthly.setdefault(month, {
+            'month': month.isoformat()[:7], 'billed': 0.0, 'bills': 0, 'collected': 0.0, 'new_customers': 0,
+        })
+
+    for row in live_invoices.annotate(month=TruncMonth('issue_date')).values('month').annotate(
+        billed=_sum('total_bill_amount'), bills=Count('id')
+    ):
+        month_row(row['month']).update(billed=float(row['billed']), bills=row['bills'])
+    for row in live_payments.annotate(month=TruncMonth('payment_master_id__payment_date')).values('month').annotate(
+        collected=_sum('pay_amount')
+    ):
+        month_row(row['month'])['collected'] = float(row['collected'])
+    for row in frozen.values('month').annotate(
+        billed=_sum('billed_amount'), bills=Coalesce(Sum('invoice_count'), 0), collected=_sum('collected_amount')
+    ):
+        month_row(row['month']).update(billed=float(row['billed']), bills=row['bills'], collected=float(row['collected']))
+    for row in CustomerMaster.objects.filter(new_in_range).order_by().annotate(
+        month=TruncMonth('created_at')
+    ).values('month').annotate(count=Count('id')):
+        month = row['month'].date() if isinstance(row['month'], datetime) else row['month']
+        month_row(month)['new_customers'] = row['count']
+
+    total_bills = billing['total_bills']
+    return {
+        'period': {'start_date': start.isoformat(), 'end_date': end.isoformat()},
+        'revenue': {
+            'total_bills': total_bills,
+            'total_amount': float(billing['total_amount']),
+            'total_received': float(billing['total_received']),
+            'total_due': float(billing['total_due']),
+            'total_vat': float(billing['total_vat']),
+            'total_discount': float(billing['total_discount']),
+            'avg_bill': round(float(billing['total_amount']) / total_bills, 2) if total_bills else 0.0,
+            'by_status': {name: billing[f'{name}_bills'] for name in INVOICE_STATUSES},
+        },
+        'collections': {
+            'total_collected': float(collections['total_collected']),
+            'payment_count': collections['payment_count'],
+            'collection_rate': round(
+                float(collections['total_collected'] / billing['total_amount']) * 100, 1
+            ) if billing['total_amount'] else 0.0,
+            'by_method': [
+                {
+                    'payment_method': row['payment_master_id__payment_method'],
+                    'amount': float(row['amount']),
+                    'payment_count': row['payment_count'],
+                }
+                for row in by_method
+            ],
+        },
+        'customers': {
+            'total': customers['total_customers'],
+            'total_active': customers['active_customers'],
+            'new': customers['new_customers'],
+            'churned': customers['churned_customers'],
+            'net_change': customers['new_customers'] - customers['churned_customers'],
+            'new_by_type': {name: customers[f'new_{name}'] for name in customer_types},
+        },
+        'monthly': [monthly[month] for month in sorted(monthly)],
+    }
+
+
+def activity_counts(since, until, user_id=None):
+    """
+    (user id, action, count) rows for every tracked action in [since, until).
+
+    Each source is a range scan on its (user, timestamp) index; the branches
+    are combined with UNION ALL and grouped once in the database.
+    """
+    branches = []
+    for action, (model, user_field, at_field) in ACTIVITY_SOURCES.items():
+        qs = model.objects.filter(**{
+            f'{user_field}__isnull': False,
+            f'{at_field}__gte': since,
+            f'{at_field}__lt': until,
+        })
+        if user_id is not None:
+            qs = qs.filter(**{user_field: user_id})
+        if at_field == 'updated_at':
+            qs = qs.filter(updated_at__gt=F('created_at') + UPDATE_GRACE)
+        branches.append(qs.order_by().values(
+            user_id=F(user_field), action=Value(action, output_field=CharField())
+        ))
+
+    sql, sql_params = branches[0].union(*branches[1:], all=True).query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT activity.user_id, activity.action, COUNT(*) FROM ({sql}) activity '
+            f'GROUP BY activity.user_id, activity.action',
+            sql_params,
+        )
+        return cursor.fetchall()
+
+
+def data_entry_performance(params):
+    """Records created and updated per user, most active first"""
+    start, end = report_range(params)
+    user_id = params.get('user_id')
+    if user_id:
+        try:
+            user_id = int(user_id)
+        except ValueError:
+            raise ValidationError({'user_id': 'user_id must be an integer.'})
+    else:
+        user_id = None
+
+    per_user = {}
+    for row_user_id, action, count in activity_counts(*moment_range(start, end), user_id=user_id):
+        per_user.setdefault(row_user_id, {name: 0 for name in ACTIVITY_SOURCES})[action] = count
+
+    users = get_user_model().objects.in_bulk(per_user.keys())
+    rows = []
+    for row_user_id, actions in per_user.items():
+        user = users.get(row_user_id)
+        updates = sum(count for action, count in actions.items() if action.startswith('update_'))
+        total = sum(actions.values())
+        rows.append({
+            'user_id': row_user_id,
+            'username': user.username if user else None,
+            'email': user.email if user else None,
+            'actions': actions,
+            'entries': total - updates,
+            'updates': updates,
+            'total_actions': total,
+        })
+    rows.sort(key=lambda row: (-row['total_actions'], row['username'] or ''))
+
+    return {
+        'period': {'start_date': start.isoformat(), 'end_date': end.isoformat()},
+        'summary': {
+            'total_activities': sum(row['total_actions'] for row in rows),
+            'unique_users': len(rows),
+            'total_entries': sum(row['entries'] for row in rows),
+            'total_updates': sum(row['updates'] for row in rows),
+        },
+        'user_performance': rows,
+    }
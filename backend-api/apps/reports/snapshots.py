@@ -0,0 +1,103 @@
+"""
+Monthly customer state snapshots, captured set-based with INSERT ... SELECT
+"""
+from datetime import date, datetime, time
+
+from django.db import connection, transaction
+from django.db.models import BooleanField, Case, CharField, DateField, DateTimeField, F, Value, When
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from apps.customers.models import CustomerMaster
+from apps.utility.versions import bump_version, get_version
+from .models import CustomerMonthlySnapshot
+
+
+# Snapshot column -> CustomerMaster field copied as-is
+COPIED_COLUMNS = {
+    'customer_id': 'id',
+    'kam_id': 'kam_id',
+    'customer_type': 'customer_type',
+    'total_client': 'total_client',
+    'total_active_client': 'total_active_client',
+    'previous_total_client': 'previous_total_client',
+    'free_giveaway_client': 'free_giveaway_client',
+}
+
+
+def get_snapshot_version():
+    """Current snapshot version; cached cohort reports embed it in their keys"""
+    return get_version('customer_snapshots')
+
+
+def bump_snapshot_version():
+    bump_version('customer_snapshots')
+
+
+def _next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _insert_select(month, status, customers, approximate):
+    """Replace month's rows with one INSERT ... SELECT over the given customers"""
+    source = customers.order_by().values(
+        *COPIED_COLUMNS.values(),
+        snapshot_status=status,
+        snapshot_month=Value(month, output_field=DateField()),
+        snapshot_activation=TruncMonth('created_at', output_field=DateField()),
+        snapshot_approximate=Value(approximate, output_field=BooleanField()),
+        snapshot_captured_at=Value(timezone.now(), output_field=DateTimeField()),
+    )
+    # values() selects the plain fields first, then the expressions in order
+    columns = [*COPIED_COLUMNS, 'status', 'month', 'activation_month', 'approximate', 'captured_at']
+    sql, params = source.query.sql_with_params()
+    table = CustomerMonthlySnapshot._meta.db_table
+    quote = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        CustomerMonthlySnapshot.objects.filter(month=month).delete()
+        cursor.execute(
+            f'INSERT INTO {quote(table)} ({", ".join(quote(column) for column in columns)}) {sql}',
+            params,
+        )
+        written = cursor.rowcount
+    transaction.on_commit(bump_snapshot_version)
+    return written
+
+
+def capture_customer_snapshots(month=None):
+    """
+    Record every customer's current state as the snapshot of month (default:
+    the current month). Run daily: the last capture in a month becomes its
+    month-end state. Returns the number of rows written.
+    """
+    month = (month or timezone.localdate()).replace(day=1)
+    return _insert_select(month, F('status'), CustomerMaster.objects.all(), approximate=False)
+
+
+def backfill_customer_snapshots(since, until=None):
+    """
+    Approximate snapshots for months before capturing started, from current data.
+
+    A customer counts from its creation month. One that is no longer active
+    is taken as active until the month of its last update. MAC counters are
+    today's values. Rows are flagged approximate; months that were really
+    captured are left alone. Returns rows written.
+    """
+    month = since.replace(day=1)
+    until = (until or timezone.localdate()).replace(day=1)
+    written = 0
+    while month < until:
+        if CustomerMonthlySnapshot.objects.filter(month=month, approximate=False).exists():
+            # Never overwrite a real capture
+            month = _next_month(month)
+            continue
+        month_end = timezone.make_aware(datetime.combine(_next_month(month), time.min))
+        status = Case(
+            When(status='active', then=Value('active')),
+            When(updated_at__gte=month_end, then=Value('active')),
+            default=F('status'),
+            output_field=CharField(),
+        )
+        written += _insert_select(month, status, CustomerMaster.objects.filter(created_at__lt=month_end), approximate=True)
+        month = _next_month(month)
+    return written
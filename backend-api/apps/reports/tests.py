@@ -0,0 +1,293 @@
+from datetime import date, datetime, time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.bills.tests import make_customer, make_entitlement, make_detail, make_invoice, make_payment
+from apps.customers.models import CustomerMaster, KAMMaster
+from apps.dashboard.tests import make_billed_invoice
+from .cohorts import cohort_report
+from .models import CustomerMonthlySnapshot
+from .reports import company_report, data_entry_performance
+from .snapshots import backfill_customer_snapshots, capture_customer_snapshots
+
+User = get_user_model()
+
+
+class CompanyReportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.acme = make_customer('Acme')
+        cls.globex = make_customer('Globex', customer_type='soho', status='inactive')
+        make_payment(make_invoice(make_entitlement(cls.acme), date(2025, 1, 10), '1000', paid='400'), date(2025, 1, 20), '400')
+        make_payment(make_invoice(make_entitlement(cls.globex), date(2025, 2, 5), '500', paid='500'),
+                     date(2025, 2, 6), '500', payment_method='bkash')
+        make_invoice(make_entitlement(cls.acme), date(2025, 2, 15), '300', status='cancelled')
+        make_invoice(make_entitlement(cls.acme), date(2025, 4, 1), '999')
+
+    def test_billing_and_collections(self):
+        report = company_report({'start_date': '2025-01-01', 'end_date': '2025-02-28'})
+        self.assertEqual(report['period'], {'start_date': '2025-01-01', 'end_date': '2025-02-28'})
+        revenue = report['revenue']
+        self.assertEqual(
+            (revenue['total_bills'], revenue['total_amount'], revenue['total_received'], revenue['total_due']),
+            (2, 1500.0, 900.0, 600.0),
+        )
+        self.assertEqual(revenue['avg_bill'], 750.0)
+        self.assertEqual(revenue['by_status'], {'draft': 0, 'unpaid': 0, 'partial': 1, 'paid': 1})
+        collections = report['collections']
+        self.assertEqual((collections['total_collected'], collections['payment_count']), (900.0, 2))
+        self.assertEqual(collections['collection_rate'], 60.0)
+        self.assertEqual(
+            [(row['payment_method'], row['amount']) for row in collections['by_method']],
+            [('bkash', 500.0), ('cash', 400.0)],
+        )
+        self.assertEqual(
+            [(row['month'], row['billed'], row['bills'], row['collected']) for row in report['monthly']],
+            [('2025-01', 1000.0, 1, 400.0), ('2025-02', 500.0, 1, 500.0)],
+        )
+
+    def test_customer_movements(self):
+        today = timezone.localdate()
+        customers = company_report({'start_date': (today - timedelta(days=1)).isoformat()})['customers']
+        self.assertEqual((customers['total'], customers['total_active'], customers['new']), (2, 1, 2))
+        self.assertEqual((customers['churned'], customers['net_change']), (1, 1))
+        self.assertEqual((customers['new_by_type']['bw'], customers['new_by_type']['soho']), (1, 1))
+
+        customers = company_report({'start_date': '2024-01-01', 'end_date': '2024-12-31'})['customers']
+        self.assertEqual((customers['total'], customers['new'], customers['churned']), (0, 0, 0))
+
+    def test_invalid_range(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_superuser(email='admin@example.com', username='admin', password='admin'))
+        url = reverse('reports-company')
+        self.assertEqual(client.get(url, {'start_date': '2025-03-01', 'end_date': '2025-02-01'}).status_code, 400)
+        self.assertEqual(client.get(url, {'start_date': '01/03/2025'}).status_code, 400)
+        self.assertEqual(client.get(url).status_code, 200)
+
+
+class DataEntryPerformanceTests(TestCase):
+
+    def setUp(self):
+        self.alice = User.objects.create_user(email='alice@example.com', username='alice', password='alice')
+        self.bob = User.objects.create_user(email='bob@example.com', username='bob', password='bob')
+        customer = make_customer('Acme', created_by=self.alice, updated_by=self.alice)
+        entitlement = make_entitlement(customer)
+        make_detail(entitlement, date(2025, 1, 1), date(2025, 1, 31), created_by=self.alice)
+        invoice = make_invoice(entitlement, date(2025, 1, 1), created_by=self.bob)
+        make_payment(invoice, date(2025, 1, 5), created_by=self.bob)
+        make_payment(invoice, date(2025, 1, 6), created_by=self.bob)
+
+    def test_counts_per_user(self):
+        report = data_entry_performance({'start_date': timezone.localdate().isoformat()})
+        self.assertEqual(
+            [(row['username'], row['entries'], row['updates']) for row in report['user_performance']],
+            [('bob', 3, 0), ('alice', 2, 0)],
+        )
+        self.assertEqual(report['user_performance'][0]['actions']['create_payment'], 2)
+        self.assertEqual(report['summary'], {'total_activities': 5, 'unique_users': 2, 'total_entries': 5, 'total_updates': 0})
+
+    def test_edits_count_as_updates(self):
+        # A save well after creation is an edit, one right after it is not
+        CustomerMaster.objects.update(
+            created_at=timezone.now() - timedelta(minutes=5), updated_by=self.bob, updated_at=timezone.now()
+        )
+        report = data_entry_performance({'start_date': timezone.localdate().isoformat(), 'user_id': str(self.bob.pk)})
+        bob, = report['user_performance']
+        self.assertEqual((bob['entries'], bob['updates'], bob['actions']['update_customer']), (3, 1, 1))
+
+    def test_invalid_user(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_superuser(email='admin@example.com', username='admin', password='admin'))
+        self.assertEqual(client.get(reverse('reports-performance'), {'user_id': 'bob'}).status_code, 400)
+
+
+class PivotReportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(email='admin@example.com', username='admin', password='admin')
+        cls.kam = KAMMaster.objects.create(kam_name='Rahim')
+        acme = make_customer('Acme', kam_id=cls.kam)
+        globex = make_customer('Globex', customer_type='soho')
+        invoice = make_billed_invoice(acme, date(2025, 1, 10), [('bw', '600'), ('soho', '400')])
+        make_payment(invoice, date(2025, 1, 20), '250', payment_method='bkash')
+        make_payment(invoice, date(2025, 2, 2), '150')
+        make_billed_invoice(globex, date(2025, 2, 5), [('soho', '300')])
+        make_invoice(make_entitlement(globex), date(2025, 2, 7), '700', status='cancelled')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def pivot(self, **params):
+        response = self.client.get(reverse('reports-pivot'), params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_group_by_dimensions(self):
+        data = self.pivot(dimensions='customer_type,issue_month', measures='billed,invoice_count')
+        self.assertEqual(data['results'], [
+            {'customer_type': 'bw', 'issue_month': '2025-01', 'billed': 1000.0, 'invoice_count': 1},
+            {'customer_type': 'soho', 'issue_month': '2025-02', 'billed': 300.0, 'invoice_count': 1},
+        ])
+        self.assertEqual(data['totals'], {'billed': 1300.0, 'invoice_count': 2})
+
+        data = self.pivot(source='invoice_lines', dimensions='package_type', measures='billed,line_count', sort='package_type')
+        self.assertEqual(
+            [(row['package_type'], row['billed'], row['line_count']) for row in data['results']],
+            [('bw', 600.0, 1), ('soho', 700.0, 2)],
+        )
+
+        data = self.pivot(source='payments', dimensions='kam,payment_method', kam=str(self.kam.pk))
+        self.assertEqual(
+            [(row['kam'], row['payment_method'], row['paid']) for row in data['results']],
+            [('Rahim', 'bkash', 250.0), ('Rahim', 'cash', 150.0)],
+        )
+
+    def test_filters_and_paging(self):
+        self.assertEqual(self.pivot(measures='billed', issue_month='2025-02')['results'], [{'billed': 300.0}])
+        self.assertEqual(self.pivot(measures='billed', start_date='2025-01-11')['totals'], {'billed': 300.0})
+
+        data = self.pivot(dimensions='customer', measures='billed', page_size='1')
+        self.assertEqual((data['count'], data['results'][0]['customer']), (2, 'Acme'))
+        self.assertIsNotNone(data['next'])
+        self.assertEqual(self.pivot(dimensions='customer', measures='billed', page_size='1', page='2')['results'][0]['customer'], 'Globex')
+
+    def test_invalid_requests(self):
+        url = reverse('reports-pivot')
+        for params in [
+            {'source': 'ledger'},
+            {'dimensions': 'payment_method'},
+            {'dimensions': 'customer,kam,status,issue_month,nttn_company'},
+            {'measures': 'mbps'},
+            {'sort': 'customer'},
+            {'issue_month': '2025/02'},
+            {'kam': 'Rahim'},
+        ]:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(url, params).status_code, 400)
+
+    def test_csv_export(self):
+        response = self.client.get(reverse('reports-pivot-export'), {'dimensions': 'customer_type', 'measures': 'billed,due'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(
+            b''.join(response.streaming_content).decode().splitlines(),
+            ['customer_type,billed,due', 'bw,1000.0,1000.0', 'soho,300.0,300.0'],
+        )
+
+
+def aware(day):
+    return timezone.make_aware(datetime.combine(day, time(12)))
+
+
+class CustomerSnapshotTests(TestCase):
+
+    def setUp(self):
+        self.acme = make_customer('Acme', total_client=None)
+        self.partner = make_customer('Partner', customer_type='channel_partner', total_client=40, total_active_client=35)
+        # Left in March
+        CustomerMaster.objects.filter(pk=self.acme.pk).update(
+            created_at=aware(date(2025, 1, 10)), updated_at=aware(date(2025, 3, 15)), status='inactive'
+        )
+        CustomerMaster.objects.filter(pk=self.partner.pk).update(created_at=aware(date(2025, 2, 1)))
+
+    def snapshots(self, month):
+        return {
+            row.customer_id: (row.status, row.activation_month, row.total_client, row.approximate)
+            for row in CustomerMonthlySnapshot.objects.filter(month=month)
+        }
+
+    def test_capture_replaces_the_month(self):
+        self.assertEqual(capture_customer_snapshots(date(2025, 4, 20)), 2)
+        self.assertEqual(self.snapshots(date(2025, 4, 1)), {
+            self.acme.pk: ('inactive', date(2025, 1, 1), None, False),
+            self.partner.pk: ('active', date(2025, 2, 1), 40, False),
+        })
+        CustomerMaster.objects.filter(pk=self.partner.pk).update(total_client=45)
+        capture_customer_snapshots(date(2025, 4, 30))
+        self.assertEqual(self.snapshots(date(2025, 4, 1))[self.partner.pk][2], 45)
+        self.assertEqual(CustomerMonthlySnapshot.objects.count(), 2)
+
+    def test_backfill_keeps_real_captures(self):
+        capture_customer_snapshots(date(2025, 2, 1))
+        self.assertEqual(backfill_customer_snapshots(date(2025, 1, 1), until=date(2025, 5, 1)), 1 + 2 + 2)
+        self.assertEqual(self.snapshots(date(2025, 1, 1)), {self.acme.pk: ('active', date(2025, 1, 1), None, True)})
+        self.assertEqual(self.snapshots(date(2025, 2, 1))[self.acme.pk], ('inactive', date(2025, 1, 1), None, False))
+        # Inactive from the month-end after its last update
+        self.assertEqual(self.snapshots(date(2025, 3, 1))[self.acme.pk], ('inactive', date(2025, 1, 1), None, True))
+        self.assertEqual(self.snapshots(date(2025, 3, 1))[self.partner.pk], ('active', date(2025, 2, 1), 40, True))
+        self.assertFalse(CustomerMonthlySnapshot.objects.filter(month=date(2025, 5, 1)).exists())
+
+
+class CohortReportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(email='admin@example.com', username='admin', password='admin')
+        # Customer 1 stays, 2 churns in February and comes back in March,
+        # 3 joins in February, 4 is a MAC partner growing its clients
+        history = {
+            1: ('bw', 1, ['active', 'active', 'active'], [None] * 3),
+            2: ('bw', 1, ['active', 'inactive', 'active'], [None] * 3),
+            3: ('soho', 2, [None, 'active', 'active'], [None] * 3),
+            4: ('channel_partner', 1, ['active', 'active', 'active'], [10, 15, 12]),
+        }
+        for customer_id, (customer_type, activation, statuses, clients) in history.items():
+            for month, (status, total_client) in enumerate(zip(statuses, clients), start=1):
+                if status:
+                    CustomerMonthlySnapshot.objects.create(
+                        month=date(2025, month, 1), customer_id=customer_id, customer_type=customer_type,
+                        status=status, activation_month=date(2025, activation, 1), total_client=total_client,
+                        total_active_client=total_client, captured_at=timezone.now(),
+                    )
+
+    def report(self, **params):
+        return cohort_report({'start_month': '2025-01', 'end_month': '2025-03', **params})
+
+    def test_retention(self):
+        report = self.report()
+        self.assertEqual(report['period'], {'start_month': '2025-01', 'end_month': '2025-03'})
+        self.assertFalse(report['approximate'])
+        self.assertEqual(report['retention'], [
+            {'cohort': '2025-01', 'size': 3, 'retention': [1.0, 0.6667, 1.0]},
+            {'cohort': '2025-02', 'size': 1, 'retention': [1.0, 1.0]},
+        ])
+
+    def test_churn(self):
+        self.assertEqual(
+            [(row['month'], row['active'], row['new'], row['churned'], row['reactivated'], row['churn_rate'])
+             for row in self.report()['churn']],
+            [('2025-01', 3, 3, 0, 0, None), ('2025-02', 3, 1, 1, 0, 0.3333), ('2025-03', 4, 0, 0, 1, 0.0)],
+        )
+        self.assertEqual([row['active'] for row in self.report(customer_type='soho')['churn']], [1, 1])
+
+    def test_mac_growth(self):
+        growth = self.report()['mac_growth']
+        self.assertEqual(
+            [(row['month'], row['total_clients'], row['net_new_clients'], row['growth_rate']) for row in growth['monthly']],
+            [('2025-01', 10, None, None), ('2025-02', 15, 5, 0.5), ('2025-03', 12, -3, -0.2)],
+        )
+        self.assertEqual([row['avg_clients'] for row in growth['by_months_since_activation']], [10.0, 15.0, 12.0])
+
+    def test_endpoint_follows_captures(self):
+        cache.clear()
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        url = reverse('reports-cohorts')
+        params = {'start_month': '2025-01', 'end_month': '2025-04'}
+        self.assertEqual(len(client.get(url, params).data['churn']), 3)
+
+        make_customer('Initech')
+        with self.captureOnCommitCallbacks(execute=True):
+            capture_customer_snapshots(date(2025, 4, 1))
+        self.assertEqual(client.get(url, params).data['churn'][-1]['month'], '2025-04')
+
+        self.assertEqual(client.get(url, {'start_month': '2025-03', 'end_month': '2025-01'}).status_code, 400)
+        self.assertEqual(client.get(url, {'kam_id': 'Rahim'}).status_code, 400)
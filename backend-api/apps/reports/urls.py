@@ -0,0 +1,16 @@
+from django.urls import path
+from .views import (
+    CompanyReportView,
+    DataEntryPerformanceView,
+    PivotReportView,
+    PivotExportView,
+    CohortReportView,
+)
+
+urlpatterns = [
+    path('company/', CompanyReportView.as_view(), name='reports-company'),
+    path('performance/', DataEntryPerformanceView.as_view(), name='reports-performance'),
+    path('pivot/', PivotReportView.as_view(), name='reports-pivot'),
+    path('pivot/export/', PivotExportView.as_view(), name='reports-pivot-export'),
+    path('cohorts/', CohortReportView.as_view(), name='reports-cohorts'),
+]
@@ -0,0 +1,139 @@
+"""
+REST API Views for Reports App
+"""
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import permissions
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.views import APIView
+from rest_framework.response import Response
+
+from apps.authentication.permissions import RequirePermissions
+from apps.bills.utils import get_billing_version
+from apps.dashboard.utils import snapshot_cache_key, get_or_compute
+from apps.payment.utils import get_payments_version
+from .cohorts import cohort_report
+from .pivot import PivotQuery, iter_pivot_csv
+from .reports import company_report, data_entry_performance
+from .snapshots import get_snapshot_version
+
+
+class ReportView(APIView):
+    permission_classes = [permissions.IsAuthenticated, RequirePermissions]
+    required_permissions = ['reports:read']
+
+
+class CompanyReportView(ReportView):
+    def get(self, request):
+        """
+        Billing, collections and customer movements over a date range
+        Query parameters:
+        - start_date, end_date: Range (YYYY-MM-DD, default: current month to date)
+        """
+        return Response(company_report(request.query_params))
+
+
+class DataEntryPerformanceView(ReportView):
+    def get(self, request):
+        """
+        Records created and updated per user over a date range
+        Query parameters:
+        - start_date, end_date: Range (YYYY-MM-DD, default: current month to date)
+        - user_id: Only this user
+        """
+        return Response(data_entry_performance(request.query_params))
+
+
+class PivotPagination(PageNumberPagination):
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class PivotReportView(ReportView):
+    def get(self, request):
+        """
+        Pivot table: one GROUP BY over whitelisted dimensions and measures, paginated and cached
+        Query parameters:
+        - source: 'invoices', 'invoice_lines', 'payments' (default: 'invoices')
+        - dimensions: Comma-separated, e.g. 'customer_type,kam,issue_month'
+          (customer_type, kam, customer, nttn_company, bandwidth_type, status, plus
+          issue_month for invoices and invoice_lines, package_type for invoice_lines,
+          payment_method and payment_month for payments)
+        - measures: Comma-separated (default: all of the source)
+          invoices: billed, paid, due, vat, discount, invoice_count
+          invoice_lines: billed, subtotal, vat, discount, mbps, line_count
+          payments: paid, payment_count
+        - <dimension>=value: Filter on a dimension (kam/customer by id, months as YYYY-MM)
+        - start_date, end_date: Range on the issue or payment date (YYYY-MM-DD)
+        - sort: Measure or dimension column, '-' for descending (default: -first measure)
+        - page, page_size: Pagination (default page_size 100, max 1000)
+        """
+        query = PivotQuery(request.query_params)
+        paginator = PivotPagination()
+        key_params = {
+            **query.normalized(),
+            'page': request.query_params.get(paginator.page_query_param, '1'),
+            'page_size': paginator.get_page_size(request),
+            'billing': get_billing_version(),
+            'payments': get_payments_version(),
+        }
+
+        def compute():
+            totals = query.totals()
+            report = {
+                'source': query.source_name,
+                'dimensions': query.dimensions,
+                'measures': query.measures,
+                'count': 1,
+                'next': None,
+                'previous': None,
+                'totals': totals,
+                'results': [totals],
+            }
+            if query.columns:
+                rows = paginator.paginate_queryset(query.queryset(), request, view=self)
+                report.update({
+                    'count': paginator.page.paginator.count,
+                    'next': paginator.get_next_link(),
+                    'previous': paginator.get_previous_link(),
+                    'results': [query.serialize(row) for row in rows],
+                })
+            return report
+
+        cache_key = snapshot_cache_key('reports:pivot', key_params)
+        return Response(get_or_compute(cache_key, compute, settings.REPORT_CACHE_TIMEOUT))
+
+
+class PivotExportView(ReportView):
+    def get(self, request):
+        """Stream every pivot row as CSV (same parameters as the pivot, without paging)"""
+        query = PivotQuery(request.query_params)
+        response = StreamingHttpResponse(iter_pivot_csv(query), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="pivot_{query.source_name}.csv"'
+        return response
+
+
+class CohortReportView(ReportView):
+    def get(self, request):
+        """
+        Customer retention by activation cohort, monthly churn and MAC client growth, cached
+        Read from the monthly customer snapshots (capture_customer_snapshots)
+        Query parameters:
+        - start_month, end_month: Range (YYYY-MM, default: last 12 months)
+        - customer_type, kam_id: Filters
+        """
+        params = request.query_params
+        key_params = {
+            name: params[name]
+            for name in ['start_month', 'end_month', 'customer_type', 'kam_id']
+            if params.get(name)
+        }
+        key_params.update({
+            # The default range is relative to today
+            'today': timezone.localdate(),
+            'snapshots': get_snapshot_version(),
+        })
+        cache_key = snapshot_cache_key('reports:cohorts', key_params)
+        return Response(get_or_compute(cache_key, lambda: cohort_report(params), settings.REPORT_CACHE_TIMEOUT))
@@ -65,24 +65,27 @@ class User(AbstractUser):
         if self.is_superuser:
             return True
         
-        if not self.role:
+        if not self.role_id:
             return False
         
-        return self.role.permissions.filter(codename=permission_codename).exists()
+        from apps.utility.refdata import role_permissions
+        return permission_codename in role_permissions(self.role_id)
     
     def has_perm(self, perm):
         """Django permission check"""
         if self.is_superuser:
             return True
         
-        if not self.role:
+        if not self.role_id:
             return False
         
-        return self.role.permissions.filter(codename=perm).exists()
+        from apps.utility.refdata import role_permissions
+        return perm in role_permissions(self.role_id)
     
     def get_permissions_list(self):
         """Get all permissions for the user"""
-        if not self.role:
+        if not self.role_id:
             return []
         
-        return list(self.role.get_permissions())
+        from apps.utility.refdata import role_permissions
+        return sorted(role_permissions(self.role_id))
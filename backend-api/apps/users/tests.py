@@ -1,3 +1,32 @@
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from apps.authentication.models import Role
+from tests.query_budget import measure
+
+User = get_user_model()
+
+
+class UserListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(email='admin@example.com', username='admin', password='admin')
+        roles = [Role.objects.create(name=name) for name in ('sales_person', 'data_entry', 'sales_manager')]
+        for index in range(6):
+            User.objects.create_user(
+                email=f'user{index}@example.com', username=f'user{index}', password='user', role=roles[index % 3]
+            )
+
+    def test_role_names_cost_no_query_per_user(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        url = reverse('users-list-create')
+        response = client.get(url, {'page_size': 100, 'ordering': 'email'})
+        self.assertEqual(
+            [row.get('role_name') for row in response.data['results'][:4]],
+            [None, 'sales_person', 'data_entry', 'sales_manager'],
+        )
+        self.assertEqual(measure(client, url, 2).queries, measure(client, url, 100).queries)
@@ -35,7 +35,7 @@ class MeView(APIView):
 
 
 class UserListCreateView(generics.ListCreateAPIView):
-    queryset = User.objects.all()
+    queryset = User.objects.select_related('role')
     permission_classes = [permissions.IsAuthenticated, IsAdminOrSuperAdmin]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['role', 'is_active']
@@ -49,7 +49,7 @@ class UserListCreateView(generics.ListCreateAPIView):
 
 
 class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = User.objects.all()
+    queryset = User.objects.select_related('role')
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated, IsAdminOrSuperAdmin]
 
@@ -5,3 +5,6 @@ class UtilityConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.utility'
 
+
+    def ready(self):
+        from . import signals  # noqa: F401
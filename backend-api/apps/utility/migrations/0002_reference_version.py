@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:33
+
+from django.db import migrations, models
+
+
+def create_versions(apps, schema_editor):
+    ReferenceVersion = apps.get_model('utility', 'ReferenceVersion')
+    ReferenceVersion.objects.bulk_create([
+        ReferenceVersion(table=table) for table in ('packages', 'utility', 'kams', 'roles')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('utility', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferenceVersion',
+            fields=[
+                ('table', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('version', models.PositiveBigIntegerField(default=1)),
+            ],
+            options={
+                'db_table': 'reference_version',
+            },
+        ),
+        migrations.RunPython(create_versions, migrations.RunPython.noop),
+    ]
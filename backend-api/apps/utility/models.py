@@ -49,3 +49,15 @@ class UtilityDetails(models.Model):
     def __str__(self):
         return f"{self.type} - {self.name} ({self.number})"
 
+
+
+class ReferenceVersion(models.Model):
+    """Version counter of cached data (see apps.utility.versions), shared by every worker"""
+    table = models.CharField(max_length=50, primary_key=True)
+    version = models.PositiveBigIntegerField(default=1)
+
+    class Meta:
+        db_table = 'reference_version'
+
+    def __str__(self):
+        return f"{self.table} v{self.version}"
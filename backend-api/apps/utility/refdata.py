@@ -0,0 +1,229 @@
+"""
+Reference-data cache for small, rarely changing tables.
+
+Packages and their pricings, utility information and its account
+details, KAMs, and roles with their permissions are read as immutable
+snapshots. Each table has a version counter (see versions), bumped by
+signals once a write to it commits. A snapshot is looked up first in a
+small per-process LRU, then in the shared cache, and only then loaded
+from the database, all under the current version. A worker therefore serves the
+new data from its next request after a change.
+"""
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+from functools import cached_property
+from types import MappingProxyType
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch
+from rest_framework.settings import api_settings
+
+from .versions import get_version
+
+
+TABLES = ['packages', 'utility', 'kams', 'roles']
+
+
+def _freeze(rows):
+    return tuple(MappingProxyType(dict(row)) for row in rows)
+
+
+def _by_id(rows):
+    return MappingProxyType({row['id']: row for row in rows})
+
+
+# ---- snapshots -------------------------------------------------------------
+# Loaders return plain picklable data for the shared cache; snapshot classes
+# wrap it read-only for the process.
+
+class PackagesSnapshot:
+    """Serialized packages (pricings nested) and raw pricing rows"""
+
+    def __init__(self, data):
+        self.packages = _freeze(data['packages'])
+        self.pricings = _freeze(data['pricings'])
+
+    @cached_property
+    def pricing_index(self):
+        from apps.package.pricing import PricingIndex
+        return PricingIndex.from_rows(self.pricings)
+
+
+def _load_packages():
+    from apps.package.models import PackageMaster, PackagePricing
+    from apps.package.serializers import PackageMasterSnapshotSerializer
+
+    packages = PackageMaster.objects.prefetch_related(
+        Prefetch('pricings', queryset=PackagePricing.objects.order_by('-val_start_at'))
+    ).order_by('package_name', 'id')
+    payload = PackageMasterSnapshotSerializer(packages, many=True).data
+    pricings = PackagePricing.objects.order_by().values(
+        'id', 'package_master_id', 'rate', 'mbps', 'val_start_at', 'val_end_at', 'is_active'
+    )
+    return {'packages': [dict(row) for row in payload], 'pricings': list(pricings)}
+
+
+class UtilitySnapshot:
+    """Serialized utility information (details nested) and raw rows for lookups"""
+
+    def __init__(self, data):
+        self.masters = _freeze(data['masters'])
+        self.rows = _freeze(data['rows'])
+        self.by_id = _by_id(self.rows)
+
+    @property
+    def active(self):
+        """The newest active utility information row, or None"""
+        return next((row for row in self.rows if row['is_active']), None)
+
+
+def _load_utility():
+    from apps.utility.models import UtilityInformationMaster
+    from apps.utility.serializers import UtilityInformationMasterSerializer
+
+    masters = UtilityInformationMaster.objects.prefetch_related('details').order_by('-created_at', '-id')
+    rows = masters.values('id', 'vat_rate', 'is_active')
+    return {
+        'masters': [dict(row) for row in UtilityInformationMasterSerializer(masters, many=True).data],
+        'rows': list(rows),
+    }
+
+
+class KAMsSnapshot:
+    """Every KAM row by id"""
+
+    def __init__(self, data):
+        self.rows = _freeze(data)
+        self.by_id = _by_id(self.rows)
+
+    def instance(self, kam_id):
+        """A detached KAMMaster built from the snapshot, or None; assigning it to an FK costs no query"""
+        from apps.customers.models import KAMMaster
+        row = self.by_id.get(kam_id)
+        return KAMMaster(**row) if row else None
+
+
+def _load_kams():
+    from apps.customers.models import KAMMaster
+    return list(KAMMaster.objects.order_by('id').values())
+
+
+class RolesSnapshot:
+    """Role rows by id with the codenames each grants"""
+
+    def __init__(self, data):
+        self.rows = _freeze(data['roles'])
+        self.by_id = _by_id(self.rows)
+        self.permissions = MappingProxyType({
+            role_id: frozenset(codenames) for role_id, codenames in data['permissions'].items()
+        })
+
+    def role_permissions(self, role_id):
+        return self.permissions.get(role_id, frozenset())
+
+
+def _load_roles():
+    from apps.authentication.models import Role
+    permissions = {}
+    for role_id, codename in Role.permissions.through.objects.order_by().values_list('role_id', 'permission__codename'):
+        permissions.setdefault(role_id, []).append(codename)
+    return {'roles': list(Role.objects.order_by('id').values('id', 'name', 'is_active')), 'permissions': permissions}
+
+
+SNAPSHOTS = {
+    'packages': (_load_packages, PackagesSnapshot),
+    'utility': (_load_utility, UtilitySnapshot),
+    'kams': (_load_kams, KAMsSnapshot),
+    'roles': (_load_roles, RolesSnapshot),
+}
+
+
+# ---- two-tier lookup -------------------------------------------------------
+
+class LocalCache:
+    """Small thread-safe LRU of snapshots keyed by (table, version)"""
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_local = LocalCache(settings.REFDATA_LOCAL_SIZE)
+
+
+def clear_local():
+    """Drop this process's snapshots; the next lookups go to the shared cache"""
+    _local.clear()
+
+
+def get_snapshot(table):
+    """The current snapshot of a reference table"""
+    version = get_version(table)
+    snapshot = _local.get((table, version))
+    if snapshot is None:
+        load, wrap = SNAPSHOTS[table]
+        shared_key = f'refdata:{table}:v{version}'
+        data = cache.get(shared_key)
+        if data is None:
+            data = load()
+            cache.set(shared_key, data, timeout=settings.REFDATA_CACHE_TIMEOUT)
+        snapshot = _local.put((table, version), wrap(data))
+    return snapshot
+
+
+def packages():
+    return get_snapshot('packages')
+
+
+def utility():
+    return get_snapshot('utility')
+
+
+def kams():
+    return get_snapshot('kams')
+
+
+def roles():
+    return get_snapshot('roles')
+
+
+def role_permissions(role_id):
+    """Codenames granted to a role (frozenset)"""
+    return roles().role_permissions(role_id)
+
+
+def vat_rate(utility_id):
+    """VAT rate of a utility information row; 0 for None or an unknown id"""
+    row = utility().by_id.get(utility_id)
+    return row['vat_rate'] if row else Decimal('0')
+
+
+def is_unfiltered_list(view):
+    """
+    True when a list request has no filter, search or ordering parameter,
+    so the view can page through a snapshot instead of querying
+    """
+    params = list(getattr(view, 'filterset_fields', None) or []) + [api_settings.SEARCH_PARAM, api_settings.ORDERING_PARAM]
+    return not any(view.request.query_params.get(name) for name in params)
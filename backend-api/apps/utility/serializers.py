@@ -37,6 +37,7 @@ class UtilityInformationMasterSerializer(serializers.ModelSerializer):
     
     def get_active_details(self, obj):
         """Get only active utility details"""
-        active = obj.details.filter(is_active=True)
+        # Filtered in Python so prefetched details are reused
+        active = [detail for detail in obj.details.all() if detail.is_active]
         return UtilityDetailsSerializer(active, many=True).data
 
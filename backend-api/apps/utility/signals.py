@@ -0,0 +1,40 @@
+"""
+Signal handlers keeping the reference-data cache current
+"""
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete
+
+from apps.authentication.models import Permission, Role
+from apps.customers.models import KAMMaster
+from apps.package.models import PackageMaster, PackagePricing
+from .models import UtilityInformationMaster, UtilityDetails
+from .versions import bump_version
+
+# Reference table each model's writes invalidate
+SOURCES = {
+    PackageMaster: 'packages',
+    PackagePricing: 'packages',
+    UtilityInformationMaster: 'utility',
+    UtilityDetails: 'utility',
+    KAMMaster: 'kams',
+    Role: 'roles',
+    Permission: 'roles',
+}
+
+
+def reference_data_changed(sender, **kwargs):
+    """Bump the table's version once the write is committed"""
+    transaction.on_commit(partial(bump_version, SOURCES[sender]))
+
+
+def role_permissions_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(partial(bump_version, 'roles'))
+
+
+for model in SOURCES:
+    post_save.connect(reference_data_changed, sender=model, dispatch_uid=f'refdata_save_{model.__name__}')
+    post_delete.connect(reference_data_changed, sender=model, dispatch_uid=f'refdata_delete_{model.__name__}')
+m2m_changed.connect(role_permissions_changed, sender=Role.permissions.through, dispatch_uid='refdata_role_permissions')
@@ -0,0 +1,57 @@
+"""
+Version counters for cached data, shared by every worker.
+
+A cache embeds the version of what it was built from in its keys and is
+invalidated by bumping that version once a write commits. The counters
+live in the reference_version table rather than in the cache, which is
+per process unless REDIS_URL is set, so a bump reaches every worker.
+Each request reads all the counters in one query; outside a request
+every lookup reads them afresh.
+"""
+from asgiref.local import Local
+from django.core.signals import request_finished, request_started
+from django.db.models import F
+
+
+# Versions read by the current request; None outside a request
+_request = Local()
+
+
+def _start_request(**kwargs):
+    _request.versions = {}
+
+
+def _finish_request(**kwargs):
+    _request.versions = None
+
+
+request_started.connect(_start_request, dispatch_uid='versions_start_request')
+request_finished.connect(_finish_request, dispatch_uid='versions_finish_request')
+
+
+def _load_versions():
+    from .models import ReferenceVersion
+    return dict(ReferenceVersion.objects.values_list('table', 'version'))
+
+
+def get_version(name):
+    """Current version of name, read once per request"""
+    versions = getattr(_request, 'versions', None)
+    if versions is None:
+        return _load_versions().get(name, 1)
+    if not versions:
+        versions.update(_load_versions())
+    return versions.get(name, 1)
+
+
+def bump_version(name):
+    """Invalidate everything cached under the current version of name, in every process"""
+    from .models import ReferenceVersion
+    counter = ReferenceVersion.objects.filter(table=name)
+    if not counter.update(version=F('version') + 1):
+        # First bump of name: create its row, racing other workers safely
+        ReferenceVersion.objects.bulk_create([ReferenceVersion(table=name)], ignore_conflicts=True)
+        counter.update(version=F('version') + 1)
+    # The rest of this request sees the write too
+    if getattr(_request, 'versions', None):
+        _request.versions.clear()
@@ -2,6 +2,7 @@
 REST API Views for Utility App - GET only
 """
 from rest_framework import viewsets, generics, permissions, filters
+from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import UtilityInformationMaster, UtilityDetails
 from .serializers import (
@@ -9,6 +10,7 @@ from .serializers import (
     UtilityDetailsSerializer,
 )
 from apps.authentication.permissions import RequirePermissions
+from . import refdata
 
 
 class UtilityInformationMasterListView(generics.ListAPIView):
@@ -21,6 +23,14 @@ class UtilityInformationMasterListView(generics.ListAPIView):
     filterset_fields = ['is_active']
     ordering_fields = ['created_at']
 
+    def list(self, request, *args, **kwargs):
+        # Unfiltered lists are paged straight out of the utility snapshot
+        if not refdata.is_unfiltered_list(self):
+            return super().list(request, *args, **kwargs)
+        masters = [item for item in refdata.utility().masters if item['is_active']]
+        page = self.paginate_queryset(masters)
+        return Response(masters) if page is None else self.get_paginated_response(page)
+
 
 class UtilityInformationMasterDetailView(generics.RetrieveAPIView):
     """GET only - Retrieve single Utility Information Master"""
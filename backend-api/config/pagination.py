@@ -0,0 +1,11 @@
+"""
+Default pagination for the API
+"""
+from django.conf import settings
+from rest_framework.pagination import PageNumberPagination
+
+
+class StandardPagination(PageNumberPagination):
+    """Page-number pagination; clients may ask for up to PAGINATION_MAX_SIZE rows with ?page_size="""
+    page_size_query_param = 'page_size'
+    max_page_size = settings.PAGINATION_MAX_SIZE
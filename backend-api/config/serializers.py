@@ -0,0 +1,230 @@
+"""
+Batched serializer fields and sparse fieldsets.
+
+A BatchField gets its value from a loader method on its serializer that
+is called with all the objects being serialized and returns a mapping of
+object pk to value. Under BatchListSerializer the loader runs once per
+list, i.e. once per page of a list endpoint, so a related lookup is one
+IN query however many rows the page has. A single object is loaded on
+its own. The list also prefetches the relations its child's nested
+serializers and dotted sources go through, where the queryset has not.
+
+SparseFieldsMixin lets a GET request pick the fields of the response
+with ?fields= and ?expand= (see FieldSelection); fields left out are
+never evaluated, and views consult the same FieldSelection to leave
+out the joins, prefetches and annotations only those fields need.
+"""
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models import Count, prefetch_related_objects
+from rest_framework import serializers
+
+
+class BatchField(serializers.Field):
+    """
+    Read-only field resolved by a loader method of the serializer,
+    load_<field_name>(objs) unless loader names another one. The loader
+    returns {obj.pk: value} with an entry for every obj. Fields sharing a
+    loader share one call; key picks an item out of each value.
+    """
+
+    def __init__(self, loader=None, key=None, **kwargs):
+        self.loader = loader
+        self.key = key
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def bind(self, field_name, parent):
+        super().bind(field_name, parent)
+        if self.loader is None:
+            self.loader = f'load_{field_name}'
+
+    def to_representation(self, obj):
+        loaded = getattr(self.parent, '_batch_values', {}).get(self.loader)
+        if loaded is None or obj.pk not in loaded:
+            loaded = getattr(self.parent, self.loader)([obj])
+        value = loaded[obj.pk]
+        return value[self.key] if self.key is not None and value is not None else value
+
+
+def _relation_paths(model, serializer, prefix=''):
+    """Lookups of the relations serializer's fields read through, nested serializers included"""
+    for field in serializer.fields.values():
+        if field.source == '*':
+            continue
+        nested = isinstance(field, serializers.BaseSerializer)
+        attrs = field.source_attrs if nested else field.source_attrs[:-1]
+        related = model
+        for attr in attrs:
+            try:
+                relation = related._meta.get_field(attr)
+            except FieldDoesNotExist:
+                break
+            if not relation.is_relation:
+                break
+            related = relation.related_model
+        else:
+            if attrs:
+                path = prefix + '__'.join(attrs)
+                yield path
+                if nested:
+                    yield from _relation_paths(related, getattr(field, 'child', field), f'{path}__')
+
+
+def _items(data):
+    return list(data.all() if isinstance(data, models.manager.BaseManager) else data or [])
+
+
+def prime(serializer, objs):
+    """
+    Prefetch the relations serializer's fields read and run its batch
+    loaders over objs, once per loader; nested lists are primed with the
+    children of all of objs at once.
+    """
+    if objs:
+        prefetch_related_objects(objs, *sorted(set(_relation_paths(type(objs[0]), serializer))))
+    values = {}
+    for field in serializer.fields.values():
+        if isinstance(field, BatchField) and field.loader not in values:
+            values[field.loader] = getattr(serializer, field.loader)(objs) if objs else {}
+        elif isinstance(field, BatchListSerializer) and field.source != '*':
+            prime(field.child, [child for obj in objs for child in _items(field.get_attribute(obj))])
+    serializer._batch_values = values
+    serializer._batch_primed = {obj.pk for obj in objs}
+
+
+class BatchListSerializer(serializers.ListSerializer):
+    """ListSerializer that resolves its child's batch fields once for the whole list"""
+
+    def to_representation(self, data):
+        items = _items(data)
+        if not {item.pk for item in items} <= getattr(self.child, '_batch_primed', set()):
+            prime(self.child, items)
+        return [self.child.to_representation(item) for item in items]
+
+
+# ---- loader helpers --------------------------------------------------------
+
+def is_prefetched(obj, name):
+    return name in getattr(obj, '_prefetched_objects_cache', {})
+
+
+def aggregate_by(objs, queryset, field, aggregate, default=0):
+    """{obj.pk: aggregate over the rows of queryset whose field is obj.pk}, one grouped query"""
+    pks = [obj.pk for obj in objs]
+    values = dict(
+        queryset.filter(**{f'{field}__in': pks}).order_by().values(field).annotate(value=aggregate).values_list(field, 'value')
+    )
+    return {pk: default if values.get(pk) is None else values[pk] for pk in pks}
+
+
+def count_related(objs, name):
+    """{obj.pk: number of obj.<name>}, from prefetched rows when every obj has them, else one grouped COUNT"""
+    if all(is_prefetched(obj, name) for obj in objs):
+        return {obj.pk: len(getattr(obj, name).all()) for obj in objs}
+    relation = objs[0]._meta.get_field(name)
+    return aggregate_by(objs, relation.related_model._default_manager, relation.field.name, Count('pk'))
+
+
+# ---- sparse fieldsets ------------------------------------------------------
+
+def _names(value):
+    return {name.strip() for name in value.split(',') if name.strip()} if value is not None else None
+
+
+@lru_cache(maxsize=None)
+def _field_names(serializer_class):
+    # Without a request in its context the serializer keeps all its fields
+    return frozenset(serializer_class().fields)
+
+
+def _check_names(param, names, valid):
+    unknown = (names or set()) - valid
+    if unknown:
+        return {param: [
+            f"Unknown name(s) in ?{param}=: {', '.join(sorted(unknown))}. "
+            f"Valid names: {', '.join(sorted(valid)) or 'none'}."
+        ]}
+    return {}
+
+
+class FieldSelection:
+    """
+    The top-level fields a GET request asked for.
+
+    ?fields=a,b limits the response to those fields. Fields listed in the
+    serializer's Meta.expandable_fields (nested or costly ones) are also
+    controlled by ?expand=x,y: once either parameter is given, an
+    expandable field is only included when it is named in one of them,
+    so ?expand= alone drops all of them. Without both parameters, and on
+    other methods, every field is included. A name the serializer does not
+    have is rejected with a 400 listing the valid ones.
+    """
+
+    def __init__(self, fields=None, expand=None, expandable=()):
+        self.fields = fields
+        self.expand = expand
+        self.expandable = frozenset(expandable)
+
+    @classmethod
+    def from_request(cls, request, serializer_class):
+        if request is None or request.method != 'GET':
+            return ALL_FIELDS
+        fields = _names(request.query_params.get('fields') or None)
+        expand = _names(request.query_params.get('expand'))
+        if fields is None and expand is None:
+            return ALL_FIELDS
+        meta = getattr(serializer_class, 'Meta', None)
+        expandable = frozenset(getattr(meta, 'expandable_fields', ()))
+        errors = {
+            **_check_names('fields', fields, _field_names(serializer_class)),
+            **_check_names('expand', expand, expandable),
+        }
+        if errors:
+            raise serializers.ValidationError(errors)
+        return cls(fields, expand, expandable)
+
+    @classmethod
+    def for_view(cls, view):
+        """The selection of the view's request, for trimming its queryset"""
+        request = getattr(view, 'request', None)
+        if request is None or request.method != 'GET':
+            return ALL_FIELDS
+        return cls.from_request(request, view.get_serializer_class())
+
+    def wants(self, *names):
+        """True when any of names is part of the response"""
+        return any(self._wants(name) for name in names)
+
+    def _wants(self, name):
+        if name in self.expandable:
+            return name in (self.fields or set()) | (self.expand or set())
+        return self.fields is None or name in self.fields
+
+    def trim(self, data):
+        """A dict of data with only the selected keys"""
+        return data if self is ALL_FIELDS else {name: value for name, value in data.items() if self._wants(name)}
+
+
+ALL_FIELDS = FieldSelection()
+
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin applying the request's FieldSelection to its fields.
+    Only the serializer at the top of the response is trimmed, not the
+    ones nested in it.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        root = self.parent if isinstance(self.parent, serializers.ListSerializer) else self
+        if root.parent is not None:
+            return fields
+        selection = FieldSelection.from_request(self.context.get('request'), type(self))
+        if selection is ALL_FIELDS:
+            return fields
+        return {name: field for name, field in fields.items() if selection.wants(name)}
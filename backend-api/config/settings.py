@@ -67,6 +67,8 @@ INSTALLED_APPS = [
     'apps.payment',
     'apps.utility',
     'apps.feedback',
+    'apps.dashboard',
+    'apps.reports',
 ]
 
 MIDDLEWARE = [
@@ -194,7 +196,7 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'config.pagination.StandardPagination',
     'PAGE_SIZE': 10,
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -255,8 +257,45 @@ SPECTACULAR_SETTINGS = {
     ],
 }
 
+# Cache: shared Redis when REDIS_URL is set, otherwise per-process memory
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+REPORT_CACHE_TIMEOUT = config('REPORT_CACHE_TIMEOUT', default=300, cast=int)
+# Seconds between incremental daily_revenue_fact refreshes of refresh_revenue_facts --every
+DASHBOARD_FACT_MAX_AGE = config('DASHBOARD_FACT_MAX_AGE', default=60, cast=int)
+# Answer dashboard fact queries from an in-process NumPy copy of daily_revenue_fact
+DASHBOARD_CUBE_ENABLED = config('DASHBOARD_CUBE_ENABLED', default=False, cast=bool)
+# Live KPI streams (/api/dashboard/stream/): open connections allowed per worker, seconds between keepalives
+DASHBOARD_STREAM_MAX_CONNECTIONS = config('DASHBOARD_STREAM_MAX_CONNECTIONS', default=200, cast=int)
+DASHBOARD_STREAM_HEARTBEAT = config('DASHBOARD_STREAM_HEARTBEAT', default=15, cast=int)
+# Without REDIS_URL stream events stay in the worker whose write produced them, so
+# the stream is only served when set here for a single-process ASGI server
+DASHBOARD_STREAM_SINGLE_PROCESS = config('DASHBOARD_STREAM_SINGLE_PROCESS', default=False, cast=bool)
+# Feedback view counts are buffered per worker and written in one UPDATE every
+# FEEDBACK_VIEW_FLUSH_INTERVAL seconds or once FEEDBACK_VIEW_FLUSH_SIZE items are pending
+FEEDBACK_VIEW_FLUSH_INTERVAL = config('FEEDBACK_VIEW_FLUSH_INTERVAL', default=30, cast=int)
+FEEDBACK_VIEW_FLUSH_SIZE = config('FEEDBACK_VIEW_FLUSH_SIZE', default=500, cast=int)
+# Reference-data snapshots (packages, utility info, KAMs, roles): seconds kept in the
+# shared cache per version, and snapshots held in each worker's LRU
+REFDATA_CACHE_TIMEOUT = config('REFDATA_CACHE_TIMEOUT', default=3600, cast=int)
+REFDATA_LOCAL_SIZE = config('REFDATA_LOCAL_SIZE', default=16, cast=int)
+
 ACTIVITY_LOG_ENABLED = config('ACTIVITY_LOG_ENABLED', default=True, cast=bool)
 PAGINATION_DEFAULT_SIZE = config('PAGINATION_DEFAULT_SIZE', default=10, cast=int)
+# Largest page a client may ask for with ?page_size=
+PAGINATION_MAX_SIZE = config('PAGINATION_MAX_SIZE', default=100, cast=int)
 
 # Swagger/OpenAPI Settings (drf_yasg)
 SWAGGER_SETTINGS = {
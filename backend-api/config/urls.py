@@ -53,4 +53,6 @@ urlpatterns = [
     path('api/packages/', include('apps.package.urls')),
     path('api/utility/', include('apps.utility.urls')),
     path('api/feedback/', include('apps.feedback.urls')),
+    path('api/dashboard/', include('apps.dashboard.urls')),
+    path('api/reports/', include('apps.reports.urls')),
 ]
@@ -0,0 +1,241 @@
+"""
+Query-count budgets for the API.
+
+seed() fills the database with a few hundred rows per table, api_routes()
+walks config/urls.py for every GET route under /api/, and measure() calls
+one with a page size, counting SQL queries and wall time. A route passes
+when it stays within its budget and costs the same number of queries at
+page size 100 as at 10: anything that grows with the page is an N+1.
+Wall time is only reported, never asserted: it depends on the machine.
+"""
+import time
+from collections import namedtuple
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver, reverse
+
+from apps.authentication.models import Role
+from apps.bills.models import CustomerEntitlementMaster, CustomerEntitlementDetails, InvoiceMaster, InvoiceDetails
+from apps.customers.models import CustomerMaster, KAMMaster, Prospect
+from apps.dashboard.facts import refresh_daily_revenue_facts
+from apps.feedback.models import Feedback, FeedbackComment, FeedbackVote
+from apps.package.models import PackageMaster, PackagePricing
+from apps.payment.models import PaymentMaster, PaymentDetails
+from apps.utility import refdata
+from apps.utility.models import UtilityInformationMaster, UtilityDetails
+
+User = get_user_model()
+
+
+PAGE_SIZES = (10, 100)
+
+# Queries a route may issue per request; everything not listed gets DEFAULT_BUDGET
+DEFAULT_BUDGET = 12
+BUDGETS = {
+    # Exports stream one SELECT, however many rows they write, plus the activity log
+    'customer-export': 3,
+    'invoice-aging-export': 3,
+    'reports-pivot-export': 3,
+    # Dashboard reads only the fact tables; refresh_revenue_facts keeps them current
+    'dashboard-kpis': 4,
+    'dashboard-weekly-revenue': 4,
+    'dashboard-monthly-revenue': 4,
+    'dashboard-yearly-revenue': 4,
+    'dashboard-customer-wise-revenue': 4,
+    'dashboard-kam-performance': 4,
+}
+
+# Not JSON endpoints (docs, event stream) or not meaningful without a body
+SKIP = {'schema-swagger-ui', 'schema-redoc', 'schema-json', 'api-root', 'dashboard-stream'}
+
+# Models behind URL keyword arguments that are not the view's own pk
+KWARG_MODELS = {'feedback_id': Feedback, 'user_id': User}
+
+Route = namedtuple('Route', ['name', 'kwargs', 'model'])
+Measurement = namedtuple('Measurement', ['status', 'queries', 'ms', 'rows'])
+
+
+def seed(scale=150):
+    """Seed scale customers with entitlements, invoices, payments, prospects and feedback; returns a superuser"""
+    call_command('seed_rbac', verbosity=0)
+    admin = User.objects.create_superuser(email='budget@example.com', username='budget', password='budget')
+    roles = list(Role.objects.order_by('id'))
+    users = User.objects.bulk_create([
+        User(email=f'user{index}@example.com', username=f'user{index}', role=roles[index % len(roles)])
+        for index in range(30)
+    ])
+
+    utility = UtilityInformationMaster.objects.create(vat_rate=Decimal('15'), terms_condition='Net 30')
+    UtilityDetails.objects.bulk_create([
+        UtilityDetails(utility_master_id=utility, type='bank', name=f'Bank {index}', number=str(index))
+        for index in range(3)
+    ])
+
+    packages = PackageMaster.objects.bulk_create([
+        PackageMaster(package_name=f'Package {index}', package_type='soho') for index in range(20)
+    ])
+    # Three consecutive 120-day pricings per package, the last one current
+    start = date.today() - timedelta(days=300)
+    pricings = PackagePricing.objects.bulk_create([
+        PackagePricing(
+            package_master_id=package, rate=Decimal(500 + 100 * step), mbps=10 * (step + 1),
+            val_start_at=start + timedelta(days=120 * step), val_end_at=start + timedelta(days=120 * step + 119),
+        )
+        for package in packages for step in range(3)
+    ])
+
+    kams = KAMMaster.objects.bulk_create([KAMMaster(kam_name=f'KAM {index}') for index in range(20)])
+    types = [choice for choice, _ in CustomerMaster.CUSTOMER_TYPE_CHOICES]
+    customers = CustomerMaster.objects.bulk_create([
+        CustomerMaster(
+            customer_name=f'Customer {index}', email=f'customer{index}@example.com', address='-',
+            customer_type=types[index % len(types)], kam_id=kams[index % len(kams)],
+            customer_number=f'CUST-{index:05d}', created_by=admin,
+        )
+        for index in range(scale)
+    ])
+    # The first customer has a second entitlement, so it has a previous bill
+    entitlements = CustomerEntitlementMaster.objects.bulk_create([
+        CustomerEntitlementMaster(
+            customer_master_id=customer, bill_number=f'BL-{index}', activation_date=start, created_by=admin,
+        )
+        for index, customer in enumerate(customers + customers[:1])
+    ])
+    details = CustomerEntitlementDetails.objects.bulk_create([
+        CustomerEntitlementDetails(
+            cust_entitlement_id=entitlement, start_date=start, end_date=start + timedelta(days=730),
+            type='soho' if line else 'bw', package_pricing_id=pricings[(entitlement.id + line) % len(pricings)],
+            mbps=Decimal(10 + line), unit_price=Decimal(100), remarks='IPT - seeded', created_by=admin,
+        )
+        for entitlement in entitlements for line in range(2)
+    ])
+    invoices = InvoiceMaster.objects.bulk_create([
+        InvoiceMaster(
+            invoice_number=f'INV-{entitlement.id}', customer_entitlement_master_id=entitlement,
+            issue_date=date.today() - timedelta(days=entitlement.id % 90), information_master_id=utility,
+            total_bill_amount=Decimal('2300'), total_vat_amount=Decimal('300'), total_balance_due=Decimal('1150'),
+            total_paid_amount=Decimal('1150'), status='partial', created_by=admin,
+        )
+        for entitlement in entitlements
+    ])
+    InvoiceDetails.objects.bulk_create([
+        InvoiceDetails(invoice_master_id=invoice, entitlement_details_id=detail, sub_total=Decimal('1000'), vat_rate=Decimal('15'))
+        for invoice, detail in zip(
+            [invoice for invoice in invoices for _ in range(2)], details
+        )
+    ])
+    payments = PaymentMaster.objects.bulk_create([
+        PaymentMaster(
+            payment_date=invoice.issue_date, payment_method='bank_transfer', status='completed',
+            customer_entitlement_master_id=invoice.customer_entitlement_master_id, invoice_master_id=invoice,
+            received_by=admin, created_by=admin,
+        )
+        for invoice in invoices
+    ])
+    PaymentDetails.objects.bulk_create([
+        PaymentDetails(
+            payment_master_id=payment, pay_amount=Decimal('1150'), status='completed', received_by=admin, created_by=admin,
+        )
+        for payment in payments
+    ])
+
+    Prospect.objects.bulk_create([
+        Prospect(name=f'Prospect {index}', email=f'prospect{index}@example.com', kam=users[index % len(users)])
+        for index in range(scale)
+    ])
+    feedback = Feedback.objects.bulk_create([
+        Feedback(
+            title=f'Feedback {index}', description=f'Seeded feedback number {index}',
+            submitted_by=users[index % len(users)], status='pending',
+        )
+        for index in range(scale)
+    ])
+    FeedbackComment.objects.bulk_create([
+        FeedbackComment(feedback=item, user=admin, content='Noted')
+        for item in feedback for _ in range(2)
+    ])
+    FeedbackVote.objects.bulk_create([FeedbackVote(feedback=item, user=admin) for item in feedback])
+    # bulk_create sends no signals; build the dashboard facts as a deploy would
+    refresh_daily_revenue_facts(full=True)
+    return admin
+
+
+def _walk(patterns, kwargs=()):
+    for pattern in patterns:
+        names = kwargs + tuple(_kwarg_names(pattern.pattern))
+        if isinstance(pattern, URLResolver):
+            yield from _walk(pattern.url_patterns, names)
+        else:
+            yield pattern, names
+
+
+def _kwarg_names(pattern):
+    converters = getattr(pattern, 'converters', None)
+    if converters:
+        return list(converters)
+    regex = getattr(pattern, 'regex', None)
+    return list(regex.groupindex) if regex is not None else []
+
+
+def _get_view(callback):
+    """The DRF view class of a GET route, or None"""
+    view = getattr(callback, 'cls', None)
+    actions = getattr(callback, 'actions', None)
+    if actions is not None:
+        return view if 'get' in actions else None
+    return view if view is not None and hasattr(view, 'get') else None
+
+
+def api_routes():
+    """Every GET route under /api/, once per name"""
+    seen = set()
+    for pattern, kwargs in _walk(get_resolver().url_patterns):
+        if not pattern.name or pattern.name in SKIP or pattern.name in seen:
+            continue
+        view = _get_view(pattern.callback)
+        if view is None or 'format' in kwargs:
+            continue
+        seen.add(pattern.name)
+        queryset = getattr(view, 'queryset', None)
+        model = None
+        if kwargs:
+            model = KWARG_MODELS.get(kwargs[0]) or (queryset.model if queryset is not None else None)
+            if model is None:
+                continue
+        yield Route(pattern.name, kwargs, model)
+
+
+def route_url(route):
+    if not route.kwargs:
+        return reverse(route.name)
+    pk = route.model.objects.order_by('pk').values_list('pk', flat=True).first()
+    return reverse(route.name, kwargs={route.kwargs[0]: pk})
+
+
+def budget(route):
+    return BUDGETS.get(route.name, DEFAULT_BUDGET)
+
+
+def measure(client, url, page_size):
+    """
+    Call url cold (empty cache); the status, SQL query count, wall time and
+    rows returned. Streamed responses (the exports) run their queries while
+    the body is produced, so the body is consumed inside the capture.
+    """
+    cache.clear()
+    refdata.clear_local()
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        response = client.get(url, {'page_size': page_size})
+        if response.streaming:
+            b''.join(response.streaming_content)
+        elapsed = (time.perf_counter() - started) * 1000
+    data = getattr(response, 'data', None)
+    rows = len(data['results']) if isinstance(data, dict) and isinstance(data.get('results'), list) else None
+    return Measurement(response.status_code, len(queries), elapsed, rows)
@@ -0,0 +1,45 @@
+import os
+from unittest import mock
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from apps.feedback.counters import ViewCounter
+from .query_budget import PAGE_SIZES, api_routes, budget, measure, route_url, seed
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Every GET route under /api/ stays within its query budget, and costs the
+    same at every page size. Set QUERY_BUDGET_REPORT=1 to print the numbers.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = seed()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        # Buffer every feedback view, so a flush that falls due mid-test does not add a query
+        counter = ViewCounter(interval=3600, max_pending=10 ** 6)
+        patcher = mock.patch('apps.feedback.counters.view_counter', counter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(counter.stop)
+
+    def test_routes_within_budget(self):
+        report = []
+        for route in api_routes():
+            with self.subTest(route=route.name):
+                url = route_url(route)
+                small, large = (measure(self.client, url, size) for size in PAGE_SIZES)
+                report.append((route.name, budget(route), small, large))
+                self.assertEqual(large.status, 200, url)
+                self.assertLessEqual(large.queries, budget(route), url)
+                self.assertEqual(large.queries, small.queries, f'{url}: queries grow with the page size')
+
+        if os.environ.get('QUERY_BUDGET_REPORT'):
+            print(f'\n{"route":<36} {"budget":>6} ' + ' '.join(f'{f"q{size}":>5} {f"ms{size}":>7}' for size in PAGE_SIZES))
+            for name, limit, *measurements in report:
+                print(f'{name:<36} {limit:>6} ' + ' '.join(f'{m.queries:>5} {m.ms:>7.1f}' for m in measurements))
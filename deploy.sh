@@ -34,6 +34,12 @@ pip install -r requirements.txt
 echo "🗄️  Running database migrations..."
 python manage.py migrate  
 
+# Catch the dashboard facts up, then refresh them every minute from cron
+echo "📊 Refreshing dashboard facts..."
+python manage.py refresh_revenue_facts
+FACTS_CRON="* * * * * cd $(pwd) && flock -n /tmp/refresh_revenue_facts.lock venv/bin/python manage.py refresh_revenue_facts >> /tmp/refresh_revenue_facts.log 2>&1"
+(crontab -l 2>/dev/null | grep -v 'refresh_revenue_facts'; echo "$FACTS_CRON") | crontab -
+
 # Collect static files
 echo "📁 Collecting static files..."
 python manage.py collectstatic --noinput
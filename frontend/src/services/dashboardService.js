@@ -87,35 +87,39 @@ const dashboardService = {
     }
   },
 
+  /**
+   * Get the whole dashboard (KPIs, series, customer-wise, KAM) in one request
+   * @param {Object} params - Optional period, start_date, end_date and filters
+   * @returns {Promise<Object>} Dashboard snapshot
+   */
+  getSnapshot: async (params = {}) => {
+    try {
+      const response = await axios.get(`${API_BASE_URL}/dashboard/snapshot/`, { params });
+      return response.data || {};
+    } catch (error) {
+      console.error('Error fetching dashboard snapshot:', error);
+      throw error;
+    }
+  },
+
   /**
    * Get dashboard summary statistics
    * @returns {Promise<Object>} Summary statistics
    */
   getSummary: async () => {
     try {
-      const [weekly, monthly, yearly, customerWise] = await Promise.all([
-        dashboardService.getWeeklyRevenue(),
-        dashboardService.getMonthlyRevenue(),
-        dashboardService.getYearlyRevenue(),
-        dashboardService.getCustomerWiseRevenue(),
-      ]);
-
-      const totalRevenue = monthly.reduce((sum, item) => sum + (item.revenue || 0), 0);
-      const totalCustomers = customerWise.length;
-      const activeCustomers = customerWise.length;
-      const collectionRate = customerWise.length > 0
-        ? (customerWise.filter(c => c.collectionRate > 0).length / customerWise.length * 100).toFixed(1)
-        : 0;
+      const snapshot = await dashboardService.getSnapshot();
+      const summary = snapshot.summary || {};
 
       return {
-        totalRevenue,
-        totalCustomers,
-        activeCustomers,
-        collectionRate,
-        weeklyData: weekly,
-        monthlyData: monthly,
-        yearlyData: yearly,
-        customerWiseData: customerWise,
+        totalRevenue: summary.total_revenue || 0,
+        totalCustomers: summary.total_customers || 0,
+        activeCustomers: summary.active_customers || 0,
+        collectionRate: summary.collection_rate || 0,
+        weeklyData: snapshot.weekly || [],
+        monthlyData: snapshot.monthly || [],
+        yearlyData: snapshot.yearly || [],
+        customerWiseData: snapshot.customer_wise || [],
       };
     } catch (error) {
       console.error('Error fetching dashboard summary:', error);